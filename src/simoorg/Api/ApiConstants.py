@@ -23,8 +23,26 @@ API_PIPE_DIR = '/tmp/'
 READ_TIMEOUT_SECS = 2
 MOIRAI_GET_COMMAND_PREFIX = 'api_get_'
 MOIRAI_OTHER_COMMAND_PREFIX = 'api_other_'
-API_COMMANDS = ['list', 'plan', 'events', 'servers']
+API_COMMANDS = ['list', 'plan', 'events', 'servers', 'metrics', 'stats']
+# Commands whose output only changes when the service registers again,
+# the output of list changes with every new service
+SERVICE_DATA_COMMANDS = ['plan', 'servers']
 THREADPOOL_SIZE = 1
+# api.yaml keys for the moirai threads executing api commands and
+# the bounded queue feeding them
+API_WORKERS_KEY = 'api_workers'
+API_QUEUE_SIZE_KEY = 'api_queue_size'
+DEFAULT_API_WORKERS = 4
+DEFAULT_API_QUEUE_SIZE = 64
+# api.yaml key for the unix socket of the RPC channel, when it is not set
+# the api server talks to moirai through the FIFO
+RPC_SOCKET_KEY = 'moirai_rpc_socket'
+
+# Optional arguments of the events command, with their types, and the
+# keys of a paginated events response
+EVENTS_PAGE_ARGS = [('cursor', int), ('since', float), ('limit', int)]
+EVENTS_KEY = 'events'
+NEXT_CURSOR_KEY = 'next_cursor'
 
 # Moriai fifo msg keys
 FIFO_ENDPOINT_KEY = "api_fifo_path"
@@ -35,3 +53,8 @@ METHOD_KEY = 'method'
 
 # Api Fifo msg keys
 COMMAND_OUTPUT_KEY = "command_output"
+# Version of the command output, sent as its ETag by the api server
+COMMAND_VERSION_KEY = "version"
+# Version of the service data in moirai, also pushed on the RPC channel
+# whenever a service registers
+DATA_VERSION_KEY = "data_version"
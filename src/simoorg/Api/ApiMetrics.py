@@ -0,0 +1,142 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Counters and latency samples for the api commands handled by moirai,
+    reported through the metrics api command
+"""
+import threading
+from collections import deque
+
+# Number of recent latencies kept per command for the percentiles
+LATENCY_SAMPLES = 1000
+
+
+class ApiMetrics(object):
+    """
+        Api metrics class
+    """
+    def __init__(self, samples=LATENCY_SAMPLES):
+        """
+            Init function for the ApiMetrics class
+            Args:
+                samples - Number of recent latencies kept per command
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.samples = samples
+        # command -> [count, total seconds, max seconds, recent samples]
+        self.command_latency = {}
+        self.queue_wait = deque(maxlen=samples)
+        self.dropped_replies = 0
+        self.metrics_lock = threading.Lock()
+
+    def record_command(self, command, latency):
+        """
+            Record the execution time of a command
+            Args:
+                command - the api command
+                latency - execution time in seconds
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.metrics_lock.acquire()
+        try:
+            if command not in self.command_latency:
+                self.command_latency[command] = \
+                    [0, 0.0, 0.0, deque(maxlen=self.samples)]
+            stats = self.command_latency[command]
+            stats[0] += 1
+            stats[1] += latency
+            stats[2] = max(stats[2], latency)
+            stats[3].append(latency)
+        finally:
+            self.metrics_lock.release()
+
+    def record_queue_wait(self, wait_time):
+        """
+            Record how long a command waited in the work queue
+            Args:
+                wait_time - seconds between reading and executing a command
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.metrics_lock.acquire()
+        try:
+            self.queue_wait.append(wait_time)
+        finally:
+            self.metrics_lock.release()
+
+    def record_dropped_reply(self):
+        """
+            Count a reply which could not be delivered to its client
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.metrics_lock.acquire()
+        try:
+            self.dropped_replies += 1
+        finally:
+            self.metrics_lock.release()
+
+    def get_snapshot(self):
+        """
+            Returns the current metrics, latencies are in milliseconds
+            Args:
+                None
+            Return:
+                A dict with the per command latencies, the queue wait
+                percentiles and the number of dropped replies
+            Raise:
+                None
+        """
+        self.metrics_lock.acquire()
+        try:
+            commands = {}
+            for command, stats in self.command_latency.iteritems():
+                count, total, max_latency, recent = stats
+                commands[command] = {
+                    'count': count,
+                    'mean_ms': total * 1000 / count,
+                    'max_ms': max_latency * 1000,
+                    'p50_ms': get_percentile(recent, 0.5) * 1000,
+                    'p99_ms': get_percentile(recent, 0.99) * 1000}
+            return {'commands': commands,
+                    'queue_wait_p50_ms':
+                    get_percentile(self.queue_wait, 0.5) * 1000,
+                    'queue_wait_p99_ms':
+                    get_percentile(self.queue_wait, 0.99) * 1000,
+                    'dropped_replies': self.dropped_replies}
+        finally:
+            self.metrics_lock.release()
+
+
+def get_percentile(samples, fraction):
+    """
+        Nearest rank percentile of a sequence of samples, 0 if empty
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -22,7 +22,9 @@ import yaml
 import time
 from flask import Flask
 from flask import request
+from flask import Response
 import simoorg.Api.ApiConstants as ApiConstants
+from simoorg.Api.RpcChannel import RpcClient, RpcError
 import uuid
 import os
 import signal
@@ -36,12 +38,18 @@ class MoiraiApiServer(object):
         self.app = Flask(__name__)
         self.service_map = {}
         self.event_map = {}
+        # (command, service name) -> (version, output) of versioned outputs
+        self.response_cache = {}
         signal.signal(signal.SIGTERM, self.term_handler)
         signal.signal(signal.SIGQUIT, self.term_handler)
         signal.signal(signal.SIGINT, self.term_handler)
 
         with open(config_dir) as config_fd:
             self.api_config = yaml.load(config_fd)
+        self.rpc_client = None
+        if self.api_config.get(ApiConstants.RPC_SOCKET_KEY):
+            self.rpc_client = RpcClient(
+                self.api_config[ApiConstants.RPC_SOCKET_KEY])
         self.api_fifo_name = str(uuid.uuid4()) + '.fifo'
         self.api_fifo_path = os.path.join(ApiConstants.API_PIPE_DIR,
                                           self.api_fifo_name)
@@ -73,6 +81,9 @@ class MoiraiApiServer(object):
         """
         print "SHUTTING DOWN THE API SERVER"
 
+        if self.rpc_client is not None:
+            self.rpc_client.close()
+
         # close api fifo file obj
         try:
             self.api_fifo_file.close()
@@ -126,8 +137,7 @@ class MoiraiApiServer(object):
                 Set up a route that returns a list of services
             """
             args = {}
-            op_msg = self.execute_command(command, args, request.method)
-            return op_msg
+            return self.make_response(command, args)
 
         @self.app.route('/<service_name>/<command>')
         def get_plan(service_name, command):
@@ -135,14 +145,88 @@ class MoiraiApiServer(object):
                 Set up a route that returns the current plan
             """
             args = {'service_name': service_name}
-            op_msg = self.execute_command(command, args, request.method)
+            for arg_name, _ in ApiConstants.EVENTS_PAGE_ARGS:
+                if arg_name in request.args:
+                    args[arg_name] = request.args[arg_name]
+            return self.make_response(command, args)
+
+    def make_response(self, command, args):
+        """
+            Answer an api call. Versioned outputs carry their version as
+            ETag and a conditional GET for the current version gets an
+            empty 304 response
+        """
+        op_msg, version = self.fetch_output(command, args, request.method)
+        if version is None:
             return op_msg
+        if request.if_none_match.contains(version):
+            response = Response(status=304)
+        else:
+            response = Response(op_msg)
+        response.set_etag(version)
+        return response
+
+    def fetch_output(self, command, args, method):
+        """
+            Return the output of a command with its version, served from
+            the response cache while the data version pushed by moirai
+            over the RPC channel shows it is still current
+        """
+        cache_key = (command, args.get('service_name'))
+        cached = self.response_cache.get(cache_key)
+        if method == 'GET' and cached is not None and \
+                self.is_current(command, cached[0]):
+            return cached[1], cached[0]
+        op_msg, version = self.execute_versioned_command(command, args,
+                                                         method)
+        if method == 'GET' and version is not None:
+            self.response_cache[cache_key] = (version, op_msg)
+        return op_msg, version
+
+    def is_current(self, command, version):
+        """
+            Check whether a cached output version is still current. The
+            FIFO has no way to push versions, so without the RPC channel
+            every request, conditional or not, is a full round trip to
+            moirai and only the reply to the http client is saved
+        """
+        if self.rpc_client is None:
+            return False
+        data_version = self.rpc_client.data_version
+        if data_version is None:
+            return False
+        if command in ApiConstants.SERVICE_DATA_COMMANDS:
+            # the plan and servers of a service stay the same until a
+            # fate book reload replaces or removes a service, which
+            # changes the version prefix
+            return (version.rsplit('-', 1)[0] ==
+                    data_version.rsplit('-', 1)[0])
+        return version == data_version
 
     def execute_command(self, command, args, method):
         """
-            For any given command and arguments, the function connects to
-            the moirai FIFO and reads the ouput via api FIFO
+            For any given command and arguments, the function sends the
+            command to moirai over the RPC channel if one is configured,
+            else it connects to the moirai FIFO and reads the ouput via
+            api FIFO
+        """
+        return self.execute_versioned_command(command, args, method)[0]
+
+    def execute_versioned_command(self, command, args, method):
         """
+            Same as execute_command, but returns a tuple of the output and
+            its version, the version is None for outputs which are not
+            versioned and for errors
+        """
+        if self.rpc_client is not None:
+            try:
+                response_map = self.rpc_client.request(command, args, method)
+            except RpcError as exc:
+                op_msg = str(exc)
+                print "LOG: " + op_msg
+                return op_msg, None
+            return (response_map[ApiConstants.COMMAND_OUTPUT_KEY],
+                    response_map.get(ApiConstants.COMMAND_VERSION_KEY))
         if self.moirai_fifo_fd is None:
             try:
                 self.moirai_fifo_fd = os.open(
@@ -151,7 +235,7 @@ class MoiraiApiServer(object):
                 self.moirai_fifo_file = os.fdopen(self.moirai_fifo_fd, 'w')
             except:
                 self.moirai_fifo_fd = None
-                return "Unable to connect to Moirai Service"
+                return "Unable to connect to Moirai Service", None
         self.command_id = self.command_id + 1
         command_map = {ApiConstants.FIFO_ENDPOINT_KEY: self.api_fifo_path,
                        ApiConstants.COMMAND_ID_KEY: self.command_id,
@@ -165,12 +249,12 @@ class MoiraiApiServer(object):
         except IOError:
             op_msg = ("Unable to communicate with moirai")
             print "LOG: " + op_msg
-            return op_msg
+            return op_msg, None
         except OSError:
             self.moirai_fifo_fd = None
             op_msg = ("Unable to communicate with moirai")
             print "LOG: " + op_msg
-            return op_msg
+            return op_msg, None
 
         # Read from api fifo
         start_time = time.time()
@@ -184,18 +268,19 @@ class MoiraiApiServer(object):
             if current_time - start_time > ApiConstants.READ_TIMEOUT_SECS:
                 op_msg = ("No message recieved from Moirai")
                 print "LOG: " + op_msg
-                return op_msg
+                return op_msg, None
         try:
             output_obj = json.loads(output_string)
         except ValueError:
             op_msg = "Recieved object is not a json object"
             print "LOG: " + op_msg
-            return op_msg
+            return op_msg, None
         if output_obj[ApiConstants.COMMAND_ID_KEY] != self.command_id:
             op_msg = ("Recieved output with incorrect command id")
             print "LOG: " + op_msg
-            return op_msg
-        return output_obj[ApiConstants.COMMAND_OUTPUT_KEY]
+            return op_msg, None
+        return (output_obj[ApiConstants.COMMAND_OUTPUT_KEY],
+                output_obj.get(ApiConstants.COMMAND_VERSION_KEY))
 
 
 def create_app(config_path):
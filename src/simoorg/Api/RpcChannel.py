@@ -0,0 +1,517 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    A local RPC channel between the api server and moirai over a unix
+    domain socket. Messages are json objects, one per line, using the same
+    keys as the FIFO messages. Every request carries a command id and its
+    response carries the same id, so one connection can have many requests
+    in flight and responses may come back in any order. The client keeps
+    its connection open across requests and reconnects when it breaks.
+    Moirai also pushes messages without a command id to every connection,
+    these carry the current data version so the api server knows when its
+    cached outputs went stale
+"""
+import os
+import json
+import errno
+import socket
+import itertools
+import threading
+from multiprocessing.pool import ThreadPool
+
+import simoorg.Api.ApiConstants as ApiConstants
+
+DEFAULT_SERVER_WORKERS = 8
+LISTEN_BACKLOG = 64
+RECV_CHUNK_SIZE = 65536
+
+
+class RpcError(Exception):
+    """
+        Raised when the RPC connection to moirai could not be used
+    """
+    pass
+
+
+class RpcTimeout(RpcError):
+    """
+        Raised when moirai did not answer a request in time
+    """
+    pass
+
+
+class LineSocket(object):
+    """
+        Wraps a connected socket to send and receive json lines, sends
+        are serialized so several threads can share the socket
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.read_buffer = ''
+
+    def send_message(self, message):
+        """
+            Send a dict as a single json line
+            Raise:
+                socket.error - The connection is broken
+        """
+        data = json.dumps(message) + '\n'
+        self.send_lock.acquire()
+        try:
+            self.sock.sendall(data)
+        finally:
+            self.send_lock.release()
+
+    def recv_message(self):
+        """
+            Block until a complete line arrived and return it decoded,
+            returns None once the peer closed the connection
+            Raise:
+                socket.error - The connection is broken
+                ValueError - The line is not valid json
+        """
+        while '\n' not in self.read_buffer:
+            chunk = self.sock.recv(RECV_CHUNK_SIZE)
+            if not chunk:
+                return None
+            self.read_buffer += chunk
+        line, self.read_buffer = self.read_buffer.split('\n', 1)
+        return json.loads(line)
+
+    def close(self):
+        """
+            Close the socket ignoring errors
+        """
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+
+class RpcServer(object):
+    """
+        Moirai side of the channel, accepts connections and runs every
+        request through the dispatch function on a thread pool
+    """
+    def __init__(self, socket_path, dispatch,
+                 workers=DEFAULT_SERVER_WORKERS):
+        """
+            Init function for the RpcServer class
+            Args:
+                socket_path - Path of the unix socket to listen on
+                dispatch - A callable taking (command, args, method) and
+                    returning the command output along with a dict of
+                    extra keys for the response
+                workers - Number of requests handled in parallel
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.socket_path = socket_path
+        self.dispatch = dispatch
+        self.workers = workers
+        self.listen_sock = None
+        self.request_pool = None
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.stopped = False
+
+    def start(self):
+        """
+            Bind the socket and start accepting connections on a daemon
+            thread, a stale socket file left by a previous run is removed
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                socket.error - Unable to bind the socket
+        """
+        try:
+            os.unlink(self.socket_path)
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+        self.listen_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listen_sock.bind(self.socket_path)
+        self.listen_sock.listen(LISTEN_BACKLOG)
+        self.request_pool = ThreadPool(self.workers)
+        accept_thread = threading.Thread(target=self.accept_loop)
+        accept_thread.daemon = True
+        accept_thread.start()
+
+    def accept_loop(self):
+        """
+            Accept connections and start a reader thread for each one
+        """
+        while not self.stopped:
+            try:
+                sock, _ = self.listen_sock.accept()
+            except socket.error:
+                if self.stopped:
+                    return
+                continue
+            connection = LineSocket(sock)
+            self.connections_lock.acquire()
+            try:
+                self.connections.append(connection)
+            finally:
+                self.connections_lock.release()
+            reader_thread = threading.Thread(target=self.read_loop,
+                                             args=(connection,))
+            reader_thread.daemon = True
+            reader_thread.start()
+
+    def read_loop(self, connection):
+        """
+            Read requests from a connection and queue them for the workers
+        """
+        try:
+            while True:
+                try:
+                    request_map = connection.recv_message()
+                except ValueError:
+                    print "[Error] Recieved non json object, skipping"
+                    continue
+                if request_map is None:
+                    break
+                self.request_pool.apply_async(self.handle_request,
+                                              (connection, request_map))
+        except socket.error:
+            pass
+        finally:
+            connection.close()
+            self.connections_lock.acquire()
+            try:
+                if connection in self.connections:
+                    self.connections.remove(connection)
+            finally:
+                self.connections_lock.release()
+
+    def handle_request(self, connection, request_map):
+        """
+            Run a single request and send back its output
+        """
+        command_id = request_map.get(ApiConstants.COMMAND_ID_KEY)
+        try:
+            command = request_map[ApiConstants.COMMAND_KEY]
+            args = request_map[ApiConstants.ARGS_KEY]
+            method = request_map[ApiConstants.METHOD_KEY]
+        except KeyError as exc:
+            command_output = "Malformed message missing {0}".format(exc)
+            response_keys = {}
+        else:
+            try:
+                command_output, response_keys = self.dispatch(command, args,
+                                                              method)
+            except Exception:
+                command_output = "Unexpected error in moirai"
+                response_keys = {}
+        response_map = {ApiConstants.COMMAND_ID_KEY: command_id,
+                        ApiConstants.COMMAND_OUTPUT_KEY: command_output}
+        response_map.update(response_keys)
+        try:
+            connection.send_message(response_map)
+        except socket.error:
+            # the client went away, its reader thread cleans up
+            pass
+
+    def broadcast(self, message):
+        """
+            Send a message to every connected client, clients which went
+            away are skipped
+            Args:
+                message - A dict without a command id
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.connections_lock.acquire()
+        try:
+            connections = list(self.connections)
+        finally:
+            self.connections_lock.release()
+        for connection in connections:
+            try:
+                connection.send_message(message)
+            except socket.error:
+                pass
+
+    def stop(self):
+        """
+            Stop accepting connections and close the open ones
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.stopped = True
+        if self.listen_sock is not None:
+            try:
+                self.listen_sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            self.listen_sock.close()
+        self.connections_lock.acquire()
+        try:
+            connections = list(self.connections)
+        finally:
+            self.connections_lock.release()
+        for connection in connections:
+            connection.close()
+        if self.request_pool is not None:
+            self.request_pool.terminate()
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+
+def is_newer_version(data_version, current_version):
+    """
+        Compare two moirai data versions, which look like
+        "<instance id>.<data epoch>-<data version>"
+        Args:
+            data_version - The version just received
+            current_version - The version known so far, or None
+        Return:
+            True if data_version should replace current_version
+        Raise:
+            None
+    """
+    if current_version is None:
+        return True
+    try:
+        prefix, version = data_version.rsplit('-', 1)
+        instance_id, epoch = prefix.rsplit('.', 1)
+        current_prefix, current = current_version.rsplit('-', 1)
+        current_instance_id, current_epoch = current_prefix.rsplit('.', 1)
+        if instance_id != current_instance_id:
+            # moirai restarted, its versions start over
+            return True
+        return ((int(epoch), int(version)) >
+                (int(current_epoch), int(current)))
+    except ValueError:
+        return True
+
+
+class RpcClient(object):
+    """
+        Api server side of the channel, safe to share between threads.
+        Requests from all threads go over one connection and a reader
+        thread hands every response to the thread waiting for its id
+    """
+    def __init__(self, socket_path, timeout=ApiConstants.READ_TIMEOUT_SECS):
+        """
+            Init function for the RpcClient class
+            Args:
+                socket_path - Path of the unix socket moirai listens on
+                timeout - Default seconds to wait for a response
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.connection = None
+        self.connection_pid = None
+        self.connection_lock = threading.Lock()
+        self.command_ids = itertools.count(1)
+        # Latest data version heard from moirai, None while not connected
+        self.data_version = None
+        # command id -> [threading.Event, response message, connection]
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+    def get_connection(self):
+        """
+            Return the open connection, connecting first if needed. A
+            connection inherited through fork is never reused
+            Raise:
+                RpcError - Unable to connect to moirai
+        """
+        self.connection_lock.acquire()
+        try:
+            if self.connection is not None and \
+                    self.connection_pid == os.getpid():
+                return self.connection
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+            except socket.error as exc:
+                sock.close()
+                raise RpcError("Unable to connect to moirai: {0}"
+                               .format(exc))
+            connection = LineSocket(sock)
+            self.connection = connection
+            self.connection_pid = os.getpid()
+            reader_thread = threading.Thread(target=self.read_loop,
+                                             args=(connection,))
+            reader_thread.daemon = True
+            reader_thread.start()
+            return connection
+        finally:
+            self.connection_lock.release()
+
+    def read_loop(self, connection):
+        """
+            Route every response to the request waiting for it
+        """
+        try:
+            while True:
+                try:
+                    response_map = connection.recv_message()
+                except ValueError:
+                    continue
+                if response_map is None:
+                    break
+                data_version = response_map.get(
+                    ApiConstants.DATA_VERSION_KEY)
+                # a response may carry an older version than a broadcast
+                # which overtook it, never move backwards
+                if data_version is not None and \
+                        is_newer_version(data_version, self.data_version):
+                    self.data_version = data_version
+                command_id = response_map.get(ApiConstants.COMMAND_ID_KEY)
+                if command_id is None:
+                    continue
+                self.pending_lock.acquire()
+                try:
+                    waiter = self.pending.get(command_id)
+                finally:
+                    self.pending_lock.release()
+                # responses to requests which timed out are dropped
+                if waiter is not None:
+                    waiter[1] = response_map
+                    waiter[0].set()
+        except socket.error:
+            pass
+        finally:
+            self.drop_connection(connection)
+
+    def drop_connection(self, connection):
+        """
+            Close a broken connection and wake up its waiting requests
+        """
+        self.connection_lock.acquire()
+        try:
+            if self.connection is connection:
+                self.connection = None
+                # moirai may come back as a new instance
+                self.data_version = None
+        finally:
+            self.connection_lock.release()
+        connection.close()
+        self.pending_lock.acquire()
+        try:
+            for waiter in self.pending.values():
+                if waiter[2] is connection:
+                    waiter[0].set()
+        finally:
+            self.pending_lock.release()
+
+    def call(self, command, args, method, timeout=None):
+        """
+            Send a command to moirai and wait for its output
+            Args:
+                command - the api command
+                args - arguments for the command
+                method - api method name (GET/PUT/POST)
+                timeout - seconds to wait, defaults to the client timeout
+            Return:
+                The command output returned by moirai
+            Raise:
+                RpcTimeout - No response in time
+                RpcError - The connection could not be used
+        """
+        response_map = self.request(command, args, method, timeout)
+        return response_map[ApiConstants.COMMAND_OUTPUT_KEY]
+
+    def request(self, command, args, method, timeout=None):
+        """
+            Send a command to moirai and wait for the whole response
+            Args:
+                command - the api command
+                args - arguments for the command
+                method - api method name (GET/PUT/POST)
+                timeout - seconds to wait, defaults to the client timeout
+            Return:
+                The response dict, holding the command output and any
+                version keys
+            Raise:
+                RpcTimeout - No response in time
+                RpcError - The connection could not be used
+        """
+        if timeout is None:
+            timeout = self.timeout
+        command_id = next(self.command_ids)
+        waiter = [threading.Event(), None, None]
+        try:
+            connection = self.get_connection()
+            waiter[2] = connection
+            self.pending_lock.acquire()
+            try:
+                self.pending[command_id] = waiter
+            finally:
+                self.pending_lock.release()
+            try:
+                connection.send_message(
+                    {ApiConstants.COMMAND_ID_KEY: command_id,
+                     ApiConstants.COMMAND_KEY: command,
+                     ApiConstants.ARGS_KEY: args,
+                     ApiConstants.METHOD_KEY: method})
+            except socket.error as exc:
+                self.drop_connection(connection)
+                raise RpcError("Unable to send to moirai: {0}".format(exc))
+            waiter[0].wait(timeout)
+            if waiter[1] is not None:
+                return waiter[1]
+            if waiter[0].is_set():
+                raise RpcError("Connection to moirai closed")
+            raise RpcTimeout("No message recieved from Moirai")
+        finally:
+            self.pending_lock.acquire()
+            try:
+                self.pending.pop(command_id, None)
+            finally:
+                self.pending_lock.release()
+
+    def close(self):
+        """
+            Close the connection, the next call reconnects
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.connection_lock.acquire()
+        try:
+            connection = self.connection
+        finally:
+            self.connection_lock.release()
+        if connection is not None:
+            self.drop_connection(connection)
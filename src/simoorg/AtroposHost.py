@@ -0,0 +1,230 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Hosts several atropos in a single worker process, used by the pooled
+    engine of moirai. Each atropos runs its schedule on a thread of its own
+    and keeps its own journal, topology, logger and connection pool, so a
+    fate book still only affects its own service. SIGTERM is handled once
+    for the process and passed on to every hosted atropos, atropos with a
+    failure in flight ignore it while the others stop. Moirai can stop a
+    single hosted atropos through the control queue of the worker, under
+    the same rule
+"""
+import signal
+import threading
+import traceback
+
+import simoorg.atropos as atropos
+
+# How long the main thread blocks in a join, kept short so it can still
+# run the signal handler
+JOIN_INTERVAL = 1.0
+
+
+class AtroposHost(object):
+    """
+        Atropos host class
+    """
+    def __init__(self, configs, config_dir, output_queue, event_queue,
+                 verbose=False, debug=False, control_queue=None,
+                 stopped_queue=None, impact_ledger=None):
+        """
+            Init function for the AtroposHost class
+            Args:
+                configs - A dict mapping service names to fate book contents
+                config_dir - Path to config directory
+                output_queue - A multi processing queue to add atropos
+                information
+                event_queue - A multi processing queue to record event status
+                verbose - Verbosity flag
+                debug - debug flag
+                control_queue - A multi processing queue of the names of
+                    the services whose atropos should stop
+                stopped_queue - A multi processing queue the names of the
+                    services whose atropos stopped are added to
+                impact_ledger - The impact ledger moirai shares between
+                    all the atropos, None if there is none
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.configs = configs
+        self.config_dir = config_dir
+        self.output_queue = output_queue
+        self.event_queue = event_queue
+        self.verbose = verbose
+        self.debug = debug
+        self.hosted_atropos = {}
+        self.control_queue = control_queue
+        self.stopped_queue = stopped_queue
+        self.impact_ledger = impact_ledger
+        self.sigterm_received = False
+        # services asked to stop before their atropos was registered
+        self.stop_requested = set()
+        self.hosted_lock = threading.Lock()
+        self.atropos_threads = []
+
+    def run(self):
+        """
+            Start one thread for each fate book and wait for all of them
+            to finish
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        signal.signal(signal.SIGTERM, self.sigterm_handler)
+        if self.control_queue is not None:
+            control_thread = threading.Thread(target=self.control_loop)
+            control_thread.daemon = True
+            control_thread.start()
+        for service_name, config in sorted(self.configs.iteritems()):
+            atropos_thread = threading.Thread(target=self.run_atropos,
+                                              args=(service_name, config))
+            atropos_thread.daemon = True
+            atropos_thread.start()
+            self.atropos_threads.append(atropos_thread)
+        for atropos_thread in self.atropos_threads:
+            while atropos_thread.is_alive():
+                atropos_thread.join(JOIN_INTERVAL)
+
+    def run_atropos(self, service_name, config):
+        """
+            Create an atropos for a fate book and follow its plan, any
+            error only ends this atropos
+            Args:
+                service_name - Name of the service in the fate book
+                config - A dict containing fate book contents
+            Return:
+                None
+            Raise:
+                None
+        """
+        try:
+            atropos_obj = atropos.Atropos(config, self.config_dir,
+                                          self.output_queue,
+                                          self.event_queue,
+                                          verbose=self.verbose,
+                                          debug=self.debug,
+                                          install_signal_handler=False,
+                                          start=False,
+                                          impact_ledger=self.impact_ledger)
+            self.hosted_lock.acquire()
+            try:
+                self.hosted_atropos[service_name] = atropos_obj
+                if (self.sigterm_received or
+                        service_name in self.stop_requested):
+                    # SIGTERM or a stop request came in while this atropos
+                    # was starting up
+                    atropos_obj.request_stop()
+            finally:
+                self.hosted_lock.release()
+            atropos_obj.main_loop()
+        except SystemExit:
+            pass
+        except Exception:
+            print ("[ERROR]: Atropos for {0} stopped with an error"
+                   .format(service_name))
+            traceback.print_exc()
+        finally:
+            self.hosted_lock.acquire()
+            try:
+                self.hosted_atropos.pop(service_name, None)
+            finally:
+                self.hosted_lock.release()
+            if self.stopped_queue is not None:
+                self.stopped_queue.put(service_name)
+
+    def control_loop(self):
+        """
+            A thread stopping the hosted atropos named on the control
+            queue. An atropos with a failure in flight ignores the request
+            as it would ignore SIGTERM, moirai asks again later
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        while True:
+            try:
+                service_name = self.control_queue.get()
+            except (EOFError, IOError):
+                # the queue was torn down while moirai exits
+                return
+            self.hosted_lock.acquire()
+            try:
+                atropos_obj = self.hosted_atropos.get(service_name)
+                if atropos_obj is None:
+                    self.stop_requested.add(service_name)
+            finally:
+                self.hosted_lock.release()
+            if atropos_obj is not None and atropos_obj.handle_sigterm():
+                atropos_obj.request_stop()
+
+    def sigterm_handler(self, recvd_signal, frame):
+        """
+            Signal handler for the worker process, every hosted atropos
+            decides on its own, the process exits once all of them stopped
+            Args:
+                recvd_signal - Signal that was received
+                frame - Current stack frame
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.hosted_lock.acquire()
+        try:
+            self.sigterm_received = True
+            hosted_atropos = self.hosted_atropos.values()
+        finally:
+            self.hosted_lock.release()
+        for atropos_obj in hosted_atropos:
+            if atropos_obj.handle_sigterm():
+                atropos_obj.request_stop()
+
+
+def host_atropos(configs, config_dir, output_queue, event_queue,
+                 verbose=False, debug=False, control_queue=None,
+                 stopped_queue=None, impact_ledger=None):
+    """
+        Entry point of a pooled engine worker process
+        Args:
+            configs - A dict mapping service names to fate book contents
+            config_dir - Path to config directory
+            output_queue - A multi processing queue to add atropos information
+            event_queue - A multi processing queue to record event status
+            verbose - Verbosity flag
+            debug - debug flag
+            control_queue - A multi processing queue of the names of the
+                services whose atropos should stop
+            stopped_queue - A multi processing queue the names of the
+                services whose atropos stopped are added to
+            impact_ledger - The impact ledger moirai shares between all the
+                atropos, None if there is none
+        Return:
+            None
+        Raise:
+            None
+    """
+    AtroposHost(configs, config_dir, output_queue, event_queue,
+                verbose=verbose, debug=debug, control_queue=control_queue,
+                stopped_queue=stopped_queue,
+                impact_ledger=impact_ledger).run()
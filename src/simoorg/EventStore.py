@@ -0,0 +1,309 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Event store used by moirai to serve the events api. Each service has
+    an append only segment holding its events already encoded as json,
+    so an event is encoded once when it is recorded and never again.
+    Events are addressed by their position in the segment, which is the
+    cursor handed out to api clients, and a time index maps a timestamp
+    to the first position after it. Full pages of a segment never change,
+    their encoded form is cached and reused by every later response.
+    The store also keeps the recent timings of each failure, reported by
+    the stats api command
+"""
+import json
+import threading
+from bisect import bisect_right
+from collections import deque
+
+from simoorg.Api.ApiMetrics import get_percentile
+
+# Number of events in a cached page
+PAGE_SIZE = 500
+# Number of recent samples kept per failure and timing for the percentiles
+TIMING_SAMPLES = 1000
+# Keys of the timings atropos attaches to its events, all in seconds
+INDUCE_LATENCY_KEY = 'induce_latency'
+REVERT_LATENCY_KEY = 'revert_latency'
+TIME_TO_HEALTHY_KEY = 'time_to_healthy'
+TIMING_KEYS = [INDUCE_LATENCY_KEY, REVERT_LATENCY_KEY, TIME_TO_HEALTHY_KEY]
+REVERT_SUFFIX = '-revert'
+STATS_PERCENTILES = [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]
+
+
+class EventSegment(object):
+    """
+        Events of a single service in the order they were recorded
+    """
+    def __init__(self, page_size=PAGE_SIZE):
+        """
+            Init function for the EventSegment class
+            Args:
+                page_size - Number of events in a cached page
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.page_size = page_size
+        self.encoded_events = []
+        # Latest trigger time seen up to each position, sorted even if
+        # events of overlapping failures arrive slightly out of order
+        self.time_index = []
+        self.page_cache = {}
+
+    def __len__(self):
+        return len(self.encoded_events)
+
+    def append(self, event):
+        """
+            Encode an event and add it at the end of the segment
+            Args:
+                event - [failure_name, trigger_time, node_name,
+                         trigger_status]
+            Return:
+                None
+            Raise:
+                None
+        """
+        trigger_time = event[1]
+        if self.time_index and self.time_index[-1] > trigger_time:
+            trigger_time = self.time_index[-1]
+        self.encoded_events.append(json.dumps(event))
+        self.time_index.append(trigger_time)
+
+    def find_since(self, since):
+        """
+            Position of the first event recorded after the given time
+            Args:
+                since - Epoch time
+            Return:
+                A position in the segment
+            Raise:
+                None
+        """
+        return bisect_right(self.time_index, since)
+
+    def get_page(self, page_number):
+        """
+            Encoded contents of a full page, without the enclosing brackets
+        """
+        if page_number not in self.page_cache:
+            page_start = page_number * self.page_size
+            self.page_cache[page_number] = ','.join(
+                self.encoded_events[page_start:page_start + self.page_size])
+        return self.page_cache[page_number]
+
+    def encode_range(self, start, end):
+        """
+            Json list of the events between two positions, full pages
+            inside the range come from the page cache
+            Args:
+                start - Position of the first event
+                end - Position after the last event
+            Return:
+                The events encoded as a json list
+            Raise:
+                None
+        """
+        parts = []
+        position = start
+        while position < end:
+            page_number = position // self.page_size
+            page_end = (page_number + 1) * self.page_size
+            if (position == page_number * self.page_size and
+                    page_end <= end):
+                parts.append(self.get_page(page_number))
+                position = page_end
+            else:
+                stop = min(end, page_end)
+                parts.append(','.join(self.encoded_events[position:stop]))
+                position = stop
+        return '[' + ','.join(parts) + ']'
+
+
+class FailureTimings(object):
+    """
+        Recent timings of the successful events of one failure
+    """
+    def __init__(self, samples=TIMING_SAMPLES):
+        """
+            Init function for the FailureTimings class
+            Args:
+                samples - Number of recent samples kept per timing
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.timings = dict((timing_key, deque(maxlen=samples))
+                            for timing_key in TIMING_KEYS)
+        self.counts = dict((timing_key, 0) for timing_key in TIMING_KEYS)
+        # reverts after which the service did not turn healthy in time
+        self.unrecovered = 0
+
+    def record(self, timings):
+        """
+            Add the timings of an event
+            Args:
+                timings - dict of timing key to seconds
+            Return:
+                None
+            Raise:
+                None
+        """
+        for timing_key in TIMING_KEYS:
+            if timings.get(timing_key) is not None:
+                self.timings[timing_key].append(timings[timing_key])
+                self.counts[timing_key] += 1
+        if (TIME_TO_HEALTHY_KEY in timings and
+                timings[TIME_TO_HEALTHY_KEY] is None):
+            self.unrecovered += 1
+
+    def get_summary(self):
+        """
+            Count and percentiles of each timing recorded so far
+        """
+        summary = {'unrecovered': self.unrecovered}
+        for timing_key in TIMING_KEYS:
+            recent = self.timings[timing_key]
+            if not recent:
+                continue
+            summary[timing_key] = {'count': self.counts[timing_key]}
+            for name, fraction in STATS_PERCENTILES:
+                summary[timing_key][name] = get_percentile(recent, fraction)
+        return summary
+
+
+class EventStore(object):
+    """
+        Event store class
+    """
+    def __init__(self, page_size=PAGE_SIZE):
+        """
+            Init function for the EventStore class
+            Args:
+                page_size - Number of events in a cached page
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.page_size = page_size
+        self.segments = {}
+        # service -> failure name -> FailureTimings
+        self.failure_timings = {}
+        self.store_lock = threading.Lock()
+
+    def __contains__(self, service):
+        return service in self.segments
+
+    def add_event(self, service, event):
+        """
+            Record an event of a service
+            Args:
+                service - Name of the service
+                event - [failure_name, trigger_time, node_name,
+                         trigger_status] optionally followed by a dict of
+                         timings
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.store_lock.acquire()
+        try:
+            if service not in self.segments:
+                self.segments[service] = EventSegment(self.page_size)
+                self.failure_timings[service] = {}
+            self.segments[service].append(event)
+            if len(event) > 4 and event[4] and event[3]:
+                self.record_timings(service, event[0], event[4])
+        finally:
+            self.store_lock.release()
+
+    def record_timings(self, service, event_name, timings):
+        """
+            Add the timings of a successful event to the timings of its
+            failure, called with the store lock held
+        """
+        if event_name.endswith(REVERT_SUFFIX):
+            event_name = event_name[:-len(REVERT_SUFFIX)]
+        service_timings = self.failure_timings[service]
+        if event_name not in service_timings:
+            service_timings[event_name] = FailureTimings()
+        service_timings[event_name].record(timings)
+
+    def get_stats(self, service):
+        """
+            Get the timing percentiles of each failure of a service
+            Args:
+                service - Name of the service
+            Return:
+                dict of failure name to a dict with the count, p50, p95 and
+                p99 of each timing, in seconds, and the number of reverts
+                the service did not recover from in time
+            Raise:
+                None
+        """
+        self.store_lock.acquire()
+        try:
+            return dict((failure_name, timings.get_summary())
+                        for failure_name, timings in
+                        self.failure_timings.get(service, {}).iteritems())
+        finally:
+            self.store_lock.release()
+
+    def get_event_count(self, service):
+        """
+            Number of events recorded for a service
+        """
+        self.store_lock.acquire()
+        try:
+            if service not in self.segments:
+                return 0
+            return len(self.segments[service])
+        finally:
+            self.store_lock.release()
+
+    def get_events(self, service, cursor=None, since=None, limit=None):
+        """
+            Get the events of a service as a json list
+            Args:
+                service - Name of the service
+                cursor - Position to start from, as returned by an earlier
+                    call
+                since - Only return events recorded after this epoch time
+                limit - Maximum number of events returned
+            Return:
+                A tuple of the events encoded as a json list and the cursor
+                to pass in to get the events following them
+            Raise:
+                KeyError - No event was recorded for the service
+        """
+        self.store_lock.acquire()
+        try:
+            segment = self.segments[service]
+            start = 0
+            if cursor is not None:
+                start = max(start, min(cursor, len(segment)))
+            if since is not None:
+                start = max(start, segment.find_since(since))
+            end = len(segment)
+            if limit is not None:
+                end = min(end, start + max(limit, 0))
+            return segment.encode_range(start, end), end
+        finally:
+            self.store_lock.release()
@@ -0,0 +1,253 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Fate book loader used by moirai. Fate books are parsed with the libyaml
+    safe loader when it is available and checked against the fate book
+    schema. Every valid fate book is cached with the mtime, size and sha1
+    of its file, and the cache is saved to disk so a restart only parses
+    the fate books which changed since the last run
+"""
+import os
+import stat
+import hashlib
+import tempfile
+import cPickle as pickle
+
+import yaml
+try:
+    from yaml import CSafeLoader as FateBookYamlLoader
+except ImportError:
+    from yaml import SafeLoader as FateBookYamlLoader
+
+# Bump whenever the schema or the parsed form of a fate book changes,
+# older caches are then ignored
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join(
+    tempfile.gettempdir(), 'simoorg_fate_books_{0}.cache'.format(os.getuid()))
+
+NUMBER_TYPES = (int, long, float)
+HANDLER_SCHEMA = {'type': (basestring, True, None),
+                  'coordinate': (basestring, True, None),
+                  'arguments': (list, False, None)}
+FAILURE_SCHEMA = {'name': (basestring, True, None),
+                  'induce_handler': (dict, True, HANDLER_SCHEMA),
+                  'restore_handler': (dict, True, HANDLER_SCHEMA),
+                  'wait_seconds': (NUMBER_TYPES, True, None),
+                  'fanout': (dict, False, None)}
+# section name -> (type, mandatory, schema of the section items), the
+# schema of a list section applies to each of its items
+FATE_BOOK_SCHEMA = {'service': (basestring, True, None),
+                    'topology': (dict, True,
+                                 {'topology_plugin': (basestring, False,
+                                                      None),
+                                  'topology_config': (basestring, True,
+                                                      None)}),
+                    'logger': (dict, True, None),
+                    'impact_limits': (dict, False,
+                                      {'cluster': (basestring, False,
+                                                   None),
+                                       'per_host_maximum': (NUMBER_TYPES,
+                                                            False, None),
+                                       'per_group_maximum': (NUMBER_TYPES,
+                                                             False, None)}),
+                    'journal_log': (basestring, False, None),
+                    'connection_pool': (dict, False, None),
+                    'healthcheck': (dict, False,
+                                    {'plugin': (basestring, True, None)}),
+                    'destiny': (dict, True,
+                                {'scheduler_plugin': (basestring, True,
+                                                      None)}),
+                    'failures': (list, True, FAILURE_SCHEMA)}
+
+
+def validate_schema(config, schema, prefix=''):
+    """
+        Check a parsed fate book, or a part of it, against a schema
+        Args:
+            config - the parsed yaml
+            schema - dict of key to (type, mandatory, schema of the value)
+            prefix - path of config inside the fate book, for the errors
+        Return:
+            A list of error strings, empty if config matches the schema
+        Raise:
+            None
+    """
+    if not isinstance(config, dict):
+        return ["{0} should be a mapping".format(prefix or 'fate book')]
+    errors = []
+    for key, (value_type, mandatory, sub_schema) in sorted(
+            schema.iteritems()):
+        key_path = prefix + key
+        if config.get(key) is None:
+            if mandatory:
+                errors.append("missing {0}".format(key_path))
+            continue
+        value = config[key]
+        if not isinstance(value, value_type) or isinstance(value, bool):
+            errors.append("{0} has the wrong type {1}".format(
+                key_path, type(value).__name__))
+        elif sub_schema is not None and isinstance(value, list):
+            for index, item in enumerate(value):
+                errors.extend(validate_schema(
+                    item, sub_schema, "{0}[{1}].".format(key_path, index)))
+        elif sub_schema is not None:
+            errors.extend(validate_schema(value, sub_schema,
+                                          key_path + '.'))
+    return errors
+
+
+class FateBookLoader(object):
+    """
+        Fate book loader class
+    """
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH):
+        """
+            Init function for the FateBookLoader class, reads the cache
+            saved by an earlier run
+            Args:
+                cache_path - File the cache is saved to, None to only keep
+                    it in memory
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.cache_path = cache_path
+        # file path -> (mtime, size, sha1, parsed fate book)
+        self.cache = {}
+        self.cache_changed = False
+        self.parsed = 0
+        self.cached = 0
+        if cache_path is not None:
+            self.cache = self.read_cache()
+
+    def read_cache(self):
+        """
+            Read the cache file, a file which is missing, unreadable, from
+            another cache version or writable by other users is ignored
+        """
+        try:
+            with open(self.cache_path, 'rb') as cache_fd:
+                cache_stat = os.fstat(cache_fd.fileno())
+                # the cache is unpickled, only trust a file nobody else
+                # could have written
+                if (cache_stat.st_uid != os.getuid() or
+                        cache_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+                    return {}
+                version, cache = pickle.load(cache_fd)
+        except Exception:
+            return {}
+        if version != CACHE_VERSION or not isinstance(cache, dict):
+            return {}
+        return cache
+
+    def save(self):
+        """
+            Write the cache to the cache file if it changed, the file is
+            replaced atomically so concurrent runs never read half a cache
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None, a cache which can not be saved is only kept in memory
+        """
+        if self.cache_path is None or not self.cache_changed:
+            return
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_path))
+        try:
+            temp_fd, temp_path = tempfile.mkstemp(dir=cache_dir,
+                                                  prefix='.fate_books_')
+        except (IOError, OSError) as exc:
+            print "[WARNING]: Unable to save the fate book cache", exc
+            return
+        try:
+            with os.fdopen(temp_fd, 'wb') as cache_fd:
+                pickle.dump((CACHE_VERSION, self.cache), cache_fd,
+                            pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, self.cache_path)
+            self.cache_changed = False
+        except (IOError, OSError, pickle.PicklingError) as exc:
+            print "[WARNING]: Unable to save the fate book cache", exc
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def load(self, fate_book_path):
+        """
+            Get the parsed and validated contents of a fate book. The file
+            is not read again if its mtime and size match the cache, and
+            not parsed again if its sha1 matches
+            Args:
+                fate_book_path - Path to the fate book
+            Return:
+                The fate book as a dict, shared with the cache so it should
+                not be modified
+            Raise:
+                IOError/OSError - Unable to read the fate book
+                ValueError - The fate book is not valid yaml or does not
+                    match the fate book schema
+        """
+        fate_book_path = os.path.abspath(fate_book_path)
+        file_stat = os.stat(fate_book_path)
+        entry = self.cache.get(fate_book_path)
+        if (entry is not None and entry[0] == file_stat.st_mtime and
+                entry[1] == file_stat.st_size):
+            self.cached += 1
+            return entry[3]
+        with open(fate_book_path, 'rb') as fate_book_fd:
+            data = fate_book_fd.read()
+        digest = hashlib.sha1(data).hexdigest()
+        if entry is not None and entry[2] == digest:
+            # only touched, keep the parsed fate book under the new mtime
+            config = entry[3]
+            self.cached += 1
+        else:
+            try:
+                config = yaml.load(data, Loader=FateBookYamlLoader)
+            except yaml.YAMLError as exc:
+                raise ValueError("Unable to parse fate book {0}: {1}"
+                                 .format(fate_book_path, exc))
+            errors = validate_schema(config, FATE_BOOK_SCHEMA)
+            if errors:
+                raise ValueError("Invalid fate book {0}: {1}".format(
+                    fate_book_path, '; '.join(errors)))
+            self.parsed += 1
+        self.cache[fate_book_path] = (file_stat.st_mtime, file_stat.st_size,
+                                      digest, config)
+        self.cache_changed = True
+        return config
+
+    def forget(self, fate_books_dir, fate_book_paths):
+        """
+            Drop the cache entries of the fate books of a directory which
+            are not in the given list, so deleted fate books do not stay in
+            the cache forever. Entries of other directories are kept
+            Args:
+                fate_books_dir - The fate book directory
+                fate_book_paths - Paths of the fate books still in use
+            Return:
+                None
+            Raise:
+                None
+        """
+        fate_books_dir = os.path.abspath(fate_books_dir)
+        keep = set(os.path.abspath(path) for path in fate_book_paths)
+        for cached_path in self.cache.keys():
+            if (os.path.dirname(cached_path) == fate_books_dir and
+                    cached_path not in keep):
+                del self.cache[cached_path]
+                self.cache_changed = True
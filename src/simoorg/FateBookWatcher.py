@@ -0,0 +1,183 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Watches the fate book directory for changes so moirai can reload the
+    fate books while it runs. On linux the directory is watched with
+    inotify through libc, elsewhere or if inotify can not be set up the
+    directory is polled. The watcher only tells that something changed,
+    moirai then loads the fate books again and works out what changed
+"""
+import os
+import errno
+import select
+import ctypes
+import ctypes.util
+import time
+
+# inotify events which mean a fate book was written, added, moved or
+# removed
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+FATE_BOOK_EVENTS = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+                    IN_MOVED_TO | IN_CREATE | IN_DELETE)
+INOTIFY_READ_SIZE = 64 * 1024
+
+INOTIFY_MODE = 'inotify'
+POLLING_MODE = 'polling'
+DEFAULT_POLL_INTERVAL = 2.0
+# Editors write a file in several steps, later events arriving within this
+# many seconds are folded into the same change
+SETTLE_TIME = 0.2
+
+
+class FateBookWatcher(object):
+    """
+        Fate book watcher class
+    """
+    def __init__(self, fate_books_dir, poll_interval=DEFAULT_POLL_INTERVAL,
+                 use_inotify=True):
+        """
+            Init function for the FateBookWatcher class
+            Args:
+                fate_books_dir - The fate book directory
+                poll_interval - Seconds between two scans of the directory
+                    when it is polled
+                use_inotify - Try inotify before falling back to polling
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.fate_books_dir = fate_books_dir
+        self.poll_interval = poll_interval
+        self.inotify_fd = None
+        if use_inotify:
+            self.inotify_fd = self.init_inotify()
+        self.mode = INOTIFY_MODE if self.inotify_fd is not None \
+            else POLLING_MODE
+        self.snapshot = self.scan()
+
+    def init_inotify(self):
+        """
+            Set up an inotify watch on the fate book directory
+            Args:
+                None
+            Return:
+                The inotify file descriptor, None if inotify is not
+                available
+            Raise:
+                None
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                               use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return None
+        inotify_fd = inotify_init1(IN_NONBLOCK)
+        if inotify_fd < 0:
+            return None
+        if inotify_add_watch(inotify_fd, self.fate_books_dir,
+                             FATE_BOOK_EVENTS) < 0:
+            os.close(inotify_fd)
+            return None
+        return inotify_fd
+
+    def scan(self):
+        """
+            Name, mtime and size of every file of the fate book directory
+        """
+        snapshot = {}
+        try:
+            fate_files = os.listdir(self.fate_books_dir)
+        except OSError:
+            return snapshot
+        for fate_file in fate_files:
+            try:
+                file_stat = os.stat(os.path.join(self.fate_books_dir,
+                                                 fate_file))
+            except OSError:
+                continue
+            snapshot[fate_file] = (file_stat.st_mtime, file_stat.st_size)
+        return snapshot
+
+    def drain_inotify(self):
+        """
+            Read all the pending inotify events, returns True if there was
+            any
+        """
+        drained = False
+        while True:
+            try:
+                if not os.read(self.inotify_fd, INOTIFY_READ_SIZE):
+                    return drained
+            except OSError as exc:
+                if exc.errno in (errno.EAGAIN, errno.EINTR):
+                    return drained
+                raise
+            drained = True
+
+    def wait_for_change(self, timeout):
+        """
+            Block until the fate book directory changed or timeout seconds
+            went by
+            Args:
+                timeout - Most seconds to wait
+            Return:
+                True if the directory changed else False
+            Raise:
+                None
+        """
+        if self.mode == POLLING_MODE:
+            deadline = time.time() + timeout
+            while True:
+                snapshot = self.scan()
+                if snapshot != self.snapshot:
+                    self.snapshot = snapshot
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(self.poll_interval, remaining))
+        try:
+            readable, _, _ = select.select([self.inotify_fd], [], [],
+                                           timeout)
+        except select.error:
+            return False
+        if not readable or not self.drain_inotify():
+            return False
+        while select.select([self.inotify_fd], [], [], SETTLE_TIME)[0]:
+            self.drain_inotify()
+        return True
+
+    def close(self):
+        """
+            Stop watching the fate book directory
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
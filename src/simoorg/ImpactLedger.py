@@ -0,0 +1,355 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Moirai wide impact ledger, shared by every atropos through shared
+    memory. Each journal still enforces the total_maximum of its own fate
+    book, the ledger adds budgets across services: how many nodes a
+    service, a host and a cluster may have impacted at once, whichever
+    atropos impacts them.
+
+    The ledger is created by moirai before the atropos processes are
+    forked, the processes inherit the shared arrays and locks. Counters
+    live in a hash table keyed by a fingerprint of their name, each slot
+    is guarded by one of a few striped locks so admissions for unrelated
+    services, hosts and clusters do not wait for each other. Every
+    admission is recorded as a holding, so the charges of an atropos
+    which died can be released by service
+"""
+import struct
+import ctypes
+import hashlib
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+# api.yaml section and keys configuring the ledger
+IMPACT_LEDGER_KEY = 'impact_ledger'
+SERVICE_MAXIMUM_KEY = 'service_maximum'
+HOST_MAXIMUM_KEY = 'host_maximum'
+CLUSTER_MAXIMUM_KEY = 'cluster_maximum'
+CLUSTER_LIMITS_KEY = 'cluster_limits'
+SLOTS_KEY = 'slots'
+# fate book impact_limits key naming the cluster a service runs on
+CLUSTER_KEY = 'cluster'
+
+SERVICE_COUNTER = 'service'
+HOST_COUNTER = 'host'
+CLUSTER_COUNTER = 'cluster'
+DEFAULT_SLOTS = 4096
+DEFAULT_STRIPES = 16
+# every holding takes the slots of its service, host and cluster counters
+HOLDING_FIELDS = 3
+NO_SLOT = -1
+FINGERPRINT = struct.Struct('q')
+
+
+def get_fingerprint(counter_type, name):
+    """
+        64 bit fingerprint of a counter name, never 0 as 0 marks a free
+        slot
+    """
+    key = u'{0}:{1}'.format(counter_type, name).encode('utf-8')
+    digest = hashlib.md5(key).digest()
+    fingerprint, = FINGERPRINT.unpack(digest[:FINGERPRINT.size])
+    return fingerprint or 1
+
+
+class ImpactLedger(object):
+    """
+        Impact ledger class
+    """
+    def __init__(self, service_maximum=None, host_maximum=None,
+                 cluster_maximum=None, cluster_limits=None,
+                 slots=DEFAULT_SLOTS, stripes=DEFAULT_STRIPES):
+        """
+            Init function for the ImpactLedger class, a budget left to None
+            is not enforced
+            Args:
+                service_maximum - Most nodes a service may have impacted
+                host_maximum - Most failures a host may have at once
+                cluster_maximum - Most nodes a cluster may have impacted
+                cluster_limits - Dict of cluster name to its own maximum
+                slots - Number of counters and of holdings the ledger has
+                    room for
+                stripes - Number of locks the counters are spread over
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.limits = {SERVICE_COUNTER: service_maximum,
+                       HOST_COUNTER: host_maximum,
+                       CLUSTER_COUNTER: cluster_maximum}
+        self.cluster_limits = dict(cluster_limits or {})
+        self.slots = slots
+        self.stripes = stripes
+        self.fingerprints = RawArray(ctypes.c_longlong, slots)
+        self.counts = RawArray('i', slots)
+        # holding i uses entries [3i, 3i + 3), a free holding has NO_SLOT
+        # for its service. Holdings are split in one range per stripe, a
+        # holding is taken from the range of its service's stripe
+        self.holdings = RawArray('i', [NO_SLOT] * (slots * HOLDING_FIELDS))
+        self.stripe_locks = [multiprocessing.Lock() for _ in range(stripes)]
+        # only taken to claim the slot of a counter seen for the first time
+        self.claim_lock = multiprocessing.Lock()
+        # counter name -> slot and (service, target, cluster) -> counters,
+        # filled separately by every process
+        self.slot_cache = {}
+        self.counter_cache = {}
+
+    def find_slot(self, fingerprint):
+        """
+            Probe the table for a fingerprint
+            Return:
+                (slot, True) if found, else (first free slot, False), the
+                slot is None if the table is full
+        """
+        slot = fingerprint % self.slots
+        for _ in xrange(self.slots):
+            current = self.fingerprints[slot]
+            if current == fingerprint:
+                return slot, True
+            if current == 0:
+                return slot, False
+            slot = (slot + 1) % self.slots
+        return None, False
+
+    def get_slot(self, counter_type, name):
+        """
+            Slot of a counter, claimed the first time the counter is used.
+            Slots are never given back, so a slot once found stays valid
+            Args:
+                counter_type - SERVICE_COUNTER, HOST_COUNTER or
+                    CLUSTER_COUNTER
+                name - Name of the service, host or cluster
+            Return:
+                The slot of the counter, None if the ledger is full
+            Raise:
+                None
+        """
+        key = (counter_type, name)
+        slot = self.slot_cache.get(key)
+        if slot is not None:
+            return slot
+        fingerprint = get_fingerprint(counter_type, name)
+        slot, found = self.find_slot(fingerprint)
+        if not found:
+            self.claim_lock.acquire()
+            try:
+                slot, found = self.find_slot(fingerprint)
+                if slot is None:
+                    return None
+                if not found:
+                    self.fingerprints[slot] = fingerprint
+            finally:
+                self.claim_lock.release()
+        self.slot_cache[key] = slot
+        return slot
+
+    def get_limit(self, counter_type, name):
+        """
+            Budget of a counter, None if it is not enforced
+        """
+        if counter_type == CLUSTER_COUNTER and name in self.cluster_limits:
+            return self.cluster_limits[name]
+        return self.limits[counter_type]
+
+    def get_counters(self, service, target, cluster):
+        """
+            Slots and budgets of the counters an impact on target is
+            charged to, with the stripes guarding them, cached per process
+            Return:
+                ([(slot, limit), ...], stripes) tuple, None if the ledger
+                has no room left
+        """
+        key = (service, target, cluster)
+        counters = self.counter_cache.get(key)
+        if counters is not None:
+            return counters
+        names = [(SERVICE_COUNTER, service), (HOST_COUNTER, target)]
+        if cluster is not None:
+            names.append((CLUSTER_COUNTER, cluster))
+        slot_limits = []
+        for counter_type, name in names:
+            slot = self.get_slot(counter_type, name)
+            if slot is None:
+                return None
+            slot_limits.append((slot, self.get_limit(counter_type, name)))
+        stripes = sorted(set([counter_slot % self.stripes
+                              for counter_slot, _ in slot_limits]))
+        counters = (slot_limits, stripes)
+        self.counter_cache[key] = counters
+        return counters
+
+    def take_holding(self, slot_limits):
+        """
+            Record a holding in the range of the service's stripe and bump
+            its counters, called with the stripe locks of the counters held
+            Return:
+                Holding id, None if the range is full
+        """
+        stripe = slot_limits[0][0] % self.stripes
+        per_stripe = self.slots // self.stripes
+        holdings = self.holdings
+        for holding in xrange(stripe * per_stripe,
+                              (stripe + 1) * per_stripe):
+            base = holding * HOLDING_FIELDS
+            if holdings[base] != NO_SLOT:
+                continue
+            for index, (slot, _) in enumerate(slot_limits):
+                holdings[base + index] = slot
+                self.counts[slot] += 1
+            return holding
+        return None
+
+    def acquire_stripes(self, stripes):
+        """
+            Take stripe locks, the stripes must be sorted so every process
+            takes them in the same order
+        """
+        for stripe in stripes:
+            self.stripe_locks[stripe].acquire()
+
+    def release_stripes(self, stripes):
+        """
+            Release the stripe locks taken by acquire_stripes
+        """
+        for stripe in reversed(stripes):
+            self.stripe_locks[stripe].release()
+
+    def admit(self, service, target, cluster=None, force=False):
+        """
+            Atomically check the budgets of the service, the host and the
+            cluster and charge one impact to all three if they allow it
+            Args:
+                service - Name of the service
+                target - The node about to be impacted
+                cluster - The cluster the service runs on, if any
+                force - Charge the impact even if a budget is used up, for
+                    impacts which already happened
+            Return:
+                A holding id to pass to release, None if a budget is used
+                up or the ledger is full. A forced impact is only refused
+                when the ledger is full: the counters have no free slot
+                or the holdings of the service's stripe, slots // stripes
+                of them, are all taken
+            Raise:
+                None
+        """
+        counters = self.get_counters(service, target, cluster)
+        if counters is None:
+            return None
+        slot_limits, stripes = counters
+        self.acquire_stripes(stripes)
+        try:
+            if not force:
+                counts = self.counts
+                for slot, limit in slot_limits:
+                    if limit is not None and counts[slot] >= limit:
+                        return None
+            return self.take_holding(slot_limits)
+        finally:
+            self.release_stripes(stripes)
+
+    def release(self, holding):
+        """
+            Give back the impact charged by admit
+            Args:
+                holding - The holding id returned by admit
+            Return:
+                None
+            Raise:
+                None
+        """
+        base = holding * HOLDING_FIELDS
+        holding_slots = self.holdings[base:base + HOLDING_FIELDS]
+        slots = [slot for slot in holding_slots if slot != NO_SLOT]
+        if not slots:
+            return
+        stripes = sorted(set([slot % self.stripes for slot in slots]))
+        self.acquire_stripes(stripes)
+        try:
+            if self.holdings[base:base + HOLDING_FIELDS] != holding_slots:
+                # released meanwhile
+                return
+            for index in range(HOLDING_FIELDS):
+                slot = self.holdings[base + index]
+                if slot != NO_SLOT:
+                    self.counts[slot] -= 1
+                self.holdings[base + index] = NO_SLOT
+        finally:
+            self.release_stripes(stripes)
+
+    def release_service(self, service):
+        """
+            Give back every impact held by a service, used once its atropos
+            is gone
+            Args:
+                service - Name of the service
+            Return:
+                Number of impacts released
+            Raise:
+                None
+        """
+        service_slot = self.get_slot(SERVICE_COUNTER, service)
+        if service_slot is None:
+            return 0
+        stripe = service_slot % self.stripes
+        per_stripe = self.slots // self.stripes
+        released = 0
+        for holding in xrange(stripe * per_stripe,
+                              (stripe + 1) * per_stripe):
+            if self.holdings[holding * HOLDING_FIELDS] == service_slot:
+                self.release(holding)
+                released += 1
+        return released
+
+    def get_count(self, counter_type, name):
+        """
+            Current impact charged to a counter
+            Args:
+                counter_type - SERVICE_COUNTER, HOST_COUNTER or
+                    CLUSTER_COUNTER
+                name - Name of the service, host or cluster
+            Return:
+                The number of impacts held
+            Raise:
+                None
+        """
+        slot = self.get_slot(counter_type, name)
+        if slot is None:
+            return 0
+        return self.counts[slot]
+
+
+def create_impact_ledger(api_config):
+    """
+        Create the ledger configured in the api configs
+        Args:
+            api_config - The parsed api.yaml
+        Return:
+            An ImpactLedger, None if the api configs have no impact_ledger
+            section
+        Raise:
+            None
+    """
+    ledger_config = (api_config or {}).get(IMPACT_LEDGER_KEY)
+    if not ledger_config:
+        return None
+    return ImpactLedger(
+        service_maximum=ledger_config.get(SERVICE_MAXIMUM_KEY),
+        host_maximum=ledger_config.get(HOST_MAXIMUM_KEY),
+        cluster_maximum=ledger_config.get(CLUSTER_MAXIMUM_KEY),
+        cluster_limits=ledger_config.get(CLUSTER_LIMITS_KEY),
+        slots=ledger_config.get(SLOTS_KEY, DEFAULT_SLOTS))
@@ -14,8 +14,21 @@
 
 """
     This module is responsibiling for journaling the current status of
-    atropos (Currently a stub)
+    atropos. The impact counters live in memory, kept for the service as a
+    whole, for each host and for each topology group of the impacted
+    nodes. When a journal log is
+    configured every induce and revert is also written to it so the
+    failures left induced by a dead atropos can be reverted later. When
+    moirai runs an impact ledger, impacts are also admitted by its budgets
+    shared with the other services
 """
+from simoorg.JournalLog import JournalLog
+from simoorg.ImpactLedger import CLUSTER_KEY
+
+# impact_limits keys for the impact allowed on a single host and on a
+# single topology group, such as a rack or the replicas of a partition
+PER_HOST_MAXIMUM_KEY = 'per_host_maximum'
+PER_GROUP_MAXIMUM_KEY = 'per_group_maximum'
 
 
 class Journal(object):
@@ -23,24 +36,97 @@ class Journal(object):
         The Journal class
     """
     def __init__(self, impact, logger_instance=None, verbose=False,
-                 debug=False):
+                 debug=False, log_path=None, ledger=None, service=None,
+                 node_groups=None):
         """
-            Init function for joural class
+            Init function for joural class, the failures still outstanding
+            in the journal log start charged to the journal
             Args:
                 impact - the maximum impact limit
                 logger_instance - an instance of logger class
                 verbose - verbosity flag
                 debug - debug flag
+                log_path - Path of the journal log, None to keep the
+                    journal in memory only
+                ledger - The moirai impact ledger, None if there is none
+                service - Name of the service, which its impacts are
+                    charged to in the ledger
+                node_groups - Function giving the group labels of a node,
+                    needed by per_group_maximum
             Return:
                 None
             Raise:
-                None
+                ValueError - The file is not a journal log
+                IOError/OSError - Unable to open the journal log
         """
         self.verbose = verbose
         self.debug = debug
         self.impacted_total = 0
         self.impact_limits = impact
         self.logger_instance = logger_instance
+        self.journal_log = None
+        self.outstanding = []
+        self.ledger = ledger
+        self.service = service
+        self.cluster = (impact or {}).get(CLUSTER_KEY)
+        self.per_host_maximum = (impact or {}).get(PER_HOST_MAXIMUM_KEY)
+        self.per_group_maximum = (impact or {}).get(PER_GROUP_MAXIMUM_KEY)
+        self.node_groups = node_groups
+        # target -> ledger holdings of its impacts
+        self.ledger_holdings = {}
+        # host -> impact and group label -> impact, entries are dropped
+        # once back to 0. The groups a target had when it was impacted are
+        # kept, so its revert releases them even if the topology changed
+        self.host_impacts = {}
+        self.group_impacts = {}
+        self.target_groups = {}
+        if log_path is not None:
+            self.journal_log = JournalLog(log_path)
+            self.outstanding = self.journal_log.outstanding
+            self.impacted_total = len(self.outstanding)
+            for _, target, _ in self.outstanding:
+                self.charge_target(target)
+                self.hold_ledger_impact(target, force=True)
+
+    def get_node_groups(self, target):
+        """
+            Group labels of a target, only looked up when per_group_maximum
+            is set
+        """
+        if self.per_group_maximum is None or self.node_groups is None:
+            return []
+        return self.node_groups(target)
+
+    def charge_target(self, target):
+        """
+            Bump the host and group counters of a target
+        """
+        self.host_impacts[target] = self.host_impacts.get(target, 0) + 1
+        groups = self.get_node_groups(target)
+        for label in groups:
+            self.group_impacts[label] = self.group_impacts.get(label, 0) + 1
+        self.target_groups.setdefault(target, []).append(groups)
+
+    def discharge_target(self, target):
+        """
+            Undo charge_target for one impact of a target
+        """
+        impact = self.host_impacts.get(target, 0) - 1
+        if impact > 0:
+            self.host_impacts[target] = impact
+        else:
+            self.host_impacts.pop(target, None)
+        groups_stack = self.target_groups.get(target)
+        if not groups_stack:
+            return
+        for label in groups_stack.pop():
+            impact = self.group_impacts.get(label, 0) - 1
+            if impact > 0:
+                self.group_impacts[label] = impact
+            else:
+                self.group_impacts.pop(label, None)
+        if not groups_stack:
+            del self.target_groups[target]
 
     def cast_impact(self, target):
         """
@@ -57,6 +143,7 @@ class Journal(object):
                                    log_level="DEBUG")
 
         self.impacted_total = self.impacted_total + 1
+        self.charge_target(target)
         self.logger_instance.logit("INFO",
                                    "Bumped up impacted nodes: {0}".
                                    format(self.impacted_total),
@@ -73,6 +160,10 @@ class Journal(object):
                 None
         """
         self.impacted_total = self.impacted_total - 1
+        self.discharge_target(target)
+        holdings = self.ledger_holdings.get(target)
+        if holdings:
+            self.ledger.release(holdings.pop())
         self.logger_instance.logit("INFO",
                                    "Reverted impact. Current impact: total "
                                    "({0})".format(self.impacted_total),
@@ -90,11 +181,71 @@ class Journal(object):
         """
         return self.impacted_total
 
-    def is_total_impact_allowed(self):
+    def hold_ledger_impact(self, target, force=False):
+        """
+            Admit an impact on target in the moirai impact ledger
+            Args:
+                target - The node about to be impacted
+                force - Charge an impact which already happened, even over
+                    the budgets
+            Return:
+                True if the ledger admitted the impact or there is no
+                ledger, else False
+            Raise:
+                None
+        """
+        if self.ledger is None:
+            return True
+        holding = self.ledger.admit(self.service, target, self.cluster,
+                                    force=force)
+        if holding is None:
+            if force:
+                # the impact happened anyway, the ledger now under counts
+                # it and may admit impacts over the budgets
+                self.logger_instance.logit("WARNING",
+                                           "The impact ledger has no room"
+                                           " left to record the impact of"
+                                           " {0} on {1}",
+                                           log_level="WARNING",
+                                           args=(self.service, target))
+            return False
+        self.ledger_holdings.setdefault(target, []).append(holding)
+        return True
+
+    def allowed(self, target=None):
         """
-            Check if the current impact is at acceptable levels
+            Check whether one more impact on target stays within the total,
+            per host and per group limits, without charging anything
             Args:
+                target - The node about to be impacted, None to only check
+                    the total
+            Return:
+                True if the impact is allowed else False
+            Raise:
                 None
+        """
+        if self.impacted_total + 1 > self.impact_limits['total_maximum']:
+            return False
+        if target is None:
+            return True
+        if self.per_host_maximum is not None and \
+                self.host_impacts.get(target, 0) >= self.per_host_maximum:
+            return False
+        if self.per_group_maximum is not None and self.group_impacts:
+            for label in self.get_node_groups(target):
+                if self.group_impacts.get(label, 0) >= \
+                        self.per_group_maximum:
+                    return False
+        return True
+
+    def is_total_impact_allowed(self, target=None):
+        """
+            Check if the current impact is at acceptable levels. Given a
+            target, its host and group limits and the moirai impact ledger
+            are checked as well, a True answer then holds the target's
+            budget in the ledger so the caller must cast_impact the target
+            Args:
+                target - The node about to be impacted
             Return:
                 True if the current level is below impact level else False
             Raise
@@ -105,10 +256,15 @@ class Journal(object):
                                    .format(self.get_total_impacted(),
                                            self.get_total_impact_limit()),
                                    log_level="DEBUG")
-        if self.get_total_impacted() + 1 > self.get_total_impact_limit():
+        if not self.allowed(target):
             return False
-        else:
-            return True
+        if target is not None and not self.hold_ledger_impact(target):
+            self.logger_instance.logit("INFO",
+                                       "The impact ledger has no budget"
+                                       " left for {0}".format(target),
+                                       log_level="VERBOSE")
+            return False
+        return True
 
     def get_total_impact_limit(self):
         """
@@ -122,3 +278,70 @@ class Journal(object):
 
         """
         return self.impact_limits['total_maximum']
+
+    def get_outstanding(self):
+        """
+            Fetch the failures the journal log had outstanding when the
+            journal was opened
+            Args:
+                None
+            Return:
+                List of (failure_name, target, trigger_time) tuples
+            Raise:
+                None
+        """
+        return list(self.outstanding)
+
+    def log_intent(self, record_type, failure_name, trigger_time, targets):
+        """
+            Durably record that a failure is about to be induced or
+            reverted on the targets, before the handlers run
+            Args:
+                record_type - INDUCE_INTENT or REVERT_INTENT
+                failure_name - Name of the failure
+                trigger_time - The time the failure was planned at
+                targets - The nodes the handlers will run on
+            Return:
+                None
+            Raise:
+                OSError - Unable to write to the journal log
+        """
+        if self.journal_log is None:
+            return
+        self.journal_log.append([(record_type, failure_name, target,
+                                  trigger_time, True)
+                                 for target in targets], durable=True)
+
+    def log_completion(self, record_type, failure_name, trigger_time,
+                       target, status):
+        """
+            Record the outcome of an induce or revert handler
+            Args:
+                record_type - INDUCE_DONE or REVERT_DONE
+                failure_name - Name of the failure
+                trigger_time - The time the failure was planned at
+                target - The node the handler ran on
+                status - True if the handler succeeded
+            Return:
+                None
+            Raise:
+                OSError - Unable to write to the journal log
+        """
+        if self.journal_log is None:
+            return
+        self.journal_log.append([(record_type, failure_name, target,
+                                  trigger_time, status)])
+
+    def close(self):
+        """
+            Sync and close the journal log
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                OSError - Unable to sync the journal log
+        """
+        if self.journal_log is not None:
+            self.journal_log.close()
+            self.journal_log = None
@@ -0,0 +1,299 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Append-only write-ahead log backing the journal. Every induce and
+    revert is written as an intent record before its handlers run and as
+    a completion record for each node once they ran. Intent records are
+    made durable before atropos acts, concurrent intents share a single
+    fsync (group commit). Replaying the log gives the failures which were
+    induced, or may have been, and not reverted yet.
+
+    The log is a binary file made of a header followed by records, each
+    record is framed by its length and crc32 so a record torn by a crash
+    ends the replay instead of corrupting it
+"""
+import os
+import time
+import struct
+import zlib
+import threading
+
+LOG_HEADER = 'SIMOORG-JOURNAL-1\n'
+FRAME = struct.Struct('!II')
+RECORD = struct.Struct('!BBdd')
+STRING_LENGTH = struct.Struct('!H')
+
+INDUCE_INTENT = 1
+INDUCE_DONE = 2
+REVERT_INTENT = 3
+REVERT_DONE = 4
+RECORD_TYPES = (INDUCE_INTENT, INDUCE_DONE, REVERT_INTENT, REVERT_DONE)
+
+
+def encode_record(record_type, failure_name, target, trigger_time,
+                  status=True):
+    """
+        Encode a framed log record
+        Args:
+            record_type - One of the RECORD_TYPES
+            failure_name - Name of the failure
+            target - The node the failure acts on
+            trigger_time - The time the failure was planned at, together
+                with the failure name and the target it identifies the
+                failure
+            status - Handler status of a completion record
+        Return:
+            The record as a string
+        Raise:
+            None
+    """
+    payload = [RECORD.pack(record_type, int(bool(status)), trigger_time,
+                           time.time())]
+    for value in (failure_name, target):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        payload.append(STRING_LENGTH.pack(len(value)))
+        payload.append(value)
+    payload = ''.join(payload)
+    return FRAME.pack(len(payload), zlib.crc32(payload) & 0xffffffff) + \
+        payload
+
+
+def decode_record(payload):
+    """
+        Decode the payload of a log record
+        Args:
+            payload - The record without its frame
+        Return:
+            (record_type, status, failure_name, target, trigger_time) tuple
+        Raise:
+            struct.error/ValueError - Malformed record
+    """
+    record_type, status, trigger_time, _ = RECORD.unpack_from(payload)
+    offset = RECORD.size
+    strings = []
+    for _ in range(2):
+        length, = STRING_LENGTH.unpack_from(payload, offset)
+        offset += STRING_LENGTH.size
+        strings.append(payload[offset:offset + length].decode('utf-8'))
+        offset += length
+    if offset != len(payload) or record_type not in RECORD_TYPES:
+        raise ValueError("Malformed journal record")
+    return record_type, bool(status), strings[0], strings[1], trigger_time
+
+
+def replay(log_path):
+    """
+        Read a journal log and work out the failures which are still
+        outstanding. A failure is outstanding from its induce intent until
+        a successful revert completion, an induce which failed may have
+        been partly applied and stays outstanding as well
+        Args:
+            log_path - Path of the journal log
+        Return:
+            List of (failure_name, target, trigger_time) tuples in the
+            order they were induced, empty if there is no log
+        Raise:
+            ValueError - The file is not a journal log
+            IOError - Unable to read the log
+    """
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, 'rb') as log_fd:
+        data = log_fd.read()
+    if not data:
+        return []
+    if not data.startswith(LOG_HEADER):
+        raise ValueError("{0} is not a journal log".format(log_path))
+    outstanding = {}
+    order = []
+    offset = len(LOG_HEADER)
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        payload = data[offset + FRAME.size:offset + FRAME.size + length]
+        if len(payload) != length or \
+                zlib.crc32(payload) & 0xffffffff != crc:
+            # a record torn by a crash, nothing after it was acknowledged
+            break
+        try:
+            record_type, status, failure_name, target, trigger_time = \
+                decode_record(payload)
+        except (struct.error, ValueError):
+            break
+        offset += FRAME.size + length
+        key = (failure_name, target, trigger_time)
+        if record_type == INDUCE_INTENT:
+            if key not in outstanding:
+                order.append(key)
+            outstanding[key] = True
+        elif record_type == REVERT_DONE and status:
+            outstanding.pop(key, None)
+    return [failure for failure in order if outstanding.pop(failure, False)]
+
+
+def compact(log_path):
+    """
+        Rewrite a journal log with only the induce intents of its
+        outstanding failures. The new log replaces the old one atomically
+        Args:
+            log_path - Path of the journal log
+        Return:
+            The outstanding failures, as returned by replay
+        Raise:
+            ValueError - The file is not a journal log
+            IOError/OSError - Unable to read or write the log
+    """
+    outstanding = replay(log_path)
+    log_dir = os.path.dirname(os.path.abspath(log_path))
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    temp_path = '{0}.{1}.tmp'.format(log_path, os.getpid())
+    with open(temp_path, 'wb') as temp_fd:
+        temp_fd.write(LOG_HEADER)
+        for failure_name, target, trigger_time in outstanding:
+            temp_fd.write(encode_record(INDUCE_INTENT, failure_name, target,
+                                        trigger_time))
+        temp_fd.flush()
+        os.fsync(temp_fd.fileno())
+    os.rename(temp_path, log_path)
+    dir_fd = os.open(log_dir, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return outstanding
+
+
+def sync_fd(log_fd):
+    """
+        Flush a file descriptor to disk, only its data when possible
+    """
+    if hasattr(os, 'fdatasync'):
+        os.fdatasync(log_fd)
+    else:
+        os.fsync(log_fd)
+
+
+class JournalLog(object):
+    """
+        Journal log class
+    """
+    def __init__(self, log_path, group_commit=True):
+        """
+            Init function for the JournalLog class, the existing log is
+            compacted before new records are appended to it
+            Args:
+                log_path - Path of the journal log, created if missing
+                group_commit - Let concurrent durable appends share an
+                    fsync, else every durable append does its own
+            Return:
+                None
+            Raise:
+                ValueError - The file is not a journal log
+                IOError/OSError - Unable to open the log
+        """
+        self.log_path = log_path
+        self.group_commit = group_commit
+        self.outstanding = compact(log_path)
+        self.log_fd = os.open(log_path, os.O_WRONLY | os.O_APPEND)
+        # appended and synced count the appends written to the file and
+        # the appends known to be on disk, syncing is set while one thread
+        # runs the fsync the others wait for
+        self.lock = threading.Lock()
+        self.synced_cond = threading.Condition(self.lock)
+        self.appended = 0
+        self.synced = 0
+        self.syncing = False
+        self.fsyncs = 0
+
+    def append(self, records, durable=False):
+        """
+            Write records to the log. The records reach the operating
+            system right away, so they survive atropos dying, durable
+            records are also on disk when append returns
+            Args:
+                records - list of (record_type, failure_name, target,
+                    trigger_time, status) tuples
+                durable - Wait for the records to be on disk
+            Return:
+                None
+            Raise:
+                OSError - Unable to write to the log
+        """
+        data = ''.join([encode_record(*record) for record in records])
+        with self.lock:
+            if self.log_fd is None:
+                raise OSError("Journal log {0} is closed"
+                              .format(self.log_path))
+            os.write(self.log_fd, data)
+            self.appended += 1
+            sequence = self.appended
+            if durable and not self.group_commit:
+                sync_fd(self.log_fd)
+                self.fsyncs += 1
+                self.synced = sequence
+                return
+        if durable:
+            self.sync(sequence)
+
+    def sync(self, sequence=None):
+        """
+            Wait until the records appended so far are on disk. The first
+            waiting thread runs the fsync for every record written before
+            it started, the threads arriving meanwhile wait for it and
+            then share the next fsync
+            Args:
+                sequence - Only wait for the first sequence appends, by
+                    default for all of them
+            Return:
+                None
+            Raise:
+                OSError - Unable to sync the log
+        """
+        with self.lock:
+            if sequence is None:
+                sequence = self.appended
+            while self.synced < sequence:
+                if self.syncing:
+                    self.synced_cond.wait()
+                    continue
+                self.syncing = True
+                covered = self.appended
+                log_fd = self.log_fd
+                self.lock.release()
+                try:
+                    sync_fd(log_fd)
+                finally:
+                    self.lock.acquire()
+                    self.syncing = False
+                    self.synced_cond.notify_all()
+                self.fsyncs += 1
+                self.synced = max(self.synced, covered)
+
+    def close(self):
+        """
+            Sync and close the log
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                OSError - Unable to sync the log
+        """
+        self.sync()
+        with self.lock:
+            if self.log_fd is not None:
+                os.close(self.log_fd)
+                self.log_fd = None
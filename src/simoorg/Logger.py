@@ -16,9 +16,257 @@
     The logger class responsible for writing the loglines to the given
     file. We can also set the log level to one of the following levels
     WARNING, INFO, VERBOSE and DEBUG
+    When async_writer is set in the log config, log lines are handed to a
+    writer thread shared by all the loggers of a process, which writes
+    them in batches and flushes once flush_size bytes are pending or
+    flush_interval seconds passed
 """
+import os
 import sys
+import time
 import datetime
+import threading
+from collections import deque
+
+# Optional log config keys of the buffered mode
+ASYNC_WRITER_KEY = 'async_writer'
+FLUSH_INTERVAL_KEY = 'flush_interval'
+FLUSH_SIZE_KEY = 'flush_size'
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_FLUSH_SIZE = 65536
+# Most records the writer takes off its queue before writing them out
+MAX_BATCH_RECORDS = 1024
+LOG_LINE_FORMAT = "[{0}] [{1}]: {2}\n"
+
+# Writer thread of the current process, see get_log_writer
+LOG_WRITER = None
+LOG_WRITER_PID = None
+LOG_WRITER_LOCK = threading.Lock()
+
+
+class FlushRequest(object):
+    """
+        Queued by LogWriter.flush, set once the lines before it are flushed
+    """
+    def __init__(self):
+        self.flushed = threading.Event()
+
+
+class LogWriter(object):
+    """
+        Writes the log lines of every logger in the process from a single
+        thread. Files are opened once per path, with buffering on. Loggers
+        only append records to a deque, the writer is woken up when it
+        went idle
+    """
+    def __init__(self, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 flush_size=DEFAULT_FLUSH_SIZE):
+        """
+            Init function for the LogWriter class
+            Args:
+                flush_interval - Most seconds a written line stays buffered
+                flush_size - Pending bytes after which buffers are flushed
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.records = deque()
+        self.writer_idle = False
+        self.writer_cond = threading.Condition(threading.Lock())
+        self.file_handles = {}
+        self.file_lock = threading.Lock()
+        self.pending_bytes = 0
+        self.last_flush = time.time()
+        writer_thread = threading.Thread(target=self.run)
+        writer_thread.daemon = True
+        writer_thread.start()
+
+    def open_file(self, path):
+        """
+            Return the file object used for a log file, opening it on
+            first use
+            Args:
+                path - Path to the log file
+            Return:
+                file object to the log file
+            Raise:
+                IOError - Unable to open the file
+        """
+        self.file_lock.acquire()
+        try:
+            if path not in self.file_handles:
+                self.file_handles[path] = open(path, "a")
+            return self.file_handles[path]
+        finally:
+            self.file_lock.release()
+
+    def write(self, file_handle, console, log_time, log_type, message):
+        """
+            Queue a log line, it is formatted by the writer thread
+            Args:
+                file_handle - File object returned by open_file or None
+                console - Flag to also write the line to stdout
+                log_time - datetime of the log call
+                log_type - the log type
+                message - The log message
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.records.append((file_handle, console, log_time, log_type,
+                             message))
+        if self.writer_idle:
+            self.wake_writer()
+
+    def wake_writer(self):
+        """
+            Wake up the writer thread waiting for records
+        """
+        self.writer_cond.acquire()
+        try:
+            self.writer_cond.notify()
+        finally:
+            self.writer_cond.release()
+
+    def flush(self):
+        """
+            Block until every line queued so far is written and flushed
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        flush_request = FlushRequest()
+        self.records.append(flush_request)
+        self.wake_writer()
+        flush_request.flushed.wait()
+
+    def run(self):
+        """
+            The writer thread, takes the queued lines off in batches
+        """
+        while True:
+            batch = []
+            while self.records and len(batch) < MAX_BATCH_RECORDS:
+                batch.append(self.records.popleft())
+            if not batch:
+                self.wait_for_records()
+                continue
+            flush_requests = self.write_batch(batch)
+            if (flush_requests or self.pending_bytes >= self.flush_size or
+                    time.time() - self.last_flush >= self.flush_interval):
+                self.flush_all()
+            for flush_request in flush_requests:
+                flush_request.flushed.set()
+
+    def wait_for_records(self):
+        """
+            Sleep until a logger queues a record, or until buffered lines
+            are due to be flushed
+        """
+        self.writer_cond.acquire()
+        try:
+            self.writer_idle = True
+            # a record queued before writer_idle was set did not wake us
+            if not self.records:
+                if self.pending_bytes:
+                    timeout = (self.last_flush + self.flush_interval -
+                               time.time())
+                    if timeout > 0:
+                        self.writer_cond.wait(timeout)
+                else:
+                    self.writer_cond.wait()
+            self.writer_idle = False
+        finally:
+            self.writer_cond.release()
+        if self.pending_bytes and not self.records and \
+                time.time() - self.last_flush >= self.flush_interval:
+            self.flush_all()
+
+    def write_batch(self, batch):
+        """
+            Write a batch of records, lines for the same file are joined
+            into a single write
+            Args:
+                batch - A list of records and flush requests
+            Return:
+                The flush requests found in the batch
+            Raise:
+                None
+        """
+        flush_requests = []
+        file_lines = {}
+        console_lines = []
+        for record in batch:
+            if isinstance(record, FlushRequest):
+                flush_requests.append(record)
+                continue
+            file_handle, console, log_time, log_type, message = record
+            line = LOG_LINE_FORMAT.format(log_time, log_type, message)
+            if file_handle is not None:
+                file_lines.setdefault(file_handle, []).append(line)
+            if console:
+                console_lines.append(line)
+            self.pending_bytes += len(line)
+        for file_handle, lines in file_lines.iteritems():
+            try:
+                file_handle.write(''.join(lines))
+            except (IOError, ValueError) as exc:
+                print ("[WARNING]: Unable to write to the log file {0}: {1}"
+                       .format(file_handle.name, exc))
+        if console_lines:
+            sys.stdout.write(''.join(console_lines))
+        return flush_requests
+
+    def flush_all(self):
+        """
+            Flush the buffers of every log file and of stdout
+        """
+        self.file_lock.acquire()
+        try:
+            file_handles = self.file_handles.values()
+        finally:
+            self.file_lock.release()
+        for file_handle in file_handles:
+            try:
+                file_handle.flush()
+            except (IOError, ValueError):
+                pass
+        sys.stdout.flush()
+        self.pending_bytes = 0
+        self.last_flush = time.time()
+
+
+def get_log_writer(flush_interval=DEFAULT_FLUSH_INTERVAL,
+                   flush_size=DEFAULT_FLUSH_SIZE):
+    """
+        Returns the log writer of the current process, creating it first
+        if needed. The flush settings of the first logger asking for it
+        are used. A forked process gets a writer of its own, the writer
+        thread does not survive a fork
+        Args:
+            flush_interval - Most seconds a written line stays buffered
+            flush_size - Pending bytes after which buffers are flushed
+        Return:
+            A LogWriter
+        Raise:
+            None
+    """
+    global LOG_WRITER, LOG_WRITER_PID
+    LOG_WRITER_LOCK.acquire()
+    try:
+        if LOG_WRITER is None or LOG_WRITER_PID != os.getpid():
+            LOG_WRITER = LogWriter(flush_interval, flush_size)
+            LOG_WRITER_PID = os.getpid()
+        return LOG_WRITER
+    finally:
+        LOG_WRITER_LOCK.release()
 
 
 class Logger(object):
@@ -42,6 +290,13 @@ class Logger(object):
         self.logger_file_handle = None
         self.full_log_config_path = None
         self.log_levels = ["WARNING", "INFO", "VERBOSE", "DEBUG"]
+        self.level_index = dict((level, index) for index, level
+                                in enumerate(self.log_levels))
+        # The log config is resolved on first use, see resolve_config
+        self.resolved_log_level = None
+        self.file_logging_enabled = False
+        self.console_logging_enabled = False
+        self.log_writer = None
 
     def get_current_log_level(self):
         """
@@ -165,6 +420,8 @@ class Logger(object):
         """
         if not self.logger_file_handle:
             try:
+                if self.log_writer is not None:
+                    return self.open_writer_file()
                 file_desc = open(self.get_logger_file_path(), "a", 0)
                 self.logger_file_handle = file_desc
                 return self.logger_file_handle
@@ -175,24 +432,94 @@ class Logger(object):
         else:
             return self.logger_file_handle
 
-    def logit(self, log_type, message, log_level="INFO"):
+    def open_writer_file(self):
+        """
+            Open the log file through the log writer of the process
+        """
+        self.logger_file_handle = \
+            self.log_writer.open_file(self.get_logger_file_path())
+        return self.logger_file_handle
+
+    def resolve_config(self):
+        """
+            Validate the log config and keep the outcome, so logit does
+            not look it up again on every call
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        log_level = self.get_current_log_level()
+        self.file_logging_enabled = self.is_file_logging_enabled()
+        self.console_logging_enabled = self.is_console_logging_enabled()
+        if self.log_config.get(ASYNC_WRITER_KEY):
+            self.log_writer = get_log_writer(
+                self.log_config.get(FLUSH_INTERVAL_KEY,
+                                    DEFAULT_FLUSH_INTERVAL),
+                self.log_config.get(FLUSH_SIZE_KEY, DEFAULT_FLUSH_SIZE))
+            if self.file_logging_enabled:
+                self.get_logger_file_handle()
+        self.resolved_log_level = log_level
+
+    def is_enabled_for(self, log_level):
+        """
+            Check if messages of a log level get logged, lets callers skip
+            building expensive messages
+            Args:
+                log_level - the log level
+            Return:
+                True if messages of this level are logged else False
+            Raise:
+                None
+        """
+        if self.resolved_log_level is None:
+            self.resolve_config()
+        return self.resolved_log_level >= self.level_index[log_level]
+
+    def logit(self, log_type, message, log_level="INFO", args=None):
         """
             Add a message to the log if the message log level is acceptable
             Args:
                 log_type - the log type
                 message - The log message
                 log_level - the log level
+                args - optional arguments, when given the message is a
+                    format string only formatted if the message is logged
+            Return:
+                None
+            Raise:
+                None
+        """
+        if not self.is_enabled_for(log_level):
+            return
+        if args is not None:
+            message = message.format(*args)
+        if self.log_writer is not None:
+            file_handle = None
+            if self.file_logging_enabled:
+                file_handle = self.logger_file_handle
+            self.log_writer.write(file_handle, self.console_logging_enabled,
+                                  datetime.datetime.now(), log_type, message)
+            return
+        line = LOG_LINE_FORMAT.format(datetime.datetime.now(), log_type,
+                                      message)
+        if self.file_logging_enabled:
+            self.get_logger_file_handle().write(line)
+        if self.console_logging_enabled:
+            sys.stdout.write(line)
+
+    def flush(self):
+        """
+            Wait until the lines logged so far are written out, only
+            needed with async_writer
+            Args:
+                None
             Return:
                 None
             Raise:
                 None
         """
-        if self.get_current_log_level() >= self.log_levels.index(log_level):
-            if self.is_file_logging_enabled():
-                self.get_logger_file_handle()\
-                    .write("[{0}] [{1}]: {2}\n".format(datetime.datetime.now(),
-                                                       log_type, message))
-            if self.is_console_logging_enabled():
-                sys.stdout.write("[{0}] [{1}]: {2}\n"
-                                 .format(datetime.datetime.now(),
-                                         log_type, message))
+        if self.log_writer is not None:
+            self.log_writer.flush()
@@ -0,0 +1,239 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Resolves the handler, healthcheck, scheduler and topology plugins named
+    in a fate book. A plugin class is imported once per process and kept in
+    a cache shared by every atropos of the process. Plugins whose class sets
+    REUSABLE = True can have their instances kept and handed out again by
+    the registry of an atropos, instead of being built for every use
+"""
+import hashlib
+import json
+import threading
+
+# plugin types and the packages holding them
+HANDLER_PLUGIN = "handler"
+HEALTHCHECK_PLUGIN = "healthcheck"
+SCHEDULER_PLUGIN = "scheduler"
+TOPOLOGY_PLUGIN = "topology"
+PLUGIN_PATHS = {HANDLER_PLUGIN: "simoorg.plugins.handler",
+                HEALTHCHECK_PLUGIN: "simoorg.plugins.healthcheck",
+                SCHEDULER_PLUGIN: "simoorg.plugins.scheduler",
+                TOPOLOGY_PLUGIN: "simoorg.plugins.topology"}
+# class attribute through which a plugin allows its instances to be reused
+REUSABLE_ATTRIBUTE = "REUSABLE"
+
+# (plugin type, plugin name) -> class, shared by the whole process
+PLUGIN_CLASSES = {}
+PLUGIN_CLASSES_LOCK = threading.Lock()
+
+
+def get_plugin_class(plugin_type, plugin_name):
+    """
+        Get the class of a plugin, importing its module on first use.
+        Plugin foo of a type lives in the module <type package>.foo.foo
+        and is the class foo of that module
+        Args:
+            plugin_type - One of the keys of PLUGIN_PATHS
+            plugin_name - Name of the plugin
+        Return:
+            The plugin class
+        Raise:
+            ImportError - If the plugin module can not be imported
+            AttributeError - If the module has no class of that name
+    """
+    cache_key = (plugin_type, plugin_name)
+    try:
+        return PLUGIN_CLASSES[cache_key]
+    except KeyError:
+        pass
+    PLUGIN_CLASSES_LOCK.acquire()
+    try:
+        if cache_key not in PLUGIN_CLASSES:
+            plugin_module = __import__(PLUGIN_PATHS[plugin_type] + '.' +
+                                       plugin_name + '.' + plugin_name,
+                                       fromlist=[plugin_name])
+            PLUGIN_CLASSES[cache_key] = getattr(plugin_module, plugin_name)
+        return PLUGIN_CLASSES[cache_key]
+    finally:
+        PLUGIN_CLASSES_LOCK.release()
+
+
+def is_reusable(plugin_class):
+    """
+        Check whether a plugin allows its instances to be reused
+    """
+    return getattr(plugin_class, REUSABLE_ATTRIBUTE, False) is True
+
+
+def get_config_key(plugin_config):
+    """
+        Stable digest of a plugin config, to be made part of the
+        instance key of a reusable plugin built from that config
+        Args:
+            plugin_config - The plugin config, usually a dict, or None
+        Return:
+            sha1 hex digest of the config, None if there is no config
+        Raise:
+            None
+    """
+    if plugin_config is None:
+        return None
+    serialized = json.dumps(plugin_config, sort_keys=True, default=repr)
+    return hashlib.sha1(serialized).hexdigest()
+
+
+def get_fate_book_plugins(fate_book):
+    """
+        List the plugins named in a fate book
+        Args:
+            fate_book - A dict containing fate book contents
+        Return:
+            list of (plugin type, plugin name, where it is named) tuples
+        Raise:
+            None
+    """
+    plugins = []
+    topology = fate_book.get('topology') or {}
+    if topology.get('topology_plugin'):
+        plugins.append((TOPOLOGY_PLUGIN, topology['topology_plugin'],
+                        'topology'))
+    destiny = fate_book.get('destiny') or {}
+    if destiny.get('scheduler_plugin'):
+        plugins.append((SCHEDULER_PLUGIN, destiny['scheduler_plugin'],
+                        'destiny'))
+    healthcheck = fate_book.get('healthcheck') or {}
+    if healthcheck.get('plugin'):
+        plugins.append((HEALTHCHECK_PLUGIN, healthcheck['plugin'],
+                        'healthcheck'))
+        # children of a composite health check
+        plugin_configs = healthcheck.get('plugin_configs')
+        if isinstance(plugin_configs, dict):
+            for index, child in enumerate(plugin_configs.get('checks') or
+                                          []):
+                if isinstance(child, dict) and child.get('plugin'):
+                    plugins.append((HEALTHCHECK_PLUGIN, child['plugin'],
+                                    'healthcheck check {0}'.format(index)))
+    for failure in fate_book.get('failures') or []:
+        for handler_key in ('induce_handler', 'restore_handler'):
+            handler = failure.get(handler_key) or {}
+            if handler.get('type'):
+                plugins.append((HANDLER_PLUGIN, handler['type'],
+                                '{0} of failure {1}'.format(
+                                    handler_key, failure.get('name'))))
+    return plugins
+
+
+def validate_fate_book(fate_book):
+    """
+        Check that every plugin named in a fate book can be loaded
+        Args:
+            fate_book - A dict containing fate book contents
+        Return:
+            list of error messages, empty if every plugin was found
+        Raise:
+            None
+    """
+    errors = []
+    for plugin_type, plugin_name, location in \
+            get_fate_book_plugins(fate_book):
+        try:
+            get_plugin_class(plugin_type, plugin_name)
+        except (ImportError, AttributeError, SyntaxError) as exc:
+            errors.append("Unknown {0} plugin {1} in {2}: {3}".format(
+                plugin_type, plugin_name, location, exc))
+    return errors
+
+
+class PluginRegistry(object):
+    """
+        Plugin registry of one atropos, holds the reusable plugin instances
+    """
+    def __init__(self):
+        """
+            Init function for the PluginRegistry class
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.instances = {}
+        self.instances_lock = threading.Lock()
+
+    def get_class(self, plugin_type, plugin_name):
+        """
+            Get the class of a plugin, see get_plugin_class
+        """
+        return get_plugin_class(plugin_type, plugin_name)
+
+    def get_instance(self, plugin_type, plugin_name, instance_key, *args,
+                     **kwargs):
+        """
+            Get an instance of a plugin. A new instance is built from args
+            and kwargs unless the plugin is reusable and an instance was
+            already built for the same instance_key
+            Args:
+                plugin_type - One of the keys of PLUGIN_PATHS
+                plugin_name - Name of the plugin
+                instance_key - Hashable key telling apart the instances
+                    of a reusable plugin, for eg the target of a handler.
+                    Plugins built from a config should include its
+                    get_config_key
+                args, kwargs - Arguments of the plugin constructor
+            Return:
+                The plugin instance
+            Raise:
+                ImportError/AttributeError - See get_plugin_class
+                Any exception raised by the plugin constructor
+        """
+        plugin_class = self.get_class(plugin_type, plugin_name)
+        if not is_reusable(plugin_class):
+            return plugin_class(*args, **kwargs)
+        cache_key = (plugin_type, plugin_name, instance_key)
+        self.instances_lock.acquire()
+        try:
+            if cache_key not in self.instances:
+                self.instances[cache_key] = plugin_class(*args, **kwargs)
+            return self.instances[cache_key]
+        finally:
+            self.instances_lock.release()
+
+    def pop_instances(self, plugin_type):
+        """
+            Forget the instances of a plugin type kept for reuse, so the
+            caller can close them
+            Args:
+                plugin_type - One of the keys of PLUGIN_PATHS
+            Return:
+                list of the instances which were kept
+            Raise:
+                None
+        """
+        self.instances_lock.acquire()
+        try:
+            cache_keys = [cache_key for cache_key in self.instances
+                          if cache_key[0] == plugin_type]
+            return [self.instances.pop(cache_key)
+                    for cache_key in cache_keys]
+        finally:
+            self.instances_lock.release()
+
+    def is_cached(self, plugin_type, plugin_name, instance_key):
+        """
+            Check whether an instance is kept for reuse
+        """
+        return (plugin_type, plugin_name, instance_key) in self.instances
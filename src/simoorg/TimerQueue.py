@@ -0,0 +1,167 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    A heap based timer queue used by atropos to drive its run loop.
+    Items are scheduled for a due time and handed out in due time order,
+    items scheduled for the same time keep their scheduling order.
+    Like Queue.Queue, every item handed out counts as an active task until
+    task_done is called, so the consumer knows when no more work can show up
+"""
+import heapq
+import itertools
+import threading
+import time
+
+# Upper bound on a single wait, so a consumer blocked in get still gets to
+# run signal handlers and notices items scheduled by other threads
+MAX_WAIT_SECONDS = 1.0
+
+
+class TimerQueue(object):
+    """
+        Timer queue class
+    """
+    def __init__(self):
+        """
+            Init function for the TimerQueue class
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.timer_heap = []
+        self.sequence = itertools.count()
+        self.active_tasks = 0
+        self.stopped = False
+        self.timer_cond = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        """
+            Number of items waiting for their due time
+        """
+        self.timer_cond.acquire()
+        try:
+            return len(self.timer_heap)
+        finally:
+            self.timer_cond.release()
+
+    def schedule(self, due_time, item):
+        """
+            Add an item to be handed out at due_time
+            Args:
+                due_time - Epoch time at which the item becomes due
+                item - Any object
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.timer_cond.acquire()
+        try:
+            heapq.heappush(self.timer_heap,
+                           (due_time, next(self.sequence), item))
+            self.timer_cond.notify()
+        finally:
+            self.timer_cond.release()
+
+    def get(self):
+        """
+            Block until the earliest item is due and return it. The item
+            counts as an active task until task_done is called
+            Args:
+                None
+            Return:
+                (due_time, item) tuple, or None once the queue is empty
+                and no task is active, or after stop was called
+            Raise:
+                None
+        """
+        self.timer_cond.acquire()
+        try:
+            while not self.stopped:
+                if self.timer_heap:
+                    wait_time = self.timer_heap[0][0] - time.time()
+                    if wait_time <= 0:
+                        due_time, _, item = heapq.heappop(self.timer_heap)
+                        self.active_tasks += 1
+                        return due_time, item
+                    self.timer_cond.wait(min(wait_time, MAX_WAIT_SECONDS))
+                elif self.active_tasks:
+                    self.timer_cond.wait(MAX_WAIT_SECONDS)
+                else:
+                    return None
+            return None
+        finally:
+            self.timer_cond.release()
+
+    def task_done(self):
+        """
+            Mark an item returned by get as processed, items scheduled
+            while processing it should be scheduled before calling this
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.timer_cond.acquire()
+        try:
+            self.active_tasks -= 1
+            self.timer_cond.notify_all()
+        finally:
+            self.timer_cond.release()
+
+    def discard(self, predicate):
+        """
+            Drop the pending items for which predicate returns True,
+            items already handed out are not affected
+            Args:
+                predicate - Function called with each pending item
+            Return:
+                Number of items dropped
+            Raise:
+                None
+        """
+        self.timer_cond.acquire()
+        try:
+            kept = [entry for entry in self.timer_heap
+                    if not predicate(entry[2])]
+            dropped = len(self.timer_heap) - len(kept)
+            heapq.heapify(kept)
+            self.timer_heap = kept
+            self.timer_cond.notify_all()
+            return dropped
+        finally:
+            self.timer_cond.release()
+
+    def stop(self):
+        """
+            Make get return None right away, used to abort the run loop
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.timer_cond.acquire()
+        try:
+            self.stopped = True
+            self.timer_cond.notify_all()
+        finally:
+            self.timer_cond.release()
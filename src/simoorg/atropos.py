@@ -22,36 +22,114 @@ import time
 import datetime
 import os
 import signal
+import threading
+from multiprocessing.pool import ThreadPool
 from simoorg.Logger import Logger
 from simoorg.Journal import Journal
+from simoorg.JournalLog import INDUCE_INTENT, INDUCE_DONE, REVERT_INTENT, \
+    REVERT_DONE
+from simoorg.TimerQueue import TimerQueue
+from simoorg.EventStore import INDUCE_LATENCY_KEY, REVERT_LATENCY_KEY, \
+    TIME_TO_HEALTHY_KEY
+from simoorg.PluginRegistry import PluginRegistry, HANDLER_PLUGIN, \
+    HEALTHCHECK_PLUGIN, SCHEDULER_PLUGIN, TOPOLOGY_PLUGIN, get_config_key
+from simoorg.plugins.common.ConnectionPool import ConnectionPool
 
 
-# PATH to handler plugins
-HANDLER_PLUGIN_PATH = "simoorg.plugins.handler"
-SCHEDULER_PLUGIN_PATH = "simoorg.plugins.scheduler"
-TOPOLOGY_PLUGIN_PATH = "simoorg.plugins.topology"
-HEALTHCHECK_PLUGIN_PATH = "simoorg.plugins.healthcheck"
 DEFAULT_TOPOPLOGY_PLUGIN = "StaticTopology"
 
 # config key name
 HEALTHCHECK_PLUGINCONFIG_KEY = "plugin_configs"
+HEALTHCHECK_GATE_REVERT_KEY = "gate_revert"
+HEALTHCHECK_GATE_TIMEOUT_KEY = "gate_timeout"
+HEALTHCHECK_GATE_INTERVAL_KEY = "gate_interval"
+HEALTHCHECK_GATE_BACKOFF_KEY = "gate_backoff"
+HEALTHCHECK_GATE_MAX_INTERVAL_KEY = "gate_max_interval"
+HEALTHCHECK_PROBE_RECOVERY_KEY = "probe_recovery"
+POOL_MAX_CONNECTIONS_KEY = "max_connections"
+POOL_IDLE_TIMEOUT_KEY = "idle_timeout"
+FANOUT_KEY = "fanout"
+FANOUT_COUNT_KEY = "count"
+FANOUT_CONCURRENCY_KEY = "concurrency"
+FANOUT_ALL_NODES = "all"
+
+# fate book key for the path of the journal log, relative to the config
+# directory
+JOURNAL_LOG_KEY = "journal_log"
 
 # other constants
 SUDO_USER_KEY = 'sudo_user'
+DEFAULT_START_GATE_TIMEOUT = 60
+# Events starting this many seconds after their trigger time are skipped
+MISSED_EVENT_TOLERANCE = 1
+MIN_EVENT_WORKERS = 2
+# Seconds a probed revert waits for the service to recover, and between
+# the first two health checks while waiting. The interval is multiplied
+# by the backoff after every failed check, up to the max interval
+DEFAULT_GATE_TIMEOUT = 300
+DEFAULT_GATE_INTERVAL = 5
+DEFAULT_GATE_BACKOFF = 2
+DEFAULT_GATE_MAX_INTERVAL = 60
+INDUCE_EVENT = 'induce'
+REVERT_EVENT = 'revert'
+
+
+def is_induce_event(timer_event):
+    """
+        Tell if a timer queue entry induces a failure
+        Args:
+            timer_event - (event type, failure name, trigger time,
+                target nodes) tuple
+        Return:
+            True for an induction, False for a revert
+        Raise:
+            None
+    """
+    return timer_event[0] == INDUCE_EVENT
 
 
-def sleep_correctly(period):
+class StartGate(object):
     """
-        Sleep function can be interrupted by external signals,
-        during failure run we cant let signals effect our sleep time
-        This small wrapper ensure that even if one sleep command
-        is interrupted, we are still blocked for the equested duration
+        Lets the handlers of a fan-out connect at their own pace and then
+        releases all of them at once, so the failure hits every node at
+        close to the same instant
     """
-    current_time = time.time()
-    end_time = current_time + period
-    while current_time < end_time:
-        time.sleep(end_time - current_time)
-        current_time = time.time()
+    def __init__(self, parties, timeout=DEFAULT_START_GATE_TIMEOUT):
+        """
+            Init function for the StartGate class
+            Args:
+                parties - Number of handlers sharing the gate
+                timeout - Maximum seconds a handler waits for the others
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.parties = parties
+        self.timeout = timeout
+        self.arrived = 0
+        self.gate_lock = threading.Lock()
+        self.gate_open = threading.Event()
+
+    def wait(self):
+        """
+            Block until every party has arrived or the timeout expired
+            Args:
+                None
+            Return:
+                True if all the parties arrived else False
+            Raise:
+                None
+        """
+        self.gate_lock.acquire()
+        try:
+            self.arrived += 1
+            if self.arrived >= self.parties:
+                self.gate_open.set()
+        finally:
+            self.gate_lock.release()
+        self.gate_open.wait(self.timeout)
+        return self.gate_open.is_set()
 
 
 class Atropos(object):
@@ -61,7 +139,8 @@ class Atropos(object):
 
     def __init__(self, config, config_dir, output_queue,
                  event_queue, verbose=False, debug=False,
-                 logger_instance=None):
+                 logger_instance=None, install_signal_handler=True,
+                 start=True, impact_ledger=None):
         """
             Init function for the atropos class
             Args:
@@ -72,6 +151,13 @@ class Atropos(object):
                 event_queue - A multi processing queue to record event status
                 verbose - Verbosity flag
                 debug - debug flag
+                install_signal_handler - Install the SIGTERM handler, only
+                    possible from the main thread. An AtroposHost hosting
+                    several atropos in one process installs its own
+                start - Run the main loop right away, else the caller is
+                    expected to call main_loop
+                impact_ledger - The impact ledger moirai shares between
+                    all the atropos, None if there is none
             Return:
                 None
             Raise:
@@ -98,8 +184,26 @@ class Atropos(object):
         self.impact_limits = None
         self.scheduler_plugin = None
         self.journal = None
+        self.journal_log = None
         self.topology_object = None
         self.healthcheck = None
+        self.connection_pool = None
+        self.handler_connection_pool = None
+        # plugin classes are imported once per process, reusable plugin
+        # instances are kept for the life of this atropos
+        self.plugin_registry = PluginRegistry()
+        # run loop state, the journal lock guards the journal and the
+        # induction and pending revert counters which are shared by the
+        # event threads
+        self.timer_queue = None
+        self.event_pool = None
+        self.event_error = None
+        self.exit_requested = False
+        self.running_inductions = 0
+        self.pending_reverts = 0
+        self.leaked_impacts = 0
+        self.journal_lock = threading.Lock()
+        self.impact_ledger = impact_ledger
         self.output_queue = output_queue
         self.event_queue = event_queue
 
@@ -128,9 +232,13 @@ class Atropos(object):
 
         self.populate_scheduler_plugin()
 
-        signal.signal(signal.SIGTERM, self.sigterm_handler)
+        self.populate_connection_pool()
+
+        if install_signal_handler:
+            signal.signal(signal.SIGTERM, self.sigterm_handler)
 
-        self.main_loop()
+        if start:
+            self.main_loop()
 
     def main_loop(self):
         """
@@ -145,8 +253,7 @@ class Atropos(object):
                 KeyError: If destiny is malformed (missing important
                                                    information)
         """
-        self.journal = Journal(self.impact_limits,
-                               logger_instance=self.logger_instance)
+        self.open_journal()
         if self.scheduler_plugin is None:
             self.logger_instance.logit("Error",
                                        "Scheduler NOT found")
@@ -157,10 +264,8 @@ class Atropos(object):
                                    .format(self.scheduler_plugin),
                                    log_level="VERBOSE")
         try:
-            scheduler_module = __import__(SCHEDULER_PLUGIN_PATH + '.' +
-                                          self.scheduler_plugin + '.' +
-                                          self.scheduler_plugin,
-                                          fromlist=self.scheduler_plugin)
+            scheduler_class = self.plugin_registry.get_class(
+                SCHEDULER_PLUGIN, self.scheduler_plugin)
         except ImportError:
             self.logger_instance.logit("Error",
                                        "The scheduler plugin {0}"
@@ -168,8 +273,14 @@ class Atropos(object):
                                        .format(self.scheduler_plugin),
                                        log_level="VERBOSE")
             raise
+        except AttributeError:
+            self.logger_instance.logit("Error",
+                                       "The scheduler class {0}"
+                                       " not found"
+                                       .format(self.scheduler_plugin),
+                                       log_level="VERBOSE")
+            raise
         try:
-            scheduler_class = getattr(scheduler_module, self.scheduler_plugin)
             scheduler = scheduler_class(self.get_scheduler_destiny(),
                                         verbose=True)
         except (AttributeError, KeyError):
@@ -180,67 +291,144 @@ class Atropos(object):
                                        log_level="VERBOSE")
             raise
 
-        # Put all the atropos specific info into the output queue
-        self.output_queue.put((self.service, self.get_all_nodes(),
-                               scheduler.get_plan()))
-
-        for event in scheduler.get_plan():
-            for failure_name, trigger_time in event.iteritems():
-                self.logger_instance.logit("INFO", "Acting on NonDeterministic"
-                                                   " plan: {0}, triggertime:"
-                                                   " {1}, service name: {2}".
-                                           format(failure_name,
-                                                  datetime.datetime.
-                                                  fromtimestamp(
-                                                      int(trigger_time)),
-                                                  self.service),
-                                           log_level="VERBOSE")
-                current_timestamp = int(time.time())
-                if current_timestamp > trigger_time:
-                    self.logger_instance.logit("WARNING",
-                                               "Encountered a missed event"
-                                               " in the plan. Skipping: {0}"
-                                               .format(failure_name))
-                    # Add an item in event queue specifying that
-                    self.event_queue.put((self.service, failure_name,
-                                          trigger_time, "NOT_DECIDED", False))
-                    self.event_queue.put((self.service, failure_name +
-                                          "-revert", trigger_time,
-                                          "NOT_DECIDED", False))
-                    continue
-                else:
-                    self.logger_instance.logit("INFO",
-                                               "Sleeping till {0} to induce:"
-                                               " {1} on random node"
-                                               .format(
-                                                   datetime.datetime.
-                                                   fromtimestamp(
-                                                       int(trigger_time)),
-                                                   failure_name))
-                    sleep_correctly(trigger_time - current_timestamp)
-                    random_node = self.get_random_node()
-                    if not random_node:
-                        self.logger_instance.logit("FATAL",
-                                                   "Could not "
-                                                   "get_random_node()."
-                                                   " Skipping this cycle.")
-                        self.event_queue.put((self.service, failure_name,
-                                              trigger_time, "FAILED_TO_FETCH",
-                                              False))
-                        self.event_queue.put((self.service, failure_name +
-                                              "-revert", trigger_time,
-                                              "FAILED_TO_FETCH", False))
-
-                        continue
-                    self.logger_instance.logit("INFO",
-                                               "Waking up to induce: {0}"
-                                               " on the node: {1}".
-                                               format(failure_name,
-                                                      random_node))
-                    self.execute_fate(random_node, failure_name, trigger_time)
+        # Put all the atropos specific info into the output queue, the
+        # compact plan crosses the queue in its binary form
+        plan = scheduler.get_compact_plan()
+        self.output_queue.put((self.service, self.get_all_nodes(), plan))
+
+        try:
+            self.follow_plan(plan)
+        finally:
+            self.close_journal()
+            self.handler_connection_pool.close_all()
+            self.close_topology()
+            self.close_health_checks()
+            self.logger_instance.flush()
         if self.verbose:
             print '[VERBOSE INFO]:', self.service, 'main_loop completed'
 
+    def follow_plan(self, plan):
+        """
+            Schedule every event of the plan on the timer queue and run
+            the timer loop until all the failures are induced and reverted.
+            Inductions and reverts are separate timer entries executed on
+            a thread pool, so a pending revert never blocks the next event
+            and the number of overlapping failures is only bounded by the
+            journal
+            Args:
+                plan - The CompactPlan generated by the scheduler
+            Return:
+                None
+            Raise:
+                The first exception raised while executing a timer event,
+                once the reverts of the failures already induced have run
+        """
+        self.timer_queue = TimerQueue()
+        log_plan = self.logger_instance.is_enabled_for("VERBOSE")
+        for failure_name, trigger_time in plan:
+            if log_plan:
+                self.logger_instance.logit(
+                    "INFO", "Acting on NonDeterministic plan: {0},"
+                    " triggertime: {1}, service name: {2}"
+                    .format(failure_name,
+                            datetime.datetime.fromtimestamp(
+                                int(trigger_time)),
+                            self.service),
+                    log_level="VERBOSE")
+            self.timer_queue.schedule(trigger_time,
+                                      (INDUCE_EVENT, failure_name,
+                                       trigger_time, None))
+        if self.exit_requested:
+            # request_stop was called before the timer queue existed
+            self.timer_queue.discard(is_induce_event)
+        self.event_pool = ThreadPool(self.get_event_workers())
+        try:
+            while True:
+                # Dont keep idle ssh sessions open while we wait
+                self.handler_connection_pool.evict_idle()
+                next_entry = self.timer_queue.get()
+                if next_entry is None:
+                    break
+                due_time, timer_event = next_entry
+                if is_induce_event(timer_event):
+                    # the failure is in flight from now on, even though
+                    # nothing is charged to the journal yet
+                    self.count_induction(1)
+                self.event_pool.apply_async(self.run_timer_event,
+                                            (due_time, timer_event))
+        finally:
+            # let the events already handed out finish, an induction
+            # killed halfway would leave its failure behind
+            self.event_pool.close()
+            self.event_pool.join()
+        if self.event_error is not None:
+            raise self.event_error[0], self.event_error[1], \
+                self.event_error[2]
+        if self.exit_requested:
+            sys.exit()
+
+    def run_timer_event(self, due_time, timer_event):
+        """
+            Execute a single timer entry on the event pool
+            Args:
+                due_time - The time the entry was scheduled for
+                timer_event - (event type, failure name, trigger time,
+                    target nodes) tuple
+            Return:
+                None
+            Raise:
+                None, exceptions are saved and re raised by the run loop
+        """
+        event_type, failure_name, trigger_time, nodes = timer_event
+        try:
+            if event_type == INDUCE_EVENT:
+                if self.event_error is None and not self.exit_requested:
+                    self.induce_fate(failure_name, trigger_time)
+            else:
+                self.revert_fate(nodes, failure_name, trigger_time, due_time)
+        except Exception:
+            self.logger_instance.logit("ERROR",
+                                       "Unable to run the {0} of {1}"
+                                       .format(event_type, failure_name))
+            self.stop_inducing(sys.exc_info())
+        finally:
+            if event_type == INDUCE_EVENT:
+                # the revert, if any, is already counted as pending
+                self.count_induction(-1)
+            self.timer_queue.task_done()
+
+    def stop_inducing(self, exc_info):
+        """
+            Keep the first error raised by a timer event and drop the
+            inductions still waiting on the timer queue. The reverts of the
+            failures already induced stay scheduled, the run loop drains
+            them before re raising the error
+            Args:
+                exc_info - sys.exc_info() of the error
+            Return:
+                None
+            Raise:
+                None
+        """
+        if self.event_error is None:
+            self.event_error = exc_info
+        self.timer_queue.discard(is_induce_event)
+
+    def get_event_workers(self):
+        """
+            Size of the thread pool running the timer events, one worker
+            for each failure the journal may keep in flight and one spare
+            for events which end up skipped
+            Args:
+                None
+            Return:
+                Number of worker threads
+            Raise:
+                None
+        """
+        return max(MIN_EVENT_WORKERS,
+                   self.journal.get_total_impact_limit() + 1)
+
     def get_failure_definition(self, failure_name):
         """
             Returns the definition of specific failure from the configs
@@ -272,6 +460,28 @@ class Atropos(object):
         except KeyError:
             self.scheduler_plugin = None
 
+    def populate_connection_pool(self):
+        """
+            Create the connection pool shared by all the handlers of this
+            atropos, so induce and revert on the same node reuse one
+            authenticated connection. The pool can be tuned through the
+            optional connection_pool section of the fate book
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        pool_config = self.connection_pool or {}
+        pool_args = {'logger_instance': self.logger_instance}
+        if POOL_MAX_CONNECTIONS_KEY in pool_config:
+            pool_args['max_connections'] = \
+                pool_config[POOL_MAX_CONNECTIONS_KEY]
+        if POOL_IDLE_TIMEOUT_KEY in pool_config:
+            pool_args['idle_timeout'] = pool_config[POOL_IDLE_TIMEOUT_KEY]
+        self.handler_connection_pool = ConnectionPool(**pool_args)
+
     def get_failures(self):
         """
             Fetch all the failure definitions from the failures
@@ -320,6 +530,19 @@ class Atropos(object):
         """
         return self.topology_object.get_random_node()
 
+    def get_random_nodes(self, count):
+        """
+            Call topology plugin to get a number of distinct random nodes
+            Args:
+                count - Number of nodes required
+            Return:
+                Output of the call to get_random_nodes
+                in the topology plugin
+            Raise:
+                None
+        """
+        return self.topology_object.get_random_nodes(count)
+
     def get_all_nodes(self):
         """
             fetches all the nodes that are supported by topology plugin
@@ -333,6 +556,28 @@ class Atropos(object):
         """
         return self.topology_object.get_all_nodes()
 
+    def get_node_groups(self, node):
+        """
+            Call topology plugin to get the group labels of a node, used
+            by the journal for per_group_maximum
+            Args:
+                node - A node
+            Return:
+                list of group labels, empty if the topology plugin could
+                not be asked
+            Raise:
+                None
+        """
+        if self.topology_object is None:
+            return []
+        try:
+            return self.topology_object.get_node_groups(node)
+        except Exception as exc:
+            self.logger_instance.logit("WARNING",
+                                       "Unable to get the groups of {0}:"
+                                       " {1}".format(node, exc))
+            return []
+
     def populate_topology(self):
         """
             Imports the topology plugin specified in the configs,
@@ -356,10 +601,8 @@ class Atropos(object):
             self.topology_plugin = DEFAULT_TOPOPLOGY_PLUGIN
         try:
             # Try importing the plugin specified in the config
-            topology_module = __import__(TOPOLOGY_PLUGIN_PATH + '.' +
-                                         self.topology_plugin + '.' +
-                                         self.topology_plugin,
-                                         fromlist=[self.topology_plugin])
+            topology_class = self.plugin_registry.get_class(
+                TOPOLOGY_PLUGIN, self.topology_plugin)
         except ImportError:
             # if topology import failed try import the default topology
             self.logger_instance.logit("WARNING",
@@ -369,12 +612,8 @@ class Atropos(object):
                                        DEFAULT_TOPOPLOGY_PLUGIN,
                                        log_level="WARNING")
             self.topology_plugin = DEFAULT_TOPOPLOGY_PLUGIN
-            topology_module = __import__(TOPOLOGY_PLUGIN_PATH + '.' +
-                                         self.topology_plugin + '.' +
-                                         self.topology_plugin,
-                                         fromlist=[self.topology_plugin])
-        try:
-            topology_class = getattr(topology_module, self.topology_plugin)
+            topology_class = self.plugin_registry.get_class(
+                TOPOLOGY_PLUGIN, self.topology_plugin)
         except AttributeError as exc:
             self.logger_instance.logit("ERROR",
                                        "Something went wrong in class fetch"
@@ -389,6 +628,45 @@ class Atropos(object):
                                               .format(self.topology_config),
                                               self.logger)
 
+    def close_topology(self):
+        """
+            Let the topology plugin release its connections and threads
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        if self.topology_object is None:
+            return
+        try:
+            self.topology_object.close()
+        except Exception as exc:
+            self.logger_instance.logit("ERROR",
+                                       "Unable to close the topology: {0}"
+                                       .format(exc))
+
+    def close_health_checks(self):
+        """
+            Let the health check plugins kept for reuse release their
+            connections and threads
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        for health_check in self.plugin_registry.pop_instances(
+                HEALTHCHECK_PLUGIN):
+            try:
+                health_check.close()
+            except Exception as exc:
+                self.logger_instance.logit("ERROR",
+                                           "Unable to close the health"
+                                           " check: {0}".format(exc))
+
     def get_health_check(self):
         """
             Fetch the current health check
@@ -407,7 +685,8 @@ class Atropos(object):
     def import_health_check(self, plugin_name, coordinate,
                             hc_plugin_config=None):
         """
-            Imports the healthcheck that has been defined in the fatebook
+            Imports the healthcheck that has been defined in the fatebook,
+            a healthcheck plugin which is reusable is only built once
             Args:
                 plugin_name: Name of healthcheck plugin
                 coordinate: Any specific coordinate for the health check
@@ -420,12 +699,14 @@ class Atropos(object):
         """
         try:
             self.logger_instance.logit("INFO",
-                                       "Healthceck plugin defined: {0}"
-                                       .format(plugin_name),
-                                       log_level="VERBOSE")
-            healthcheck_module = __import__(HEALTHCHECK_PLUGIN_PATH + '.' +
-                                            plugin_name + '.' + plugin_name,
-                                            fromlist=[plugin_name])
+                                       "Healthceck plugin defined: {0}",
+                                       log_level="VERBOSE",
+                                       args=(plugin_name,))
+            # a changed plugin config must not get the old instance
+            instance_key = (coordinate, get_config_key(hc_plugin_config))
+            return self.plugin_registry.get_instance(
+                HEALTHCHECK_PLUGIN, plugin_name, instance_key, coordinate,
+                hc_plugin_config)
         except ImportError as exc:
             self.logger_instance.logit("INFO",
                                        "Healthcheck block defined,"
@@ -435,48 +716,416 @@ class Atropos(object):
                                        log_level="WARNING")
             self.healthcheck = None
             raise
-        health_check_class = getattr(healthcheck_module, plugin_name)
-        return health_check_class(coordinate, hc_plugin_config)
 
-    def execute_fate(self, node, failure_name, trigger_time=0):
+    def induce_fate(self, failure_name, trigger_time):
         """
-            Induce the specified failure on the node, wait for the
-            configured wait seconds and then revert the failure. Both
-            of the event execution status are captured in the event queue
+            Induce the specified failure on the target nodes and schedule
+            its revert after the configured wait seconds. The induce
+            execution status is captured in the event queue. Events which
+            start too long after their trigger time are skipped
             Args:
-                node - The target node for the failure
-                failure_name- The failure to be induced and reverted
-                trigger_time - The time at which the failure is being induced
-                                (this is mainly for the event queue)
+                failure_name- The failure to be induced
+                trigger_time - The time at which the failure was planned
             Return:
                 None
             Raise:
                 Any exception returned by the handler
         """
+        latency = time.time() - trigger_time
+        if latency >= MISSED_EVENT_TOLERANCE:
+            self.logger_instance.logit("WARNING",
+                                       "Encountered a missed event"
+                                       " in the plan. Skipping: {0}"
+                                       .format(failure_name))
+            # Add an item in event queue specifying that
+            self.event_queue.put((self.service, failure_name,
+                                  trigger_time, "NOT_DECIDED", False, {}))
+            self.event_queue.put((self.service, failure_name +
+                                  "-revert", trigger_time,
+                                  "NOT_DECIDED", False, {}))
+            return
         self.logger_instance.logit("INFO",
-                                   "Atropos executing fate: {0} for target {1}"
-                                   .format(failure_name, node),
-                                   log_level="VERBOSE")
+                                   "Starting {0} {1:.3f} seconds after its"
+                                   " trigger time",
+                                   log_level="VERBOSE",
+                                   args=(failure_name, latency))
+        nodes = self.get_target_nodes(failure_name)
+        if not nodes:
+            self.logger_instance.logit("FATAL",
+                                       "Could not "
+                                       "get_random_node()."
+                                       " Skipping this cycle.")
+            self.event_queue.put((self.service, failure_name,
+                                  trigger_time, "FAILED_TO_FETCH",
+                                  False, {}))
+            self.event_queue.put((self.service, failure_name +
+                                  "-revert", trigger_time,
+                                  "FAILED_TO_FETCH", False, {}))
+            return
+        self.logger_instance.logit("INFO",
+                                   "Waking up to induce: {0}"
+                                   " on the node: {1}".
+                                   format(failure_name, ', '.join(nodes)))
+
+        handler_data, sudo_user = self.get_handler_data(failure_name)
+        if handler_data is None:
+            return
+        if not self.run_health_check():
+            self.logger_instance.logit("INFO", "HealthCheck failed."
+                                               " Skipping the failure"
+                                               " scenario",
+                                       log_level="INFO")
+            return
+        self.logger_instance.logit("INFO",
+                                   "HealthCheck successfully finished."
+                                   " Proceeding with the failure"
+                                   " scenario", log_level="INFO")
+        impacted_nodes = self.cast_impact_for_nodes(nodes)
+        if not impacted_nodes:
+            if self.has_pending_reverts():
+                # Other failures are still running, their reverts will
+                # free up the journal, so only this event is lost
+                self.logger_instance.logit("WARNING",
+                                           "Impact limit reached while "
+                                           "failures are waiting to be "
+                                           "reverted. Skipping: {0}"
+                                           .format(failure_name))
+            else:
+                self.logger_instance.logit("WARNING",
+                                           "Impact limit reached. Please "
+                                           "fix the service and rerun the "
+                                           "failure inducer")
+                self.request_stop()
+        for target in nodes[len(impacted_nodes):]:
+            if impacted_nodes:
+                self.logger_instance.logit("WARNING",
+                                           "Impact limit reached, "
+                                           "skipping {0} on the node: {1}"
+                                           .format(failure_name, target))
+            self.event_queue.put((self.service, failure_name,
+                                  trigger_time, target, False, {}))
+            self.event_queue.put((self.service,
+                                  failure_name + '-revert',
+                                  trigger_time, target, False, {}))
+        if not impacted_nodes:
+            return
+
+        concurrency = self.get_fanout_concurrency(handler_data,
+                                                  impacted_nodes)
+        handler_timings = {}
+        try:
+            self.journal.log_intent(INDUCE_INTENT, failure_name,
+                                    trigger_time, impacted_nodes)
+            induce_results = self.run_parallel(
+                self.run_inducer, impacted_nodes,
+                handler_data['induce_handler'], sudo_user, concurrency,
+                handler_timings)
+        except Exception:
+            self.settle_impacts([], len(impacted_nodes))
+            raise
+        induced_nodes = []
+        for target, induced in zip(impacted_nodes, induce_results):
+            self.journal.log_completion(INDUCE_DONE, failure_name,
+                                        trigger_time, target, induced)
+            timings = {INDUCE_LATENCY_KEY: handler_timings.get(target)}
+            if induced:
+                self.logger_instance.logit("INFO",
+                                           "Successfully executed "
+                                           "induce handler for: {0}"
+                                           .format(failure_name))
+                self.event_queue.put((self.service, failure_name,
+                                      trigger_time, target, True, timings))
+                induced_nodes.append(target)
+            else:
+                self.logger_instance.logit("WARNING",
+                                           "Could not run induce "
+                                           "handler for: {0}"
+                                           .format(failure_name))
+                self.event_queue.put((self.service, failure_name,
+                                      trigger_time, target, False, timings))
+                self.event_queue.put((self.service,
+                                      failure_name + '-revert',
+                                      trigger_time, target, False, {}))
+        # Nodes whose induce failed stay charged to the journal
+        self.settle_impacts([], len(impacted_nodes) - len(induced_nodes))
+        if induced_nodes:
+            self.logger_instance.logit("INFO",
+                                       "Waiting {0} seconds before"
+                                       " waking up "
+                                       "and issuing a revert"
+                                       .format(handler_data['wait_seconds']))
+            self.timer_queue.schedule(time.time() +
+                                      handler_data['wait_seconds'],
+                                      (REVERT_EVENT, failure_name,
+                                       trigger_time, induced_nodes))
+
+    def revert_fate(self, nodes, failure_name, trigger_time, due_time):
+        """
+            Revert a failure previously induced by induce_fate, the revert
+            execution status is captured in the event queue. If the
+            recovery is probed, the revert events are sent once the
+            service is healthy again or the probe gave up
+            Args:
+                nodes - The nodes the failure was induced on
+                failure_name- The failure to be reverted
+                trigger_time - The time at which the failure was planned
+                due_time - The time at which the revert was scheduled
+            Return:
+                None
+            Raise:
+                Any exception returned by the handler
+        """
+        self.logger_instance.logit("INFO",
+                                   "Starting revert of {0} {1:.3f} seconds"
+                                   " after it was due",
+                                   log_level="VERBOSE",
+                                   args=(failure_name,
+                                         time.time() - due_time))
+        handler_data, sudo_user = self.get_handler_data(failure_name)
+        concurrency = self.get_fanout_concurrency(handler_data, nodes)
+        handler_timings = {}
+        try:
+            revert_results = self.run_logged_reverts(
+                nodes, failure_name, trigger_time, handler_data, sudo_user,
+                concurrency, handler_timings)
+        except Exception:
+            self.settle_impacts([], len(nodes))
+            raise
+        reverted_nodes = [target for target, reverted
+                          in zip(nodes, revert_results) if reverted]
+        recovery_timing = {}
+        recovered = True
+        if reverted_nodes and self.is_recovery_probed():
+            time_to_healthy = self.wait_for_recovery(failure_name)
+            recovery_timing[TIME_TO_HEALTHY_KEY] = time_to_healthy
+            recovered = time_to_healthy is not None
+        for target, reverted in zip(nodes, revert_results):
+            timings = {REVERT_LATENCY_KEY: handler_timings.get(target)}
+            if reverted:
+                self.logger_instance.logit("INFO",
+                                           "Successfully executed"
+                                           " revert handler for:"
+                                           " {0}"
+                                           .format(failure_name))
+                timings.update(recovery_timing)
+                self.event_queue.put((self.service,
+                                      failure_name + '-revert',
+                                      trigger_time, target, True, timings))
+            else:
+                self.logger_instance.logit("WARNING",
+                                           "Could not run revert "
+                                           "hadler for: {0}"
+                                           .format(failure_name))
+                self.event_queue.put((self.service,
+                                      failure_name + '-revert',
+                                      trigger_time, target, False, timings))
+        if not recovered and self.is_revert_gated():
+            # the reverted nodes stay charged to the journal until the
+            # service is healthy again, so no new failure is induced on
+            # a service which has not recovered yet
+            self.logger_instance.logit("WARNING",
+                                       "Service did not recover after"
+                                       " reverting {0}, keeping its"
+                                       " nodes charged to the journal",
+                                       args=(failure_name,))
+            reverted_nodes = []
+        # Nodes whose revert failed stay charged to the journal
+        self.settle_impacts(reverted_nodes,
+                            len(nodes) - len(reverted_nodes))
+
+    def run_logged_reverts(self, nodes, failure_name, trigger_time,
+                           handler_data, sudo_user, concurrency,
+                           timings=None):
+        """
+            Run the reverter against the nodes with a revert intent written
+            to the journal log before and a completion after each node
+            Args:
+                nodes - The nodes the failure was induced on
+                failure_name - The failure to be reverted
+                trigger_time - The time at which the failure was planned
+                handler_data - The failure definition
+                sudo_user - User to run the handler as
+                concurrency - Most reverter calls running at once
+                timings - Optional dict filled with the seconds each
+                    node's reverter took
+            Return:
+                List of revert statuses, in the order of nodes
+            Raise:
+                Any exception returned by the handler
+                OSError - Unable to write to the journal log
+        """
+        self.journal.log_intent(REVERT_INTENT, failure_name, trigger_time,
+                                nodes)
+        revert_results = self.run_parallel(
+            self.run_reverter, nodes, handler_data['restore_handler'],
+            sudo_user, concurrency, timings)
+        for target, reverted in zip(nodes, revert_results):
+            self.journal.log_completion(REVERT_DONE, failure_name,
+                                        trigger_time, target, reverted)
+        return revert_results
+
+    def open_journal(self):
+        """
+            Create the journal, backed by the journal log if the fate book
+            sets one. Failures a previous atropos left outstanding in the
+            log stay charged and keep a failure in flight until they are
+            reverted
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                ValueError - The file is not a journal log
+                IOError/OSError - Unable to open the journal log
+        """
+        log_path = None
+        if self.journal_log:
+            log_path = os.path.join(self.config_dir, self.journal_log)
+        self.journal = Journal(self.impact_limits,
+                               logger_instance=self.logger_instance,
+                               log_path=log_path,
+                               ledger=self.impact_ledger,
+                               service=self.service,
+                               node_groups=self.get_node_groups)
+        outstanding = self.journal.get_outstanding()
+        if outstanding:
+            failures = ['{0} on {1}'.format(failure_name, target)
+                        for failure_name, target, _ in outstanding]
+            self.logger_instance.logit("WARNING",
+                                       "The journal log has {0} failures"
+                                       " which were never reverted: {1}"
+                                       .format(len(failures),
+                                               ', '.join(failures)))
+            self.journal_lock.acquire()
+            try:
+                self.leaked_impacts += len(outstanding)
+                self.update_failure_in_flight()
+            finally:
+                self.journal_lock.release()
+
+    def close_journal(self):
+        """
+            Sync and close the journal log
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        if self.journal is None:
+            return
+        try:
+            self.journal.close()
+        except OSError as exc:
+            self.logger_instance.logit("ERROR",
+                                       "Unable to close the journal log:"
+                                       " {0}".format(exc))
+
+    def revert_outstanding(self):
+        """
+            Revert the failures the journal log had outstanding when the
+            journal was opened, grouped the way they were induced. Nodes
+            which are reverted are released from the journal
+            Args:
+                None
+            Return:
+                Number of failures still outstanding
+            Raise:
+                OSError - Unable to write to the journal log
+        """
+        failures = []
+        failure_nodes = {}
+        for failure_name, target, trigger_time in \
+                self.journal.get_outstanding():
+            key = (failure_name, trigger_time)
+            if key not in failure_nodes:
+                failures.append(key)
+                failure_nodes[key] = []
+            failure_nodes[key].append(target)
+        remaining = 0
+        for failure_name, trigger_time in failures:
+            nodes = failure_nodes[(failure_name, trigger_time)]
+            handler_data, sudo_user = self.get_handler_data(failure_name)
+            if handler_data is None:
+                self.logger_instance.logit("ERROR",
+                                           "Can not revert {0} on {1}, the"
+                                           " failure is no longer defined",
+                                           args=(failure_name,
+                                                 ', '.join(nodes)))
+                remaining += len(nodes)
+                continue
+            self.logger_instance.logit("INFO",
+                                       "Reverting {0} left outstanding on"
+                                       " {1}".format(failure_name,
+                                                     ', '.join(nodes)))
+            handler_timings = {}
+            revert_results = self.run_logged_reverts(
+                nodes, failure_name, trigger_time, handler_data, sudo_user,
+                self.get_fanout_concurrency(handler_data, nodes),
+                handler_timings)
+            reverted_nodes = []
+            for target, reverted in zip(nodes, revert_results):
+                timings = {REVERT_LATENCY_KEY: handler_timings.get(target)}
+                self.event_queue.put((self.service,
+                                      failure_name + '-revert',
+                                      trigger_time, target, reverted,
+                                      timings))
+                if reverted:
+                    reverted_nodes.append(target)
+            remaining += len(nodes) - len(reverted_nodes)
+            self.journal_lock.acquire()
+            try:
+                for target in reverted_nodes:
+                    self.journal.revert_impact(target)
+                self.leaked_impacts -= len(reverted_nodes)
+                self.update_failure_in_flight()
+            finally:
+                self.journal_lock.release()
+        return remaining
 
+    def get_handler_data(self, failure_name):
+        """
+            Fetch the failure definition and the sudo user for a failure
+            Args:
+                failure_name - Name of the failure
+            Return:
+                (failure definition, sudo user) tuple, the failure
+                definition is None if the failure is not defined
+            Raise:
+                None
+        """
         custom_failure_definition = \
             self.get_failure_definition(failure_name)
 
-        if custom_failure_definition:
-            if self.debug:
-                print ('[DEBUG INFO]: FOUND IN CUSTOM FAILRUES. '
-                       'about to run handler:', custom_failure_definition,
-                       'for', failure_name)
-            # break immediately, as custom failures overried base failures
-            handler_data = custom_failure_definition
-            if SUDO_USER_KEY in handler_data:
-                sudo_user = handler_data[SUDO_USER_KEY]
-            else:
-                sudo_user = None
-        else:
+        if not custom_failure_definition:
             print ('[WARNING]: Failure', failure_name,
                    'has not been found in nyx.yaml and FateBook for ',
                    self.service)
+            return None, None
+        if self.debug:
+            print ('[DEBUG INFO]: FOUND IN CUSTOM FAILRUES. '
+                   'about to run handler:', custom_failure_definition,
+                   'for', failure_name)
+        # break immediately, as custom failures overried base failures
+        handler_data = custom_failure_definition
+        if SUDO_USER_KEY in handler_data:
+            sudo_user = handler_data[SUDO_USER_KEY]
+        else:
+            sudo_user = None
+        return handler_data, sudo_user
 
+    def run_health_check(self, revert=False):
+        """
+            Run the health check plugin configured in the fate book
+            Args:
+                revert - Run the check done after a revert instead of
+                    the one done before an induce
+            Return:
+                Output of the check call of the health check plugin
+            Raise:
+                Any exception raised by the health check plugin
+        """
         hc_config = self.get_health_check()
         hc_plugin_config = None
 
@@ -484,136 +1133,354 @@ class Atropos(object):
             hc_plugin_config = hc_config[HEALTHCHECK_PLUGINCONFIG_KEY]
 
         if hc_config:
+            # a composite health check has no coordinate of its own
             h_chck = self.import_health_check(hc_config['plugin'],
-                                              hc_config['coordinate'],
+                                              hc_config.get('coordinate'),
                                               hc_plugin_config)
+        if revert:
+            return h_chck.check_revert()
+        return h_chck.check()
+
+    def is_revert_gated(self):
+        """
+            Check whether the fate book asks reverts to wait for the health
+            check
+            Args:
+                None
+            Return:
+                True if reverts are gated else False
+            Raise:
+                None
+        """
+        hc_config = self.get_health_check()
+        return bool(hc_config and hc_config.get(HEALTHCHECK_GATE_REVERT_KEY))
+
+    def is_recovery_probed(self):
+        """
+            Check whether the time the service takes to recover after a
+            revert is measured, gated reverts are always probed
+            Args:
+                None
+            Return:
+                True if reverts are probed else False
+            Raise:
+                None
+        """
+        hc_config = self.get_health_check()
+        return bool(hc_config and
+                    (hc_config.get(HEALTHCHECK_PROBE_RECOVERY_KEY) or
+                     hc_config.get(HEALTHCHECK_GATE_REVERT_KEY)))
+
+    def wait_for_recovery(self, failure_name):
+        """
+            Run the revert health check until it passes or gate_timeout
+            seconds went by. The first checks are gate_interval seconds
+            apart, the interval grows by gate_backoff after every failed
+            check up to gate_max_interval
+            Args:
+                failure_name - The failure which was reverted
+            Return:
+                Seconds the service took to turn healthy, None if it did
+                not recover in time
+            Raise:
+                Any exception raised by the health check plugin
+        """
+        hc_config = self.get_health_check()
+        timeout = hc_config.get(HEALTHCHECK_GATE_TIMEOUT_KEY,
+                                DEFAULT_GATE_TIMEOUT)
+        interval = hc_config.get(HEALTHCHECK_GATE_INTERVAL_KEY,
+                                 DEFAULT_GATE_INTERVAL)
+        backoff = hc_config.get(HEALTHCHECK_GATE_BACKOFF_KEY,
+                                DEFAULT_GATE_BACKOFF)
+        max_interval = hc_config.get(HEALTHCHECK_GATE_MAX_INTERVAL_KEY,
+                                     DEFAULT_GATE_MAX_INTERVAL)
+        start_time = time.time()
+        deadline = start_time + timeout
+        while True:
+            if self.run_health_check(revert=True):
+                time_to_healthy = time.time() - start_time
+                self.logger_instance.logit("INFO",
+                                           "Service healthy {0:.3f} seconds"
+                                           " after reverting {1}",
+                                           log_level="VERBOSE",
+                                           args=(time_to_healthy,
+                                                 failure_name))
+                return time_to_healthy
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * backoff, max(max_interval, interval))
+
+    def cast_impact_for_nodes(self, nodes):
+        """
+            Charge each node to the journal the impact limits allow, a node
+            over its host or group limit is skipped. Every charged node has
+            a revert pending until it is settled
+            Args:
+                nodes - list of target nodes
+            Return:
+                list of nodes which were charged to the journal, in order
+            Raise:
+                None
+        """
+        impacted_nodes = []
+        self.journal_lock.acquire()
         try:
-            if not h_chck.check():
-                self.logger_instance.logit("INFO", "HealthCheck failed."
-                                                   " Skipping the failure"
-                                                   " scenario",
-                                           log_level="INFO")
-            else:
+            for target in nodes:
+                if not self.journal.is_total_impact_allowed(target):
+                    continue
                 self.logger_instance.logit("INFO",
-                                           "HealthCheck successfully finished."
-                                           " Proceeding with the failure"
-                                           " scenario", log_level="INFO")
-                if self.journal.is_total_impact_allowed():
-                    self.logger_instance.logit("INFO",
-                                               "Total impact is allowed",
-                                               log_level="VERBOSE")
-                    self.journal.cast_impact(node)
-                    self.failure_in_flight = True
-                    if self.run_inducer(node, handler_data['induce_handler'],
-                                        sudo_user):
-                        self.logger_instance.logit("INFO",
-                                                   "Successfully executed "
-                                                   "induce handler for: {0}"
-                                                   .format(failure_name))
-                        self.event_queue.put((self.service, failure_name,
-                                              trigger_time, node,
-                                              True))
-
-                        self.logger_instance.logit("INFO",
-                                                   "Waiting {0} seconds before"
-                                                   " waking up "
-                                                   "and issuing a revert"
-                                                   .format(
-                                                       handler_data[
-                                                           'wait_seconds']))
-                        sleep_correctly(handler_data['wait_seconds'])
-                        if self.run_reverter(node,
-                                             handler_data['restore_handler'],
-                                             sudo_user):
-                            self.logger_instance.logit("INFO",
-                                                       "Successfully executed"
-                                                       " revert handler for:"
-                                                       " {0}"
-                                                       .format(failure_name))
-                            self.journal.revert_impact(node)
-                            self.failure_in_flight = False
-                            self.event_queue.put((self.service,
-                                                  failure_name + '-revert',
-                                                  trigger_time, node,
-                                                  True))
-
-                        else:
-                            self.logger_instance.logit("WARNING",
-                                                       "Could not run revert "
-                                                       "hadler for: {0}"
-                                                       .format(failure_name))
-                            self.event_queue.put((self.service,
-                                                  failure_name + '-revert',
-                                                  trigger_time, node,
-                                                  False))
-
-                    else:
-                        self.logger_instance.logit("WARNING",
-                                                   "Could not run induce "
-                                                   "handler for: {0}"
-                                                   .format(failure_name))
-                        self.event_queue.put((self.service, failure_name,
-                                              trigger_time, node,
-                                              False))
-                        self.event_queue.put((self.service,
-                                              failure_name + '-revert',
-                                              trigger_time, node,
-                                              False))
-
-                else:
-                    self.logger_instance.logit("WARNING",
-                                               "Impact limit reached. Please "
-                                               "fix the service and rerun the "
-                                               "failure inducer")
-                    sys.exit()
-        except Exception:
-            raise
+                                           "Total impact is allowed",
+                                           log_level="VERBOSE")
+                self.journal.cast_impact(target)
+                impacted_nodes.append(target)
+            self.pending_reverts += len(impacted_nodes)
+            self.update_failure_in_flight()
+        finally:
+            self.journal_lock.release()
+        return impacted_nodes
+
+    def settle_impacts(self, reverted_nodes, leaked_count):
+        """
+            Close the pending reverts of nodes which were either reverted
+            or could not be induced or reverted. Only the reverted nodes
+            are released from the journal, failed nodes keep their impact
+            and keep a failure in flight
+            Args:
+                reverted_nodes - nodes which were successfully reverted
+                leaked_count - number of nodes whose induce or revert failed
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.journal_lock.acquire()
+        try:
+            for target in reverted_nodes:
+                self.journal.revert_impact(target)
+            self.pending_reverts -= len(reverted_nodes) + leaked_count
+            self.leaked_impacts += leaked_count
+            self.update_failure_in_flight()
+        finally:
+            self.journal_lock.release()
+
+    def has_pending_reverts(self):
+        """
+            Check if any induced failure is still waiting for its revert
+            Args:
+                None
+            Return:
+                True if a revert is pending else False
+            Raise:
+                None
+        """
+        self.journal_lock.acquire()
+        try:
+            return self.pending_reverts > 0
+        finally:
+            self.journal_lock.release()
+
+    def count_induction(self, delta):
+        """
+            Track the inductions handed to the event pool which did not
+            finish yet, an induction counts as a failure in flight from the
+            moment it is dispatched
+            Args:
+                delta - 1 when an induction is dispatched, -1 when it ends
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.journal_lock.acquire()
+        try:
+            self.running_inductions += delta
+            self.update_failure_in_flight()
+        finally:
+            self.journal_lock.release()
+
+    def update_failure_in_flight(self):
+        """
+            Recompute failure_in_flight, must be called with the journal
+            lock held
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.failure_in_flight = (self.running_inductions > 0 or
+                                  self.pending_reverts > 0 or
+                                  self.leaked_impacts > 0)
+
+    def get_fanout_concurrency(self, failure_definition, nodes):
+        """
+            Number of handler calls a failure may run in parallel, by
+            default all the nodes of a fan-out are hit at once
+            Args:
+                failure_definition - The failure definition dictionary
+                nodes - The target nodes
+            Return:
+                concurrency level
+            Raise:
+                None
+        """
+        fanout = failure_definition.get(FANOUT_KEY) or {}
+        concurrency = fanout.get(FANOUT_CONCURRENCY_KEY, len(nodes))
+        return max(1, min(concurrency, len(nodes)))
+
+    def get_target_nodes(self, failure_name):
+        """
+            Pick the nodes a failure should act on, a single random node
+            unless the failure definition has a fanout section
+            Args:
+                failure_name - Name of the failure
+            Return:
+                list of target nodes, empty if the topology could not
+                provide any
+            Raise:
+                None
+        """
+        failure_definition = self.get_failure_definition(failure_name)
+        fanout = None
+        if failure_definition:
+            fanout = failure_definition.get(FANOUT_KEY)
+        if not fanout:
+            random_node = self.get_random_node()
+            if not random_node:
+                return []
+            return [random_node]
+        count = fanout.get(FANOUT_COUNT_KEY, 1)
+        if count == FANOUT_ALL_NODES:
+            return list(self.get_all_nodes())
+        return self.get_random_nodes(count)
+
+    def run_parallel(self, handler_function, nodes, handler_data, sudo_user,
+                     concurrency, timings=None):
+        """
+            Run an inducer or reverter against all the nodes, for more than
+            one node the calls run on a bounded thread pool. The pool is
+            never larger than the handler connection pool, as every call
+            holds a connection. When all the nodes fit in the pool the
+            handlers first connect and then fire together, keeping the skew
+            between the nodes small
+            Args:
+                handler_function - run_inducer or run_reverter
+                nodes - list of target nodes
+                handler_data - Any data required by the handler
+                sudo_user - user to run the command as
+                concurrency - maximum number of parallel handler calls
+                timings - If given, a dict filled with the seconds the
+                    handler took on each node
+            Return:
+                list of booleans, the handler status for each node
+            Raise:
+                Any exception raised by the handler for a single node,
+                in fan-out mode exceptions are logged and count as failures
+        """
+        if len(nodes) == 1:
+            start_time = time.time()
+            try:
+                return [handler_function(nodes[0], handler_data, sudo_user)]
+            finally:
+                if timings is not None:
+                    timings[nodes[0]] = time.time() - start_time
+        if self.handler_connection_pool is not None:
+            # a handler holds its connection while it waits at the gate, a
+            # party which can not get one would keep the gate shut
+            concurrency = max(1, min(
+                concurrency, self.handler_connection_pool.max_connections))
+        start_gate = None
+        if concurrency >= len(nodes):
+            start_gate = StartGate(len(nodes))
+
+        def run_on_node(target):
+            """
+                Run the handler on one node of the fan-out
+            """
+            node_start_time = time.time()
+            try:
+                return handler_function(target, handler_data, sudo_user,
+                                        start_gate=start_gate)
+            except Exception as exc:
+                self.logger_instance.logit("ERROR",
+                                           "Handler failed on {0} with "
+                                           "exception {1}"
+                                           .format(target, exc))
+                return False
+            finally:
+                if timings is not None:
+                    timings[target] = time.time() - node_start_time
 
-    def run_inducer(self, node, handler_data, sudo_user):
+        start_time = time.time()
+        pool = ThreadPool(concurrency)
+        try:
+            results = pool.map(run_on_node, nodes)
+        finally:
+            pool.close()
+            pool.join()
+        self.logger_instance.logit("INFO",
+                                   "Ran handler on {0} nodes with concurrency"
+                                   " {1} in {2:.3f} seconds",
+                                   log_level="VERBOSE",
+                                   args=(len(nodes), concurrency,
+                                         time.time() - start_time))
+        return results
+
+    def run_inducer(self, node, handler_data, sudo_user, start_gate=None):
         """
             Runs the failure inducer on a specific target node
             Args:
                 node - The target node on which failure should be run
                 handler_data - Any data required by the handler
+                start_gate - StartGate shared by the nodes of a fan-out
             Return:
                 True if the handler was successful else False
             Raise:
                 None
         """
-        return self.run_handler(node, handler_data, sudo_user)
+        return self.run_handler(node, handler_data, sudo_user, start_gate)
 
-    def run_reverter(self, node, handler_data, sudo_user):
+    def run_reverter(self, node, handler_data, sudo_user, start_gate=None):
         """
             Runs the failure revert on a specific target node
             Args:
                 node - The target node on which failure should be run
                 handler_data - Any data required by the handler
+                start_gate - StartGate shared by the nodes of a fan-out
             Return:
                 True if the handler was successful else False
             Raise:
                 None
         """
-        return self.run_handler(node, handler_data, sudo_user)
+        return self.run_handler(node, handler_data, sudo_user, start_gate)
 
-    def run_handler(self, target, handler_data, sudo_user):
+    def run_handler(self, target, handler_data, sudo_user, start_gate=None):
         """
             Runs a specified coordinate on a specific target node
             Args:
                 node - The target node on which failure should be run
                 handler_data - Any data required by the handler, includes
                     information like Handler name, coordinate and arguments
+                start_gate - StartGate shared by the nodes of a fan-out
             Return:
                 True if the handler was successful else False
             Raise:
                 None
         """
+        # Copy the arguments, the same handler data is used for every
+        # node and every run of the failure
+        arguments = list(handler_data['arguments'] or [])
         if sudo_user is not None:
-            handler_data['arguments'].append(sudo_user)
+            arguments.append(sudo_user)
         return self.abstract_handler(handler_data['type'],
                                      target, handler_data['coordinate'],
-                                     handler_data['arguments'])
+                                     arguments, start_gate)
 
-    def abstract_handler(self, handler_name, target, coordinate, arguments):
+    def abstract_handler(self, handler_name, target, coordinate, arguments,
+                         start_gate=None):
         """
             Runs the specified handler for a given target (eg: server) and a
             coordinate (eg: a shell script) and arguments
@@ -622,6 +1489,8 @@ class Atropos(object):
                 target - Target on which handler should act on
                 coordinate - The command that should be executed on the target
                 arguments - Any arguments to the coordinate
+                start_gate - If given, the command is only executed once
+                    every handler sharing the gate is authenticated
             Return:
                 True - if the command_status returned by handler is 0
                 False - if it is not zero
@@ -633,16 +1502,24 @@ class Atropos(object):
                                    " coodrinate: {2}, args: {3}"
                                    .format(handler_name, target,
                                            coordinate, arguments), "VERBOSE")
-        # XXX add try catch exception
-        handler_module = __import__(HANDLER_PLUGIN_PATH + '.' +
-                                    handler_name + '.' + handler_name,
-                                    fromlist=[handler_name])
-        handler_class = getattr(handler_module, handler_name)
-        handler = handler_class(self.config_dir, target,
-                                self.logger_instance, verbose=True)
-        handler.authenticate()
-        command_status, command_output, command_error = \
-            handler.execute_command(coordinate, arguments)
+        handler = None
+        try:
+            try:
+                # a reusable handler is kept per target
+                handler = self.plugin_registry.get_instance(
+                    HANDLER_PLUGIN, handler_name, target, self.config_dir,
+                    target, self.logger_instance, verbose=True)
+                if hasattr(handler, 'set_connection_pool'):
+                    handler.set_connection_pool(self.handler_connection_pool)
+                handler.authenticate()
+            finally:
+                if start_gate is not None:
+                    start_gate.wait()
+            command_status, command_output, command_error = \
+                handler.execute_command(coordinate, arguments)
+        finally:
+            if handler is not None and hasattr(handler, 'close'):
+                handler.close()
         self.logger_instance.logit("INFO", "STDOUT: {0}"
                                    .format(command_output))
         self.logger_instance.logit("INFO", "STDERR: {0}"
@@ -666,6 +1543,20 @@ class Atropos(object):
             Raise:
                 None
         """
+        if self.handle_sigterm():
+            sys.exit(0)
+
+    def handle_sigterm(self):
+        """
+            Log the reception of SIGTERM and decide if atropos should exit,
+            atropos ignores the signal if in the middle of a failure
+            Args:
+                None
+            Return:
+                True if atropos should exit else False
+            Raise:
+                None
+        """
         if self.failure_in_flight:
             self.logger_instance.logit("INFO",
                                        "Atropos received SIGTERM, "
@@ -674,11 +1565,28 @@ class Atropos(object):
                                        "Service name in fate book: {1}"
                                        .format(os.getpid(), self.service),
                                        log_level="WARNING")
-        else:
-            self.logger_instance.logit("INFO",
-                                       "Atropos received SIGTERM. Pid: "
-                                       "{0}, Service name in fate book:"
-                                       "{1}. Wrapping up and exiting"
-                                       .format(os.getpid(), self.service),
-                                       log_level="WARNING")
-            sys.exit(0)
+            return False
+        self.logger_instance.logit("INFO",
+                                   "Atropos received SIGTERM. Pid: "
+                                   "{0}, Service name in fate book:"
+                                   "{1}. Wrapping up and exiting"
+                                   .format(os.getpid(), self.service),
+                                   log_level="WARNING")
+        return True
+
+    def request_stop(self):
+        """
+            Make the run loop return and exit its thread, used when atropos
+            does not run in a process of its own. The inductions still to
+            come are dropped, the reverts already scheduled run before the
+            loop returns
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.exit_requested = True
+        if self.timer_queue is not None:
+            self.timer_queue.discard(is_induce_event)
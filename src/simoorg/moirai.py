@@ -22,11 +22,52 @@
 
 import yaml
 import simoorg.atropos as atropos
+from simoorg.AtroposHost import host_atropos
+from simoorg.EventStore import EventStore
+from simoorg.FateBookLoader import FateBookLoader, DEFAULT_CACHE_PATH
+from simoorg.FateBookWatcher import FateBookWatcher, DEFAULT_POLL_INTERVAL
+from simoorg.ImpactLedger import create_impact_ledger
+from simoorg.PluginRegistry import validate_fate_book
+from simoorg.plugins.scheduler.BaseScheduler import CompactPlan
 import os
+import time
+import errno
+import signal
+import select
+import Queue
 import multiprocessing
 import threading
 import json
+import uuid
 import simoorg.Api.ApiConstants as ApiConstants
+from simoorg.Api.ApiMetrics import ApiMetrics
+from simoorg.Api.RpcChannel import RpcServer
+
+# api.yaml keys selecting how atropos are run
+# fork - one process for each fate book
+# pooled - a fixed number of worker processes, each hosting several atropos
+ATROPOS_ENGINE_KEY = 'atropos_engine'
+ATROPOS_WORKERS_KEY = 'atropos_workers'
+FORK_ENGINE = 'fork'
+POOLED_ENGINE = 'pooled'
+# api.yaml key for the file caching the parsed fate books between runs,
+# set it to null to only parse them in memory
+FATE_BOOK_CACHE_KEY = 'fate_book_cache'
+# api.yaml keys for reloading the fate books while moirai runs
+RELOAD_FATE_BOOKS_KEY = 'reload_fate_books'
+FATE_BOOK_POLL_INTERVAL_KEY = 'fate_book_poll_interval'
+# How long the reload thread waits for a fate book change before looking
+# at the atropos it is replacing, and how often an atropos which still has
+# a failure in flight is asked again to stop
+RELOAD_CHECK_SECS = 1.0
+STOP_RETRY_SECS = 5.0
+# How long finish blocks in a join before looking for atropos started by
+# a reload
+ARMY_JOIN_SECS = 1.0
+
+# How long the service map drain blocks on the data queue before checking
+# whether moirai is shutting down
+DATA_QUEUE_POLL_SECS = 1.0
 
 
 class Moirai(object):
@@ -51,22 +92,62 @@ class Moirai(object):
         self.config_dir = config_dir
         self.debug = debug
         self.api_proc = None
-        self.atropos_fate_book_streams = []
+        self.atropos_fate_book_paths = []
         self.atropos_fate_book_configs = {}
         self.atropos_army = {}
+        # Guards the atropos army and the fate book configs, which the
+        # reload thread changes while moirai runs
+        self.army_lock = threading.Lock()
+        self.fate_book_loader = None
+        self.reload_thread = None
+        self.reload_stopped = threading.Event()
+        # service -> fate book to start once the running atropos of the
+        # service stopped, None if the fate book was removed
+        self.pending_restarts = {}
+        # service -> time the running atropos was last asked to stop
+        self.stop_requests = {}
+        # pid of a pooled worker -> (control queue, stopped queue)
+        self.atropos_host_queues = {}
+        # services whose atropos stopped in a pooled worker
+        self.stopped_services = set()
         self.verbose = True
         self.debug = False
         self.fifo_fd = None
         self.fifo_read_lock = threading.Lock()
         self.service_map = {}
-        self.event_map = {}
+        # The plan, server list and service list never change between
+        # two services registering, so their json output is kept here
+        # together with a version. data_version moves on with every new
+        # service, a service keeps the version it registered with.
+        # data_epoch moves on whenever a reload replaces or removes a
+        # service, which ends the version of every service
+        self.instance_id = uuid.uuid4().hex
+        self.data_epoch = 0
+        self.data_version = 0
+        self.service_versions = {}
+        self.encoded_responses = {}
+        self.api_stopped = threading.Event()
+        self.event_store = EventStore()
         self.api_read_procs = []
+        self.rpc_server = None
+        # api commands may come from several threads, the api lock guards
+        # the service map, the versions and the encoded responses. It is
+        # only held while they are read or written, never while encoding
+        self.api_lock = threading.Lock()
+        self.api_worker_threads = []
+        self.api_metrics = ApiMetrics()
         try:
             with open(self.api_config_file) as api_config_fd:
                 self.api_config = yaml.load(api_config_fd)
         except IOError:
             print "Missing API config file, exiting"
             raise
+        self.api_work_queue = Queue.Queue(
+            self.api_config.get(ApiConstants.API_QUEUE_SIZE_KEY,
+                                ApiConstants.DEFAULT_API_QUEUE_SIZE))
+        # Budgets shared by all the atropos, created before they are forked
+        # so they inherit its shared memory
+        self.impact_ledger = create_impact_ledger(self.api_config)
         # Data_queue will enqueue tuples containing the items
         # service-name, plan and server list
         self.atropos_data_queue = multiprocessing.Queue()
@@ -93,17 +174,145 @@ class Moirai(object):
                 None
         """
         while not self.atropos_data_queue.empty():
-            service, servers, plan = self.atropos_data_queue.get()
+            try:
+                service, servers, plan = \
+                    self.atropos_data_queue.get_nowait()
+            except Queue.Empty:
+                # another api thread took the last entry
+                return
+            self.add_service_entry(service, servers, plan)
+
+    def add_service_entry(self, service, servers, plan):
+        """
+            Add a service to the service map, encode its api responses
+            and announce the new data version to the api server
+            Args:
+                service - Name of the service
+                servers - Server list returned by the topology
+                plan - Plan returned by the scheduler
+            Return:
+                None
+            Raise:
+                None
+        """
+        if isinstance(plan, CompactPlan):
+            encoded_plan = plan.to_json()
+        else:
+            encoded_plan = json.dumps(plan)
+        encoded_servers = json.dumps(servers)
+        self.api_lock.acquire()
+        try:
             if service in self.service_map.keys():
                 print ("Duplicate service entry for " + service +
                        ". Skipping the new entry!!!")
-            else:
-                self.service_map[service] = (servers, plan)
+                return
+            self.service_map[service] = (servers, plan)
+            self.data_version += 1
+            self.service_versions[service] = self.data_version
+            self.encoded_responses[('plan', service)] = encoded_plan
+            self.encoded_responses[('servers', service)] = encoded_servers
+            self.encoded_responses[('list', None)] = \
+                json.dumps(self.service_map.keys())
+            data_version = self.get_data_version()
+        finally:
+            self.api_lock.release()
+        if self.rpc_server is not None:
+            self.rpc_server.broadcast({ApiConstants.DATA_VERSION_KEY:
+                                       data_version})
+
+    def remove_service_entry(self, service):
+        """
+            Remove a service whose atropos was stopped by a reload from the
+            service map, the replacing atropos registers again with its own
+            plan
+            Args:
+                service - Name of the service
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.api_lock.acquire()
+        try:
+            if service not in self.service_map:
+                return
+            del self.service_map[service]
+            del self.service_versions[service]
+            self.encoded_responses.pop(('plan', service), None)
+            self.encoded_responses.pop(('servers', service), None)
+            self.encoded_responses[('list', None)] = \
+                json.dumps(self.service_map.keys())
+            self.data_epoch += 1
+            self.data_version += 1
+            data_version = self.get_data_version()
+        finally:
+            self.api_lock.release()
+        if self.rpc_server is not None:
+            self.rpc_server.broadcast({ApiConstants.DATA_VERSION_KEY:
+                                       data_version})
+
+    def service_map_drain(self):
+        """
+            A thread which adds services to the service map as soon as
+            atropos report them, so data versions move on without waiting
+            for an api call
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        while not self.api_stopped.is_set():
+            try:
+                service, servers, plan = self.atropos_data_queue.get(
+                    timeout=DATA_QUEUE_POLL_SECS)
+            except Queue.Empty:
+                continue
+            except (EOFError, IOError):
+                # the queue was torn down while moirai exits
+                return
+            self.add_service_entry(service, servers, plan)
+
+    def get_data_version(self):
+        """
+            Version of the service data, changes with every new service,
+            with every reload removing a service and with every restart of
+            moirai
+        """
+        return '{0}-{1}'.format(self.get_version_prefix(), self.data_version)
+
+    def get_version_prefix(self):
+        """
+            Part of the versions shared by every output that is still
+            current
+        """
+        return '{0}.{1}'.format(self.instance_id, self.data_epoch)
+
+    def get_response_version(self, command, args):
+        """
+            Version of the output of a command, the output stays the same
+            for as long as the version does
+            Args:
+                command - the api command
+                args - arguments of the command
+            Return:
+                The version string, or None if the output is not versioned
+            Raise:
+                None
+        """
+        if command == 'list':
+            return self.get_data_version()
+        if command in ApiConstants.SERVICE_DATA_COMMANDS:
+            service_name = args.get('service_name')
+            if service_name in self.service_versions:
+                return '{0}-{1}'.format(self.get_version_prefix(),
+                                        self.service_versions[service_name])
+        return None
 
     def update_event_map(self):
         """
-            Creates/Update the event map dictionary with items for
-            each of the service entry in the event queue
+            Add the events waiting in the event queue to the event store
             Args:
                 None
             Return:
@@ -112,64 +321,273 @@ class Moirai(object):
                 None
         """
         while not self.atropos_event_queue.empty():
-            (service, failure_name, trigger_time, node_name,
-             trigger_status) = self.atropos_event_queue.get()
-            if service in self.event_map.keys():
-                self.event_map[service].append([failure_name, trigger_time,
-                                                node_name, trigger_status])
-            else:
-                self.event_map[service] = [[failure_name, trigger_time,
-                                            node_name, trigger_status]]
+            # (service, failure_name, trigger_time, node_name,
+            #  trigger_status) optionally followed by the event timings
+            try:
+                event = self.atropos_event_queue.get_nowait()
+            except Queue.Empty:
+                # another api thread took the last event
+                return
+            self.event_store.add_event(event[0], list(event[1:]))
 
     def read_configs(self):
         """
-            Create file object to each fate book in the fate book directory
-            under the config path
+            List the fate books in the fate book directory under the config
+            path, they are only opened when they are loaded
             Args:
                 None
             Return:
                 None
             Raise:
-                IOError/OSError - Unable to open a fate book
+                IOError/OSError - Unable to list the fate book directory
         """
         try:
-            for fate_file in os.listdir(self.fate_books_dir):
-                if os.path.isfile(self.fate_books_dir + "/" + fate_file):
-                    if self.verbose:
-                        print "[INFO]: Found moirai fate book ", fate_file
-                    self.atropos_fate_book_streams.append(open(
-                        self.fate_books_dir + "/" + fate_file, "r"))
+            self.atropos_fate_book_paths = self.list_fate_books()
         except Exception, exc:
             print ("[FATAL]: Failed initializing Moirai fate books..."
                    "bailing out", exc)
             raise
+        if self.verbose:
+            for fate_book_path in self.atropos_fate_book_paths:
+                print ("[INFO]: Found moirai fate book ",
+                       os.path.basename(fate_book_path))
+
+    def list_fate_books(self):
+        """
+            Paths of the files in the fate book directory
+            Args:
+                None
+            Return:
+                A sorted list of paths
+            Raise:
+                IOError/OSError - Unable to list the fate book directory
+        """
+        fate_book_paths = []
+        for fate_file in sorted(os.listdir(self.fate_books_dir)):
+            fate_book_path = os.path.join(self.fate_books_dir, fate_file)
+            if os.path.isfile(fate_book_path):
+                fate_book_paths.append(fate_book_path)
+        return fate_book_paths
 
     def load_config(self):
         """
-            Read from each file object in self.atropos_fate_book_streams
+            Load each fate book listed by read_configs, fate books which did
+            not change since the last run come from the fate book cache
             Args:
                 None
             Return:
                 None
             Raise:
                 IOError/OSError - Unable to read a fatebook
-                ValueError - Duplicate fate book with the same service name
+                ValueError - Duplicate fate book with the same service name,
+                    a fate book which does not match the fate book schema
+                    or a fate book naming a plugin which does not exist
         """
+        self.fate_book_loader = FateBookLoader(
+            self.api_config.get(FATE_BOOK_CACHE_KEY, DEFAULT_CACHE_PATH))
         try:
-            for stream in self.atropos_fate_book_streams:
-                yaml_def = yaml.load(stream)
-                if yaml_def["service"] in self.atropos_fate_book_configs:
-                    print ("[FATAL]: Duplicate fate book for",
-                           yaml_def["service"])
-                    raise ValueError("Duplicate fate book for {}".format(
-                        yaml_def["service"]))
-                else:
-                    self.atropos_fate_book_configs[yaml_def["service"]] = \
-                        yaml_def
+            self.atropos_fate_book_configs = self.parse_fate_books(
+                self.atropos_fate_book_paths)
         except Exception, exc:
             print ("[FATAL]: Failed loading Moirai fate books...bailing out",
                    exc)
             raise
+        if self.verbose:
+            print ("[INFO]: Parsed {0} fate books, {1} unchanged fate books"
+                   " came from the cache"
+                   .format(self.fate_book_loader.parsed,
+                           self.fate_book_loader.cached))
+
+    def parse_fate_books(self, fate_book_paths):
+        """
+            Load a set of fate books through the fate book loader and save
+            its cache
+            Args:
+                fate_book_paths - Paths of the fate books
+            Return:
+                A dict mapping service names to fate book contents
+            Raise:
+                IOError/OSError - Unable to read a fatebook
+                ValueError - Duplicate fate book with the same service name,
+                    a fate book which does not match the fate book schema
+                    or a fate book naming a plugin which does not exist
+        """
+        fate_book_configs = {}
+        for fate_book_path in fate_book_paths:
+            yaml_def = self.fate_book_loader.load(fate_book_path)
+            if yaml_def["service"] in fate_book_configs:
+                raise ValueError("Duplicate fate book for {}".format(
+                    yaml_def["service"]))
+            plugin_errors = validate_fate_book(yaml_def)
+            if plugin_errors:
+                raise ValueError("Fate book for {0} names unknown "
+                                 "plugins: {1}".format(
+                                     yaml_def["service"],
+                                     '; '.join(plugin_errors)))
+            fate_book_configs[yaml_def["service"]] = yaml_def
+        self.fate_book_loader.forget(self.fate_books_dir, fate_book_paths)
+        self.fate_book_loader.save()
+        return fate_book_configs
+
+    def reload_fate_books(self):
+        """
+            Load the fate books again and bring the atropos in line with
+            them. Atropos of new fate books are started, atropos of removed
+            fate books are stopped and atropos of changed fate books are
+            replaced, so they plan again. Atropos of unchanged fate books
+            keep running. If the fate books can not be loaded, the running
+            atropos are left alone
+            Args:
+                None
+            Return:
+                (added, removed, changed) tuple of sorted service name lists
+            Raise:
+                None
+        """
+        try:
+            fate_book_configs = self.parse_fate_books(self.list_fate_books())
+        except Exception, exc:
+            print ("[ERROR]: Not reloading the fate books, keeping the "
+                   "running atropos", exc)
+            return [], [], []
+        self.army_lock.acquire()
+        try:
+            if self.reload_stopped.is_set():
+                return [], [], []
+            old_configs = self.atropos_fate_book_configs
+            added = sorted(set(fate_book_configs) - set(old_configs))
+            removed = sorted(set(old_configs) - set(fate_book_configs))
+            changed = sorted(service for service in fate_book_configs
+                             if service in old_configs and
+                             fate_book_configs[service] !=
+                             old_configs[service])
+            self.atropos_fate_book_configs = fate_book_configs
+            for service in removed + changed:
+                self.pending_restarts[service] = \
+                    fate_book_configs.get(service)
+                self.request_atropos_stop(service)
+            new_configs = {}
+            for service in added:
+                if service in self.pending_restarts:
+                    # the atropos of an earlier fate book of this service
+                    # is still stopping
+                    self.pending_restarts[service] = \
+                        fate_book_configs[service]
+                else:
+                    new_configs[service] = fate_book_configs[service]
+            if new_configs:
+                self.deploy_atropos(new_configs)
+        finally:
+            self.army_lock.release()
+        if self.verbose and (added or removed or changed):
+            print ("[INFO]: Reloaded fate books, added: {0}, removed: {1},"
+                   " changed: {2}".format(added, removed, changed))
+        return added, removed, changed
+
+    def request_atropos_stop(self, service):
+        """
+            Ask the atropos of a service to stop, an atropos with a failure
+            in flight ignores the request, as it ignores SIGTERM, so the
+            request is repeated until it stopped. Called with the army lock
+            held
+            Args:
+                service - Name of the service
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.stop_requests[service] = time.time()
+        proc = self.atropos_army.get(service)
+        if proc is None or not proc.is_alive():
+            return
+        if proc.pid in self.atropos_host_queues:
+            self.atropos_host_queues[proc.pid][0].put(service)
+            return
+        try:
+            os.kill(proc.pid, signal.SIGTERM)
+        except OSError as exc:
+            if exc.errno != errno.ESRCH:
+                raise
+
+    def is_atropos_stopped(self, service):
+        """
+            Check whether the atropos of a service is no longer running,
+            called with the army lock held
+        """
+        proc = self.atropos_army.get(service)
+        if proc is None or not proc.is_alive():
+            return True
+        return service in self.stopped_services
+
+    def drain_stopped_services(self):
+        """
+            Collect the services whose atropos stopped in a pooled worker,
+            called with the army lock held
+        """
+        for _, stopped_queue in self.atropos_host_queues.values():
+            while True:
+                try:
+                    self.stopped_services.add(stopped_queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+    def restart_stopped_atropos(self):
+        """
+            Start the atropos of the changed fate books whose old atropos
+            stopped, and ask the others to stop again
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.army_lock.acquire()
+        try:
+            self.drain_stopped_services()
+            new_configs = {}
+            for service, config in self.pending_restarts.items():
+                if self.is_atropos_stopped(service):
+                    del self.pending_restarts[service]
+                    del self.stop_requests[service]
+                    self.atropos_army.pop(service, None)
+                    self.stopped_services.discard(service)
+                    self.remove_service_entry(service)
+                    if config is not None:
+                        new_configs[service] = config
+                elif (time.time() - self.stop_requests[service] >=
+                      STOP_RETRY_SECS):
+                    self.request_atropos_stop(service)
+            if new_configs and not self.reload_stopped.is_set():
+                self.deploy_atropos(new_configs)
+        finally:
+            self.army_lock.release()
+
+    def fate_book_reload_loop(self):
+        """
+            A thread which reloads the fate books whenever the fate book
+            directory changes, until moirai finishes
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        watcher = FateBookWatcher(
+            self.fate_books_dir,
+            self.api_config.get(FATE_BOOK_POLL_INTERVAL_KEY,
+                                DEFAULT_POLL_INTERVAL))
+        if self.verbose:
+            print "[INFO]: Watching the fate books by", watcher.mode
+        try:
+            while not self.reload_stopped.is_set():
+                if watcher.wait_for_change(RELOAD_CHECK_SECS):
+                    self.reload_fate_books()
+                self.restart_stopped_atropos()
+        finally:
+            watcher.close()
 
     def api_fifo_read(self):
         """
@@ -190,6 +608,8 @@ class Moirai(object):
                                               moirai class)
             args - arugments for the command
             method - api method name (GET/PUT/POST)
+            The commands are only read and checked here, they are executed
+            by the api workers fed through the bounded work queue
 
             Args:
                 None
@@ -236,35 +656,119 @@ class Moirai(object):
                 if skip_iteration_flag:
                     continue
 
-                fifo_endpoint = response_map[ApiConstants.FIFO_ENDPOINT_KEY]
-                command_id = response_map[ApiConstants.COMMAND_ID_KEY]
-                command = response_map[ApiConstants.COMMAND_KEY]
-                args = response_map[ApiConstants.ARGS_KEY]
-                method = response_map[ApiConstants.METHOD_KEY]
-                if command not in ApiConstants.API_COMMANDS:
-                    output_msg = {ApiConstants.COMMAND_ID_KEY: command_id,
-                                  ApiConstants.COMMAND_OUTPUT_KEY:
-                                  "No such command found"}
-                else:
-                    if method == "GET":
-                        moirai_function = (ApiConstants.
-                                           MOIRAI_GET_COMMAND_PREFIX + command)
-                    else:
-                        moirai_function = (ApiConstants.
-                                           MOIRAI_OTHER_COMMAND_PREFIX +
-                                           command)
+                # blocks when the queue is full, pushing back on the
+                # api server instead of growing without bounds
+                self.api_work_queue.put((response_map, time.time()))
+
+    def api_command_worker(self):
+        """
+            A thread which executes the commands read from the FIFO and
+            writes the replies back to the api server
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        while True:
+            response_map, read_time = self.api_work_queue.get()
+            self.api_metrics.record_queue_wait(time.time() - read_time)
+            command_output, response_keys = self.dispatch_command(
+                response_map[ApiConstants.COMMAND_KEY],
+                response_map[ApiConstants.ARGS_KEY],
+                response_map[ApiConstants.METHOD_KEY])
+            output_msg = {ApiConstants.COMMAND_ID_KEY:
+                          response_map[ApiConstants.COMMAND_ID_KEY],
+                          ApiConstants.COMMAND_OUTPUT_KEY: command_output}
+            output_msg.update(response_keys)
+            if not self.write_reply(
+                    response_map[ApiConstants.FIFO_ENDPOINT_KEY],
+                    json.dumps(output_msg)):
+                self.api_metrics.record_dropped_reply()
+
+    def write_reply(self, fifo_endpoint, reply):
+        """
+            Write a reply to the FIFO of an api server without blocking
+            on it for longer than the api read timeout, a client which
+            went away or stopped reading loses its reply
+            Args:
+                fifo_endpoint - Input FIFO of the api server
+                reply - The reply string
+            Return:
+                True if the whole reply was written else False
+            Raise:
+                None
+        """
+        try:
+            reply_fd = os.open(fifo_endpoint, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError:
+            # ENXIO, nobody is reading the FIFO anymore
+            return False
+        deadline = time.time() + ApiConstants.READ_TIMEOUT_SECS
+        try:
+            while reply:
                 try:
-                    command_handler = getattr(self, moirai_function)
-                    command_output = command_handler(args)
-                    output_msg = {ApiConstants.COMMAND_ID_KEY: command_id,
-                                  ApiConstants.COMMAND_OUTPUT_KEY:
-                                  command_output}
-                except:
-                    output_msg = {ApiConstants.COMMAND_ID_KEY: command_id,
-                                  ApiConstants.COMMAND_OUTPUT_KEY:
-                                  "Unexpected error in moirai"}
-                with open(fifo_endpoint, 'w') as output_fd:
-                    output_fd.write(json.dumps(output_msg))
+                    written = os.write(reply_fd, reply)
+                    reply = reply[written:]
+                except OSError as exc:
+                    if exc.errno != errno.EAGAIN:
+                        return False
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    select.select([], [reply_fd], [], remaining)
+            return True
+        finally:
+            os.close(reply_fd)
+
+    def dispatch_command(self, command, args, method):
+        """
+            Run an api command, shared by the FIFO and the RPC channel
+            Args:
+                command - the api command called (command along with method
+                    should map to a unique function in moirai class)
+                args - arugments for the command
+                method - api method name (GET/PUT/POST)
+            Return:
+                A tuple of the command output, or an error message, and a
+                dict of extra keys for the response. These are the current
+                data version and, for versioned outputs, the version of
+                the output
+            Raise:
+                None
+        """
+        if command not in ApiConstants.API_COMMANDS:
+            return "No such command found", {}
+        if method == "GET":
+            moirai_function = (ApiConstants.MOIRAI_GET_COMMAND_PREFIX +
+                               command)
+        else:
+            moirai_function = (ApiConstants.MOIRAI_OTHER_COMMAND_PREFIX +
+                               command)
+        start_time = time.time()
+        try:
+            # the command handlers take the api lock themselves, only
+            # around the shared state they read or write
+            command_handler = getattr(self, moirai_function)
+            command_output = command_handler(args)
+            self.api_lock.acquire()
+            try:
+                response_keys = {ApiConstants.DATA_VERSION_KEY:
+                                 self.get_data_version()}
+                if method == "GET":
+                    version = self.get_response_version(command, args)
+                    if version is not None:
+                        response_keys[ApiConstants.COMMAND_VERSION_KEY] = \
+                            version
+            finally:
+                self.api_lock.release()
+            return command_output, response_keys
+        except:
+            return "Unexpected error in moirai", {}
+        finally:
+            self.api_metrics.record_command(command,
+                                            time.time() - start_time)
 
     def api_get_list(self, args):
         """
@@ -278,7 +782,16 @@ class Moirai(object):
                 None
         """
         self.update_service_map()
-        return json.dumps(self.service_map.keys())
+        self.api_lock.acquire()
+        try:
+            encoded_list = self.encoded_responses.get(('list', None))
+            if encoded_list is None:
+                services = self.service_map.keys()
+        finally:
+            self.api_lock.release()
+        if encoded_list is None:
+            return json.dumps(services)
+        return encoded_list
 
     def api_get_plan(self, args):
         """
@@ -292,9 +805,7 @@ class Moirai(object):
                 None
         """
         self.update_service_map()
-        service_name = args['service_name']
-        servers, plan = self.service_map[service_name]
-        return json.dumps(plan)
+        return self.get_encoded_response('plan', args['service_name'])
 
     def api_get_servers(self, args):
         """
@@ -309,31 +820,109 @@ class Moirai(object):
 
         """
         self.update_service_map()
-        service_name = args['service_name']
-        servers, plan = self.service_map[service_name]
-        return json.dumps(servers)
+        return self.get_encoded_response('servers', args['service_name'])
+
+    def get_encoded_response(self, command, service_name):
+        """
+            Fetch the response of a service command encoded when the
+            service was added
+            Args:
+                command - plan or servers
+                service_name - Name of the service
+            Return:
+                The encoded response
+            Raise:
+                KeyError - Unknown service
+        """
+        self.api_lock.acquire()
+        try:
+            return self.encoded_responses[(command, service_name)]
+        finally:
+            self.api_lock.release()
 
     def api_get_events(self, args):
         """
             Get the status of all the events already executed by atropos
             An event is a tuple containing the elements
             (service name, event name, trigger_time,
-             target of the event, Event status)
+             target of the event, Event status, timings)
             Here event name is the failure name if it was a failure event
-            for revert events it is failure name + '-revert'
+            for revert events it is failure name + '-revert'. The timings
+            are a dict with the induce_latency of failure events, the
+            revert_latency and, if the recovery was probed, the
+            time_to_healthy of revert events, all in seconds
+            Without any of the cursor, since and limit arguments the whole
+            event list is returned. With any of them a page of events is
+            returned along with the cursor to fetch the next page
 
             Args:
                 args - expects a dictionary containing a key for service_name
+                    and optionally the keys cursor (position of the first
+                    event), since (epoch time, only later events are
+                    returned) and limit (maximum number of events)
             Returns:
-                event list encoded as a json string
+                event list encoded as a json string, or a json object with
+                the keys events and next_cursor when paginated
             Raise:
                 None
         """
         self.update_event_map()
         service_name = args['service_name']
-        if service_name not in self.event_map.keys():
-            return json.dumps([()])
-        return json.dumps(self.event_map[service_name])
+        page_args = {}
+        for arg_name, arg_type in ApiConstants.EVENTS_PAGE_ARGS:
+            if args.get(arg_name) is not None:
+                try:
+                    page_args[arg_name] = arg_type(args[arg_name])
+                except ValueError:
+                    return "Invalid value for {0}".format(arg_name)
+        if service_name not in self.event_store:
+            if not page_args:
+                return json.dumps([()])
+            return json.dumps({ApiConstants.EVENTS_KEY: [],
+                               ApiConstants.NEXT_CURSOR_KEY: 0})
+        events, next_cursor = self.event_store.get_events(service_name,
+                                                          **page_args)
+        if not page_args:
+            return events
+        # the events are already encoded, only wrap them
+        return '{{"{0}": {1}, "{2}": {3}}}'.format(
+            ApiConstants.EVENTS_KEY, events,
+            ApiConstants.NEXT_CURSOR_KEY, next_cursor)
+
+    def api_get_stats(self, args):
+        """
+            Get the timing percentiles of each failure of a service, from
+            the timings atropos attached to its events
+            Args:
+                args - expects a dictionary containing a key for service_name
+            Returns:
+                dict of failure name to the count, p50, p95 and p99 of its
+                induce_latency, revert_latency and time_to_healthy, and the
+                number of reverts the service did not recover from, encoded
+                as a json string
+            Raise:
+                None
+        """
+        self.update_event_map()
+        return json.dumps(self.event_store.get_stats(args['service_name']))
+
+    def api_get_metrics(self, args):
+        """
+            Get the metrics of the api command handling
+            Args:
+                args - expects an empty dictionary
+            Returns:
+                A dict encoded as a json string, with the work queue depth,
+                the per command latencies in milliseconds and the number
+                of replies which could not be delivered
+            Raise:
+                None
+        """
+        metrics = self.api_metrics.get_snapshot()
+        metrics['queue_depth'] = self.api_work_queue.qsize()
+        metrics['queue_size'] = self.api_work_queue.maxsize
+        metrics['workers'] = len(self.api_worker_threads)
+        return json.dumps(metrics)
 
     def spawn_atropos(self):
         """
@@ -355,7 +944,151 @@ class Moirai(object):
             self.finish()
             raise
         # Deploy atropos army
-        for service_name, config in self.atropos_fate_book_configs.iteritems():
+        self.army_lock.acquire()
+        try:
+            self.deploy_atropos(self.atropos_fate_book_configs)
+        finally:
+            self.army_lock.release()
+        self.start_api_listeners()
+        if self.api_config.get(RELOAD_FATE_BOOKS_KEY, True):
+            self.reload_thread = threading.Thread(
+                target=self.fate_book_reload_loop)
+            self.reload_thread.daemon = True
+            self.reload_thread.start()
+
+    def start_api_listeners(self):
+        """
+            Start the FIFO read threads, the thread draining the service
+            data reported by atropos and, if a socket is configured, the
+            RPC server used by the api server
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                socket.error - Unable to listen on the RPC socket
+        """
+        for t_index in range(ApiConstants.THREADPOOL_SIZE):
+            self.api_read_procs.append(
+                threading.Thread(target=self.api_fifo_read,
+                                 args=(),
+                                 kwargs={}))
+            self.api_read_procs[t_index].daemon = True
+            self.api_read_procs[t_index].start()
+        workers = self.api_config.get(ApiConstants.API_WORKERS_KEY,
+                                      ApiConstants.DEFAULT_API_WORKERS)
+        for _ in range(workers):
+            worker_thread = threading.Thread(target=self.api_command_worker)
+            worker_thread.daemon = True
+            worker_thread.start()
+            self.api_worker_threads.append(worker_thread)
+        rpc_socket = self.api_config.get(ApiConstants.RPC_SOCKET_KEY)
+        if rpc_socket:
+            self.rpc_server = RpcServer(rpc_socket, self.dispatch_command)
+            self.rpc_server.start()
+        drain_thread = threading.Thread(target=self.service_map_drain)
+        drain_thread.daemon = True
+        drain_thread.start()
+
+    def get_atropos_engine(self):
+        """
+            Fetch the engine used to run atropos from the api configs
+            Args:
+                None
+            Return:
+                FORK_ENGINE or POOLED_ENGINE
+            Raise:
+                ValueError - Unknown engine in the api configs
+        """
+        engine = self.api_config.get(ATROPOS_ENGINE_KEY, FORK_ENGINE)
+        if engine not in (FORK_ENGINE, POOLED_ENGINE):
+            raise ValueError("Unknown atropos engine {0}".format(engine))
+        return engine
+
+    def recover_journals(self, fate_book_configs):
+        """
+            Revert the failures a dead atropos left outstanding in the
+            journal log of its fate book, before a new atropos starts for
+            it. Failures which can not be reverted are left in the log
+            and charged to the journal of the new atropos. The recovering
+            atropos is not given the impact ledger, its journal would
+            charge the outstanding failures a second time
+            Args:
+                fate_book_configs - A dict mapping service names to fate
+                    book contents
+            Return:
+                None
+            Raise:
+                None
+        """
+        for service_name, config in sorted(fate_book_configs.iteritems()):
+            if not config.get(atropos.JOURNAL_LOG_KEY):
+                continue
+            recovery_atropos = None
+            try:
+                recovery_atropos = atropos.Atropos(
+                    config, self.config_dir, self.atropos_data_queue,
+                    self.atropos_event_queue, verbose=self.verbose,
+                    debug=self.debug, install_signal_handler=False,
+                    start=False)
+                recovery_atropos.open_journal()
+                if not recovery_atropos.journal.get_outstanding():
+                    continue
+                print ("[INFO]: Reverting the failures left outstanding"
+                       " by the last atropos of " + service_name)
+                remaining = recovery_atropos.revert_outstanding()
+                if remaining:
+                    print ("[WARNING]: {0} failures of {1} could not be"
+                           " reverted and stay in its journal log"
+                           .format(remaining, service_name))
+            except Exception, exc:
+                print ("[ERROR]: Unable to recover the journal log of "
+                       "{0}: {1}".format(service_name, exc))
+            finally:
+                if recovery_atropos is not None:
+                    recovery_atropos.close_journal()
+                    recovery_atropos.handler_connection_pool.close_all()
+                    recovery_atropos.close_topology()
+                    recovery_atropos.close_health_checks()
+
+    def deploy_atropos(self, fate_book_configs):
+        """
+            Start the atropos of a set of fate books with the configured
+            engine, called with the army lock held. The failures left
+            outstanding in their journal logs are reverted first, then the
+            impacts a previous atropos of these services still holds in
+            the impact ledger are given back
+            Args:
+                fate_book_configs - A dict mapping service names to fate
+                    book contents
+            Return:
+                None
+            Raise:
+                ValueError - Unknown engine in the api configs
+        """
+        engine = self.get_atropos_engine()
+        self.recover_journals(fate_book_configs)
+        # the new atropos charges the failures still outstanding again
+        if self.impact_ledger is not None:
+            for service_name in fate_book_configs:
+                self.impact_ledger.release_service(service_name)
+        if engine == POOLED_ENGINE:
+            self.deploy_pooled_atropos(fate_book_configs)
+        else:
+            self.deploy_forked_atropos(fate_book_configs)
+
+    def deploy_forked_atropos(self, fate_book_configs):
+        """
+            Spawn one atropos process for each fate book
+            Args:
+                fate_book_configs - A dict mapping service names to fate
+                    book contents
+            Return:
+                None
+            Raise:
+                None
+        """
+        for service_name, config in fate_book_configs.iteritems():
             if self.verbose:
                 print "[INFO]: Deploying atropos for:", service_name
             handler = getattr(atropos, 'Atropos')
@@ -364,20 +1097,66 @@ class Moirai(object):
                                                  self.atropos_data_queue,
                                                  self.atropos_event_queue,),
                                            kwargs={'verbose': self.verbose,
-                                                   'debug': self.debug})
+                                                   'debug': self.debug,
+                                                   'impact_ledger':
+                                                   self.impact_ledger})
             proc.start()
             self.atropos_army[service_name] = proc
-        for t_index in range(ApiConstants.THREADPOOL_SIZE):
-            self.api_read_procs.append(
-                threading.Thread(target=self.api_fifo_read,
-                                 args=(),
-                                 kwargs={}))
-            self.api_read_procs[t_index].daemon = True
-            self.api_read_procs[t_index].start()
+
+    def deploy_pooled_atropos(self, fate_book_configs):
+        """
+            Spread the fate books over a fixed number of worker processes,
+            each worker runs its atropos on threads. atropos_army still
+            maps every service to the process running it. Each worker gets
+            a control queue to stop a single atropos and reports the
+            atropos which stopped on its stopped queue
+            Args:
+                fate_book_configs - A dict mapping service names to fate
+                    book contents
+            Return:
+                None
+            Raise:
+                None
+        """
+        workers = self.api_config.get(ATROPOS_WORKERS_KEY) or \
+            multiprocessing.cpu_count()
+        service_names = sorted(fate_book_configs.keys())
+        workers = min(workers, len(service_names))
+        for worker_index in range(workers):
+            worker_configs = {}
+            for service_name in service_names[worker_index::workers]:
+                worker_configs[service_name] = \
+                    fate_book_configs[service_name]
+            if self.verbose:
+                print ("[INFO]: Deploying atropos worker {0} for: {1}"
+                       .format(worker_index,
+                               ', '.join(sorted(worker_configs.keys()))))
+            control_queue = multiprocessing.Queue()
+            stopped_queue = multiprocessing.Queue()
+            proc = multiprocessing.Process(target=host_atropos,
+                                           args=(worker_configs,
+                                                 self.config_dir,
+                                                 self.atropos_data_queue,
+                                                 self.atropos_event_queue,),
+                                           kwargs={'verbose': self.verbose,
+                                                   'debug': self.debug,
+                                                   'control_queue':
+                                                   control_queue,
+                                                   'stopped_queue':
+                                                   stopped_queue,
+                                                   'impact_ledger':
+                                                   self.impact_ledger})
+            proc.start()
+            self.atropos_host_queues[proc.pid] = (control_queue,
+                                                  stopped_queue)
+            for service_name in worker_configs:
+                self.atropos_army[service_name] = proc
 
     def finish(self):
         """
-            Close all file object and wait for the atropos process to complete
+            Close all file object and wait for the atropos process to
+            complete, including the atropos started by fate book reloads
+            in the meantime
             Args:
                 None
             Return:
@@ -385,11 +1164,27 @@ class Moirai(object):
             Raise:
                 IOError - Unable to close fifo file object
         """
-        for stream in self.atropos_fate_book_streams:
-            stream.close()
-        for service, proc in self.atropos_army.iteritems():
-            proc.join()
+        while True:
+            self.army_lock.acquire()
+            try:
+                running = [proc for proc in set(self.atropos_army.values())
+                           if proc.is_alive()]
+                if not running and not self.pending_restarts:
+                    # no reload may start an atropos from now on
+                    self.reload_stopped.set()
+                    break
+            finally:
+                self.army_lock.release()
+            if running:
+                running[0].join(ARMY_JOIN_SECS)
+            else:
+                time.sleep(ARMY_JOIN_SECS)
+        if self.reload_thread is not None:
+            self.reload_thread.join()
         self.atropos_fate_book_configs = {}
+        self.api_stopped.set()
+        if self.rpc_server is not None:
+            self.rpc_server.stop()
         try:
             if self.fifo_fd:
                 self.fifo_fd.close()
@@ -0,0 +1,331 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    A keyed connection pool that handler plugins can use to reuse
+    authenticated connections across failure inductions and reverts.
+    Each atropos owns one pool, connections are created on demand through
+    a factory, validated before reuse and evicted after staying idle
+"""
+import time
+import threading
+
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_ACQUIRE_TIMEOUT = 60
+
+
+class ConnectionPoolExhausted(Exception):
+    """
+        Raised when no connection could be handed out before the
+        acquire timeout expired
+    """
+    pass
+
+
+class ConnectionPool(object):
+    """
+        Connection pool class
+    """
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT,
+                 logger_instance=None):
+        """
+            Init function for the ConnectionPool class
+            Args:
+                max_connections - Maximum number of open connections
+                    (idle and in use) across all the keys
+                idle_timeout - Seconds after which an idle connection
+                    is closed
+                acquire_timeout - Seconds to wait for a free slot when
+                    the pool is full
+                logger_instance - An instance of logger class
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.logger_instance = logger_instance
+        # key -> list of [connection, last release time]
+        self.idle_connections = {}
+        self.total_connections = 0
+        self.stats = {'created': 0, 'reused': 0, 'evicted': 0,
+                      'discarded': 0}
+        self.pool_cond = threading.Condition(threading.Lock())
+
+    def acquire(self, key, factory, validator=None):
+        """
+            Hand out a connection for the given key, reusing an idle one
+            if it passes validation, else creating a new one
+            Args:
+                key - A hashable identifying the remote endpoint,
+                    eg: (hostname, port, username)
+                factory - A callable returning a new connected connection
+                validator - A callable taking a connection and returning
+                    True if it can still be used
+            Return:
+                A connection object
+            Raise:
+                ConnectionPoolExhausted - if the pool stayed full for
+                    longer than acquire_timeout
+                Any exception raised by the factory
+        """
+        deadline = time.time() + self.acquire_timeout
+        self.pool_cond.acquire()
+        try:
+            while True:
+                self._evict_expired()
+                connection = self._pop_idle(key)
+                if connection is not None:
+                    if validator is None or self._is_valid(validator,
+                                                           connection):
+                        self.stats['reused'] += 1
+                        return connection
+                    self._close(connection)
+                    self.total_connections -= 1
+                    self.stats['discarded'] += 1
+                    continue
+                if self.total_connections < self.max_connections:
+                    # reserve the slot, the handshake happens unlocked
+                    self.total_connections += 1
+                    break
+                if self._evict_least_recently_used():
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ConnectionPoolExhausted(
+                        "No connection available for {0} after {1} seconds"
+                        .format(key, self.acquire_timeout))
+                self.pool_cond.wait(remaining)
+        finally:
+            self.pool_cond.release()
+
+        try:
+            connection = factory()
+        except Exception:
+            self.pool_cond.acquire()
+            try:
+                self.total_connections -= 1
+                self.pool_cond.notify()
+            finally:
+                self.pool_cond.release()
+            raise
+        self.pool_cond.acquire()
+        try:
+            self.stats['created'] += 1
+        finally:
+            self.pool_cond.release()
+        self.log("Opened a new pooled connection for {0}".format(key))
+        return connection
+
+    def release(self, key, connection):
+        """
+            Return a healthy connection to the pool so it can be reused
+            Args:
+                key - The key used to acquire the connection
+                connection - The connection object
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.pool_cond.acquire()
+        try:
+            self.idle_connections.setdefault(key, []).append(
+                [connection, time.time()])
+            self.pool_cond.notify()
+        finally:
+            self.pool_cond.release()
+
+    def discard(self, key, connection):
+        """
+            Close a connection that should not be reused (eg: the remote
+            end went away in the middle of a command)
+            Args:
+                key - The key used to acquire the connection
+                connection - The connection object
+            Return:
+                None
+            Raise:
+                None
+        """
+        self._close(connection)
+        self.pool_cond.acquire()
+        try:
+            self.total_connections -= 1
+            self.stats['discarded'] += 1
+            self.pool_cond.notify()
+        finally:
+            self.pool_cond.release()
+        self.log("Discarded pooled connection for {0}".format(key))
+
+    def evict_idle(self):
+        """
+            Close every idle connection that exceeded the idle timeout
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.pool_cond.acquire()
+        try:
+            self._evict_expired()
+        finally:
+            self.pool_cond.release()
+
+    def close_all(self):
+        """
+            Close all the idle connections, connections which are still
+            in use are closed by their handlers
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.pool_cond.acquire()
+        try:
+            for key in self.idle_connections.keys():
+                for connection, _ in self.idle_connections.pop(key):
+                    self._close(connection)
+                    self.total_connections -= 1
+            self.pool_cond.notify_all()
+        finally:
+            self.pool_cond.release()
+
+    def get_idle_count(self):
+        """
+            Returns the number of idle connections in the pool
+            Args:
+                None
+            Return:
+                Count of idle connections
+            Raise:
+                None
+        """
+        self.pool_cond.acquire()
+        try:
+            return sum([len(conns)
+                        for conns in self.idle_connections.values()])
+        finally:
+            self.pool_cond.release()
+
+    def get_stats(self):
+        """
+            Returns a copy of the pool counters
+            Args:
+                None
+            Return:
+                dict with created, reused, evicted and discarded counts
+            Raise:
+                None
+        """
+        self.pool_cond.acquire()
+        try:
+            stats = dict(self.stats)
+            stats['open'] = self.total_connections
+            return stats
+        finally:
+            self.pool_cond.release()
+
+    def _pop_idle(self, key):
+        """
+            Pop the most recently released connection for the key,
+            must be called with the pool lock held
+        """
+        connections = self.idle_connections.get(key)
+        if not connections:
+            return None
+        connection, _ = connections.pop()
+        if not connections:
+            del self.idle_connections[key]
+        return connection
+
+    def _evict_expired(self):
+        """
+            Close idle connections older than idle_timeout,
+            must be called with the pool lock held
+        """
+        if self.idle_timeout is None:
+            return
+        expiry = time.time() - self.idle_timeout
+        for key in self.idle_connections.keys():
+            fresh = []
+            for connection, last_used in self.idle_connections[key]:
+                if last_used > expiry:
+                    fresh.append([connection, last_used])
+                else:
+                    self._close(connection)
+                    self.total_connections -= 1
+                    self.stats['evicted'] += 1
+            if fresh:
+                self.idle_connections[key] = fresh
+            else:
+                del self.idle_connections[key]
+
+    def _evict_least_recently_used(self):
+        """
+            Close the idle connection which was released the longest time
+            ago to make room for a new key, must be called with the pool
+            lock held
+            Return:
+                True if a connection was evicted else False
+        """
+        oldest_key = None
+        oldest_time = None
+        for key, connections in self.idle_connections.iteritems():
+            if oldest_time is None or connections[0][1] < oldest_time:
+                oldest_key = key
+                oldest_time = connections[0][1]
+        if oldest_key is None:
+            return False
+        connection, _ = self.idle_connections[oldest_key].pop(0)
+        if not self.idle_connections[oldest_key]:
+            del self.idle_connections[oldest_key]
+        self._close(connection)
+        self.total_connections -= 1
+        self.stats['evicted'] += 1
+        return True
+
+    def _is_valid(self, validator, connection):
+        """
+            Run the validator, treating any exception as a dead connection
+        """
+        try:
+            return validator(connection)
+        except Exception:
+            return False
+
+    def _close(self, connection):
+        """
+            Close a connection ignoring any errors from the remote end
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def log(self, message):
+        """
+            Log a message at debug level if we have a logger
+        """
+        if self.logger_instance is not None:
+            self.logger_instance.logit("INFO", message, log_level="DEBUG")
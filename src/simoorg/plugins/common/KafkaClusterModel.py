@@ -0,0 +1,560 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    An in memory model of a kafka cluster, used by the kafka plugins to
+    pick brokers without going to Zookeeper for every pick.
+    The broker ids, the topic names and the controller are kept current by
+    kazoo watches. Broker hosts, the partitions of a topic and the leader
+    and isr of a partition are read when first needed and cached. A cached
+    entry older than max_staleness seconds is read again on its next
+    lookup, which bounds how stale a pick can be even if a watch event
+    was missed.
+    Once watch_replication is called, the replica assignment of every topic
+    and the state of every partition are watched as well, and the set of
+    under replicated partitions and the partitions each broker leads are
+    kept up to date as the watches fire
+"""
+import json
+import time
+import random
+import threading
+
+from kazoo.exceptions import NoNodeError
+
+from simoorg.plugins.common.ZKUtil import BROKER_IDS, BROKER_TOPICS, \
+    CONTROLLER, PARTITIONS, STATE, DECODER
+
+DEFAULT_MAX_STALENESS = 30
+
+
+class KafkaClusterModel(object):
+    """
+        Kafka cluster model class
+    """
+    def __init__(self, zk_client, zk_paths,
+                 max_staleness=DEFAULT_MAX_STALENESS):
+        """
+            Init function for the KafkaClusterModel class
+            Args:
+                zk_client - A started kazoo client
+                zk_paths - All paths in Zookeeper where the info regarding
+                kafka cluster is stored
+                max_staleness - Seconds a cached broker host, partition
+                list or partition state is used before it is read again
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.zk_client = zk_client
+        self.zk_paths = zk_paths
+        self.max_staleness = max_staleness
+        self.stopped = False
+        self.model_lock = threading.Lock()
+        # Kept current by watches
+        self.broker_ids = []
+        self.topic_names = []
+        self.controller_id = None
+        # Read on demand, broker id -> (read time, host),
+        # topic -> (read time, partitions) and
+        # topic -> {partition -> (read time, leader id, isr ids)}
+        self.broker_hosts = {}
+        self.topic_partitions = {}
+        self.partition_states = {}
+        # Kept current by watches once watch_replication is called,
+        # topic -> {partition -> replica ids}, (topic, partition) pairs
+        # with fewer in-sync replicas than replicas, (topic, partition) ->
+        # leader id and leader id -> set of (topic, partition) it leads
+        self.replication_watched = False
+        self.replica_assignments = {}
+        self.under_replicated = set()
+        self.partition_leaders = {}
+        self.led_partitions = {}
+
+    def start(self):
+        """
+            Install the watches, their first call fills in the model
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.zk_client.ChildrenWatch(self.zk_paths[BROKER_IDS],
+                                     self.update_broker_ids)
+        self.zk_client.ChildrenWatch(self.zk_paths[BROKER_TOPICS],
+                                     self.update_topic_names)
+        self.zk_client.DataWatch(self.zk_paths[CONTROLLER],
+                                 self.update_controller)
+
+    def stop(self):
+        """
+            Stop following Zookeeper, each watch is removed on its next
+            event
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.stopped = True
+
+    def watch_replication(self):
+        """
+            Start following the replica assignment of every topic and the
+            state of every partition, needed by
+            get_under_replicated_partitions
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.model_lock.acquire()
+        try:
+            self.replication_watched = True
+            topic_names = list(self.topic_names)
+        finally:
+            self.model_lock.release()
+        for topic in topic_names:
+            self.watch_topic(topic)
+
+    def watch_topic(self, topic):
+        """
+            Install the watch on the replica assignment of a topic
+        """
+        def assignment_watch(data, stat, event=None):
+            return self.update_topic_assignment(topic, data)
+        self.zk_client.DataWatch(self.zk_paths[BROKER_TOPICS] + "/" + topic,
+                                 assignment_watch)
+
+    def watch_partition_state(self, topic, partition):
+        """
+            Install the watch on the state of a partition
+        """
+        def state_watch(data, stat, event=None):
+            return self.update_partition_state(topic, partition, data)
+        self.zk_client.DataWatch(self.zk_paths[BROKER_TOPICS] + "/" + topic +
+                                 "/" + PARTITIONS + "/" + partition + STATE,
+                                 state_watch)
+
+    def update_broker_ids(self, broker_ids):
+        """
+            Watch on the broker ids, hosts of brokers which went away are
+            dropped from the cache
+        """
+        if self.stopped:
+            return False
+        self.model_lock.acquire()
+        try:
+            self.broker_ids = [str(broker_id) for broker_id in broker_ids]
+            for broker_id in self.broker_hosts.keys():
+                if broker_id not in self.broker_ids:
+                    del self.broker_hosts[broker_id]
+        finally:
+            self.model_lock.release()
+
+    def update_topic_names(self, topic_names):
+        """
+            Watch on the topics, cached partitions of deleted topics are
+            dropped
+        """
+        if self.stopped:
+            return False
+        self.model_lock.acquire()
+        try:
+            self.topic_names = list(topic_names)
+            live_topics = set(self.topic_names)
+            for topic in self.topic_partitions.keys():
+                if topic not in live_topics:
+                    del self.topic_partitions[topic]
+                    self.partition_states.pop(topic, None)
+            new_topics = []
+            if self.replication_watched:
+                for topic in self.replica_assignments.keys():
+                    if topic not in live_topics:
+                        del self.replica_assignments[topic]
+                self.under_replicated = set(
+                    (topic, partition) for topic, partition in
+                    self.under_replicated if topic in live_topics)
+                for topic, partition in self.partition_leaders.keys():
+                    if topic not in live_topics:
+                        self.set_leader(topic, partition, None)
+                new_topics = [topic for topic in self.topic_names
+                              if topic not in self.replica_assignments]
+        finally:
+            self.model_lock.release()
+        for topic in new_topics:
+            self.watch_topic(topic)
+
+    def update_topic_assignment(self, topic, data):
+        """
+            Watch on the replica assignment of a topic, partitions seen for
+            the first time get a watch on their state
+        """
+        if self.stopped or topic not in self.topic_names:
+            return False
+        assignment = {}
+        if data:
+            # data is of the form : {"version":1,
+            # "partitions":{"1":[873,1272],"0":[1272,874]}}
+            try:
+                partitions = json.loads(data.decode(DECODER))["partitions"]
+                for partition, replica_ids in partitions.items():
+                    assignment[str(partition)] = [str(broker_id) for
+                                                  broker_id in replica_ids]
+            except (ValueError, KeyError, AttributeError):
+                assignment = {}
+        self.model_lock.acquire()
+        try:
+            old_assignment = self.replica_assignments.get(topic, {})
+            self.replica_assignments[topic] = assignment
+            new_partitions = [partition for partition in assignment
+                              if partition not in old_assignment]
+            for partition in old_assignment:
+                if partition not in assignment:
+                    self.under_replicated.discard((topic, partition))
+                    self.set_leader(topic, partition, None)
+            topic_states = self.partition_states.get(topic, {})
+            for partition in assignment:
+                if partition in topic_states:
+                    self.mark_replication(topic, partition,
+                                          topic_states[partition][2])
+        finally:
+            self.model_lock.release()
+        for partition in new_partitions:
+            self.watch_partition_state(topic, partition)
+
+    def update_partition_state(self, topic, partition, data):
+        """
+            Watch on the state of a partition, keeps the cached leader and
+            isr current and updates the under replicated partitions
+        """
+        if (self.stopped or
+                partition not in self.replica_assignments.get(topic, {})):
+            return False
+        self.model_lock.acquire()
+        try:
+            if not data:
+                self.partition_states.get(topic, {}).pop(partition, None)
+                self.under_replicated.discard((topic, partition))
+                self.set_leader(topic, partition, None)
+                return
+            state = json.loads(data.decode(DECODER))
+            leader_id = str(state["leader"])
+            isr_ids = [str(broker_id) for broker_id in state["isr"]]
+            self.partition_states.setdefault(topic, {})[partition] = \
+                (time.time(), leader_id, isr_ids)
+            self.mark_replication(topic, partition, isr_ids)
+            self.set_leader(topic, partition, leader_id)
+        finally:
+            self.model_lock.release()
+
+    def set_leader(self, topic, partition, leader_id):
+        """
+            Record the leader of a partition, None once the partition is
+            gone, must be called with the model lock held
+        """
+        key = (topic, partition)
+        old_leader_id = self.partition_leaders.pop(key, None)
+        if old_leader_id is not None:
+            old_led = self.led_partitions.get(old_leader_id)
+            if old_led is not None:
+                old_led.discard(key)
+                if not old_led:
+                    del self.led_partitions[old_leader_id]
+        if leader_id is not None:
+            self.partition_leaders[key] = leader_id
+            self.led_partitions.setdefault(leader_id, set()).add(key)
+
+    def mark_replication(self, topic, partition, isr_ids):
+        """
+            Record whether a partition is under replicated, must be called
+            with the model lock held
+        """
+        replica_ids = self.replica_assignments[topic][partition]
+        if len(set(isr_ids)) < len(set(replica_ids)):
+            self.under_replicated.add((topic, partition))
+        else:
+            self.under_replicated.discard((topic, partition))
+
+    def get_under_replicated_partitions(self):
+        """
+            Get the partitions with fewer in-sync replicas than replicas,
+            watch_replication has to be called first
+            Args:
+                None
+            Return:
+                sorted list of (topic, partition) pairs
+            Raise:
+                None
+        """
+        return sorted(self.under_replicated)
+
+    def get_led_partitions(self, host):
+        """
+            Get the partitions led by the broker running on a host,
+            watch_replication has to be called first
+            Args:
+                host - hostname of the broker
+            Return:
+                sorted list of (topic, partition) pairs
+            Raise:
+                None
+        """
+        broker_ids = list(self.broker_ids)
+        hosts = self.get_hosts(broker_ids)
+        led = set()
+        self.model_lock.acquire()
+        try:
+            for broker_id, broker_host in zip(broker_ids, hosts):
+                if broker_host == host:
+                    led.update(self.led_partitions.get(broker_id, ()))
+        finally:
+            self.model_lock.release()
+        return sorted(led)
+
+    def update_controller(self, data, stat):
+        """
+            Watch on the controller znode
+        """
+        if self.stopped:
+            return False
+        if data is None:
+            self.controller_id = None
+            return
+        # data is of the form : {"version":1,"brokerid":874,
+        # "timestamp":"1425584134783"}
+        self.controller_id = str(json.loads(data.decode(DECODER))
+                                 ["brokerid"])
+
+    def is_fresh(self, read_time):
+        """
+            Check whether an entry read at read_time can still be used
+        """
+        return time.time() - read_time < self.max_staleness
+
+    def get_host(self, broker_id):
+        """
+            Get hostname of the broker with id = broker_id
+            Args:
+                broker_id - An identifier that identifies the broker
+                uniquely in the Zookeeper
+            Return:
+                Hostname, None if the broker is not registered
+            Raise:
+                None
+        """
+        return self.get_hosts([broker_id])[0]
+
+    def get_hosts(self, broker_ids):
+        """
+            Get the hostnames of several brokers, the hosts which are not
+            cached or are stale are read in one pipelined batch
+            Args:
+                broker_ids - list of broker ids
+            Return:
+                list of hostnames in the order of broker_ids, None for a
+                broker which is not registered
+            Raise:
+                None
+        """
+        broker_ids = [str(broker_id) for broker_id in broker_ids]
+        hosts = {}
+        pending = []
+        read_time = time.time()
+        for broker_id in broker_ids:
+            cached = self.broker_hosts.get(broker_id)
+            if cached is not None and self.is_fresh(cached[0]):
+                hosts[broker_id] = cached[1]
+            elif broker_id not in hosts:
+                hosts[broker_id] = None
+                pending.append((broker_id, self.zk_client.get_async(
+                    self.zk_paths[BROKER_IDS] + "/" + broker_id)))
+        for broker_id, async_result in pending:
+            try:
+                data, stat = async_result.get()
+            except NoNodeError:
+                self.broker_hosts.pop(broker_id, None)
+                continue
+            # data is of the form : {"jmx_port":-1,"timestamp":"1425582849624",
+            # "host":"hostname","version":1,"port":10251}
+            hosts[broker_id] = json.loads(data)["host"]
+            self.broker_hosts[broker_id] = (read_time, hosts[broker_id])
+        return [hosts[broker_id] for broker_id in broker_ids]
+
+    def get_all_hosts(self):
+        """
+            Get list of all hosts in cluster
+            Args:
+                None
+            Return:
+                list of hostnames
+            Raise:
+                None
+        """
+        return [host for host in self.get_hosts(list(self.broker_ids))
+                if host is not None]
+
+    def get_controller(self):
+        """
+            Get the hostname of the controller
+            Args:
+                None
+            Return:
+                hostname of the controller, None if there is none
+            Raise:
+                None
+        """
+        controller_id = self.controller_id
+        if controller_id is None:
+            return None
+        return self.get_host(controller_id)
+
+    def get_topics(self):
+        """
+            Get a list of all topics
+            Args:
+                None
+            Return:
+                list of topic names
+            Raise:
+                None
+        """
+        return self.topic_names
+
+    def get_topic(self):
+        """
+            Get a random existing topic name
+            Args:
+                None
+            Return:
+                topic name, None if there is no topic
+            Raise:
+                None
+        """
+        topic_names = self.topic_names
+        if not topic_names:
+            return None
+        return random.choice(topic_names)
+
+    def get_partitions(self, topic):
+        """
+            Get the partition ids of a topic
+            Args:
+                topic - topic name
+            Return:
+                list of partition ids, empty if the topic does not exist
+            Raise:
+                None
+        """
+        cached = self.topic_partitions.get(topic)
+        if cached is not None and self.is_fresh(cached[0]):
+            return cached[1]
+        read_time = time.time()
+        try:
+            partitions = self.zk_client.get_children(
+                self.zk_paths[BROKER_TOPICS] + "/" + str(topic) + "/" +
+                PARTITIONS)
+        except NoNodeError:
+            self.topic_partitions.pop(topic, None)
+            return []
+        self.topic_partitions[topic] = (read_time, partitions)
+        return partitions
+
+    def get_partition(self, topic):
+        """
+            Get a random partition of a topic
+            Args:
+                topic - topic name
+            Return:
+                partition id, None if the topic has no partition
+            Raise:
+                None
+        """
+        partitions = self.get_partitions(topic)
+        if not partitions:
+            return None
+        return random.choice(partitions)
+
+    def get_partition_state(self, topic, partition):
+        """
+            Get the leader and the in-sync replicas of a partition
+            Args:
+                topic - topic name
+                partition - partition id
+            Return:
+                (leader broker id, list of isr broker ids), None if the
+                partition does not exist
+            Raise:
+                None
+        """
+        partition = str(partition)
+        topic_states = self.partition_states.get(topic, {})
+        cached = topic_states.get(partition)
+        if cached is not None and self.is_fresh(cached[0]):
+            return cached[1], cached[2]
+        read_time = time.time()
+        try:
+            data, stat = self.zk_client.get(
+                self.zk_paths[BROKER_TOPICS] + "/" + str(topic) + "/" +
+                PARTITIONS + "/" + partition + STATE)
+        except NoNodeError:
+            topic_states.pop(partition, None)
+            return None
+        # data is of the form : {"controller_epoch":32,
+        # "leader":873,"version":1,"leader_epoch":18,"isr":[873,1272]}
+        state = json.loads(data.decode(DECODER))
+        leader_id = str(state["leader"])
+        isr_ids = [str(broker_id) for broker_id in state["isr"]]
+        self.partition_states.setdefault(topic, {})[partition] = \
+            (read_time, leader_id, isr_ids)
+        return leader_id, isr_ids
+
+    def get_leader(self, topic, partition):
+        """
+            Get host name of Leader for topic and partition
+            Args:
+                topic - topic name
+                partition - partition id
+            Return:
+                hostname, None if the partition does not exist
+            Raise:
+                None
+        """
+        state = self.get_partition_state(topic, partition)
+        if state is None:
+            return None
+        return self.get_host(state[0])
+
+    def get_isr(self, topic, partition):
+        """
+            Get in-sync replicas for topic and partition
+            Args:
+                topic - topic name
+                partition - partition id
+            Return:
+                list of hostnames, empty if the partition does not exist
+            Raise:
+                None
+        """
+        state = self.get_partition_state(topic, partition)
+        if state is None:
+            return []
+        return [host for host in self.get_hosts(state[1])
+                if host is not None]
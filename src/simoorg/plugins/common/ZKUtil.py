@@ -20,6 +20,8 @@
 import json
 import random
 
+from kazoo.exceptions import NoNodeError
+
 DECODER = "utf-8"
 PARTITIONS = "partitions"
 BROKER_IDS = "broker_ids"
@@ -57,20 +59,16 @@ class KafkaZkHelper(object):
             Raise:
                   None
         """
-        zook = self.zk_client
-
-        # if zook.exists(CONTROLLER_PATH):
-        controller_path = self.zk_paths[CONTROLLER]
-        if zook.exists(controller_path):
-            # data, stat = zook.get(CONTROLLER_PATH)
-            data, stat = zook.get(controller_path)
-            # data is of the form : {"version":1,"brokerid":874,
-            # "timestamp":"1425584134783"}
-            data_values = data.decode(DECODER).split(',')
-            broker_id = data_values[1].split(':')[1]
+        try:
+            data, stat = self.zk_client.get(self.zk_paths[CONTROLLER])
+        except NoNodeError:
+            return None
+        # data is of the form : {"version":1,"brokerid":874,
+        # "timestamp":"1425584134783"}
+        broker_id = json.loads(data.decode(DECODER))["brokerid"]
 
-            # get hostname of the broker from the Id
-            return self.get_host(broker_id)
+        # get hostname of the broker from the Id
+        return self.get_host(broker_id)
 
     def get_host(self, broker_id):
         """
@@ -79,36 +77,53 @@ class KafkaZkHelper(object):
                 broker_id - An identifier that identifies the broker
                 uniquely in the Zookeeper
             Return:
-                Hostname
+                Hostname, None if the broker is not registered
             Raise:
                 None
         """
-        zook = self.zk_client
-        broker_id_path = self.zk_paths[BROKER_IDS]
-        # broker_path = BROKER_IDS_PATH + "/" + str(broker_id)
-        broker_path = broker_id_path + "/" + str(broker_id)
+        return self.get_hosts([broker_id])[0]
 
-        if zook.exists(broker_path):
-            data, stat = zook.get(broker_path)
+    def get_hosts(self, broker_ids):
+        """
+            Get the hostnames of several brokers. All reads are sent
+            before the first reply is waited on, so the whole batch costs
+            about one round trip to Zookeeper
+            Args:
+                broker_ids - list of broker ids
+            Return:
+                list of hostnames in the order of broker_ids, None for a
+                broker which is not registered
+            Raise:
+                None
+        """
+        broker_id_path = self.zk_paths[BROKER_IDS]
+        pending = [self.zk_client.get_async(broker_id_path + "/" +
+                                            str(broker_id))
+                   for broker_id in broker_ids]
+        hosts = []
+        for async_result in pending:
+            try:
+                data, stat = async_result.get()
+            except NoNodeError:
+                hosts.append(None)
+                continue
             # data is of the form : {"jmx_port":-1,"timestamp":"1425582849624",
             # "host":"hostname","version":1,"port":10251}
-            return json.loads(data)["host"]
+            hosts.append(json.loads(data)["host"])
+        return hosts
 
     def get_topics(self):
         """
             Get a list of all topics
             Return:
-                  list of topic names
+                  list of topic names, None if there is no topics znode
             Raise:
                   None
         """
-        zook = self.zk_client
-        broker_topics_path = self.zk_paths[BROKER_TOPICS]
-
-        if zook.exists(broker_topics_path):
-            topics = zook.get_children(broker_topics_path)
-
-            return topics
+        try:
+            return self.zk_client.get_children(self.zk_paths[BROKER_TOPICS])
+        except NoNodeError:
+            return None
 
     def get_number_of_partitions(self, topic):
         """
@@ -116,18 +131,53 @@ class KafkaZkHelper(object):
             Args:
                 topic - topic name
             Return:
-                number of partitions
+                number of partitions, None if the topic does not exist
             Raise:
                 None
         """
-        zook = self.zk_client
-        broker_topics_path = self.zk_paths[BROKER_TOPICS]
-        path = broker_topics_path + "/" + str(topic) + "/" + PARTITIONS
+        partitions = self.get_partitions(topic)
+        if partitions is not None:
+            return len(partitions)
 
-        if zook.exists(path):
-            partitions = zook.get_children(path)
+    def get_partitions(self, topic):
+        """
+            Get the partition ids of a topic
+            Args:
+                topic - topic name
+            Return:
+                list of partition ids, None if the topic does not exist
+            Raise:
+                None
+        """
+        path = (self.zk_paths[BROKER_TOPICS] + "/" + str(topic) + "/" +
+                PARTITIONS)
+        try:
+            return self.zk_client.get_children(path)
+        except NoNodeError:
+            return None
 
-            return partitions.__len__()
+    def get_partition_state(self, topic, partition):
+        """
+            Get the leader and the in-sync replicas of a partition
+            Args:
+                topic - topic name
+                partition - partition id
+            Return:
+                (leader broker id, list of isr broker ids), None if the
+                partition does not exist
+            Raise:
+                None
+        """
+        path = (self.zk_paths[BROKER_TOPICS] + "/" + str(topic) + "/" +
+                PARTITIONS + "/" + str(partition) + STATE)
+        try:
+            data, stat = self.zk_client.get(path)
+        except NoNodeError:
+            return None
+        # data is of the form : data : {"controller_epoch":32,
+        # "leader":873,"version":1,"leader_epoch":18,"isr":[873,1272]}
+        state = json.loads(data.decode(DECODER))
+        return state["leader"], state["isr"]
 
     def get_leader(self, topic, partition):
         """
@@ -140,19 +190,9 @@ class KafkaZkHelper(object):
             Raise:
                 None
         """
-        zook = self.zk_client
-        broker_topics_path = self.zk_paths[BROKER_TOPICS]
-        path = (broker_topics_path + "/" + str(topic) + "/" +
-                PARTITIONS + "/" + str(partition) + STATE)
-
-        if zook.exists(path):
-            data, stat = zook.get(path)
-            # data is of the form : data : {"controller_epoch":32,
-            # "leader":873,"version":1,"leader_epoch":18,"isr":[873,1272]}
-            data_values = data.decode(DECODER).split(',')
-            leader_id = data_values[1].split(':')[1]
-
-            return self.get_host(leader_id)
+        state = self.get_partition_state(topic, partition)
+        if state is not None:
+            return self.get_host(state[0])
 
     def get_isr(self, topic, partition):
         """
@@ -165,25 +205,9 @@ class KafkaZkHelper(object):
             Raise:
                 None
        """
-        zook = self.zk_client
-        broker_topics_path = self.zk_paths[BROKER_TOPICS]
-        path = (broker_topics_path + "/" + str(topic) +
-                "/" + PARTITIONS + "/" + str(partition) + STATE)
-
-        if zook.exists(path):
-            data, stat = zook.get(path)
-            # data is of the form : data : {"controller_epoch":32,
-            # "leader":873,"version":1,"leader_epoch":18,"isr":[873,1272]}
-            data_values = data.decode(DECODER).split(':')
-            isr = str(data_values[5])
-            length = isr.__len__()
-            broker_list = isr[1:length - 2].split(',')
-            isr_list = []
-
-            for broker in broker_list:
-                isr_list.append(self.get_host(broker))
-
-            return isr_list
+        state = self.get_partition_state(topic, partition)
+        if state is not None:
+            return self.get_hosts(state[1])
 
     def get_topic(self):
         """
@@ -209,12 +233,8 @@ class KafkaZkHelper(object):
             Raise:
                 None
        """
-        zook = self.zk_client
-        broker_topics_path = self.zk_paths[BROKER_TOPICS]
-        path = broker_topics_path + "/" + str(topic) + "/" + PARTITIONS
-
-        if zook.exists(path):
-            partitions = zook.get_children(path)
+        partitions = self.get_partitions(topic)
+        if partitions:
             return random.choice(partitions)
 
     def get_all_hosts(self):
@@ -227,12 +247,9 @@ class KafkaZkHelper(object):
             Raise:
                 None
        """
-        zook = self.zk_client
-        broker_id_path = self.zk_paths[BROKER_IDS]
-
-        if zook.exists(broker_id_path):
-            broker_ids = zook.get_children(broker_id_path)
-            brokers = []
-            for broker_id in broker_ids:
-                brokers.append(self.get_host(broker_id))
-            return brokers
+        try:
+            broker_ids = self.zk_client.get_children(
+                self.zk_paths[BROKER_IDS])
+        except NoNodeError:
+            return None
+        return self.get_hosts(broker_ids)
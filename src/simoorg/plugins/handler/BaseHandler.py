@@ -19,12 +19,15 @@
 
 class BaseHandler(object):
     """ Base handler class"""
+    # Set to True if one instance can run several commands, also at the
+    # same time, atropos then keeps one instance per target and reuses it
+    REUSABLE = False
 
     def __init__(self, config_dir, target, logger_instance=None, verbose=True):
         """
             BaseHandler Constructor
         """
-        pass
+        self.connection_pool = None
 
     def authenticate(self):
         """
@@ -33,6 +36,21 @@ class BaseHandler(object):
         """
         pass
 
+    def set_connection_pool(self, connection_pool):
+        """
+            Atropos hands its connection pool to every handler it creates,
+            handlers which keep remote connections may use it to reuse
+            them across calls
+        """
+        self.connection_pool = connection_pool
+
+    def close(self):
+        """
+            Release any connection opened by authenticate, called by
+            atropos once the command has been executed
+        """
+        pass
+
     def execute_command(self):
         """
             This method should read the custom log output
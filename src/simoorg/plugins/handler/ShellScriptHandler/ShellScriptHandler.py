@@ -19,11 +19,87 @@
     should be specifed in the config file 'ShellScriptHandler.yaml'
 """
 import os
+import time
+import select
+import socket
+import collections
 import paramiko
 from simoorg.plugins.handler.BaseHandler import BaseHandler
 import yaml
 
 PLUGIN_CONFIG_PATH = 'plugins/handler/ShellScriptHandler/'
+DEFAULT_KEEPALIVE_INTERVAL = 30
+DEFAULT_MAX_OUTPUT_BYTES = 1024 * 1024
+# Upper bound on a single select call, the exit status is not always
+# followed by a channel close so we never block longer than this
+SELECT_INTERVAL = 1.0
+RECV_CHUNK_SIZE = 32768
+# Status returned when the command did not finish within command_timeout
+COMMAND_TIMEOUT_STATUS = -1
+
+
+class BoundedOutputBuffer(object):
+    """
+        Collects the output of a remote command while keeping only the
+        last max_bytes of it, so a chatty script cannot exhaust memory
+    """
+    def __init__(self, max_bytes):
+        """
+            Init function for the buffer
+            Args:
+                max_bytes - Maximum number of bytes retained
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.max_bytes = max_bytes
+        self.chunks = collections.deque()
+        self.size = 0
+        self.dropped_bytes = 0
+
+    def append(self, data):
+        """
+            Add a chunk of output, dropping the oldest bytes if the
+            buffer grows beyond max_bytes
+            Args:
+                data - string read from the channel
+            Return:
+                None
+            Raise:
+                None
+        """
+        if not data:
+            return
+        self.chunks.append(data)
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            excess = self.size - self.max_bytes
+            oldest = self.chunks.popleft()
+            if len(oldest) > excess:
+                self.chunks.appendleft(oldest[excess:])
+                self.size -= excess
+                self.dropped_bytes += excess
+            else:
+                self.size -= len(oldest)
+                self.dropped_bytes += len(oldest)
+
+    def get_lines(self):
+        """
+            Return the retained output as a list of lines, similar to
+            file.readlines()
+            Args:
+                None
+            Return:
+                list of lines
+            Raise:
+                None
+        """
+        lines = ''.join(self.chunks).splitlines(True)
+        if self.dropped_bytes:
+            lines.insert(0, "[{0} bytes of output truncated]\n"
+                         .format(self.dropped_bytes))
+        return lines
 
 
 class ShellScriptHandler(BaseHandler):
@@ -77,6 +153,9 @@ class ShellScriptHandler(BaseHandler):
         self.load_config()
         # initialize the config variables
         self.host_key_path = None
+        self.keepalive_interval = DEFAULT_KEEPALIVE_INTERVAL
+        self.max_output_bytes = DEFAULT_MAX_OUTPUT_BYTES
+        self.command_timeout = None
 
         # read in yaml configuration
         for key, val in self.config.iteritems():
@@ -97,23 +176,102 @@ class ShellScriptHandler(BaseHandler):
         self.sock = sock
         self.verbose = verbose
         self.debug = debug
-        self.command_timeout = command_timeout
+        if command_timeout is not None:
+            self.command_timeout = command_timeout
         self.logger_instance = logger_instance
+        self.connection_broken = False
 
     def authenticate(self):
         """
-            Authenticate ssh connection
+            Authenticate ssh connection, if atropos provided a connection
+            pool an idle authenticated client for the same host, port and
+            user is reused instead of doing a new handshake
             Args:
                 None
             Return:
                 None
             Raise:
+                ConnectionPoolExhausted - if the pool stays full
+        """
+        self.connection_broken = False
+        if self.connection_pool is not None:
+            self.ssh_client = self.connection_pool.acquire(
+                self.get_pool_key(), self.create_ssh_client,
+                self.is_connection_alive)
+        else:
+            self.ssh_client = self.create_ssh_client()
+
+    def create_ssh_client(self):
+        """
+            Create a new ssh client and connect it to the target host
+            Args:
                 None
+            Return:
+                A connected paramiko.SSHClient
+            Raise:
+                Any exception raised by connect
         """
         self.ssh_client = paramiko.SSHClient()
         self.ssh_client.load_host_keys(os.path.expanduser(self.host_key_path))
         self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         self.connect()
+        if self.keepalive_interval:
+            self.ssh_client.get_transport().set_keepalive(
+                self.keepalive_interval)
+        return self.ssh_client
+
+    def get_pool_key(self):
+        """
+            Key under which the ssh client is stored in the connection pool
+            Args:
+                None
+            Return:
+                tuple of hostname, port and username
+            Raise:
+                None
+        """
+        return (self.hostname, self.port, self.username)
+
+    def is_connection_alive(self, ssh_client):
+        """
+            Validate a pooled client before reusing it, the ignore message
+            fails fast if the remote end has silently gone away
+            Args:
+                ssh_client - A paramiko.SSHClient taken from the pool
+            Return:
+                True if the transport is still usable else False
+            Raise:
+                None
+        """
+        transport = ssh_client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except (paramiko.SSHException, EOFError, IOError):
+            return False
+        return True
+
+    def close(self):
+        """
+            Give the ssh client back to the connection pool, or close it if
+            we are not pooling or the connection broke during the command
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        if self.ssh_client is None:
+            return
+        if self.connection_pool is None:
+            self.ssh_client.close()
+        elif self.connection_broken:
+            self.connection_pool.discard(self.get_pool_key(), self.ssh_client)
+        else:
+            self.connection_pool.release(self.get_pool_key(), self.ssh_client)
+        self.ssh_client = None
 
     def connect(self):
         """
@@ -163,23 +321,28 @@ class ShellScriptHandler(BaseHandler):
                 command, bufsize=-1, timeout=self.command_timeout)
         except paramiko.SSHException, exc:
             print "Server failed to execute command", exc
+            self.connection_broken = True
             raise
         except Exception, exc:
             print ("Unkown exception while trying to execute ssh command: ",
                    command, exc)
+            self.connection_broken = True
             raise
         else:
-            while not stdout.channel.exit_status_ready():
-                pass
-            status = stdout.channel.recv_exit_status()
-            command_output = stdout.readlines()
-            error_messages = stderr.readlines()
+            status, command_output, error_messages = \
+                self.wait_for_command(stdout.channel)
             if status == 0:
                 self.logger_instance.logit("INFO", "Command finished"
                                                    " successfully",
                                            log_level="INFO")
                 self.logger_instance.logit("INFO", "Closing ssh connection",
                                            log_level="DEBUG")
+            elif status == COMMAND_TIMEOUT_STATUS:
+                self.logger_instance.logit("WARN",
+                                           "Command did not finish within"
+                                           " {0} seconds, giving up"
+                                           .format(self.command_timeout),
+                                           log_level="WARNING")
             elif status == 127:
                 self.logger_instance.logit("WARN",
                                            "Command failed. Invalid arguments"
@@ -190,14 +353,62 @@ class ShellScriptHandler(BaseHandler):
             else:
                 self.logger_instance.logit("WARN",
                                            "Comand failed. Return value: {0}"
-                                           .format(stdout.channel.
-                                                   recv_exit_status()),
+                                           .format(status),
                                            log_level="WARNING")
                 self.logger_instance.logit("INFO",
                                            "Closing ssh connection",
                                            log_level="DEBUG")
             return (status, command_output, error_messages)
 
+    def wait_for_command(self, channel):
+        """
+            Wait for the remote command to exit, sleeping in select on the
+            channel instead of polling it. Stdout and stderr are drained
+            as they arrive, which also keeps the remote side from blocking
+            on a full ssh window
+            Args:
+                channel - The paramiko channel the command runs on
+            Return:
+                tuple of exit status, stdout lines and stderr lines, the
+                status is COMMAND_TIMEOUT_STATUS if command_timeout expired
+            Raise:
+                socket.error/EOFError/paramiko.SSHException - if the
+                connection breaks while waiting, the connection is then
+                marked broken
+        """
+        stdout_buffer = BoundedOutputBuffer(self.max_output_bytes)
+        stderr_buffer = BoundedOutputBuffer(self.max_output_bytes)
+        deadline = None
+        if self.command_timeout:
+            deadline = time.time() + self.command_timeout
+        try:
+            while True:
+                while channel.recv_ready():
+                    stdout_buffer.append(channel.recv(RECV_CHUNK_SIZE))
+                while channel.recv_stderr_ready():
+                    stderr_buffer.append(channel.recv_stderr(RECV_CHUNK_SIZE))
+                if (channel.exit_status_ready() and
+                        not channel.recv_ready() and
+                        not channel.recv_stderr_ready()):
+                    break
+                wait_time = SELECT_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        channel.close()
+                        return (COMMAND_TIMEOUT_STATUS,
+                                stdout_buffer.get_lines(),
+                                stderr_buffer.get_lines())
+                    wait_time = min(wait_time, remaining)
+                select.select([channel], [], [], wait_time)
+            exit_status = channel.recv_exit_status()
+        except (socket.error, EOFError, paramiko.SSHException):
+            # the transport died under the command, keep it out of the pool
+            self.connection_broken = True
+            raise
+        return (exit_status, stdout_buffer.get_lines(),
+                stderr_buffer.get_lines())
+
     def load_config(self):
         """
             Read the shellscript handler configs
@@ -23,6 +23,8 @@
                                                      returns False)
     the config file for the class will be called test_handler.yaml and the
     class looks for it at the given config directory path
+    The string {target} in the coordinate is replaced with the target node,
+    so that fan-out failures can write one test file per node
 """
 import os
 from simoorg.plugins.handler.BaseHandler import BaseHandler
@@ -34,17 +36,20 @@ SKIP_REVERT_KEY = 'skip_revert'
 
 class TestHandler(BaseHandler):
     """ Test Handler class"""
+    REUSABLE = True
 
     def __init__(self, config_dir, target, logger_instance=None, verbose=True):
         """
             The init class for test handler
             config_dir - The path to config
-            target - The target for the handler (currently unused)
+            target - The target for the handler, substituted for {target}
+                in the coordinate
             logger_instance - An instance of logger class
             verbose - verbosity flag
         """
         BaseHandler.__init__(self, config_dir, target,
                              logger_instance, verbose)
+        self.target = target
         self.test_config = None
         if os.path.isfile(config_dir + '/test_handler.yaml'):
             with open(config_dir + '/test_handler.yaml') as config_fd:
@@ -63,6 +68,7 @@ class TestHandler(BaseHandler):
                 argument - Argument list (expected to contain only a
                                           single item i.e the action type)
         """
+        coordinate = coordinate.replace('{target}', str(self.target))
         if argument[0] == 'failure':
             if self.test_config is not None:
                 if SKIP_FAILURE_KEY in self.test_config.keys() and \
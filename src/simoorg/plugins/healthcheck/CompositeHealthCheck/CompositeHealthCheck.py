@@ -0,0 +1,209 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    A health check made of several health check plugins, run in parallel
+    with a shared deadline. The results of the children are combined by
+    a rule:
+        all - every child has to pass
+        any - one passing child is enough
+        quorum - at least quorum children have to pass
+    The check returns as soon as its outcome is decided, children still
+    running at that point finish in the background and their results are
+    ignored. A child which raises, or has not answered by the deadline,
+    counts as failed. A child still running for an earlier check is not
+    started a second time, the check waits for that run instead
+"""
+import time
+import Queue
+import threading
+from multiprocessing.pool import ThreadPool
+from simoorg.PluginRegistry import PluginRegistry, HEALTHCHECK_PLUGIN, \
+    get_config_key
+from simoorg.plugins.healthcheck.HealthCheck import HealthCheck
+
+# plugin_configs keys, a child is described like the healthcheck block
+# of a fate book
+CHECKS_KEY = 'checks'
+RULE_KEY = 'rule'
+QUORUM_KEY = 'quorum'
+TIMEOUT_KEY = 'timeout'
+CHILD_PLUGIN_KEY = 'plugin'
+CHILD_COORDINATE_KEY = 'coordinate'
+CHILD_PLUGINCONFIG_KEY = 'plugin_configs'
+
+ALL_RULE = 'all'
+ANY_RULE = 'any'
+QUORUM_RULE = 'quorum'
+# Seconds the children have to answer
+DEFAULT_TIMEOUT = 120
+
+
+class CompositeHealthCheck(HealthCheck):
+    """
+        Composite Health check class
+    """
+    REUSABLE = True
+
+    def __init__(self, script, plugin_config):
+        """
+            Init function
+            Args:
+                script - Unused
+                plugin_config - dict with the list of children under the
+                    key checks, and the optional keys rule, quorum and
+                    timeout
+            Return:
+                None
+            Raise:
+                ValueError - If there are no children or the rule is
+                    unknown or the quorum can not be met
+        """
+        HealthCheck.__init__(self, script, plugin_config)
+        if (not isinstance(plugin_config, dict) or
+                not plugin_config.get(CHECKS_KEY)):
+            raise ValueError("CompositeHealthCheck needs a list of checks")
+        self.check_configs = plugin_config[CHECKS_KEY]
+        self.rule = plugin_config.get(RULE_KEY, ALL_RULE)
+        self.timeout = plugin_config.get(TIMEOUT_KEY, DEFAULT_TIMEOUT)
+        self.required_passes = self.get_required_passes(
+            plugin_config.get(QUORUM_KEY))
+        # children are built on first use, reusable ones are kept
+        self.plugin_registry = PluginRegistry()
+        # one worker for each child, a child never runs twice at once
+        self.pool = ThreadPool(len(self.check_configs))
+        # index of a running child -> result queues waiting for its run
+        self.running_children = {}
+        self.running_lock = threading.Lock()
+        self.last_results = []
+
+    def get_required_passes(self, quorum):
+        """
+            Number of children which have to pass under the rule
+            Args:
+                quorum - quorum config value, only used by the quorum rule
+            Return:
+                number of passes
+            Raise:
+                ValueError - If the rule is unknown or the quorum is not
+                    between 1 and the number of children
+        """
+        if self.rule == ALL_RULE:
+            return len(self.check_configs)
+        if self.rule == ANY_RULE:
+            return 1
+        if self.rule == QUORUM_RULE:
+            if (not isinstance(quorum, int) or
+                    not 1 <= quorum <= len(self.check_configs)):
+                raise ValueError("quorum must be between 1 and {0}"
+                                 .format(len(self.check_configs)))
+            return quorum
+        raise ValueError("Unknown healthcheck rule {0}".format(self.rule))
+
+    def check(self):
+        """
+            Run every child in parallel and combine their results
+            Args:
+                None
+            Return:
+                True if enough children passed else False
+            Raise:
+                None
+        """
+        start_time = time.time()
+        deadline = start_time + self.timeout
+        result_queue = Queue.Queue()
+        for index, check_config in enumerate(self.check_configs):
+            if self.wait_for_child(index, result_queue):
+                self.pool.apply_async(self.run_child,
+                                      (index, check_config))
+        child_count = len(self.check_configs)
+        results = [None] * child_count
+        passes = 0
+        failures = 0
+        while (passes < self.required_passes and
+               failures <= child_count - self.required_passes):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                index, healthy = result_queue.get(timeout=remaining)
+            except Queue.Empty:
+                break
+            results[index] = healthy
+            if healthy:
+                passes += 1
+            else:
+                failures += 1
+        self.last_results = results
+        self.record_latency(time.time() - start_time)
+        return passes >= self.required_passes
+
+    def wait_for_child(self, index, result_queue):
+        """
+            Have the next result of a child put on a result queue
+            Args:
+                index - Position of the child in the checks list
+                result_queue - Queue the (index, healthy) result goes to
+            Return:
+                True if the child has to be started, False if it is
+                still running for an earlier check
+            Raise:
+                None
+        """
+        self.running_lock.acquire()
+        try:
+            if index in self.running_children:
+                self.running_children[index].append(result_queue)
+                return False
+            self.running_children[index] = [result_queue]
+            return True
+        finally:
+            self.running_lock.release()
+
+    def run_child(self, index, check_config):
+        """
+            Run one child and report its result as (index, healthy) to
+            every check waiting for it
+        """
+        try:
+            plugin_config = check_config.get(CHILD_PLUGINCONFIG_KEY)
+            child = self.plugin_registry.get_instance(
+                HEALTHCHECK_PLUGIN, check_config[CHILD_PLUGIN_KEY],
+                (index, get_config_key(plugin_config)),
+                check_config.get(CHILD_COORDINATE_KEY), plugin_config)
+            healthy = bool(child.check())
+        except Exception:
+            healthy = False
+        self.running_lock.acquire()
+        try:
+            result_queues = self.running_children.pop(index)
+        finally:
+            self.running_lock.release()
+        for result_queue in result_queues:
+            result_queue.put((index, healthy))
+
+    def close(self):
+        """
+            Stop the worker threads and close the children kept for reuse
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                Any exception raised by the close of a child
+        """
+        self.pool.terminate()
+        for child in self.plugin_registry.pop_instances(HEALTHCHECK_PLUGIN):
+            child.close()
@@ -16,30 +16,64 @@
     The default health check module
 """
 import os
+import time
+import shlex
+import signal
+import threading
+import subprocess
 from simoorg.plugins.healthcheck.HealthCheck import HealthCheck
 
+# plugin_configs keys
+TIMEOUT_KEY = 'timeout'
+CACHE_TTL_KEY = 'cache_ttl'
+USE_SHELL_KEY = 'use_shell'
+# Seconds the script may run before it is killed
+DEFAULT_TIMEOUT = 120
+# Seconds a check result is reused, 0 runs the script for every check
+DEFAULT_CACHE_TTL = 0
+
 
 class DefaultHealthCheck(HealthCheck):
     """
         Default Health check class
     """
+    REUSABLE = True
+
     def __init__(self, script, plugin_config):
         """
             Init function
             Args:
-                script - Health check script
+                script - Health check script, with its arguments
+                plugin_config - Optional dict with the keys timeout,
+                    cache_ttl and use_shell
             Return:
                 None
             Raise:
                 None
         """
         HealthCheck.__init__(self, script, plugin_config)
+        # plugin_configs is often left as None in fate books
+        if not isinstance(plugin_config, dict):
+            plugin_config = {}
+        self.timeout = plugin_config.get(TIMEOUT_KEY, DEFAULT_TIMEOUT)
+        self.cache_ttl = plugin_config.get(CACHE_TTL_KEY, DEFAULT_CACHE_TTL)
+        # coordinates may use pipes, && or environment variables, so they
+        # run through a shell unless the fate book opts out
+        self.use_shell = plugin_config.get(USE_SHELL_KEY, True)
+        self.check_lock = threading.Lock()
+        self.last_result = None
+        self.last_check_time = None
+        self.last_output = None
+        self.last_error = None
+        self.timed_out = False
 
     def check(self):
         """
             Check the health of the service (Assuming the script captures
                                              that logic, just return the
                                              execution srarus)
+            A result younger than cache_ttl seconds is returned without
+            running the script again
             Args:
                 None
             Return:
@@ -47,8 +81,90 @@ class DefaultHealthCheck(HealthCheck):
             Raise:
                 None
         """
-        status = os.system(str(self.script))
-        if status == 0:
-            return True
+        self.check_lock.acquire()
+        try:
+            if (self.last_check_time is not None and
+                    time.time() - self.last_check_time < self.cache_ttl):
+                return self.last_result
+            return self.run_check()
+        finally:
+            self.check_lock.release()
+
+    def check_revert(self):
+        """
+            Check the health after a failure was reverted. The script always
+            runs, a cached result could predate the failure, its result
+            then refreshes the cache
+            Args:
+                None
+            Return:
+                True if command was executed successfully else False
+            Raise:
+                None
+        """
+        self.check_lock.acquire()
+        try:
+            return self.run_check()
+        finally:
+            self.check_lock.release()
+
+    def run_check(self):
+        """
+            Run the script and cache its result, called with check_lock held
+        """
+        start_time = time.time()
+        self.last_result = self.run_script()
+        self.last_check_time = time.time()
+        self.record_latency(self.last_check_time - start_time)
+        return self.last_result
+
+    def run_script(self):
+        """
+            Run the script in a process group of its own, the whole group
+            is killed if the script does not finish within timeout
+            seconds. Its output and error are kept in last_output and
+            last_error
+            Args:
+                None
+            Return:
+                True if the script exited with status 0 else False
+            Raise:
+                None
+        """
+        self.timed_out = False
+        if self.use_shell:
+            command = str(self.script)
         else:
+            command = shlex.split(str(self.script))
+        try:
+            process = subprocess.Popen(command, shell=self.use_shell,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE,
+                                       close_fds=True, preexec_fn=os.setsid)
+        except OSError as exc:
+            self.last_output = ''
+            self.last_error = str(exc)
+            return False
+        kill_timer = threading.Timer(self.timeout, self.kill_process_group,
+                                     [process])
+        kill_timer.start()
+        try:
+            self.last_output, self.last_error = process.communicate()
+        finally:
+            kill_timer.cancel()
+        if self.timed_out:
             return False
+        return process.returncode == 0
+
+    def kill_process_group(self, process):
+        """
+            Kill the script and every process it started
+        """
+        if process.poll() is not None:
+            return
+        self.timed_out = True
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            # the script finished in the meantime
+            pass
@@ -15,12 +15,21 @@
 """
     The Health check interface
 """
+import collections
+
+# Number of recent check latencies kept by a healthcheck
+LATENCY_HISTORY = 100
 
 
 class HealthCheck(object):
     """
         All healthcheck plugins should inherit this class
     """
+    # Set to True if check can be called again on the same instance,
+    # atropos then builds the healthcheck once instead of before every
+    # failure
+    REUSABLE = False
+
     def __init__(self, script, plugin_config=None):
         """
             Init function of the class
@@ -32,6 +41,7 @@ class HealthCheck(object):
                 None
         """
         self.script = script
+        self.latencies = collections.deque(maxlen=LATENCY_HISTORY)
 
     # return true or false
     def check(self):
@@ -40,3 +50,54 @@ class HealthCheck(object):
             returing the status
         """
         pass
+
+    def check_revert(self):
+        """
+            Checks the health after a failure was reverted, used by atropos
+            when the healthcheck gates reverts. Plugins can override this
+            with a check of their own
+            Args:
+                None
+            Return:
+                True if the service recovered else False
+            Raise:
+                None
+        """
+        return self.check()
+
+    def record_latency(self, latency):
+        """
+            Remember how long a check took
+            Args:
+                latency - Seconds taken by the check
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.latencies.append(latency)
+
+    def close(self):
+        """
+            Release the connections and threads the healthcheck holds once
+            atropos is done with it. Plugins without any keep this default
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        pass
+
+    def get_latencies(self):
+        """
+            Get the latencies of the recent checks, oldest first
+            Args:
+                None
+            Return:
+                list of seconds
+            Raise:
+                None
+        """
+        return list(self.latencies)
@@ -17,29 +17,45 @@
     and return true or false accordingly
 """
 import os
+import time
 from kazoo.client import KazooClient
 import yaml
 from simoorg.plugins.common.ZKUtil import KafkaZkHelper
+from simoorg.plugins.common.KafkaClusterModel import KafkaClusterModel
 from simoorg.plugins.healthcheck.HealthCheck import HealthCheck
 
+# plugin_configs keys
+TOPOLOGY_CONFIG_KEY = 'topology_config'
+MAX_UNDER_REPLICATED_KEY = 'max_under_replicated'
+# Number of under replicated partitions a healthy cluster may have
+DEFAULT_MAX_UNDER_REPLICATED = 0
+
 
 class KafkaHealthCheck(HealthCheck):
     """
         Kafka Healthcheck class
     """
+    # the zookeeper session and the watches are kept across checks
+    REUSABLE = True
+
     def __init__(self, shell_script, plugin_config):
         """
             Init function for the KafkaHealthCheck class
             Args:
-                shell_script - script that is used to check the health
-                of the cluster
+                shell_script - Optional script that is used to check the
+                health of each broker
+                plugin_config - dict with the path to the kafka topology
+                config under topology_config and the optional key
+                max_under_replicated
             Return:
                 None
             Raise:
                 None
         """
         HealthCheck.__init__(self, shell_script, plugin_config)
-        self.config_file = plugin_config['topology_config']
+        self.config_file = plugin_config[TOPOLOGY_CONFIG_KEY]
+        self.max_under_replicated = plugin_config.get(
+            MAX_UNDER_REPLICATED_KEY, DEFAULT_MAX_UNDER_REPLICATED)
         with open(self.config_file, 'r') as file_desc:
             doc = yaml.load(file_desc)
 
@@ -47,6 +63,9 @@ class KafkaHealthCheck(HealthCheck):
         self.zookeeper = None
         self.zookeeper_paths = None
         self.kafka_host_resolution = None
+        self.last_under_replicated = []
+        self.cluster_model = None
+        self.zk_client = None
 
         for key, val in doc.iteritems():
             setattr(self, key, val)
@@ -55,6 +74,7 @@ class KafkaHealthCheck(HealthCheck):
             zook = KazooClient(hosts=self.zookeeper.get("host"),
                                read_only=True)
             zook.start()
+            self.zk_client = zook
 
             # read ZK Paths into a dictionary
             zk_paths = {}
@@ -64,10 +84,18 @@ class KafkaHealthCheck(HealthCheck):
                     # create zk_helper object
             helper = KafkaZkHelper(zook, zk_paths)
             self.helper = helper
+            # the replication state is followed through watches, so a
+            # check does not go to zookeeper
+            self.cluster_model = KafkaClusterModel(zook, zk_paths)
+            self.cluster_model.start()
+            self.cluster_model.watch_replication()
 
     def check(self):
         """
-          Checks the health of the cluster
+          Checks the health of the cluster, the cluster is healthy if it
+          has at most max_under_replicated under replicated partitions
+          and, if a script is configured, the script passes for every
+          broker
           Args:
               None
           Return:
@@ -75,12 +103,38 @@ class KafkaHealthCheck(HealthCheck):
           Raise:
               None
         """
-        brokers = self.helper.get_all_hosts()
-        for broker in brokers:
-            #  the shell script takes a host broker as an input
-            status = os.system(str(self.script) + " " +
-                               str(broker) + " > /dev/null")
-            # print("status : " + str(status) + " for broker : " + str(broker))
-            if status != 0:
+        start_time = time.time()
+        try:
+            self.last_under_replicated = \
+                self.cluster_model.get_under_replicated_partitions()
+            if len(self.last_under_replicated) > self.max_under_replicated:
                 return False
-        return True
+            if not self.script or str(self.script) == 'None':
+                return True
+            brokers = self.cluster_model.get_all_hosts()
+            for broker in brokers:
+                #  the shell script takes a host broker as an input
+                status = os.system(str(self.script) + " " +
+                                   str(broker) + " > /dev/null")
+                if status != 0:
+                    return False
+            return True
+        finally:
+            self.record_latency(time.time() - start_time)
+
+    def close(self):
+        """
+            Stop the cluster model and end the zookeeper session
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        if self.cluster_model is not None:
+            self.cluster_model.stop()
+        if self.zk_client is not None:
+            self.zk_client.stop()
+            self.zk_client.close()
+            self.zk_client = None
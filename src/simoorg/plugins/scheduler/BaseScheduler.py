@@ -14,8 +14,320 @@
 
 """
     The interface for all the scheduler plugins, all scheduler plugins should
-    inherit this class
+    inherit this class. Plans are handed to atropos and moirai as compact
+    plans, which keep every failure name once and the events in two arrays
 """
+import sys
+import json
+import struct
+import operator
+from array import array
+from itertools import imap, izip
+
+PLAN_HEADER = struct.Struct('<4sII')
+PLAN_MAGIC = 'SPL1'
+NAME_LENGTH = struct.Struct('<H')
+# failure ids are stored as unsigned shorts
+MAX_FAILURE_NAMES = 65536
+
+
+class PlanEvent(tuple):
+    """
+        A view of one event of a compact plan, a (failure_name,
+        trigger_time) tuple which also has them as attributes
+    """
+    __slots__ = ()
+
+    failure_name = property(operator.itemgetter(0))
+    trigger_time = property(operator.itemgetter(1))
+
+    def __new__(cls, failure_name, trigger_time):
+        return tuple.__new__(cls, (failure_name, trigger_time))
+
+    def to_dict(self):
+        """
+            The event as the {failure_name: trigger_time} dict of a list
+            plan
+        """
+        return {self.failure_name: self.trigger_time}
+
+    def __repr__(self):
+        return 'PlanEvent({0!r}, {1!r})'.format(self.failure_name,
+                                                self.trigger_time)
+
+
+def get_trigger_time(trigger_time):
+    """
+        Trigger times are stored as doubles, whole second times are given
+        back as ints like the schedulers planned them
+    """
+    if trigger_time.is_integer():
+        return int(trigger_time)
+    return trigger_time
+
+
+class CompactPlan(object):
+    """
+        Compact plan class, event i induces failure_names[failure_ids[i]]
+        at trigger_times[i]
+    """
+    def __init__(self, failure_names=None, failure_ids=None,
+                 trigger_times=None):
+        """
+            Init function for the CompactPlan class
+            Args:
+                failure_names - list of the failure names the ids refer to
+                failure_ids - array('H') of failure ids, one per event
+                trigger_times - array('d') of trigger times, one per event
+            Return:
+                None
+            Raise:
+                ValueError - The arrays do not have the same length
+        """
+        self.failure_names = []
+        self.failure_index = {}
+        for failure_name in failure_names or []:
+            self.get_failure_id(failure_name)
+        self.failure_ids = failure_ids if failure_ids is not None \
+            else array('H')
+        self.trigger_times = trigger_times if trigger_times is not None \
+            else array('d')
+        if len(self.failure_ids) != len(self.trigger_times):
+            raise ValueError("A plan needs one failure id per trigger time")
+        # whether every trigger time is a whole second, None until known
+        self.whole_seconds = None
+
+    def get_failure_id(self, failure_name):
+        """
+            Id of a failure name, the name is interned and given the next
+            id the first time it is seen
+            Args:
+                failure_name - Name of the failure
+            Return:
+                The failure id
+            Raise:
+                ValueError - The plan already has MAX_FAILURE_NAMES names
+        """
+        failure_id = self.failure_index.get(failure_name)
+        if failure_id is not None:
+            return failure_id
+        if len(self.failure_names) >= MAX_FAILURE_NAMES:
+            raise ValueError("A plan has at most {0} failure names"
+                             .format(MAX_FAILURE_NAMES))
+        if isinstance(failure_name, str):
+            failure_name = intern(failure_name)
+        failure_id = len(self.failure_names)
+        self.failure_names.append(failure_name)
+        self.failure_index[failure_name] = failure_id
+        return failure_id
+
+    def append(self, failure_name, trigger_time):
+        """
+            Add an event at the end of the plan
+            Args:
+                failure_name - Name of the failure
+                trigger_time - The time to induce it at
+            Return:
+                None
+            Raise:
+                ValueError - Too many failure names
+        """
+        self.failure_ids.append(self.get_failure_id(failure_name))
+        self.trigger_times.append(trigger_time)
+        self.whole_seconds = None
+
+    def has_whole_seconds(self):
+        """
+            Check whether every trigger time is a whole second, the
+            answer is kept until the next append
+        """
+        if self.whole_seconds is None:
+            self.whole_seconds = all(imap(float.is_integer,
+                                          self.trigger_times))
+        return self.whole_seconds
+
+    def __len__(self):
+        return len(self.trigger_times)
+
+    def __getitem__(self, index):
+        return PlanEvent(self.failure_names[self.failure_ids[index]],
+                         get_trigger_time(self.trigger_times[index]))
+
+    def __iter__(self):
+        """
+            Iterate over the events as plain (failure_name, trigger_time)
+            tuples. Every step of the chain is a builtin, so a long plan is
+            walked without a python call per event
+        """
+        if self.has_whole_seconds():
+            trigger_times = imap(int, self.trigger_times)
+        else:
+            trigger_times = imap(get_trigger_time, self.trigger_times)
+        return izip(imap(self.failure_names.__getitem__, self.failure_ids),
+                    trigger_times)
+
+    def to_events(self):
+        """
+            The plan as a list of {failure_name: trigger_time} dicts
+            Args:
+                None
+            Return:
+                list of dicts
+            Raise:
+                None
+        """
+        return [{failure_name: trigger_time}
+                for failure_name, trigger_time in self]
+
+    def to_json(self):
+        """
+            Encode the plan as the json list of single key objects the
+            api has always returned, without building the dicts or the
+            event views. The list is laid out as one format string with a
+            template per failure, filled in with a single % operation
+            Args:
+                None
+            Return:
+                json string
+            Raise:
+                None
+        """
+        failure_names = [json.dumps(failure_name).replace('%', '%%')
+                         for failure_name in self.failure_names]
+        trigger_times = self.trigger_times.tolist()
+        if self.has_whole_seconds():
+            templates = ['{' + failure_name + ': %d}'
+                         for failure_name in failure_names]
+        else:
+            # json encodes floats with repr
+            templates = ['{' + failure_name + ': %s}'
+                         for failure_name in failure_names]
+            trigger_times = map(repr, imap(get_trigger_time, trigger_times))
+        return ('[' + ', '.join(imap(templates.__getitem__,
+                                     self.failure_ids)) + ']') % \
+            tuple(trigger_times)
+
+    def to_columns(self):
+        """
+            The plan in columns, for a columnar json encoding
+            Args:
+                None
+            Return:
+                dict with the failure_names, failure_ids and trigger_times
+                lists
+            Raise:
+                None
+        """
+        return {'failure_names': list(self.failure_names),
+                'failure_ids': self.failure_ids.tolist(),
+                'trigger_times': [get_trigger_time(trigger_time) for
+                                  trigger_time in self.trigger_times]}
+
+    def to_bytes(self):
+        """
+            Encode the plan in its binary form: a header with the number
+            of names and events, the names, then the failure ids and the
+            trigger times as little endian arrays
+            Args:
+                None
+            Return:
+                The encoded plan as a string
+            Raise:
+                None
+        """
+        chunks = [PLAN_HEADER.pack(PLAN_MAGIC, len(self.failure_names),
+                                   len(self))]
+        for failure_name in self.failure_names:
+            if isinstance(failure_name, unicode):
+                failure_name = failure_name.encode('utf-8')
+            chunks.append(NAME_LENGTH.pack(len(failure_name)))
+            chunks.append(failure_name)
+        for values in (self.failure_ids, self.trigger_times):
+            if sys.byteorder != 'little':
+                values = array(values.typecode, values)
+                values.byteswap()
+            chunks.append(values.tostring())
+        return ''.join(chunks)
+
+    def __reduce__(self):
+        # pickled through the atropos data queue in the binary form, an
+        # array would otherwise be pickled as a list of python numbers
+        return decode_plan, (self.to_bytes(),)
+
+
+def decode_plan(data):
+    """
+        Decode a plan encoded by CompactPlan.to_bytes
+        Args:
+            data - The encoded plan
+        Return:
+            A CompactPlan
+        Raise:
+            ValueError - The data is not an encoded plan
+    """
+    try:
+        magic, name_count, event_count = PLAN_HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError("Truncated plan")
+    if magic != PLAN_MAGIC:
+        raise ValueError("Not an encoded plan")
+    offset = PLAN_HEADER.size
+    failure_names = []
+    for _ in xrange(name_count):
+        length, = NAME_LENGTH.unpack_from(data, offset)
+        offset += NAME_LENGTH.size
+        failure_name = data[offset:offset + length]
+        try:
+            failure_name.decode('ascii')
+        except UnicodeDecodeError:
+            failure_name = failure_name.decode('utf-8')
+        failure_names.append(failure_name)
+        offset += length
+    columns = []
+    for typecode in ('H', 'd'):
+        values = array(typecode)
+        end = offset + event_count * values.itemsize
+        if end > len(data):
+            raise ValueError("Truncated plan")
+        values.fromstring(data[offset:end])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        columns.append(values)
+        offset = end
+    return CompactPlan(failure_names, columns[0], columns[1])
+
+
+def plan_from_columns(columns):
+    """
+        Build a plan from the output of CompactPlan.to_columns
+        Args:
+            columns - dict with the failure_names, failure_ids and
+                trigger_times lists
+        Return:
+            A CompactPlan
+        Raise:
+            KeyError/ValueError - Malformed columns
+    """
+    return CompactPlan(columns['failure_names'],
+                       array('H', columns['failure_ids']),
+                       array('d', columns['trigger_times']))
+
+
+def plan_from_events(events):
+    """
+        Build a plan from a list of {failure_name: trigger_time} dicts
+        Args:
+            events - The plan as returned by get_plan
+        Return:
+            A CompactPlan
+        Raise:
+            ValueError - Too many failure names
+    """
+    plan = CompactPlan()
+    for event in events:
+        for failure_name, trigger_time in event.iteritems():
+            plan.append(failure_name, trigger_time)
+    return plan
 
 
 class BaseScheduler(object):
@@ -141,3 +453,17 @@ class BaseScheduler(object):
 
         """
         return self.plan
+
+    def get_compact_plan(self):
+        """
+            Returns the plan as a compact plan, which is what atropos
+            follows and hands to moirai. Schedulers keeping their plan in
+            arrays can build it without the list of dicts
+            Args:
+                None
+            Return:
+                A CompactPlan
+            Raise:
+                ValueError - The plan has too many failure names
+        """
+        return plan_from_events(self.get_plan())
@@ -13,12 +13,38 @@
 #
 
 """
-     A simple scheduler plugin that returns a random plan
+     A simple scheduler plugin that returns a random plan. The gaps between
+     failures are drawn in batches and summed up, with numpy when it is
+     installed, and the plan is kept as parallel arrays of failure indexes
+     and trigger times. The list of dicts the other schedulers return is
+     built from them on demand
 """
 
 import time
 import random
-from simoorg.plugins.scheduler.BaseScheduler import BaseScheduler
+from array import array
+from itertools import izip
+from simoorg.plugins.scheduler.BaseScheduler import BaseScheduler, \
+    CompactPlan
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# a batch draws this many times the events expected until the end of the
+# run, a batch which falls short is followed by another one
+BATCH_MARGIN = 1.1
+MIN_BATCH_SIZE = 64
+
+
+def get_batch_size(start_time, end_time, min_gap, max_gap):
+    """
+        Number of gaps to draw in one batch, the gaps are in minutes
+    """
+    mean_gap = (min_gap + max_gap) * 30.0
+    return max(MIN_BATCH_SIZE,
+               int((end_time - start_time) / mean_gap * BATCH_MARGIN))
 
 
 class NonDeterministicScheduler(BaseScheduler):
@@ -36,7 +62,7 @@ class NonDeterministicScheduler(BaseScheduler):
             Returns:
                 None
             Raise:
-                None
+                ValueError - max_gap_between_failures is not positive
         """
         BaseScheduler.__init__(self, destiny_object)
         self.verbose = verbose
@@ -44,49 +70,183 @@ class NonDeterministicScheduler(BaseScheduler):
 
         self.destiny_object = destiny_object
 
-        # this will contain randomly generated plan for each failure
-        self.plan = []
+        # the generated plan, event i induces failure_names[
+        # plan_failures[i]] at plan_times[i]
+        self.failure_names = []
+        self.plan_failures = array('H')
+        self.plan_times = array('l')
 
         self.generate_plan()
 
     def generate_plan(self):
         """
             Generates a plan by selecting random trigger time
-            for random failures
+            for random failures. The failures are shuffled once and
+            then planned in turn, each one a random number of minutes
+            between the min and max gap after the previous one, until
+            the total run duration is over
             Args:
                 None
             Return:
                 None
             Raise:
-                None
+                ValueError - max_gap_between_failures is not positive
         """
         if self.debug:
             print ('[VERBOSE INFO]: Generating plan for the NonDeterministic'
                    ' scheduler: ')
 
+        constraints = self.get_constraints()
+        min_gap = constraints['min_gap_between_failures']
+        max_gap = constraints['max_gap_between_failures']
+        if max_gap <= 0:
+            raise ValueError("max_gap_between_failures must be positive")
         current_timestamp = int(time.time())
-        trigger_time = current_timestamp
-        planning_completed = False
-        failure_list = self.get_failures().keys()
-        random.shuffle(failure_list)
-        while not planning_completed:
-            for failure_name in failure_list:
-                random_step = random.randint(self.
-                                             get_min_gap_between_failures(),
-                                             self.
-                                             get_max_gap_between_failures())
-                if self.debug:
-                    print ('[DEBUG INFO]: randomstep is:',
-                           random_step, 'minutes')
-                trigger_time = trigger_time + random_step * 60
-                if (trigger_time > self.get_total_run_duration() * 60 +
-                        current_timestamp):
-                    planning_completed = True
-                    break
-                self.plan.append({failure_name: trigger_time})
-                if self.debug:
-                    print ('[DEBUG INFO]: Plan item added: ',
-                           {failure_name: trigger_time})
+        end_time = current_timestamp + constraints['total_run_duration'] * 60
+        self.failure_names = self.get_failures().keys()
+        random.shuffle(self.failure_names)
+        failure_count = len(self.failure_names)
+        if not failure_count:
+            trigger_times = array('l')
+        elif numpy is not None:
+            trigger_times = self.draw_trigger_times_numpy(
+                current_timestamp, end_time, min_gap, max_gap)
+        else:
+            trigger_times = self.draw_trigger_times(
+                current_timestamp, end_time, min_gap, max_gap)
+        event_count = len(trigger_times)
+        if numpy is not None and failure_count:
+            self.plan_failures = (numpy.arange(event_count) %
+                                  failure_count).astype(numpy.uint16)
+        else:
+            cycles = event_count // max(failure_count, 1) + 1
+            self.plan_failures = (array('H', range(failure_count)) *
+                                  cycles)[:event_count]
+        self.plan_times = trigger_times
+        self.plan = None
 
         if self.debug:
-            print '[VERBOSE INFO]: NonDeterministic plan has been generated'
+            print ('[VERBOSE INFO]: NonDeterministic plan has been generated'
+                   ' with {0} events'.format(event_count))
+
+    def draw_trigger_times_numpy(self, start_time, end_time, min_gap,
+                                 max_gap):
+        """
+            Draw the trigger times in batches with numpy, the gaps of a
+            batch are summed up to trigger times and cut at end_time
+            Args:
+                start_time - Timestamp the plan starts at
+                end_time - Timestamp no failure may be planned after
+                min_gap - Shortest gap between failures in minutes
+                max_gap - Longest gap between failures in minutes
+            Return:
+                numpy array of increasing trigger times
+            Raise:
+                None
+        """
+        batches = []
+        last_time = start_time
+        while True:
+            batch_size = get_batch_size(last_time, end_time, min_gap,
+                                        max_gap)
+            gaps = numpy.random.randint(min_gap, max_gap + 1, batch_size)
+            times = last_time + numpy.cumsum(gaps * 60, dtype=numpy.int64)
+            cut = numpy.searchsorted(times, end_time, side='right')
+            batches.append(times[:cut])
+            if cut < batch_size:
+                break
+            last_time = times[-1]
+        return numpy.concatenate(batches)
+
+    def draw_trigger_times(self, start_time, end_time, min_gap, max_gap):
+        """
+            Draw the trigger times without numpy
+            Args:
+                start_time - Timestamp the plan starts at
+                end_time - Timestamp no failure may be planned after
+                min_gap - Shortest gap between failures in minutes
+                max_gap - Longest gap between failures in minutes
+            Return:
+                array of increasing trigger times
+            Raise:
+                None
+        """
+        trigger_times = array('l')
+        append = trigger_times.append
+        uniform = random.random
+        gap_span = max_gap - min_gap + 1
+        trigger_time = start_time
+        while True:
+            trigger_time += (min_gap + int(uniform() * gap_span)) * 60
+            if trigger_time > end_time:
+                return trigger_times
+            append(trigger_time)
+
+    def get_plan_arrays(self):
+        """
+            Returns the plan as parallel arrays, without building the list
+            of dicts
+            Args:
+                None
+            Return:
+                (failure_names, failure_indexes, trigger_times) tuple,
+                numpy arrays when numpy is installed
+            Raise:
+                None
+        """
+        return self.failure_names, self.plan_failures, self.plan_times
+
+    def get_compact_plan(self):
+        """
+            Returns the plan as a compact plan, copied from the arrays
+            without building the list of dicts
+            Args:
+                None
+            Return:
+                A CompactPlan
+            Raise:
+                None
+        """
+        failure_ids = array('H')
+        trigger_times = array('d')
+        if numpy is not None and len(self.plan_times):
+            failure_ids.fromstring(
+                self.plan_failures.astype(numpy.uint16).tostring())
+            trigger_times.fromstring(
+                self.plan_times.astype(numpy.float64).tostring())
+        else:
+            failure_ids.extend(self.plan_failures)
+            trigger_times.fromlist(self.plan_times.tolist())
+        compact_plan = CompactPlan(self.failure_names, failure_ids,
+                                   trigger_times)
+        # the gaps are whole minutes
+        compact_plan.whole_seconds = True
+        return compact_plan
+
+    def get_plan(self):
+        """
+            Returns the plan as a list of {failure_name: trigger_time}
+            dicts, built from the arrays the first time it is asked for
+            Args:
+                None
+            Return:
+                the plan generated at object creation
+            Raise:
+                None
+        """
+        if self.plan_view is None:
+            failure_names = self.failure_names
+            self.plan_view = [{failure_names[failure_index]: trigger_time}
+                              for failure_index, trigger_time in
+                              izip(self.plan_failures.tolist(),
+                                   self.plan_times.tolist())]
+        return self.plan_view
+
+    def set_plan(self, plan):
+        """
+            Replace the list of dicts view, None builds it again from the
+            arrays
+        """
+        self.plan_view = plan
+
+    plan = property(get_plan, set_plan)
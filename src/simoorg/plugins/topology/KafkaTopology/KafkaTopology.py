@@ -19,15 +19,17 @@
 from simoorg.plugins.topology.TopologyBuilder import TopologyBuilder
 from simoorg.Logger import Logger
 import yaml
-import random
 
-from simoorg.plugins.topology.KafkaTopology.MetaData import MetaData
+from simoorg.plugins.topology.KafkaTopology.NodeSelector import NodeSelector
 from kazoo.client import KazooClient
 from simoorg.plugins.common.ZKUtil import KafkaZkHelper
+from simoorg.plugins.common.KafkaClusterModel import KafkaClusterModel, \
+    DEFAULT_MAX_STALENESS
 
-
-PARTITION = "Partition"
-TOPIC = "Topic"
+# Group labels of a broker, one per partition it leads and one for the
+# controller
+LEADER_GROUP = "leads:{0}:{1}"
+CONTROLLER_GROUP = "role:controller"
 
 
 class KafkaTopology(TopologyBuilder):
@@ -58,6 +60,12 @@ class KafkaTopology(TopologyBuilder):
         self.zookeeper = None
         self.zookeeper_paths = None
         self.kafka_host_resolution = None
+        self.cluster_model = None
+        self.node_selector = None
+        self.zk_client = None
+        # Seconds a broker, partition list or partition state read from
+        # Zookeeper is used for picks before it is read again
+        self.max_staleness = DEFAULT_MAX_STALENESS
         self.resolved_topology = []
 
         # initializing Logger
@@ -72,6 +80,7 @@ class KafkaTopology(TopologyBuilder):
             zook = KazooClient(hosts=self.zookeeper.get("host"),
                                read_only=True)
             zook.start()
+            self.zk_client = zook
 
             # read ZK Paths into a dictionary
             zk_paths = {}
@@ -81,6 +90,10 @@ class KafkaTopology(TopologyBuilder):
             # create zk_helper object
             helper = KafkaZkHelper(zook, zk_paths)
             self.helper = helper
+            # picks are served from a watched model of the cluster
+            self.cluster_model = KafkaClusterModel(zook, zk_paths,
+                                                   self.max_staleness)
+            self.cluster_model.start()
         self.generate_plan()
 
     def get_plan(self):
@@ -95,26 +108,18 @@ class KafkaTopology(TopologyBuilder):
 
     def generate_plan(self):
         """
-            Generate a plan indicating the type of nodes for failure induction
+            Generate a plan indicating the type of nodes for failure
+            induction, and compile it into the selector table used for
+            picks
             Args:
                 None
             Return:
                 None
         """
-        if self.kafka_host_resolution:
-            for key, value in self.kafka_host_resolution.items():
-                for node_type, node_data in value.items():
-                    metadata = MetaData(node_type)
-                    if len(node_data) != 0:
-                        # check if "Topic" is specified
-                        if TOPIC in node_data:
-                            topic = node_data[TOPIC]
-                            metadata.set_topic(topic)
-                            # check if "Partition" is specified
-                            if PARTITION in node_data:
-                                partition = node_data[PARTITION]
-                                metadata.set_partition(partition)
-                    self.plan.append(metadata)
+        self.node_selector = NodeSelector(self.cluster_model,
+                                          self.kafka_host_resolution,
+                                          self.logger_instance)
+        self.plan = self.node_selector.plan
 
     def get_random_node(self):
         """
@@ -122,83 +127,61 @@ class KafkaTopology(TopologyBuilder):
             Args:
                 None
             Return:
-                hostname
+                hostname, None if no broker matches the picked node type
+        """
+        return self.node_selector.get_random_node()
+
+    def get_random_nodes(self, count, distinct=True):
+        """
+            Get hostnames of count brokers to induce failure on, served
+            from the cluster model
+            Args:
+                count - Number of nodes required
+                distinct - whether a host may be returned only once
+            Return:
+                list of at most count hostnames
+            Raise:
+                None
+        """
+        return self.node_selector.get_random_nodes(count, distinct)
+
+    def get_node_groups(self, node):
+        """
+            Label a broker by the partitions it leads and by its role,
+            served from the watched replication state of the cluster model
+            Args:
+                node - hostname of a broker
+            Return:
+                list of group labels
+            Raise:
+                None
+        """
+        if self.cluster_model is None:
+            return []
+        if not self.cluster_model.replication_watched:
+            self.cluster_model.watch_replication()
+        groups = [LEADER_GROUP.format(topic, partition) for topic, partition
+                  in self.cluster_model.get_led_partitions(node)]
+        if self.cluster_model.get_controller() == node:
+            groups.append(CONTROLLER_GROUP)
+        return groups
+
+    def close(self):
+        """
+            Stop the cluster model and end the zookeeper session
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
         """
-        failure = random.choice(self.plan)
-
-        if failure.get_node_type() == "RANDOM_BROKER":
-            if failure.get_topic() is None:
-                topic = self.helper.get_topic()
-                partition = self.helper.get_partition(topic)
-                self.logger_instance.logit("INFO",
-                                           "Selecting a random broker"
-                                           " for a Random Topic : {0},"
-                                           " Random Partition : {1}"
-                                           .format(topic, partition),
-                                           log_level="VERBOSE")
-                isr_list = self.helper.get_isr(topic, partition)
-                return random.choice(isr_list)
-            else:
-                topic = failure.get_topic()
-                # check if the partition is specified for the topic
-                if failure.get_partition() is not None:
-                    partition = failure.get_partition()
-                    self.logger_instance.logit("INFO",
-                                               "Selecting a random broker"
-                                               " for a Specified Topic : {0},"
-                                               " Specified Partition : {1}"
-                                               .format(topic, partition),
-                                               log_level="VERBOSE")
-                else:
-                    # get a random partition
-                    partition = self.helper.get_partition(topic)
-                    self.logger_instance.logit("INFO",
-                                               "Selecting a random broker"
-                                               " for a Specified Topic : {0},"
-                                               " Random Partition : {1}"
-                                               .format(topic, partition),
-                                               log_level="VERBOSE")
-                isr_list = self.helper.get_isr(topic, partition)
-                return random.choice(isr_list)
-
-        elif failure.get_node_type() == "RANDOM_LEADER":
-            topic = self.helper.get_topic()
-            partition = self.helper.get_partition(topic)
-            self.logger_instance.logit("INFO",
-                                       "Selecting a Leader for a"
-                                       " Random Topic : {0},"
-                                       " Random Partition : {1}"
-                                       .format(topic, partition),
-                                       log_level="VERBOSE")
-            return self.helper.get_leader(topic, partition)
-
-        elif failure.get_node_type() == "LEADER":
-            topic = failure.get_topic()
-            # check if the partition is specified for the topic
-            if failure.get_partition() is not None:
-                partition = failure.get_partition()
-                self.logger_instance.logit("INFO",
-                                           "Selecting a Leader"
-                                           " for a Specified Topic"
-                                           " : {0}, Specified Partition"
-                                           " : {1}".format(topic, partition),
-                                           log_level="VERBOSE")
-            else:
-                # get a random partition
-                partition = self.helper.get_partition(topic)
-                self.logger_instance.logit("INFO",
-                                           "Selecting a Leader"
-                                           " for a Specified Topic"
-                                           " : {0}, Random Partition"
-                                           " : {1}".format(topic, partition),
-                                           log_level="VERBOSE")
-            return self.helper.get_leader(topic, partition)
-
-        elif failure.get_node_type() == "CONTROLLER":
-            self.logger_instance.logit("INFO",
-                                       "Selecting Controller",
-                                       log_level="VERBOSE")
-            return self.helper.get_controller()
+        if self.cluster_model is not None:
+            self.cluster_model.stop()
+        if self.zk_client is not None:
+            self.zk_client.stop()
+            self.zk_client.close()
+            self.zk_client = None
 
     def populate_topology(self):
         self.resolved_topology = []
@@ -212,4 +195,4 @@ class KafkaTopology(TopologyBuilder):
                hostnames of all brokers
 
        """
-        return self.helper.get_all_hosts()
+        return self.cluster_model.get_all_hosts()
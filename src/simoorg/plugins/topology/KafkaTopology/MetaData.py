@@ -34,6 +34,7 @@ class MetaData(object):
         self.broker_type = broker_type
         self.partition = None
         self.topic = None
+        self.weight = 1
 
     def __str__(self):
         """
@@ -89,6 +90,26 @@ class MetaData(object):
         """
         self.partition = partition
 
+    def get_weight(self):
+        """
+            Get the relative weight with which this failure is picked
+            Return:
+                  weight
+            Raise:
+                  None
+        """
+        return self.weight
+
+    def set_weight(self, weight):
+        """
+            Set the relative weight with which this failure is picked
+            Return:
+                  None
+            Raise:
+                  None
+        """
+        self.weight = weight
+
     def get_node_type(self):
         """
             Get the kind of kafka node (broker) specified in the failure
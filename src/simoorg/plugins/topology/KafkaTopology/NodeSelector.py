@@ -0,0 +1,288 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Compiles the kafka_host_resolution section of the kafka topology config
+    into a table of selectors. The node type strings are matched once, when
+    the config is loaded; each pick then draws an entry by weight and calls
+    its selector, which resolves the entry to candidate hosts from the
+    cluster model
+"""
+import random
+import bisect
+import functools
+
+from simoorg.plugins.topology.KafkaTopology.MetaData import MetaData
+from simoorg.plugins.topology.TopologyBuilder import \
+    RANDOM_NODE_ATTEMPTS_FACTOR
+
+PARTITION = "Partition"
+TOPIC = "Topic"
+WEIGHT = "Weight"
+
+# node type -> name of the NodeSelector method resolving it
+NODE_TYPE_SELECTORS = {"RANDOM_BROKER": "select_random_broker",
+                       "RANDOM_LEADER": "select_random_leader",
+                       "LEADER": "select_leader",
+                       "CONTROLLER": "select_controller"}
+
+
+class NodeSelector(object):
+    """
+        Weighted selector of kafka brokers
+    """
+    def __init__(self, cluster_model, kafka_host_resolution, logger_instance):
+        """
+            Init function for the NodeSelector class
+            Args:
+                cluster_model - KafkaClusterModel serving the lookups
+                kafka_host_resolution - kafka_host_resolution section of
+                the topology config
+                logger_instance - Logger object
+            Return:
+                None
+            Raise:
+                None
+        """
+        self.cluster_model = cluster_model
+        self.logger_instance = logger_instance
+        self.plan = []
+        self.selectors = []
+        self.cumulative_weights = []
+        self.total_weight = 0
+        if kafka_host_resolution:
+            self.compile(kafka_host_resolution)
+
+    def compile(self, kafka_host_resolution):
+        """
+            Build the plan and the selector table from the config. Entries
+            with an unknown node type or a weight which is not positive
+            are logged and left out
+            Args:
+                kafka_host_resolution - kafka_host_resolution section of
+                the topology config
+            Return:
+                None
+            Raise:
+                None
+        """
+        for key, value in sorted(kafka_host_resolution.items()):
+            for node_type, node_data in value.items():
+                metadata = MetaData(node_type)
+                if node_data:
+                    # check if "Topic" is specified
+                    if TOPIC in node_data:
+                        metadata.set_topic(node_data[TOPIC])
+                        # check if "Partition" is specified
+                        if PARTITION in node_data:
+                            metadata.set_partition(node_data[PARTITION])
+                    if WEIGHT in node_data:
+                        metadata.set_weight(node_data[WEIGHT])
+                if node_type not in NODE_TYPE_SELECTORS:
+                    self.logger_instance.logit("WARNING",
+                                               "Ignoring {0}, unknown node"
+                                               " type {1}",
+                                               args=(key, node_type))
+                    continue
+                weight = metadata.get_weight()
+                if not isinstance(weight, (int, float)) or weight <= 0:
+                    self.logger_instance.logit("WARNING",
+                                               "Ignoring {0}, weight {1} is"
+                                               " not a positive number",
+                                               args=(key, weight))
+                    continue
+                self.plan.append(metadata)
+                self.selectors.append(functools.partial(
+                    getattr(self, NODE_TYPE_SELECTORS[node_type]),
+                    metadata.get_topic(), metadata.get_partition()))
+                self.total_weight += weight
+                self.cumulative_weights.append(self.total_weight)
+
+    def pick_selector(self):
+        """
+            Draw a selector, each with a probability proportional to its
+            weight
+            Args:
+                None
+            Return:
+                selector callable, None if the table is empty
+            Raise:
+                None
+        """
+        if not self.selectors:
+            return None
+        index = bisect.bisect_right(self.cumulative_weights,
+                                    random.random() * self.total_weight)
+        return self.selectors[min(index, len(self.selectors) - 1)]
+
+    def get_random_node(self):
+        """
+            Get a hostname of broker to induce failure on
+            Args:
+                None
+            Return:
+                hostname, None if no broker matches the picked entry
+            Raise:
+                None
+        """
+        selector = self.pick_selector()
+        if selector is None:
+            return None
+        candidates = selector()
+        if not candidates:
+            return None
+        return random.choice(candidates)
+
+    def get_random_nodes(self, count, distinct=True):
+        """
+            Get the hostnames of count brokers, each drawn like
+            get_random_node. Every draw is served from the cluster model
+            Args:
+                count - Number of nodes required
+                distinct - whether a host may be returned only once
+            Return:
+                list of at most count hostnames
+            Raise:
+                None
+        """
+        nodes = []
+        chosen = set()
+        attempts = count * RANDOM_NODE_ATTEMPTS_FACTOR
+        while len(nodes) < count and attempts > 0 and self.selectors:
+            attempts -= 1
+            candidates = self.pick_selector()()
+            if distinct:
+                candidates = [host for host in candidates
+                              if host not in chosen]
+            if not candidates:
+                continue
+            node = random.choice(candidates)
+            nodes.append(node)
+            chosen.add(node)
+        return nodes
+
+    def select_random_broker(self, topic, partition):
+        """
+            Brokers in the isr of the given or of a random partition
+            Args:
+                topic - topic name, None for a random topic
+                partition - partition id, None for a random partition
+            Return:
+                list of hostnames
+            Raise:
+                None
+        """
+        if topic is None:
+            topic = self.cluster_model.get_topic()
+            partition = self.cluster_model.get_partition(topic)
+            self.logger_instance.logit("INFO",
+                                       "Selecting a random broker"
+                                       " for a Random Topic : {0},"
+                                       " Random Partition : {1}",
+                                       log_level="VERBOSE",
+                                       args=(topic, partition))
+        elif partition is None:
+            partition = self.cluster_model.get_partition(topic)
+            self.logger_instance.logit("INFO",
+                                       "Selecting a random broker"
+                                       " for a Specified Topic : {0},"
+                                       " Random Partition : {1}",
+                                       log_level="VERBOSE",
+                                       args=(topic, partition))
+        else:
+            self.logger_instance.logit("INFO",
+                                       "Selecting a random broker"
+                                       " for a Specified Topic : {0},"
+                                       " Specified Partition : {1}",
+                                       log_level="VERBOSE",
+                                       args=(topic, partition))
+        return self.cluster_model.get_isr(topic, partition)
+
+    def select_random_leader(self, topic, partition):
+        """
+            Leader of a random partition of a random topic, the topic and
+            partition of the entry are not used
+            Args:
+                topic - unused
+                partition - unused
+            Return:
+                list of at most one hostname
+            Raise:
+                None
+        """
+        topic = self.cluster_model.get_topic()
+        partition = self.cluster_model.get_partition(topic)
+        self.logger_instance.logit("INFO",
+                                   "Selecting a Leader for a"
+                                   " Random Topic : {0},"
+                                   " Random Partition : {1}",
+                                   log_level="VERBOSE",
+                                   args=(topic, partition))
+        return self.leader_candidates(topic, partition)
+
+    def select_leader(self, topic, partition):
+        """
+            Leader of the given or of a random partition of topic
+            Args:
+                topic - topic name
+                partition - partition id, None for a random partition
+            Return:
+                list of at most one hostname
+            Raise:
+                None
+        """
+        if partition is None:
+            partition = self.cluster_model.get_partition(topic)
+            self.logger_instance.logit("INFO",
+                                       "Selecting a Leader"
+                                       " for a Specified Topic"
+                                       " : {0}, Random Partition"
+                                       " : {1}",
+                                       log_level="VERBOSE",
+                                       args=(topic, partition))
+        else:
+            self.logger_instance.logit("INFO",
+                                       "Selecting a Leader"
+                                       " for a Specified Topic"
+                                       " : {0}, Specified Partition"
+                                       " : {1}",
+                                       log_level="VERBOSE",
+                                       args=(topic, partition))
+        return self.leader_candidates(topic, partition)
+
+    def select_controller(self, topic, partition):
+        """
+            The controller, the topic and partition of the entry are not
+            used
+            Args:
+                topic - unused
+                partition - unused
+            Return:
+                list of at most one hostname
+            Raise:
+                None
+        """
+        self.logger_instance.logit("INFO",
+                                   "Selecting Controller",
+                                   log_level="VERBOSE")
+        controller = self.cluster_model.get_controller()
+        if controller is None:
+            return []
+        return [controller]
+
+    def leader_candidates(self, topic, partition):
+        leader = self.cluster_model.get_leader(topic, partition)
+        if leader is None:
+            return []
+        return [leader]
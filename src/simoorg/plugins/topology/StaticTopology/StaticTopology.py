@@ -29,7 +29,8 @@ class StaticTopology(TopologyBuilder):
             Init function, reads the config containing server list
             Args:
                 input_file - A yaml file containing a key nodes
-                    containing the server list
+                    containing the server list and optionally a key
+                    groups mapping group labels to lists of nodes
                 logger_config - configuration for logger
             Return:
                 None
@@ -39,6 +40,8 @@ class StaticTopology(TopologyBuilder):
         TopologyBuilder.__init__(self, input_file, logger_config)
         self.resolved_topology = []
         self.topology = None
+        # node -> group labels
+        self.node_groups = {}
 
         with open(self.input_file, 'r') as file_desc:
             doc = yaml.load(file_desc)
@@ -72,10 +75,42 @@ class StaticTopology(TopologyBuilder):
         """
         return random.choice(self.resolved_topology)
 
+    def get_random_nodes(self, count, distinct=True):
+        """
+            Return count random nodes from the full list
+            Args:
+                count - Number of nodes required
+                distinct - whether a node may be returned only once
+            Return:
+                A list of at most count nodes
+            Raise:
+                None
+        """
+        if not distinct:
+            if not self.resolved_topology:
+                return []
+            return [random.choice(self.resolved_topology)
+                    for _ in range(count)]
+        distinct_nodes = list(set(self.resolved_topology))
+        return random.sample(distinct_nodes, min(count, len(distinct_nodes)))
+
+    def get_node_groups(self, node):
+        """
+            Return the groups a node was listed in
+            Args:
+                node - A node
+            Return:
+                List of group labels
+            Raise:
+                None
+        """
+        return self.node_groups.get(node, [])
+
     def populate_topology(self):
         """
             Read the items from the key nodes in the topology config
-            and add it to the attribute resolved_topology
+            and add it to the attribute resolved_topology, and the
+            members of each group under the key groups
             Args:
                 None
             Return:
@@ -85,3 +120,7 @@ class StaticTopology(TopologyBuilder):
         """
         for node in self.topology['nodes']:
             self.resolved_topology.append(node)
+        for label, members in sorted((self.topology.get('groups') or
+                                      {}).items()):
+            for node in members:
+                self.node_groups.setdefault(node, []).append(label)
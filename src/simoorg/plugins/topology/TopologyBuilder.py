@@ -15,6 +15,8 @@
 """
     The Topology builder interface
 """
+# How many picks get_random_nodes makes per requested node before giving up
+RANDOM_NODE_ATTEMPTS_FACTOR = 10
 
 
 class TopologyBuilder(object):
@@ -62,6 +64,55 @@ class TopologyBuilder(object):
         """
         pass
 
+    def get_random_nodes(self, count, distinct=True):
+        """
+            Get hostnames of count random nodes, used by failures that
+            fan out to several nodes at once. Plugins can override this
+            with a cheaper implementation
+            Args:
+                count - Number of nodes required
+                distinct - whether a host may be returned only once
+            Return:
+                list of at most count hostnames
+            Raise:
+                None
+        """
+        nodes = []
+        attempts = count * RANDOM_NODE_ATTEMPTS_FACTOR
+        while len(nodes) < count and attempts > 0:
+            attempts -= 1
+            node = self.get_random_node()
+            if node and not (distinct and node in nodes):
+                nodes.append(node)
+        return nodes
+
+    def get_node_groups(self, node):
+        """
+            Get the group labels of a node, such as its rack or the
+            partitions it leads. The journal enforces per group impact
+            limits on them, plugins without groups keep this default
+            Args:
+                node - hostname of the node
+            Return:
+                list of group labels
+            Raise:
+                None
+        """
+        return []
+
+    def close(self):
+        """
+            Release the connections and threads the topology holds once
+            atropos is done with it. Plugins without any keep this default
+            Args:
+                None
+            Return:
+                None
+            Raise:
+                None
+        """
+        pass
+
     def get_all_nodes(self):
         """
             Get hostnames of all nodes in the cluster
@@ -0,0 +1,161 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Drive the api server with concurrent http clients, once talking to
+    moirai over the FIFO and once over the RPC channel. Moirai runs in this
+    process with fake service data and without any atropos, a threaded
+    flask server is started for each transport. Reports throughput, latency
+    percentiles and the number of requests which did not get their own
+    answer back
+
+    usage: python bench_api_load.py [--clients N] [--duration SECONDS]
+"""
+import os
+import json
+import time
+import yaml
+import shutil
+import httplib
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+import simoorg.Api.MoiraiApiServer as MoiraiApiServer
+from simoorg.moirai import Moirai
+
+API_HOST = '127.0.0.1'
+FIFO_PORT = 8010
+RPC_PORT = 8011
+SERVER_WARMUP_TIME = 2
+SERVICES = 10
+
+
+def api_server(config_path, port):
+    """
+        Run a threaded api server, used as a separate process
+    """
+    app = MoiraiApiServer.create_app(config_path)
+    app.run(host=API_HOST, port=port, threaded=True)
+
+
+def client_loop(port, deadline, latencies, failures, lock):
+    """
+        Request the server list of random services until the deadline
+    """
+    connection = httplib.HTTPConnection(API_HOST, port)
+    index = 0
+    while time.time() < deadline:
+        service = 'bench_service_{0}'.format(index % SERVICES)
+        index += 1
+        start_time = time.time()
+        try:
+            connection.request('GET', '/{0}/servers'.format(service))
+            data = connection.getresponse().read()
+        except (httplib.HTTPException, IOError):
+            connection.close()
+            connection = httplib.HTTPConnection(API_HOST, port)
+            data = None
+        latency = time.time() - start_time
+        try:
+            correct = json.loads(data) == [service + '-node']
+        except (TypeError, ValueError):
+            correct = False
+        lock.acquire()
+        try:
+            if correct:
+                latencies.append(latency)
+            else:
+                failures.append(data)
+        finally:
+            lock.release()
+    connection.close()
+
+
+def run_load(port, clients, duration):
+    """
+        Run the clients against one server and summarize the results
+    """
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=client_loop,
+                                args=(port, deadline, latencies, failures,
+                                      lock))
+               for _ in range(clients)]
+    for thrd in threads:
+        thrd.start()
+    for thrd in threads:
+        thrd.join()
+    latencies.sort()
+
+    def percentile(fraction):
+        if not latencies:
+            return float('nan')
+        return latencies[min(len(latencies) - 1,
+                             int(fraction * len(latencies)))] * 1000
+
+    return {'ok': len(latencies), 'failed': len(failures),
+            'rps': len(latencies) / float(duration),
+            'p50': percentile(0.5), 'p99': percentile(0.99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=int, default=10)
+    args = parser.parse_args()
+
+    root_dir = tempfile.mkdtemp(prefix='simoorg_api_bench_')
+    fifo_path = os.path.join(root_dir, 'moirai.fifo')
+    socket_path = os.path.join(root_dir, 'moirai.sock')
+    with open(os.path.join(root_dir, 'api.yaml'), 'w') as api_fd:
+        yaml.dump({'moirai_input_fifo': fifo_path,
+                   'moirai_rpc_socket': socket_path}, api_fd)
+    fifo_config = os.path.join(root_dir, 'api_fifo.yaml')
+    with open(fifo_config, 'w') as api_fd:
+        yaml.dump({'moirai_input_fifo': fifo_path}, api_fd)
+    servers = []
+    try:
+        moirai_obj = Moirai(root_dir, verbose=False)
+        for index in range(SERVICES):
+            service = 'bench_service_{0}'.format(index)
+            moirai_obj.add_service_entry(service, [service + '-node'], [])
+        moirai_obj.start_api_listeners()
+        for config_path, port in ((fifo_config, FIFO_PORT),
+                                  (os.path.join(root_dir, 'api.yaml'),
+                                   RPC_PORT)):
+            proc = multiprocessing.Process(target=api_server,
+                                           args=(config_path, port))
+            proc.start()
+            servers.append(proc)
+        time.sleep(SERVER_WARMUP_TIME)
+        print ("{0:10} {1:>8} {2:>8} {3:>9} {4:>9} {5:>9}"
+               .format('transport', 'ok', 'failed', 'req/s', 'p50(ms)',
+                       'p99(ms)'))
+        for transport, port in (('fifo', FIFO_PORT), ('rpc', RPC_PORT)):
+            result = run_load(port, args.clients, args.duration)
+            print ("{0:10} {ok:>8} {failed:>8} {rps:>9.1f} {p50:>9.2f} "
+                   "{p99:>9.2f}".format(transport, **result))
+    finally:
+        for proc in servers:
+            proc.terminate()
+            proc.join()
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Compare the memory use and the scheduling jitter of the fork and the
+    pooled atropos engines. A config directory with the requested number
+    of fate books is generated for each run, every fate book uses the test
+    scheduler and the test handler so the numbers only reflect the engine.
+    Memory is read from /proc (Linux only), jitter is the delay between the
+    trigger time of a failure and moirai receiving its induce event
+
+    usage: python bench_atropos_engine.py [--services N] [--workers N]
+"""
+import os
+import time
+import yaml
+import shutil
+import argparse
+import tempfile
+import Queue
+
+from simoorg.moirai import Moirai
+
+# Time given to the atropos to start before the first failure triggers
+STARTUP_BUFFER = 15
+EVENT_DRAIN_TIMEOUT = 30
+
+
+def build_config_dir(root_dir, services, event_times, engine, workers):
+    """
+        Write the api config, topology and one fate book per service
+    """
+    os.makedirs(os.path.join(root_dir, 'fate_books'))
+    with open(os.path.join(root_dir, 'api.yaml'), 'w') as api_fd:
+        yaml.dump({'moirai_input_fifo': os.path.join(root_dir, 'moirai.fifo'),
+                   'atropos_engine': engine,
+                   'atropos_workers': workers}, api_fd)
+    with open(os.path.join(root_dir, 'topo.yaml'), 'w') as topo_fd:
+        yaml.dump({'topology': {'nodes': ['bench-node']}}, topo_fd)
+    event_file = os.path.join(root_dir, 'event_list')
+    with open(event_file, 'w') as ev_fd:
+        ev_fd.write('\n'.join([str(event) for event in event_times]))
+    for index in range(services):
+        service = 'bench_service_{0}'.format(index)
+        test_file = os.path.join(root_dir, service + '_{target}')
+        fate_book = {
+            'service': service,
+            'topology': {'topology_plugin': 'StaticTopology',
+                         'topology_config': 'topo.yaml'},
+            'logger': {'path': os.path.join(root_dir, 'atropos.log'),
+                       'console': False, 'log_level': 'WARNING'},
+            'impact_limits': {'total_maximum': 1},
+            'healthcheck': {'plugin': 'DefaultHealthCheck',
+                            'coordinate': '/bin/true'},
+            'destiny': {'scheduler_plugin': 'TestScheduler',
+                        'TestScheduler': {
+                            'constraints': {'event_file': event_file},
+                            'failures': {'bench_failure': {}}}},
+            'failures': [{'name': 'bench_failure',
+                          'induce_handler': {'type': 'TestHandler',
+                                             'coordinate': test_file,
+                                             'arguments': ['failure']},
+                          'restore_handler': {'type': 'TestHandler',
+                                              'coordinate': test_file,
+                                              'arguments': ['revert']},
+                          'wait_seconds': 1}]}
+        with open(os.path.join(root_dir, 'fate_books', service + '.yaml'),
+                  'w') as fate_fd:
+            yaml.dump(fate_book, fate_fd)
+
+
+def read_memory_kb(pid):
+    """
+        Return the (rss, pss) of a process in kB, pss is None if the
+        kernel does not export smaps_rollup
+    """
+    rss = pss = None
+    with open('/proc/{0}/status'.format(pid)) as status_fd:
+        for line in status_fd:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+    try:
+        with open('/proc/{0}/smaps_rollup'.format(pid)) as smaps_fd:
+            for line in smaps_fd:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except IOError:
+        pass
+    return rss, pss
+
+
+def percentile(values, fraction):
+    """
+        Nearest rank percentile of a sorted list
+    """
+    if not values:
+        return float('nan')
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def run_engine(engine, services, workers, events, gap):
+    """
+        Run moirai with the given engine and return its measurements
+    """
+    root_dir = tempfile.mkdtemp(prefix='simoorg_bench_')
+    first_event = int(time.time()) + STARTUP_BUFFER
+    event_times = [first_event + index * gap for index in range(events)]
+    try:
+        build_config_dir(root_dir, services, event_times, engine, workers)
+        moirai_obj = Moirai(root_dir, verbose=False)
+        moirai_obj.spawn_atropos()
+        while len(moirai_obj.service_map) < services and \
+                time.time() < first_event:
+            moirai_obj.update_service_map()
+            time.sleep(0.1)
+        procs = set(moirai_obj.atropos_army.values())
+        total_rss = total_pss = 0
+        for proc in procs:
+            rss, pss = read_memory_kb(proc.pid)
+            total_rss += rss or 0
+            total_pss += pss or 0
+        jitter = []
+        expected_events = services * events * 2
+        received = 0
+        while received < expected_events:
+            try:
+                event = moirai_obj.atropos_event_queue.get(
+                    timeout=EVENT_DRAIN_TIMEOUT)
+            except Queue.Empty:
+                break
+            received += 1
+            if not event[1].endswith('-revert'):
+                jitter.append(time.time() - event[2])
+        moirai_obj.finish()
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+    jitter.sort()
+    return {'engine': engine, 'processes': len(procs),
+            'rss_mb': total_rss / 1024.0, 'pss_mb': total_pss / 1024.0,
+            'events': len(jitter), 'expected': services * events,
+            'p50': percentile(jitter, 0.5), 'p99': percentile(jitter, 0.99),
+            'max': jitter[-1] if jitter else float('nan')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--services', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--events', type=int, default=3)
+    parser.add_argument('--gap', type=int, default=3,
+                        help='seconds between two planned failures')
+    args = parser.parse_args()
+    print ("{0:8} {1:>6} {2:>10} {3:>10} {4:>9} {5:>9} {6:>9} {7:>9}"
+           .format('engine', 'procs', 'rss(MB)', 'pss(MB)', 'events',
+                   'p50(s)', 'p99(s)', 'max(s)'))
+    for engine in ('fork', 'pooled'):
+        result = run_engine(engine, args.services, args.workers,
+                            args.events, args.gap)
+        print ("{engine:8} {processes:>6} {rss_mb:>10.1f} {pss_mb:>10.1f} "
+               "{events:>4}/{expected:<4} {p50:>9.3f} {p99:>9.3f} "
+               "{max:>9.3f}".format(**result))
+
+
+if __name__ == '__main__':
+    main()
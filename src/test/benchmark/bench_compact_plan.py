@@ -0,0 +1,117 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Compare the memory a plan takes, the bytes it is pickled to on its
+    way to moirai like multiprocessing does, and the time taken to pickle,
+    iterate and encode it for
+    the api, as a list of single key dicts and as a compact plan
+
+    usage: python bench_compact_plan.py [--events N] [--failures N]
+"""
+import sys
+import time
+import json
+import cPickle
+import argparse
+
+from simoorg.plugins.scheduler.BaseScheduler import CompactPlan
+
+START_TIME = 1438000000
+
+
+def dicts_size(plan):
+    """
+        Bytes held by a list of single key dicts, not counting the shared
+        failure names
+    """
+    return sys.getsizeof(plan) + sum([sys.getsizeof(event) +
+                                      sys.getsizeof(event.values()[0])
+                                      for event in plan])
+
+
+def compact_size(plan):
+    """
+        Bytes held by a compact plan
+    """
+    return (sys.getsizeof(plan.failure_ids) +
+            sys.getsizeof(plan.trigger_times) +
+            sys.getsizeof(plan.failure_names))
+
+
+def timed(function, *args):
+    """
+        Call function
+        Return:
+            (result, milliseconds taken) tuple
+    """
+    start_time = time.time()
+    result = function(*args)
+    return result, (time.time() - start_time) * 1000
+
+
+def iterate_dicts(plan):
+    """
+        Walk a plan the way atropos used to
+    """
+    for event in plan:
+        for failure_name, trigger_time in event.iteritems():
+            pass
+
+
+def iterate_compact(plan):
+    """
+        Walk a compact plan the way atropos does
+    """
+    for failure_name, trigger_time in plan:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--failures', type=int, default=8)
+    args = parser.parse_args()
+
+    failure_names = ['failure{0}'.format(index)
+                     for index in range(args.failures)]
+    dict_plan = [{failure_names[index % args.failures]:
+                  START_TIME + index * 60} for index in xrange(args.events)]
+    compact_plan = CompactPlan()
+    for index in xrange(args.events):
+        compact_plan.append(failure_names[index % args.failures],
+                            START_TIME + index * 60)
+    print "{0} events, {1} failures".format(args.events, args.failures)
+    print "{0:12} {1:>10} {2:>12} {3:>10} {4:>10} {5:>10} {6:>10}".format(
+        'plan', 'MB', 'pickle MB', 'pickle ms', 'load ms', 'iter ms',
+        'json ms')
+    for name, plan, size, iterate, encode in (
+            ('dicts', dict_plan, dicts_size, iterate_dicts, json.dumps),
+            ('compact', compact_plan, compact_size, iterate_compact,
+             CompactPlan.to_json)):
+        data, dump_ms = timed(cPickle.dumps, plan, cPickle.HIGHEST_PROTOCOL)
+        _, load_ms = timed(cPickle.loads, data)
+        _, iterate_ms = timed(iterate, plan)
+        _, encode_ms = timed(encode, plan)
+        print ("{0:12} {1:>10.1f} {2:>12.1f} {3:>10.0f} {4:>10.0f}"
+               " {5:>10.0f} {6:>10.0f}".format(name, size(plan) / 1e6,
+                                               len(data) / 1e6, dump_ms,
+                                               load_ms, iterate_ms,
+                                               encode_ms))
+    _, columns_ms = timed(lambda: json.dumps(compact_plan.to_columns()))
+    print "{0:12} {1:>10.0f} ms".format('columnar json', columns_ms)
+
+
+if __name__ == '__main__':
+    main()
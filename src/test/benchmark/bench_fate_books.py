@@ -0,0 +1,100 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Compare the time moirai takes to load a directory of fate books with
+    the pure python yaml loader, as before, with the fate book loader on
+    its first run, and with the fate book loader on a restart when every
+    fate book comes from its cache
+
+    usage: python bench_fate_books.py [--books N]
+"""
+import os
+import time
+import yaml
+import shutil
+import argparse
+import tempfile
+
+from simoorg.FateBookLoader import FateBookLoader, FateBookYamlLoader
+
+TEST_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+TEMPLATE_FATEBOOK = (TEST_DIR + "/unittest_configs/moirai_configs/" +
+                     "sample_base/fate_books/test.yaml")
+
+
+def write_fate_books(fate_books_dir, books):
+    """
+        Write copies of the template fate book, each for its own service
+    """
+    with open(TEMPLATE_FATEBOOK) as template_fd:
+        template = template_fd.read()
+    paths = []
+    for index in range(books):
+        path = os.path.join(fate_books_dir, 'service{0}.yaml'.format(index))
+        with open(path, 'w') as fate_book_fd:
+            fate_book_fd.write(template.replace(
+                'service: test_service', 'service: service{0}'.format(index)))
+        paths.append(path)
+    return paths
+
+
+def time_load(load, paths):
+    """
+        Seconds taken to load every fate book
+    """
+    start_time = time.time()
+    for path in paths:
+        load(path)
+    return time.time() - start_time
+
+
+def python_yaml_load(path):
+    """
+        The way moirai used to load a fate book
+    """
+    with open(path) as fate_book_fd:
+        return yaml.load(fate_book_fd, Loader=yaml.Loader)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--books', type=int, default=500)
+    args = parser.parse_args()
+
+    root_dir = tempfile.mkdtemp(prefix='simoorg_fate_book_bench_')
+    try:
+        paths = write_fate_books(root_dir, args.books)
+        cache_path = os.path.join(root_dir, 'fate_books.cache')
+        print "yaml loader: {0}".format(FateBookYamlLoader.__name__)
+        print "{0:25} {1:>10}".format('mode', 'ms')
+        print "{0:25} {1:>10.1f}".format(
+            'yaml.load', time_load(python_yaml_load, paths) * 1000)
+        loader = FateBookLoader(cache_path)
+        first_run = time_load(loader.load, paths)
+        start_time = time.time()
+        loader.save()
+        first_run += time.time() - start_time
+        print "{0:25} {1:>10.1f}".format('loader, first run',
+                                         first_run * 1000)
+        start_time = time.time()
+        loader = FateBookLoader(cache_path)
+        restart = time_load(loader.load, paths) + time.time() - start_time
+        print "{0:25} {1:>10.1f}".format('loader, restart', restart * 1000)
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
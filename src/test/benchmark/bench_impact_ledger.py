@@ -0,0 +1,100 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Measure the latency of an impact ledger admission and release, from
+    one process and from several processes admitting at once, against a
+    counter kept behind a multiprocessing manager, which costs an IPC round
+    trip for every check
+
+    usage: python bench_impact_ledger.py [--rounds N] [--processes N]
+"""
+import time
+import argparse
+import multiprocessing
+
+from simoorg.ImpactLedger import ImpactLedger
+
+CLUSTER = 'shared-kafka'
+
+
+def ledger_rounds(ledger, service, rounds, result_queue=None):
+    """
+        Admit and release an impact rounds times
+        Return:
+            Microseconds taken by one admission and release
+    """
+    targets = ['{0}-node{1}'.format(service, index) for index in range(16)]
+    start_time = time.time()
+    for index in range(rounds):
+        holding = ledger.admit(service, targets[index % len(targets)],
+                               CLUSTER)
+        if holding is not None:
+            ledger.release(holding)
+    latency = (time.time() - start_time) * 1e6 / rounds
+    if result_queue is not None:
+        result_queue.put(latency)
+    return latency
+
+
+def manager_rounds(counters, lock, rounds):
+    """
+        The same check and charge against a manager dict
+        Return:
+            Microseconds taken by one admission and release
+    """
+    start_time = time.time()
+    for _ in range(rounds):
+        with lock:
+            if counters.get(CLUSTER, 0) < 1000:
+                counters[CLUSTER] = counters.get(CLUSTER, 0) + 1
+        with lock:
+            counters[CLUSTER] = counters[CLUSTER] - 1
+    return (time.time() - start_time) * 1e6 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rounds', type=int, default=20000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    ledger = ImpactLedger(service_maximum=10, host_maximum=1,
+                          cluster_maximum=1000)
+    print "{0:30} {1:>10}".format('mode', 'us/admit')
+    print "{0:30} {1:>10.2f}".format(
+        'ledger, 1 process', ledger_rounds(ledger, 'service0', args.rounds))
+    result_queue = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=ledger_rounds,
+                                     args=(ledger, 'service{0}'.format(index),
+                                           args.rounds, result_queue))
+             for index in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    latencies = [result_queue.get() for _ in procs]
+    print "{0:30} {1:>10.2f}".format(
+        'ledger, {0} processes'.format(args.processes),
+        sum(latencies) / len(latencies))
+    manager = multiprocessing.Manager()
+    rounds = max(1, args.rounds // 10)
+    print "{0:30} {1:>10.2f}".format(
+        'manager round trip', manager_rounds(manager.dict(), manager.Lock(),
+                                             rounds))
+    manager.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Measure the throughput of durable journal log appends from several
+    event threads, with an fsync for every append and with group commit
+    where concurrent appends share an fsync. Run it on the file system the
+    journal logs live on, fsync is close to free on tmpfs
+
+    usage: python bench_journal.py [--threads N] [--appends N] [--dir DIR]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+from simoorg.JournalLog import JournalLog, INDUCE_INTENT
+
+
+def run_appends(log_path, group_commit, threads, appends):
+    """
+        Append durable intent records from several threads
+        Return:
+            (seconds taken, number of fsyncs) tuple
+    """
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    journal_log = JournalLog(log_path, group_commit=group_commit)
+
+    def append_intents(thread_index):
+        target = 'node{0}.example.com'.format(thread_index)
+        for index in range(appends):
+            journal_log.append([(INDUCE_INTENT, 'kill_process', target,
+                                 float(index), True)], durable=True)
+    workers = [threading.Thread(target=append_intents, args=(index,))
+               for index in range(threads)]
+    start_time = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start_time
+    journal_log.close()
+    return elapsed, journal_log.fsyncs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--appends', type=int, default=100)
+    parser.add_argument('--dir', default=None,
+                        help='directory for the journal log')
+    args = parser.parse_args()
+
+    root_dir = tempfile.mkdtemp(prefix='simoorg_journal_bench_',
+                                dir=args.dir)
+    try:
+        log_path = os.path.join(root_dir, 'bench.journal')
+        total = args.threads * args.appends
+        print "{0} threads, {1} durable appends".format(args.threads, total)
+        print "{0:20} {1:>10} {2:>12} {3:>8}".format('mode', 'ms',
+                                                     'appends/s', 'fsyncs')
+        for name, group_commit in (('fsync per append', False),
+                                   ('group commit', True)):
+            elapsed, fsyncs = run_appends(log_path, group_commit,
+                                          args.threads, args.appends)
+            print "{0:20} {1:>10.1f} {2:>12.0f} {3:>8}".format(
+                name, elapsed * 1000, total / elapsed, fsyncs)
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Compare the logger writing straight to an unbuffered file with the
+    logger handing lines to the async writer. Reports the lines per second
+    logged by several threads, and the cost of a call suppressed by the
+    log level, both with the config looked up on every call as before and
+    with the resolved config, with and without lazy formatting
+
+    usage: python bench_logger.py [--lines N] [--threads N]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+from simoorg.Logger import Logger
+
+SUPPRESSED_CALLS = 200000
+
+
+def log_lines(logger, lines, threads):
+    """
+        Log lines from several threads, returns the lines per second
+        seen by the callers and the lines per second including the final
+        flush
+    """
+    def worker(thread_index):
+        for index in range(lines // threads):
+            logger.logit("INFO", "thread {0} line {1} node {2}",
+                         args=(thread_index, index, 'host.example.com'))
+    start_time = time.time()
+    workers = [threading.Thread(target=worker, args=(thread_index,))
+               for thread_index in range(threads)]
+    for thrd in workers:
+        thrd.start()
+    for thrd in workers:
+        thrd.join()
+    logged_time = time.time() - start_time
+    logger.flush()
+    total_lines = float(lines // threads * threads)
+    return (total_lines / logged_time,
+            total_lines / (time.time() - start_time))
+
+
+def old_suppressed_call(logger):
+    """
+        The level check logit used to do on every call
+    """
+    if logger.get_current_log_level() >= logger.log_levels.index("DEBUG"):
+        logger.is_file_logging_enabled()
+
+
+def time_per_call(function):
+    """
+        Nanoseconds per call of function
+    """
+    start_time = time.time()
+    for _ in xrange(SUPPRESSED_CALLS):
+        function()
+    return (time.time() - start_time) / SUPPRESSED_CALLS * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    root_dir = tempfile.mkdtemp(prefix='simoorg_logger_bench_')
+    try:
+        print "{0:10} {1:>16} {2:>16}".format('mode', 'caller lines/s',
+                                              'written lines/s')
+        for mode, async_writer in (('sync', False), ('async', True)):
+            log_config = {'path': os.path.join(root_dir, mode + '.log'),
+                          'console': False, 'log_level': 'INFO',
+                          'verbose': False, 'async_writer': async_writer}
+            logger = Logger(log_config)
+            print "{0:10} {1:>16.0f} {2:>16.0f}".format(
+                mode, *log_lines(logger, args.lines, args.threads))
+
+        print
+        print "{0:30} {1:>10}".format('suppressed call', 'ns/call')
+        suppressed_calls = (
+            ('config lookup per call', lambda: old_suppressed_call(logger)),
+            ('logit, formatted by caller',
+             lambda: logger.logit("INFO", "node {0} partition {1}"
+                                  .format('host.example.com', 7),
+                                  log_level="DEBUG")),
+            ('logit, lazy args',
+             lambda: logger.logit("INFO", "node {0} partition {1}",
+                                  log_level="DEBUG",
+                                  args=('host.example.com', 7))),
+            ('is_enabled_for', lambda: logger.is_enabled_for("DEBUG")))
+        for name, function in suppressed_calls:
+            print "{0:30} {1:>10.0f}".format(name, time_per_call(function))
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
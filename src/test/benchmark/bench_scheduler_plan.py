@@ -0,0 +1,110 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Compare the time and memory the non deterministic scheduler takes to
+    plan a long horizon, with the per event loop it used before and with
+    the batched generator, which uses numpy when it is installed
+
+    usage: python bench_scheduler_plan.py [--days N] [--failures N]
+"""
+import sys
+import time
+import random
+import argparse
+
+from simoorg.plugins.scheduler.NonDeterministicScheduler. \
+    NonDeterministicScheduler import NonDeterministicScheduler, numpy
+
+
+def loop_plan(destiny_object):
+    """
+        The way the scheduler used to generate its plan
+        Return:
+            list of {failure_name: trigger_time} dicts
+    """
+    constraints = destiny_object['constraints']
+    current_timestamp = int(time.time())
+    trigger_time = current_timestamp
+    plan = []
+    failure_list = destiny_object['failures'].keys()
+    random.shuffle(failure_list)
+    while True:
+        for failure_name in failure_list:
+            trigger_time += random.randint(
+                constraints['min_gap_between_failures'],
+                constraints['max_gap_between_failures']) * 60
+            if (trigger_time > constraints['total_run_duration'] * 60 +
+                    current_timestamp):
+                return plan
+            plan.append({failure_name: trigger_time})
+
+
+def dicts_size(plan):
+    """
+        Bytes held by a list of single key dicts, not counting the shared
+        failure names
+    """
+    return sys.getsizeof(plan) + sum([sys.getsizeof(event) +
+                                      sys.getsizeof(event.values()[0])
+                                      for event in plan])
+
+
+def arrays_size(arrays):
+    """
+        Bytes held by the parallel arrays of a plan
+    """
+    if numpy is not None:
+        return sum([array.nbytes for array in arrays])
+    return sum([sys.getsizeof(array) for array in arrays])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--failures', type=int, default=8)
+    args = parser.parse_args()
+
+    destiny_object = {
+        'constraints': {'min_gap_between_failures': 1,
+                        'max_gap_between_failures': 2,
+                        'total_run_duration': args.days * 24 * 60},
+        'failures': dict(('failure{0}'.format(index), {})
+                         for index in range(args.failures))}
+    print "backend: {0}".format('numpy' if numpy is not None else 'python')
+    start_time = time.time()
+    plan = loop_plan(destiny_object)
+    loop_seconds = time.time() - start_time
+    loop_bytes = dicts_size(plan)
+    events = len(plan)
+    del plan
+    start_time = time.time()
+    scheduler = NonDeterministicScheduler(destiny_object)
+    batch_seconds = time.time() - start_time
+    _, failure_indexes, trigger_times = scheduler.get_plan_arrays()
+    batch_bytes = arrays_size([failure_indexes, trigger_times])
+    print "{0} days, about {1} events".format(args.days, events)
+    print "{0:20} {1:>10} {2:>10}".format('mode', 'ms', 'MB')
+    print "{0:20} {1:>10.1f} {2:>10.1f}".format(
+        'per event loop', loop_seconds * 1000, loop_bytes / 1e6)
+    print "{0:20} {1:>10.1f} {2:>10.1f}".format(
+        'batched arrays', batch_seconds * 1000, batch_bytes / 1e6)
+    start_time = time.time()
+    scheduler.get_plan()
+    print "{0:20} {1:>10.1f}".format(
+        'dict view, on demand', (time.time() - start_time) * 1000)
+
+
+if __name__ == '__main__':
+    main()
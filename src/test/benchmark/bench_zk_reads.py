@@ -0,0 +1,112 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+"""
+    Count the Zookeeper round trips and the time taken by the kafka
+    helper lookups against a fake kazoo client with a fixed latency per
+    round trip. The serial rows repeat the exists and get pair per broker
+    the helper used to do, the pipelined rows use the current helper and
+    the cluster model rows serve the lookups from KafkaClusterModel
+
+    usage: python bench_zk_reads.py [--brokers N] [--latency SECONDS]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from simoorg.plugins.common.ZKUtil import KafkaZkHelper
+from simoorg.plugins.common.KafkaClusterModel import KafkaClusterModel
+
+TEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ZK_PATHS = {'broker_ids': '/brokers/ids',
+            'broker_topics': '/brokers/topics',
+            'controller': '/controller'}
+
+
+def serial_get_host(zook, broker_id):
+    """
+        The exists and get pair done for every broker before
+    """
+    broker_path = ZK_PATHS['broker_ids'] + "/" + str(broker_id)
+    if zook.exists(broker_path):
+        data, stat = zook.get(broker_path)
+        return json.loads(data)["host"]
+
+
+def serial_get_all_hosts(zook):
+    broker_id_path = ZK_PATHS['broker_ids']
+    if zook.exists(broker_id_path):
+        return [serial_get_host(zook, broker_id)
+                for broker_id in zook.get_children(broker_id_path)]
+
+
+def serial_get_isr(zook, topic, partition):
+    path = (ZK_PATHS['broker_topics'] + "/" + topic + "/partitions/" +
+            str(partition) + "/state")
+    if zook.exists(path):
+        data, stat = zook.get(path)
+        return [serial_get_host(zook, broker_id)
+                for broker_id in json.loads(data)["isr"]]
+
+
+def measure(zk_client, function):
+    """
+        Round trips, requests and milliseconds taken by one call
+    """
+    zk_client.round_trips = 0
+    zk_client.requests = 0
+    start_time = time.time()
+    function()
+    return (zk_client.round_trips, zk_client.requests,
+            (time.time() - start_time) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--brokers', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.001)
+    args = parser.parse_args()
+
+    # the fake kazoo client is shared with the unit tests
+    sys.path.insert(0, TEST_DIR)
+    from mock_modules.MockKazooClient import MockKazooClient, build_cluster
+    zk_client = MockKazooClient()
+    build_cluster(zk_client, brokers=args.brokers)
+    zk_client.latency = args.latency
+    helper = KafkaZkHelper(zk_client, ZK_PATHS)
+    model = KafkaClusterModel(zk_client, ZK_PATHS)
+    model.start()
+    cases = (
+        ('serial get_all_hosts', lambda: serial_get_all_hosts(zk_client)),
+        ('pipelined get_all_hosts', helper.get_all_hosts),
+        ('model get_all_hosts, cold', model.get_all_hosts),
+        ('model get_all_hosts, warm', model.get_all_hosts),
+        ('serial get_isr', lambda: serial_get_isr(zk_client, 'topic0', 0)),
+        ('pipelined get_isr', lambda: helper.get_isr('topic0', 0)),
+        ('model get_isr, cold', lambda: model.get_isr('topic0', 0)),
+        ('model get_isr, warm', lambda: model.get_isr('topic0', 0)))
+
+    print "{0} brokers, {1:.1f} ms per round trip".format(
+        args.brokers, args.latency * 1000)
+    print "{0:28} {1:>12} {2:>10} {3:>10}".format('call', 'round trips',
+                                                  'requests', 'ms')
+    for name, function in cases:
+        print "{0:28} {1:>12} {2:>10} {3:>10.1f}".format(
+            name, *measure(zk_client, function))
+
+
+if __name__ == '__main__':
+    main()
@@ -45,8 +45,22 @@ class Logger:
         else:
             return False
 
-    def logit(self, type, message, log_level="INFO"):
+    def is_enabled_for(self, log_level):
+        """
+            Every level is logged
+        """
+        return True
+
+    def logit(self, type, message, log_level="INFO", args=None):
         """
             Add a message to the log queue
         """
+        if args is not None:
+            message = message.format(*args)
         self.log_queue.append(message)
+
+    def flush(self):
+        """
+            Nothing is buffered
+        """
+        pass
@@ -0,0 +1,210 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+'''
+    Mock kazoo client, keeps the znodes in a dict and counts the
+    round trips made to it. Every blocking call is one round trip, async
+    requests sent while other async requests are still in flight share
+    their round trip, as they would on a real Zookeeper connection.
+    An optional latency is slept for each round trip
+'''
+import json
+import time
+import posixpath
+
+from kazoo.exceptions import NoNodeError
+
+
+class MockKazooClient(object):
+    ''' Mock KazooClient class'''
+
+    def __init__(self, latency=0):
+        """
+            init function
+        """
+        self.znodes = {'/': ''}
+        self.latency = latency
+        self.round_trips = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.children_watches = {}
+        self.data_watches = {}
+
+    def create(self, path, data='', makepath=True):
+        """
+            Create a znode and its missing parents, firing the watches
+        """
+        parent = posixpath.dirname(path)
+        if parent not in self.znodes:
+            self.create(parent, makepath=makepath)
+        self.znodes[path] = data
+        self.fire_watches(path)
+
+    def set(self, path, data):
+        """
+            Change the data of a znode
+        """
+        if path not in self.znodes:
+            raise NoNodeError(path)
+        self.znodes[path] = data
+        self.fire_watches(path)
+
+    def delete(self, path, recursive=True):
+        """
+            Delete a znode and its children
+        """
+        for znode in self.znodes.keys():
+            if znode == path or znode.startswith(path + '/'):
+                del self.znodes[znode]
+        self.fire_watches(path)
+
+    def list_children(self, path):
+        """
+            Children names of a znode, without counting a round trip
+        """
+        return sorted(posixpath.basename(znode) for znode in self.znodes
+                      if znode != '/' and posixpath.dirname(znode) == path)
+
+    def fire_watches(self, path):
+        """
+            Call the watches of a znode and of its parent
+        """
+        for watch in list(self.data_watches.get(path, [])):
+            self.call_data_watch(path, watch)
+        parent = posixpath.dirname(path)
+        for watch in list(self.children_watches.get(parent, [])):
+            self.call_children_watch(parent, watch)
+
+    def call_data_watch(self, path, watch):
+        if watch(self.znodes.get(path), None) is False:
+            self.data_watches[path].remove(watch)
+
+    def call_children_watch(self, path, watch):
+        if watch(self.list_children(path)) is False:
+            self.children_watches[path].remove(watch)
+
+    def round_trip(self):
+        self.requests += 1
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def exists(self, path):
+        self.round_trip()
+        return path in self.znodes
+
+    def get(self, path):
+        self.round_trip()
+        return self.read(path)
+
+    def read(self, path):
+        if path not in self.znodes:
+            raise NoNodeError(path)
+        return self.znodes[path], None
+
+    def get_async(self, path):
+        """
+            Send a read, the returned result blocks in get until the
+            reply is due
+        """
+        self.requests += 1
+        if not self.in_flight:
+            self.round_trips += 1
+        self.in_flight += 1
+        return MockAsyncResult(self, time.time() + self.latency,
+                               self.read, path)
+
+    def get_children(self, path):
+        self.round_trip()
+        if path not in self.znodes:
+            raise NoNodeError(path)
+        return self.list_children(path)
+
+    def ChildrenWatch(self, path, func):
+        """
+            Call func with the children of path now and on every change
+        """
+        self.round_trips += 1
+        self.children_watches.setdefault(path, []).append(func)
+        self.call_children_watch(path, func)
+
+    def DataWatch(self, path, func):
+        """
+            Call func with the data of path now and on every change
+        """
+        self.round_trips += 1
+        self.data_watches.setdefault(path, []).append(func)
+        self.call_data_watch(path, func)
+
+
+class MockAsyncResult(object):
+    ''' Mock kazoo IAsyncResult class'''
+
+    def __init__(self, zk_client, due_time, function, path):
+        """
+            init function
+        """
+        self.zk_client = zk_client
+        self.due_time = due_time
+        self.function = function
+        self.path = path
+        self.done = False
+
+    def get(self):
+        """
+            Wait for the reply, raises the error of the request if any
+        """
+        if not self.done:
+            self.done = True
+            self.zk_client.in_flight -= 1
+            wait_time = self.due_time - time.time()
+            if wait_time > 0:
+                time.sleep(wait_time)
+        return self.function(self.path)
+
+
+def build_cluster(zk_client, brokers=3, topics=2, partitions=2):
+    """
+        Fill a mock zookeeper with a kafka cluster, partition p of every
+        topic is led by broker p and replicated on every broker
+    """
+    for broker_id in range(brokers):
+        zk_client.create('/brokers/ids/{0}'.format(broker_id),
+                         json.dumps({'host': 'broker{0}'.format(broker_id),
+                                     'port': 9092, 'version': 1}))
+    for topic_index in range(topics):
+        topic = 'topic{0}'.format(topic_index)
+        for partition in range(partitions):
+            set_partition_state(zk_client, topic, partition,
+                                partition % brokers, range(brokers))
+        zk_client.set('/brokers/topics/' + topic, json.dumps(
+            {'version': 1, 'partitions': dict(
+                (str(partition), range(brokers))
+                for partition in range(partitions))}))
+    zk_client.create('/controller', json.dumps({'version': 1,
+                                                'brokerid': 0}))
+
+
+def set_partition_state(zk_client, topic, partition, leader, isr):
+    """
+        Create or update the state znode of a partition
+    """
+    path = '/brokers/topics/{0}/partitions/{1}/state'.format(
+        topic, partition)
+    data = json.dumps({'controller_epoch': 1, 'leader': leader,
+                       'version': 1, 'leader_epoch': 1, 'isr': list(isr)})
+    if path in zk_client.znodes:
+        zk_client.set(path, data)
+    else:
+        zk_client.create(path, data)
@@ -0,0 +1,141 @@
+'''
+    Mock paramiko ssh client, remembers every client it created. A command
+    runs on a MockChannel which hands out the output it was given and
+    reports its exit status once exit_ready is set
+'''
+import os
+import collections
+
+import paramiko
+
+
+class MockChannel(object):
+    ''' Mock paramiko Channel class'''
+
+    def __init__(self, stdout_chunks=(), stderr_chunks=(), exit_status=0,
+                 exit_ready=True, recv_error=None):
+        """
+            init function, the channel looks readable to select so the
+            handler never sleeps on it. recv_error is raised by recv once
+            the stdout chunks are used up
+        """
+        self.stdout_chunks = collections.deque(stdout_chunks)
+        self.stderr_chunks = collections.deque(stderr_chunks)
+        self.exit_status = exit_status
+        self.exit_ready = exit_ready
+        self.recv_error = recv_error
+        self.closed = False
+        self.read_fd, self.write_fd = os.pipe()
+        os.write(self.write_fd, 'x')
+
+    def fileno(self):
+        return self.read_fd
+
+    def recv_ready(self):
+        return bool(self.stdout_chunks) or self.recv_error is not None
+
+    def recv(self, nbytes):
+        if not self.stdout_chunks:
+            raise self.recv_error
+        return self.stdout_chunks.popleft()
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr_chunks)
+
+    def recv_stderr(self, nbytes):
+        return self.stderr_chunks.popleft()
+
+    def exit_status_ready(self):
+        return self.exit_ready
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def close(self):
+        """
+            Close the channel and its pipe
+        """
+        if not self.closed:
+            self.closed = True
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+
+
+class MockStream(object):
+    ''' Mock paramiko ChannelFile class'''
+
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class MockTransport(object):
+    ''' Mock paramiko Transport class'''
+
+    def __init__(self):
+        self.active = True
+        self.keepalive = None
+
+    def is_active(self):
+        return self.active
+
+    def send_ignore(self):
+        if not self.active:
+            raise EOFError()
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+
+class MockSSHClient(object):
+    ''' Mock paramiko SSHClient class'''
+
+    # every client created, and the channels the next commands run on
+    clients = []
+    channels = collections.deque()
+
+    def __init__(self):
+        """
+            init function
+        """
+        self.transport = None
+        self.closed = False
+        self.commands = []
+        MockSSHClient.clients.append(self)
+
+    def load_host_keys(self, path):
+        pass
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, hostname, **kwargs):
+        self.transport = MockTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def exec_command(self, command, bufsize=-1, timeout=None):
+        """
+            Run a command on the next queued channel
+        """
+        if self.transport is None or not self.transport.active:
+            raise paramiko.SSHException("Connection lost")
+        self.commands.append(command)
+        if MockSSHClient.channels:
+            channel = MockSSHClient.channels.popleft()
+        else:
+            channel = MockChannel()
+        return None, MockStream(channel), MockStream(channel)
+
+    def close(self):
+        self.closed = True
+        if self.transport is not None:
+            self.transport.active = False
+
+    @classmethod
+    def reset(cls):
+        """
+            Forget the clients and channels of a previous test
+        """
+        cls.clients = []
+        cls.channels = collections.deque()
@@ -0,0 +1,219 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import os
+import copy
+import time
+import yaml
+import shutil
+import signal
+import unittest
+import threading
+import multiprocessing
+
+import simoorg.atropos as atropos
+from simoorg.AtroposHost import AtroposHost
+from simoorg.plugins.scheduler.BaseScheduler import plan_from_events
+import mock_modules.Logger as Logger
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+DUMMY_HEALTHCHECK_SRC = (TEST_DIR + "/unittest_configs/dummy_healthcheck/" +
+                         "dummy.sh")
+DUMMY_HEALTHCHECK_DST = "/tmp/dummy.sh"
+OVERLAP_CONFIG_DIR = (TEST_DIR + "/unittest_configs/atropos_configs/" +
+                      "sample_overlap/")
+OVERLAP_FATEBOOK = OVERLAP_CONFIG_DIR + "fate_books/test.yaml"
+OVERLAP_NODES = ['overlap-node1', 'overlap-node2']
+HOSTED_SERVICES = ['hosted_service_a', 'hosted_service_b']
+TEST_FAILURE_NAME = 'test_failure'
+EVENT_SCHEDULE_BUFFER = 5
+KILL_DELAY = 3
+STOP_BUFFER = 5
+WAIT_TIMEOUT = 5
+
+
+def KillerThread(pid, sleep_time):
+    time.sleep(sleep_time)
+    os.kill(pid, signal.SIGTERM)
+
+
+def StopperThread(control_queue, service_names, sleep_time):
+    for service_name in service_names:
+        time.sleep(sleep_time)
+        control_queue.put(service_name)
+
+
+class TestAtroposHost(unittest.TestCase):
+    """
+        Test that several fate books can share one worker process
+        and still behave as independent atropos
+    """
+    def setUp(self):
+        shutil.copyfile(DUMMY_HEALTHCHECK_SRC, DUMMY_HEALTHCHECK_DST)
+        os.chmod(DUMMY_HEALTHCHECK_DST, 0744)
+        with open(OVERLAP_FATEBOOK) as c_fd:
+            base_config = yaml.load(c_fd)
+        self.configs = {}
+        for service_name in HOSTED_SERVICES:
+            config = copy.deepcopy(base_config)
+            config['service'] = service_name
+            self.configs[service_name] = config
+        self.data_q = multiprocessing.Queue()
+        self.event_q = multiprocessing.Queue()
+        self.previous_handler = signal.getsignal(signal.SIGTERM)
+
+    def tearDown(self):
+        signal.signal(signal.SIGTERM, self.previous_handler)
+        os.remove(DUMMY_HEALTHCHECK_DST)
+        for node in OVERLAP_NODES:
+            result_file = "/tmp/atropos_unittest_" + node
+            if os.path.isfile(result_file):
+                os.remove(result_file)
+
+    def write_event_file(self, event_time):
+        """
+            Write the trigger time read by the test scheduler
+        """
+        with open(self.configs[HOSTED_SERVICES[0]]['destiny']
+                  ['TestScheduler']['constraints']['event_file'],
+                  'w') as ev_fd:
+            ev_fd.write(str(event_time))
+
+    def test_hosted_services(self):
+        """
+            Every hosted fate book follows its own plan
+        """
+        self.write_event_file(int(time.time()) + EVENT_SCHEDULE_BUFFER)
+        AtroposHost(self.configs, OVERLAP_CONFIG_DIR, self.data_q,
+                    self.event_q).run()
+        services = sorted([self.data_q.get()[0] for _ in HOSTED_SERVICES])
+        self.assertEqual(services, HOSTED_SERVICES)
+        induced_services = []
+        for _ in range(2 * len(HOSTED_SERVICES)):
+            event = self.event_q.get()
+            if event[1] == TEST_FAILURE_NAME:
+                induced_services.append(event[0])
+                self.assert_(event[4])
+        self.assertEqual(sorted(induced_services), HOSTED_SERVICES)
+
+    def test_sigterm(self):
+        """
+            SIGTERM stops hosted atropos without a failure in flight
+        """
+        self.write_event_file(int(time.time()) + 60)
+        thrd = threading.Thread(target=KillerThread,
+                                args=(os.getpid(), KILL_DELAY))
+        thrd.start()
+        start_time = time.time()
+        AtroposHost(self.configs, OVERLAP_CONFIG_DIR, self.data_q,
+                    self.event_q).run()
+        thrd.join()
+        self.assert_(time.time() - start_time < KILL_DELAY + STOP_BUFFER)
+        self.assert_(self.event_q.empty())
+
+    def test_control_queue(self):
+        """
+            A hosted atropos named on the control queue stops while the
+            others keep running, each stopped service is reported
+        """
+        self.write_event_file(int(time.time()) + 60)
+        control_q = multiprocessing.Queue()
+        stopped_q = multiprocessing.Queue()
+        thrd = threading.Thread(target=StopperThread,
+                                args=(control_q, HOSTED_SERVICES,
+                                      KILL_DELAY))
+        thrd.start()
+        start_time = time.time()
+        AtroposHost(self.configs, OVERLAP_CONFIG_DIR, self.data_q,
+                    self.event_q, control_queue=control_q,
+                    stopped_queue=stopped_q).run()
+        thrd.join()
+        run_time = time.time() - start_time
+        self.assert_(2 * KILL_DELAY <= run_time <
+                     2 * KILL_DELAY + STOP_BUFFER)
+        self.assertEqual([stopped_q.get(timeout=1) for _ in HOSTED_SERVICES],
+                         HOSTED_SERVICES)
+        self.assert_(self.event_q.empty())
+
+    def test_reload_during_induce(self):
+        """
+            A stop sent by a fate book reload while a failure is being
+            induced is ignored, the failure is induced and reverted. The
+            next stop request ends the atropos
+        """
+        service_name = HOSTED_SERVICES[0]
+        control_q = multiprocessing.Queue()
+        host = AtroposHost(self.configs, OVERLAP_CONFIG_DIR, self.data_q,
+                           self.event_q, control_queue=control_q)
+        atropos_obj = atropos.Atropos(self.configs[service_name],
+                                      OVERLAP_CONFIG_DIR, self.data_q,
+                                      self.event_q,
+                                      logger_instance=Logger.Logger(),
+                                      install_signal_handler=False,
+                                      start=False)
+        host.hosted_atropos[service_name] = atropos_obj
+        atropos_obj.open_journal()
+        induce_started = threading.Event()
+        induce_released = threading.Event()
+        reverted = threading.Event()
+        induced = []
+
+        def induce_fate(failure_name, trigger_time):
+            induce_started.set()
+            induce_released.wait(WAIT_TIMEOUT)
+            induced.append(failure_name)
+            atropos_obj.timer_queue.schedule(
+                time.time() + 0.2, (atropos.REVERT_EVENT, failure_name,
+                                    trigger_time, OVERLAP_NODES))
+
+        def revert_fate(nodes, failure_name, trigger_time, due_time):
+            reverted.set()
+        atropos_obj.induce_fate = induce_fate
+        atropos_obj.revert_fate = revert_fate
+        plan_exits = []
+
+        def follow_plan():
+            now = time.time()
+            plan = plan_from_events([{'failure1': now},
+                                     {'failure2': now + 60}])
+            try:
+                atropos_obj.follow_plan(plan)
+            except SystemExit:
+                plan_exits.append(True)
+        plan_thread = threading.Thread(target=follow_plan)
+        plan_thread.start()
+        control_thread = threading.Thread(target=host.control_loop)
+        control_thread.daemon = True
+        control_thread.start()
+        induce_started.wait(WAIT_TIMEOUT)
+        # the reload asks while the failure is being induced
+        control_q.put(service_name)
+        time.sleep(1)
+        self.assert_(not atropos_obj.exit_requested)
+        induce_released.set()
+        reverted.wait(WAIT_TIMEOUT)
+        plan_thread.join(1)
+        self.assert_(plan_thread.is_alive())
+        # moirai asks again once the failure was reverted
+        control_q.put(service_name)
+        plan_thread.join(WAIT_TIMEOUT)
+        self.assert_(not plan_thread.is_alive())
+        atropos_obj.close_journal()
+        self.assertEqual(plan_exits, [True])
+        self.assertEqual(induced, ['failure1'])
+        self.assert_(reverted.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
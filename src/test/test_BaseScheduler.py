@@ -0,0 +1,88 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import json
+import pickle
+import unittest
+
+from simoorg.plugins.scheduler.BaseScheduler import CompactPlan, \
+    decode_plan, plan_from_columns, plan_from_events
+
+TEST_EVENTS = [{'kill_process': 1438000060},
+               {u'disk_failure \xe9': 1438000120.5},
+               {'kill_process': 1438000180}]
+
+
+class TestBaseScheduler(unittest.TestCase):
+    """
+        Test the compact plan the schedulers hand to atropos
+    """
+    def test_compact_plan(self):
+        """
+            A compact plan keeps every failure name once and gives the
+            events back as views and as a list of dicts
+        """
+        plan = plan_from_events(TEST_EVENTS)
+        self.assertEqual(len(plan), 3)
+        self.assertEqual(len(plan.failure_names), 2)
+        self.assertEqual(plan.failure_ids.tolist(), [0, 1, 0])
+        self.assertEqual(plan.trigger_times.typecode, 'd')
+        # iterating gives plain (failure_name, trigger_time) tuples
+        self.assertEqual(list(plan),
+                         [('kill_process', 1438000060),
+                          (u'disk_failure \xe9', 1438000120.5),
+                          ('kill_process', 1438000180)])
+        self.assertEqual((plan[1].failure_name, plan[1].trigger_time),
+                         (u'disk_failure \xe9', 1438000120.5))
+        self.assertEqual(repr(plan[0]),
+                         "PlanEvent('kill_process', 1438000060)")
+        # whole second trigger times come back as ints
+        self.assert_(isinstance(plan[0].trigger_time, int))
+        whole_plan = plan_from_events(TEST_EVENTS[::2])
+        self.assertEqual([type(trigger_time) for _, trigger_time in
+                          whole_plan], [int, int])
+        # the whole second check is done again after an append
+        whole_plan.append('kill_process', 1438000240.5)
+        self.assertEqual(list(whole_plan)[-1],
+                         ('kill_process', 1438000240.5))
+        self.assertEqual(plan[-1].to_dict(), TEST_EVENTS[-1])
+        self.assertEqual(plan.to_events(), TEST_EVENTS)
+        self.assertEqual(json.loads(plan.to_json()), TEST_EVENTS)
+        self.assertEqual(json.loads(CompactPlan().to_json()), [])
+        self.assertRaises(AttributeError, setattr, plan[0], 'target',
+                          'node1')
+
+    def test_serialisation(self):
+        """
+            The binary, columnar and pickled forms give the same plan back
+        """
+        plan = plan_from_events(TEST_EVENTS)
+        for copy in (decode_plan(plan.to_bytes()),
+                     plan_from_columns(json.loads(json.dumps(
+                         plan.to_columns()))),
+                     pickle.loads(pickle.dumps(plan, 2))):
+            self.assertEqual(copy.to_events(), TEST_EVENTS)
+        data = plan.to_bytes()
+        # a header, the names and 2 + 8 bytes for each event
+        self.assertEqual(len(data), 12 + 2 + 12 + 2 + 15 + 3 * 10)
+        self.assert_(len(pickle.dumps(plan, 2)) < len(data) + 100)
+        self.assertRaises(ValueError, decode_plan, data[:-1])
+        self.assertRaises(ValueError, decode_plan, 'SPL0' + data[4:])
+        self.assertRaises(ValueError, decode_plan, '')
+        self.assertEqual(decode_plan(CompactPlan().to_bytes()).to_events(),
+                         [])
+
+
+if __name__ == '__main__':
+    unittest.main()
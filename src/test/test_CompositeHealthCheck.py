@@ -0,0 +1,154 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import time
+import unittest
+
+import simoorg.PluginRegistry as PluginRegistry
+from simoorg.plugins.healthcheck.HealthCheck import HealthCheck
+from simoorg.plugins.healthcheck.CompositeHealthCheck.CompositeHealthCheck \
+    import CompositeHealthCheck
+
+
+class DelayedHealthCheck(HealthCheck):
+    """
+        Child check whose coordinate is (seconds to wait, result), a
+        result which is not a bool is raised
+    """
+    REUSABLE = True
+
+    def __init__(self, script, plugin_config=None):
+        HealthCheck.__init__(self, script, plugin_config)
+        self.runs = 0
+        self.closed = False
+
+    def check(self):
+        self.runs += 1
+        delay, result = self.script
+        time.sleep(delay)
+        if not isinstance(result, bool):
+            raise result
+        return result
+
+    def close(self):
+        self.closed = True
+
+
+def child(delay, result):
+    return {'plugin': 'DelayedHealthCheck', 'coordinate': (delay, result)}
+
+
+class TestCompositeHealthCheck(unittest.TestCase):
+    """
+        Test the rules, the early return and the deadline of the composite
+        health check
+    """
+    def setUp(self):
+        PluginRegistry.PLUGIN_CLASSES[
+            (PluginRegistry.HEALTHCHECK_PLUGIN, 'DelayedHealthCheck')] = \
+            DelayedHealthCheck
+
+    def tearDown(self):
+        del PluginRegistry.PLUGIN_CLASSES[
+            (PluginRegistry.HEALTHCHECK_PLUGIN, 'DelayedHealthCheck')]
+
+    def timed_check(self, plugin_config):
+        health_check = CompositeHealthCheck(None, plugin_config)
+        start_time = time.time()
+        result = health_check.check()
+        return result, time.time() - start_time, health_check
+
+    def test_rules(self):
+        """
+            all, any and quorum combine the same children differently
+        """
+        checks = [child(0, True), child(0, False), child(0, True)]
+        self.assert_(not self.timed_check({'checks': checks})[0])
+        self.assert_(self.timed_check({'checks': checks,
+                                       'rule': 'any'})[0])
+        self.assert_(self.timed_check({'checks': checks, 'rule': 'quorum',
+                                       'quorum': 2})[0])
+        self.assert_(not self.timed_check({'checks': checks,
+                                           'rule': 'quorum',
+                                           'quorum': 3})[0])
+        # a child raising counts as failed
+        self.assert_(not self.timed_check({
+            'checks': [child(0, True), child(0, ValueError('broken'))],
+            'rule': 'quorum', 'quorum': 2})[0])
+        self.assertRaises(ValueError, CompositeHealthCheck, None,
+                          {'checks': checks, 'rule': 'most'})
+        self.assertRaises(ValueError, CompositeHealthCheck, None,
+                          {'checks': checks, 'rule': 'quorum', 'quorum': 4})
+        self.assertRaises(ValueError, CompositeHealthCheck, None, None)
+
+    def test_early_return(self):
+        """
+            The check returns once the outcome is decided
+        """
+        checks = [child(0, True), child(5, True), child(5, False)]
+        result, elapsed, health_check = self.timed_check(
+            {'checks': checks, 'rule': 'any'})
+        self.assert_(result)
+        self.assert_(elapsed < 2)
+        self.assertEqual(health_check.last_results, [True, None, None])
+        checks = [child(5, True), child(0, False)]
+        result, elapsed, health_check = self.timed_check({'checks': checks})
+        self.assert_(not result)
+        self.assert_(elapsed < 2)
+
+    def test_deadline(self):
+        """
+            Children which do not answer by the deadline count as failed
+        """
+        checks = [child(0, True), child(5, True)]
+        result, elapsed, health_check = self.timed_check(
+            {'checks': checks, 'timeout': 0.3})
+        self.assert_(not result)
+        self.assert_(elapsed < 2)
+        self.assertEqual(len(health_check.get_latencies()), 1)
+
+    def test_running_child(self):
+        """
+            A child still running for an earlier check is not started
+            again, the next check waits for that run
+        """
+        checks = [child(0, True), child(1, True)]
+        result, elapsed, health_check = self.timed_check(
+            {'checks': checks, 'timeout': 0.3})
+        self.assert_(not result)
+        # the slow child is still running, its result comes in time
+        health_check.timeout = 5
+        start_time = time.time()
+        self.assert_(health_check.check())
+        self.assert_(time.time() - start_time < 2)
+        children = health_check.plugin_registry.instances.values()
+        self.assertEqual(sorted(child_check.runs for child_check
+                                in children), [1, 2])
+
+    def test_close(self):
+        """
+            close stops the workers and closes the children kept for reuse
+        """
+        result, elapsed, health_check = self.timed_check(
+            {'checks': [child(0, True), child(0, True)]})
+        self.assert_(result)
+        children = health_check.plugin_registry.instances.values()
+        self.assertEqual(len(children), 2)
+        health_check.close()
+        self.assert_(all(child_check.closed for child_check in children))
+        self.assertEqual(health_check.plugin_registry.instances, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import time
+import unittest
+
+import simoorg.plugins.common.ConnectionPool as ConnectionPool
+
+TEST_KEY = ('test-node', 22, 'test')
+OTHER_KEY = ('other-node', 22, 'test')
+
+
+class DummyConnection(object):
+    """
+        Stand in for an ssh client
+    """
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    """
+        Test reuse, validation, eviction and the connection cap
+        of the connection pool
+    """
+    def setUp(self):
+        self.created = []
+
+    def factory(self):
+        """
+            Create a dummy connection and remember it
+        """
+        connection = DummyConnection()
+        self.created.append(connection)
+        return connection
+
+    def test_reuse(self):
+        """
+            A released connection should be handed out again for the
+            same key but not for a different one
+        """
+        pool = ConnectionPool.ConnectionPool()
+        first = pool.acquire(TEST_KEY, self.factory)
+        pool.release(TEST_KEY, first)
+        second = pool.acquire(TEST_KEY, self.factory)
+        self.assert_(first is second)
+        other = pool.acquire(OTHER_KEY, self.factory)
+        self.assert_(other is not first)
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(pool.get_stats()['reused'], 1)
+
+    def test_validation(self):
+        """
+            A connection failing validation should be closed and replaced
+        """
+        pool = ConnectionPool.ConnectionPool()
+        first = pool.acquire(TEST_KEY, self.factory)
+        pool.release(TEST_KEY, first)
+        first.alive = False
+        second = pool.acquire(TEST_KEY, self.factory,
+                              lambda conn: conn.alive)
+        self.assert_(first.closed)
+        self.assert_(second is not first)
+        self.assertEqual(pool.get_stats()['open'], 1)
+
+    def test_idle_eviction(self):
+        """
+            Idle connections older than the idle timeout get closed
+        """
+        pool = ConnectionPool.ConnectionPool(idle_timeout=0.1)
+        first = pool.acquire(TEST_KEY, self.factory)
+        pool.release(TEST_KEY, first)
+        time.sleep(0.2)
+        pool.evict_idle()
+        self.assert_(first.closed)
+        self.assertEqual(pool.get_idle_count(), 0)
+        self.assertEqual(pool.get_stats()['open'], 0)
+
+    def test_max_connections(self):
+        """
+            When the pool is full, idle connections of other keys are
+            evicted and busy pools time out
+        """
+        pool = ConnectionPool.ConnectionPool(max_connections=1,
+                                             acquire_timeout=0.1)
+        first = pool.acquire(TEST_KEY, self.factory)
+        self.assertRaises(ConnectionPool.ConnectionPoolExhausted,
+                          pool.acquire, OTHER_KEY, self.factory)
+        pool.release(TEST_KEY, first)
+        other = pool.acquire(OTHER_KEY, self.factory)
+        self.assert_(first.closed)
+        self.assert_(not other.closed)
+        self.assertEqual(pool.get_stats()['open'], 1)
+
+    def test_factory_failure(self):
+        """
+            A failing handshake must not leak a slot in the pool
+        """
+        def failing_factory():
+            raise IOError("connection refused")
+        pool = ConnectionPool.ConnectionPool(max_connections=1)
+        self.assertRaises(IOError, pool.acquire, TEST_KEY, failing_factory)
+        self.assertEqual(pool.get_stats()['open'], 0)
+        connection = pool.acquire(TEST_KEY, self.factory)
+        self.assert_(connection is self.created[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from simoorg.plugins.healthcheck.DefaultHealthCheck.DefaultHealthCheck \
+    import DefaultHealthCheck
+
+
+class TestDefaultHealthCheck(unittest.TestCase):
+    """
+        Test the timeout, the result cache and the latencies of the
+        default health check
+    """
+    def setUp(self):
+        self.script_dir = tempfile.mkdtemp(prefix='simoorg_healthcheck_')
+        self.run_count_file = os.path.join(self.script_dir, 'runs')
+
+    def tearDown(self):
+        shutil.rmtree(self.script_dir)
+
+    def write_script(self, body):
+        """
+            Write an executable script counting its runs in
+            run_count_file
+        """
+        script_path = os.path.join(self.script_dir, 'check.sh')
+        with open(script_path, 'w') as script_fd:
+            script_fd.write('#!/bin/bash\necho run >> {0}\n{1}\n'.format(
+                self.run_count_file, body))
+        os.chmod(script_path, 0744)
+        return script_path
+
+    def get_run_count(self):
+        if not os.path.exists(self.run_count_file):
+            return 0
+        with open(self.run_count_file) as count_fd:
+            return len(count_fd.readlines())
+
+    def test_status(self):
+        """
+            The exit status decides the result and output is kept. The
+            coordinate runs through a shell unless use_shell is False
+        """
+        script = self.write_script('echo "$1"; exit $2')
+        health_check = DefaultHealthCheck(script + ' healthy 0', 'None')
+        self.assert_(health_check.check())
+        self.assertEqual(health_check.last_output, 'healthy\n')
+        health_check = DefaultHealthCheck(
+            'HEALTH=ok; ' + script + ' "$HEALTH" 0 | tr a-z A-Z', None)
+        self.assert_(health_check.check())
+        self.assertEqual(health_check.last_output, 'OK\n')
+        health_check = DefaultHealthCheck(script + ' "a | b" 0',
+                                          {'use_shell': False})
+        self.assert_(health_check.check())
+        self.assertEqual(health_check.last_output, 'a | b\n')
+        health_check = DefaultHealthCheck(script + ' broken 3', None)
+        self.assert_(not health_check.check())
+        self.assertEqual(len(health_check.get_latencies()), 1)
+        missing = DefaultHealthCheck(self.script_dir + '/missing.sh', None)
+        self.assert_(not missing.check())
+
+    def test_timeout(self):
+        """
+            A hung script and the processes it started are killed
+        """
+        pid_file = os.path.join(self.script_dir, 'child.pid')
+        script = self.write_script('sleep 60 &\necho $! > {0}\nsleep 60'
+                                   .format(pid_file))
+        health_check = DefaultHealthCheck(script, {'timeout': 0.5})
+        start_time = time.time()
+        self.assert_(not health_check.check())
+        self.assert_(time.time() - start_time < 10)
+        self.assert_(health_check.timed_out)
+        with open(pid_file) as pid_fd:
+            child_pid = int(pid_fd.read())
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            try:
+                os.kill(child_pid, 0)
+            except OSError:
+                break
+            time.sleep(0.05)
+        else:
+            self.fail('background process of the script survived')
+
+    def test_cache(self):
+        """
+            Checks within cache_ttl reuse the last result
+        """
+        script = self.write_script('exit 0')
+        health_check = DefaultHealthCheck(script, {'cache_ttl': 60})
+        for _ in range(3):
+            self.assert_(health_check.check())
+        self.assertEqual(self.get_run_count(), 1)
+        health_check.cache_ttl = 0
+        self.assert_(health_check.check())
+        self.assertEqual(self.get_run_count(), 2)
+        self.assertEqual(len(health_check.get_latencies()), 2)
+
+    def test_revert_bypasses_cache(self):
+        """
+            The check after a revert runs the script even when a result
+            is cached, and refreshes the cache
+        """
+        script = self.write_script('exit 0')
+        health_check = DefaultHealthCheck(script, {'cache_ttl': 60})
+        self.assert_(health_check.check())
+        self.assert_(health_check.check_revert())
+        self.assertEqual(self.get_run_count(), 2)
+        self.assert_(health_check.check())
+        self.assertEqual(self.get_run_count(), 2)
+        self.assert_(health_check.check_revert())
+        self.assertEqual(self.get_run_count(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
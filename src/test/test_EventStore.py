@@ -0,0 +1,132 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import json
+import unittest
+
+from simoorg.EventStore import EventStore
+
+TEST_PAGE_SIZE = 4
+TEST_EVENT_COUNT = 10
+
+
+class TestEventStore(unittest.TestCase):
+    """
+        Test pagination and the time index of the event store
+    """
+    def setUp(self):
+        self.event_store = EventStore(page_size=TEST_PAGE_SIZE)
+        self.events = []
+        for event_id in range(TEST_EVENT_COUNT):
+            event = ['failure' + str(event_id), 100 + event_id,
+                     'node' + str(event_id), True]
+            self.events.append(event)
+            self.event_store.add_event('test_service', event)
+
+    def test_full_history(self):
+        """
+            Without arguments every event is returned in recorded order
+        """
+        events, cursor = self.event_store.get_events('test_service')
+        self.assertEqual(json.loads(events), self.events)
+        self.assertEqual(cursor, TEST_EVENT_COUNT)
+        self.assert_('test_service' in self.event_store)
+        self.assert_('other_service' not in self.event_store)
+        self.assertRaises(KeyError, self.event_store.get_events,
+                          'other_service')
+
+    def test_cursor(self):
+        """
+            Following the returned cursor walks through all the events,
+            including pages cached by earlier calls
+        """
+        self.event_store.get_events('test_service')
+        collected = []
+        cursor = 0
+        while True:
+            events, cursor = self.event_store.get_events(
+                'test_service', cursor=cursor, limit=3)
+            events = json.loads(events)
+            if not events:
+                break
+            collected.extend(events)
+        self.assertEqual(collected, self.events)
+        new_event = ['failure_new', 200, 'node', False]
+        self.event_store.add_event('test_service', new_event)
+        events, cursor = self.event_store.get_events('test_service',
+                                                     cursor=cursor)
+        self.assertEqual(json.loads(events), [new_event])
+        self.assertEqual(cursor, TEST_EVENT_COUNT + 1)
+
+    def test_since(self):
+        """
+            since skips events recorded at or before the given time
+        """
+        events, cursor = self.event_store.get_events('test_service',
+                                                     since=104)
+        self.assertEqual(json.loads(events), self.events[5:])
+        events, cursor = self.event_store.get_events('test_service',
+                                                     since=104, limit=2)
+        self.assertEqual(json.loads(events), self.events[5:7])
+        self.assertEqual(cursor, 7)
+        events, cursor = self.event_store.get_events('test_service',
+                                                     since=1000)
+        self.assertEqual(json.loads(events), [])
+        self.assertEqual(cursor, TEST_EVENT_COUNT)
+
+    def test_out_of_order_times(self):
+        """
+            An event with an earlier trigger time than the one before it
+            is never skipped by a since lookup past the earlier one
+        """
+        late_event = ['failure_late', 300, 'node', True]
+        early_event = ['failure_early', 250, 'node', True]
+        self.event_store.add_event('test_service', late_event)
+        self.event_store.add_event('test_service', early_event)
+        events, cursor = self.event_store.get_events('test_service',
+                                                     since=200)
+        self.assertEqual(json.loads(events), [late_event, early_event])
+
+    def test_stats(self):
+        """
+            Timings of successful events are summed up per failure, revert
+            events count for the failure they revert
+        """
+        for index in range(1, 101):
+            self.event_store.add_event('timed_service', [
+                'failure1', index, 'node', True,
+                {'induce_latency': index / 100.0}])
+            self.event_store.add_event('timed_service', [
+                'failure1-revert', index, 'node', True,
+                {'revert_latency': 2.0, 'time_to_healthy': index}])
+        self.event_store.add_event('timed_service', [
+            'failure1', 101, 'node', False, {'induce_latency': 100.0}])
+        self.event_store.add_event('timed_service', [
+            'failure1-revert', 101, 'node', True,
+            {'revert_latency': 2.0, 'time_to_healthy': None}])
+        stats = self.event_store.get_stats('timed_service')
+        self.assertEqual(stats.keys(), ['failure1'])
+        failure_stats = stats['failure1']
+        self.assertEqual(failure_stats['unrecovered'], 1)
+        self.assertEqual(failure_stats['induce_latency']['count'], 100)
+        self.assertEqual(failure_stats['induce_latency']['p50'], 0.51)
+        self.assertEqual(failure_stats['induce_latency']['p99'], 1.0)
+        self.assertEqual(failure_stats['revert_latency']['count'], 101)
+        self.assertEqual(failure_stats['time_to_healthy']['p95'], 96)
+        self.assertEqual(self.event_store.get_stats('test_service'), {})
+        self.assertEqual(self.event_store.get_stats('missing'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import os
+import yaml
+import shutil
+import unittest
+import tempfile
+
+from simoorg.FateBookLoader import FateBookLoader, FATE_BOOK_SCHEMA, \
+    validate_schema
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+TEST_FATEBOOK_FILE = (TEST_DIR + "/unittest_configs/moirai_configs/" +
+                      "sample_base/fate_books/test.yaml")
+INCORRECT_FATEBOOK_FILE = (TEST_DIR + "/unittest_configs/moirai_configs/" +
+                           "sample_incorrect/fate_books/test.yaml")
+
+
+class TestFateBookLoader(unittest.TestCase):
+    """
+        Test the schema checks and the cache of the fate book loader
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='simoorg_fate_books_')
+        self.cache_path = os.path.join(self.temp_dir, 'fate_books.cache')
+        self.fate_book_path = os.path.join(self.temp_dir, 'test.yaml')
+        shutil.copy(TEST_FATEBOOK_FILE, self.fate_book_path)
+        with open(TEST_FATEBOOK_FILE) as c_fd:
+            self.expected_config = yaml.load(c_fd)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_schema(self):
+        """
+            Missing sections and values of the wrong type are reported
+            with their path in the fate book
+        """
+        self.assertEqual(validate_schema(self.expected_config,
+                                         FATE_BOOK_SCHEMA), [])
+        with open(INCORRECT_FATEBOOK_FILE) as c_fd:
+            config = yaml.load(c_fd)
+        self.assertEqual(validate_schema(config, FATE_BOOK_SCHEMA),
+                         ['missing service'])
+        config = self.expected_config
+        config['failures'][0]['wait_seconds'] = 'soon'
+        del config['destiny']['scheduler_plugin']
+        self.assertEqual(validate_schema(config, FATE_BOOK_SCHEMA),
+                         ['missing destiny.scheduler_plugin',
+                          'failures[0].wait_seconds has the wrong type str'])
+        self.assertEqual(validate_schema([], FATE_BOOK_SCHEMA),
+                         ['fate book should be a mapping'])
+        loader = FateBookLoader(None)
+        self.assertRaises(ValueError, loader.load, INCORRECT_FATEBOOK_FILE)
+
+    def test_cache(self):
+        """
+            A new loader reuses the parsed fate books saved by an earlier
+            one until the file changes
+        """
+        loader = FateBookLoader(self.cache_path)
+        self.assertEqual(loader.load(self.fate_book_path),
+                         self.expected_config)
+        self.assertEqual((loader.parsed, loader.cached), (1, 0))
+        loader.save()
+        loader = FateBookLoader(self.cache_path)
+        self.assertEqual(loader.load(self.fate_book_path),
+                         self.expected_config)
+        self.assertEqual((loader.parsed, loader.cached), (0, 1))
+        # touching the file only costs a hash
+        file_stat = os.stat(self.fate_book_path)
+        os.utime(self.fate_book_path, (file_stat.st_atime,
+                                       file_stat.st_mtime + 10))
+        loader.load(self.fate_book_path)
+        self.assertEqual((loader.parsed, loader.cached), (0, 2))
+        with open(self.fate_book_path, 'a') as c_fd:
+            c_fd.write('\nextra_section: 1\n')
+        self.assertEqual(loader.load(self.fate_book_path)['extra_section'],
+                         1)
+        self.assertEqual((loader.parsed, loader.cached), (1, 2))
+        loader.forget(self.temp_dir, [])
+        self.assertEqual(loader.cache, {})
+
+    def test_untrusted_cache(self):
+        """
+            A cache file other users could have written is ignored
+        """
+        loader = FateBookLoader(self.cache_path)
+        loader.load(self.fate_book_path)
+        loader.save()
+        os.chmod(self.cache_path, 0o666)
+        loader = FateBookLoader(self.cache_path)
+        self.assertEqual(loader.cache, {})
+        with open(self.cache_path, 'w') as cache_fd:
+            cache_fd.write('garbage')
+        os.chmod(self.cache_path, 0o600)
+        loader = FateBookLoader(self.cache_path)
+        self.assertEqual(loader.cache, {})
+        loader.load(self.fate_book_path)
+        self.assertEqual(loader.parsed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
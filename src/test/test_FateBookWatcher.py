@@ -0,0 +1,84 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import os
+import time
+import shutil
+import unittest
+import tempfile
+
+from simoorg.FateBookWatcher import FateBookWatcher, INOTIFY_MODE, \
+    POLLING_MODE
+
+TEST_POLL_INTERVAL = 0.05
+TEST_TIMEOUT = 2
+
+
+class TestFateBookWatcher(unittest.TestCase):
+    """
+        Test that both watcher modes notice fate books being written,
+        added and removed
+    """
+    def setUp(self):
+        self.fate_books_dir = tempfile.mkdtemp(prefix='simoorg_watcher_')
+        self.fate_book_path = os.path.join(self.fate_books_dir, 'test.yaml')
+        self.write_fate_book('service: test_service\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.fate_books_dir, ignore_errors=True)
+
+    def write_fate_book(self, contents, path=None):
+        with open(path or self.fate_book_path, 'w') as fate_book_fd:
+            fate_book_fd.write(contents)
+
+    def check_watcher(self, watcher):
+        """
+            Every change is seen once, and a quiet directory times out
+        """
+        try:
+            start_time = time.time()
+            self.assert_(not watcher.wait_for_change(0.2))
+            self.assert_(time.time() - start_time >= 0.2)
+            self.write_fate_book('service: test_service\nlonger: 1\n')
+            self.assert_(watcher.wait_for_change(TEST_TIMEOUT))
+            self.assert_(not watcher.wait_for_change(0.1))
+            self.write_fate_book('service: other_service\n',
+                                 os.path.join(self.fate_books_dir,
+                                              'other.yaml'))
+            self.assert_(watcher.wait_for_change(TEST_TIMEOUT))
+            os.remove(self.fate_book_path)
+            self.assert_(watcher.wait_for_change(TEST_TIMEOUT))
+        finally:
+            watcher.close()
+
+    def test_inotify(self):
+        """
+            Changes are seen through inotify
+        """
+        watcher = FateBookWatcher(self.fate_books_dir, TEST_POLL_INTERVAL)
+        self.assertEqual(watcher.mode, INOTIFY_MODE)
+        self.check_watcher(watcher)
+
+    def test_polling(self):
+        """
+            Changes are seen by polling when inotify is not used
+        """
+        watcher = FateBookWatcher(self.fate_books_dir, TEST_POLL_INTERVAL,
+                                  use_inotify=False)
+        self.assertEqual(watcher.mode, POLLING_MODE)
+        self.check_watcher(watcher)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import unittest
+import multiprocessing
+
+from simoorg.ImpactLedger import ImpactLedger, create_impact_ledger, \
+    SERVICE_COUNTER, HOST_COUNTER, CLUSTER_COUNTER
+
+TEST_CLUSTER = 'shared-kafka'
+PROCESS_ADMISSIONS = 50
+
+
+def admit_from_process(ledger, service, result_queue):
+    """
+        Admit impacts from another process until the ledger refuses
+    """
+    holdings = []
+    for index in range(PROCESS_ADMISSIONS):
+        holding = ledger.admit(service, 'node{0}'.format(index),
+                               TEST_CLUSTER)
+        if holding is None:
+            break
+        holdings.append(holding)
+    result_queue.put(len(holdings))
+
+
+class TestImpactLedger(unittest.TestCase):
+    """
+        Test the budgets enforced by the impact ledger
+    """
+    def test_budgets(self):
+        """
+            The service, host and cluster budgets are checked together
+            and released impacts free the budget again
+        """
+        ledger = ImpactLedger(service_maximum=2, host_maximum=1,
+                              cluster_maximum=3,
+                              cluster_limits={'small': 1})
+        first = ledger.admit('service1', 'node1', TEST_CLUSTER)
+        self.assertNotEqual(first, None)
+        # node1 is already impacted
+        self.assertEqual(ledger.admit('service2', 'node1', TEST_CLUSTER),
+                         None)
+        self.assertNotEqual(ledger.admit('service1', 'node2', TEST_CLUSTER),
+                            None)
+        # service1 used up its budget
+        self.assertEqual(ledger.admit('service1', 'node3', TEST_CLUSTER),
+                         None)
+        self.assertNotEqual(ledger.admit('service2', 'node3', TEST_CLUSTER),
+                            None)
+        # the cluster used up its budget
+        self.assertEqual(ledger.admit('service3', 'node4', TEST_CLUSTER),
+                         None)
+        self.assertEqual(ledger.get_count(CLUSTER_COUNTER, TEST_CLUSTER), 3)
+        self.assertNotEqual(ledger.admit('service3', 'node4', 'small'), None)
+        self.assertEqual(ledger.admit('service3', 'node5', 'small'), None)
+        ledger.release(first)
+        ledger.release(first)
+        self.assertEqual(ledger.get_count(HOST_COUNTER, 'node1'), 0)
+        self.assertEqual(ledger.get_count(SERVICE_COUNTER, 'service1'), 1)
+        self.assertNotEqual(ledger.admit('service3', 'node1', TEST_CLUSTER),
+                            None)
+        # impacts which already happened are charged over the budget
+        self.assertNotEqual(ledger.admit('service3', 'node1', TEST_CLUSTER,
+                                         force=True), None)
+        self.assertEqual(ledger.get_count(HOST_COUNTER, 'node1'), 2)
+        self.assertEqual(ledger.release_service('service3'), 3)
+        self.assertEqual(ledger.get_count(HOST_COUNTER, 'node1'), 0)
+        self.assertEqual(ledger.get_count(CLUSTER_COUNTER, 'small'), 0)
+        self.assertEqual(ledger.get_count(CLUSTER_COUNTER, TEST_CLUSTER), 2)
+
+    def test_full_stripe(self):
+        """
+            A service has slots // stripes holdings, once they are taken
+            even a forced impact is refused
+        """
+        ledger = ImpactLedger(slots=32, stripes=16)
+        holdings = [ledger.admit('service1', 'node{0}'.format(index),
+                                 force=True) for index in range(3)]
+        self.assertNotEqual(holdings[0], None)
+        self.assertNotEqual(holdings[1], None)
+        self.assertEqual(holdings[2], None)
+        self.assertEqual(ledger.get_count(SERVICE_COUNTER, 'service1'), 2)
+        ledger.release(holdings[0])
+        self.assertNotEqual(ledger.admit('service1', 'node2', force=True),
+                            None)
+
+    def test_shared_between_processes(self):
+        """
+            Processes forked after the ledger was created share its
+            budgets
+        """
+        ledger = ImpactLedger(cluster_maximum=PROCESS_ADMISSIONS)
+        result_queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=admit_from_process,
+                                         args=(ledger, 'service{0}'
+                                               .format(index), result_queue))
+                 for index in range(4)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        admitted = [result_queue.get() for _ in procs]
+        self.assertEqual(sum(admitted), PROCESS_ADMISSIONS)
+        self.assertEqual(ledger.get_count(CLUSTER_COUNTER, TEST_CLUSTER),
+                         PROCESS_ADMISSIONS)
+        for index in range(4):
+            ledger.release_service('service{0}'.format(index))
+        self.assertEqual(ledger.get_count(CLUSTER_COUNTER, TEST_CLUSTER), 0)
+
+    def test_create(self):
+        """
+            The ledger is only created when api.yaml configures it
+        """
+        self.assertEqual(create_impact_ledger({}), None)
+        ledger = create_impact_ledger({'impact_ledger':
+                                       {'host_maximum': 1, 'slots': 64}})
+        self.assertEqual(ledger.slots, 64)
+        self.assertEqual(ledger.get_limit(HOST_COUNTER, 'node1'), 1)
+        self.assertEqual(ledger.get_limit(SERVICE_COUNTER, 'service1'),
+                         None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,12 +15,23 @@
 import unittest
 import os
 import yaml
+import shutil
+import tempfile
+import threading
 
 import simoorg.Journal as Journal
+import simoorg.JournalLog as JournalLog
+from simoorg.ImpactLedger import ImpactLedger, SERVICE_COUNTER, \
+    HOST_COUNTER, CLUSTER_COUNTER
 import simoorg.Logger as Logger
+import mock_modules.Logger as MockLogger
 
 FATEBOOK_DIR = (os.path.dirname(os.path.realpath(__file__)) +
                 "/unittest_configs/journal_configs/fate_books/")
+TEST_FAILURE_NAME = 'test_failure'
+TEST_TRIGGER_TIME = 1438000000.5
+COMMIT_THREADS = 8
+COMMITS_PER_THREAD = 20
 
 
 class TestJournal(unittest.TestCase):
@@ -38,9 +49,11 @@ class TestJournal(unittest.TestCase):
         self.test_impact_limit = self.config['impact_limits']
         self.journal_obj = Journal.Journal(self.test_impact_limit,
                                            self.logger_obj)
+        self.temp_dir = tempfile.mkdtemp(prefix='simoorg_journal_')
+        self.log_path = os.path.join(self.temp_dir, 'test.journal')
 
     def tearDown(self):
-        pass
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
 
     def test_journaling(self):
         """
@@ -61,6 +74,170 @@ class TestJournal(unittest.TestCase):
         self.assertEqual(self.journal_obj.get_total_impacted(),
                          self.test_impact_limit['total_maximum'])
 
+    def test_journal_log(self):
+        """
+            Failures induced and not reverted are outstanding when the
+            journal log is opened again, and start charged to the journal
+        """
+        journal_obj = Journal.Journal(self.test_impact_limit,
+                                      self.logger_obj,
+                                      log_path=self.log_path)
+        self.assertEqual(journal_obj.get_outstanding(), [])
+        nodes = ['node1', 'node2', 'node3']
+        journal_obj.log_intent(JournalLog.INDUCE_INTENT, TEST_FAILURE_NAME,
+                               TEST_TRIGGER_TIME, nodes)
+        for target in nodes:
+            journal_obj.log_completion(JournalLog.INDUCE_DONE,
+                                       TEST_FAILURE_NAME, TEST_TRIGGER_TIME,
+                                       target, target != 'node3')
+        journal_obj.log_intent(JournalLog.REVERT_INTENT, TEST_FAILURE_NAME,
+                               TEST_TRIGGER_TIME, nodes[:2])
+        journal_obj.log_completion(JournalLog.REVERT_DONE,
+                                   TEST_FAILURE_NAME, TEST_TRIGGER_TIME,
+                                   'node1', True)
+        journal_obj.log_completion(JournalLog.REVERT_DONE,
+                                   TEST_FAILURE_NAME, TEST_TRIGGER_TIME,
+                                   'node2', False)
+        # a record torn by a crash ends the replay
+        with open(self.log_path, 'ab') as log_fd:
+            log_fd.write(JournalLog.encode_record(
+                JournalLog.REVERT_DONE, TEST_FAILURE_NAME, 'node2',
+                TEST_TRIGGER_TIME)[:-3])
+        expected = [(TEST_FAILURE_NAME, 'node2', TEST_TRIGGER_TIME),
+                    (TEST_FAILURE_NAME, 'node3', TEST_TRIGGER_TIME)]
+        self.assertEqual(JournalLog.replay(self.log_path), expected)
+        journal_obj = Journal.Journal(self.test_impact_limit,
+                                      self.logger_obj,
+                                      log_path=self.log_path)
+        self.assertEqual(journal_obj.get_outstanding(), expected)
+        self.assertEqual(journal_obj.get_total_impacted(), 2)
+        journal_obj.close()
+        # opening the log compacted it to the outstanding failures
+        self.assertEqual(JournalLog.replay(self.log_path), expected)
+        with open(self.log_path, 'w') as log_fd:
+            log_fd.write('not a journal')
+        self.assertRaises(ValueError, Journal.Journal,
+                          self.test_impact_limit, self.logger_obj,
+                          log_path=self.log_path)
+
+    def test_group_commit(self):
+        """
+            Concurrent durable appends all reach the log and share fsyncs
+        """
+        journal_log = JournalLog.JournalLog(self.log_path)
+
+        def append_intents(thread_index):
+            for index in range(COMMITS_PER_THREAD):
+                journal_log.append([(JournalLog.INDUCE_INTENT,
+                                     TEST_FAILURE_NAME,
+                                     'node{0}'.format(thread_index),
+                                     float(index), True)], durable=True)
+        threads = [threading.Thread(target=append_intents, args=(index,))
+                   for index in range(COMMIT_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        journal_log.close()
+        total = COMMIT_THREADS * COMMITS_PER_THREAD
+        self.assertEqual(journal_log.synced, total)
+        self.assert_(1 <= journal_log.fsyncs <= total)
+        self.assertEqual(len(JournalLog.replay(self.log_path)), total)
+
+    def test_impact_ledger(self):
+        """
+            Journals of different services share the budgets of the
+            impact ledger
+        """
+        ledger = ImpactLedger(host_maximum=1, cluster_maximum=2)
+        impact_limits = {'total_maximum': 5, 'cluster': 'shared'}
+        journals = [Journal.Journal(impact_limits, self.logger_obj,
+                                    ledger=ledger, service=service)
+                    for service in ('service1', 'service2')]
+        self.assert_(journals[0].is_total_impact_allowed('node1'))
+        journals[0].cast_impact('node1')
+        # the same host is already impacted by another service
+        self.assert_(not journals[1].is_total_impact_allowed('node1'))
+        self.assert_(journals[1].is_total_impact_allowed('node2'))
+        journals[1].cast_impact('node2')
+        # the shared cluster used up its budget
+        self.assert_(not journals[1].is_total_impact_allowed('node3'))
+        self.assertEqual(ledger.get_count(CLUSTER_COUNTER, 'shared'), 2)
+        journals[0].revert_impact('node1')
+        self.assertEqual(ledger.get_count(HOST_COUNTER, 'node1'), 0)
+        self.assert_(journals[1].is_total_impact_allowed('node1'))
+        # failures left outstanding in a journal log hold their budget
+        journal_log = JournalLog.JournalLog(self.log_path)
+        journal_log.append([(JournalLog.INDUCE_INTENT, TEST_FAILURE_NAME,
+                             'node4', TEST_TRIGGER_TIME, True)],
+                           durable=True)
+        journal_log.close()
+        self.assertEqual(ledger.release_service('service1'), 0)
+        journal_obj = Journal.Journal(impact_limits, self.logger_obj,
+                                      log_path=self.log_path, ledger=ledger,
+                                      service='service1')
+        self.assertEqual(ledger.get_count(HOST_COUNTER, 'node4'), 1)
+        self.assertEqual(ledger.get_count(CLUSTER_COUNTER, 'shared'), 3)
+        journal_obj.close()
+
+    def test_impact_ledger_full(self):
+        """
+            Outstanding failures the ledger has no room for are logged
+        """
+        ledger = ImpactLedger(slots=32, stripes=16)
+        journal_log = JournalLog.JournalLog(self.log_path)
+        journal_log.append([(JournalLog.INDUCE_INTENT, TEST_FAILURE_NAME,
+                             'node{0}'.format(index), TEST_TRIGGER_TIME,
+                             True) for index in range(3)], durable=True)
+        journal_log.close()
+        logger = MockLogger.Logger()
+        journal_obj = Journal.Journal({'total_maximum': 5}, logger,
+                                      log_path=self.log_path, ledger=ledger,
+                                      service='service1')
+        self.assertEqual(journal_obj.get_total_impacted(), 3)
+        self.assertEqual(ledger.get_count(SERVICE_COUNTER, 'service1'), 2)
+        self.assert_(logger.log_contains(
+            "The impact ledger has no room left to record the impact of"
+            " service1 on node2"))
+        journal_obj.close()
+
+    def test_target_limits(self):
+        """
+            Impact is tracked per host and per group, a group label stays
+            charged until the target which took it is reverted
+        """
+        node_groups = {'node1': ['rack1', 'leads:topic0:0'],
+                       'node2': ['rack1'],
+                       'node3': ['rack2']}
+        impact_limits = {'total_maximum': 5, 'per_host_maximum': 2,
+                         'per_group_maximum': 2}
+        journal_obj = Journal.Journal(impact_limits, self.logger_obj,
+                                      node_groups=lambda node:
+                                      list(node_groups.get(node, [])))
+        self.assert_(journal_obj.allowed('node1'))
+        journal_obj.cast_impact('node1')
+        journal_obj.cast_impact('node1')
+        # node1 and rack1 are used up
+        self.assert_(not journal_obj.allowed('node1'))
+        self.assert_(not journal_obj.allowed('node2'))
+        self.assert_(journal_obj.allowed('node3'))
+        self.assert_(journal_obj.is_total_impact_allowed('node4'))
+        self.assertEqual(journal_obj.group_impacts,
+                         {'rack1': 2, 'leads:topic0:0': 2})
+        # leadership moved on, the revert still releases what was charged
+        node_groups['node1'] = ['rack1']
+        journal_obj.revert_impact('node1')
+        self.assert_(journal_obj.allowed('node2'))
+        journal_obj.revert_impact('node1')
+        self.assertEqual(journal_obj.host_impacts, {})
+        self.assertEqual(journal_obj.group_impacts, {})
+        self.assertEqual(journal_obj.get_total_impacted(), 0)
+        # the total limit still applies to every target
+        for node in ('node1', 'node2', 'node3', 'node4', 'node5'):
+            journal_obj.cast_impact(node)
+        self.assert_(not journal_obj.allowed('node6'))
+        self.assert_(not journal_obj.allowed())
+
 
 if __name__ == '__main__':
     unittest.main()
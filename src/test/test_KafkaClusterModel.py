@@ -0,0 +1,158 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import json
+import unittest
+
+from simoorg.plugins.common.KafkaClusterModel import KafkaClusterModel
+from mock_modules.MockKazooClient import MockKazooClient, build_cluster, \
+    set_partition_state
+
+ZK_PATHS = {'broker_ids': '/brokers/ids',
+            'broker_topics': '/brokers/topics',
+            'controller': '/controller'}
+
+
+class TestKafkaClusterModel(unittest.TestCase):
+    """
+        Test lookups, watches and the staleness bound of the kafka
+        cluster model
+    """
+    def setUp(self):
+        self.zk_client = MockKazooClient()
+        build_cluster(self.zk_client)
+
+    def test_lookups(self):
+        """
+            Repeated lookups are served from the model
+        """
+        model = KafkaClusterModel(self.zk_client, ZK_PATHS)
+        model.start()
+        self.assertEqual(sorted(model.get_all_hosts()),
+                         ['broker0', 'broker1', 'broker2'])
+        self.assertEqual(sorted(model.get_topics()), ['topic0', 'topic1'])
+        self.assertEqual(model.get_controller(), 'broker0')
+        self.assertEqual(model.get_leader('topic1', 1), 'broker1')
+        self.assertEqual(sorted(model.get_isr('topic1', 1)),
+                         ['broker0', 'broker1', 'broker2'])
+        self.assert_(model.get_partition(model.get_topic()) in ['0', '1'])
+        round_trips = self.zk_client.round_trips
+        for _ in range(100):
+            model.get_leader('topic1', 1)
+            model.get_isr('topic1', 1)
+            model.get_all_hosts()
+            model.get_controller()
+        self.assertEqual(self.zk_client.round_trips, round_trips)
+        self.assertEqual(model.get_leader('missing', 0), None)
+        self.assertEqual(model.get_isr('missing', 0), [])
+        self.assertEqual(model.get_partition('missing'), None)
+
+    def test_watches(self):
+        """
+            New brokers, topics and controllers show up without waiting
+            for the staleness bound
+        """
+        model = KafkaClusterModel(self.zk_client, ZK_PATHS)
+        model.start()
+        self.zk_client.create('/brokers/ids/3',
+                              json.dumps({'host': 'broker3'}))
+        self.assert_('broker3' in model.get_all_hosts())
+        self.zk_client.set('/controller', json.dumps({'brokerid': 3}))
+        self.assertEqual(model.get_controller(), 'broker3')
+        self.zk_client.delete('/brokers/ids/3')
+        self.assert_('broker3' not in model.get_all_hosts())
+        self.zk_client.delete('/controller')
+        self.assertEqual(model.get_controller(), None)
+        set_partition_state(self.zk_client, 'topic2', 0, 1, [1])
+        self.assert_('topic2' in model.get_topics())
+        self.zk_client.delete('/brokers/topics/topic0')
+        self.assertEqual(sorted(model.get_topics()), ['topic1', 'topic2'])
+        model.stop()
+        self.zk_client.create('/brokers/ids/4',
+                              json.dumps({'host': 'broker4'}))
+        self.assert_('broker4' not in model.get_all_hosts())
+
+    def test_staleness(self):
+        """
+            A leader change is only seen once the cached state is older
+            than max_staleness
+        """
+        model = KafkaClusterModel(self.zk_client, ZK_PATHS,
+                                  max_staleness=3600)
+        model.start()
+        self.assertEqual(model.get_leader('topic0', 0), 'broker0')
+        set_partition_state(self.zk_client, 'topic0', 0, 2, [2])
+        self.assertEqual(model.get_leader('topic0', 0), 'broker0')
+        model.max_staleness = 0
+        self.assertEqual(model.get_leader('topic0', 0), 'broker2')
+        self.assertEqual(model.get_isr('topic0', 0), ['broker2'])
+
+    def test_under_replicated(self):
+        """
+            Under replicated partitions follow the partition states and
+            replica assignments without reading zookeeper on lookup
+        """
+        model = KafkaClusterModel(self.zk_client, ZK_PATHS)
+        model.start()
+        model.watch_replication()
+        self.assertEqual(model.get_under_replicated_partitions(), [])
+        set_partition_state(self.zk_client, 'topic0', 1, 1, [1, 2])
+        self.assertEqual(model.get_under_replicated_partitions(),
+                         [('topic0', '1')])
+        # the watch also refreshed the cached isr
+        model.get_all_hosts()
+        round_trips = self.zk_client.round_trips
+        self.assertEqual(sorted(model.get_isr('topic0', 1)),
+                         ['broker1', 'broker2'])
+        for _ in range(100):
+            model.get_under_replicated_partitions()
+        self.assertEqual(self.zk_client.round_trips, round_trips)
+        set_partition_state(self.zk_client, 'topic0', 1, 1, [0, 1, 2])
+        self.assertEqual(model.get_under_replicated_partitions(), [])
+        # a new topic and its partitions are picked up
+        set_partition_state(self.zk_client, 'topic2', 0, 0, [0])
+        self.zk_client.set('/brokers/topics/topic2', json.dumps(
+            {'version': 1, 'partitions': {'0': [0, 1]}}))
+        self.assertEqual(model.get_under_replicated_partitions(),
+                         [('topic2', '0')])
+        # shrinking the replica assignment fixes it
+        self.zk_client.set('/brokers/topics/topic2', json.dumps(
+            {'version': 1, 'partitions': {'0': [0]}}))
+        self.assertEqual(model.get_under_replicated_partitions(), [])
+        set_partition_state(self.zk_client, 'topic1', 0, 0, [0])
+        self.zk_client.delete('/brokers/topics/topic1')
+        self.assertEqual(model.get_under_replicated_partitions(), [])
+
+    def test_led_partitions(self):
+        """
+            The partitions a broker leads follow leader elections
+        """
+        model = KafkaClusterModel(self.zk_client, ZK_PATHS)
+        model.start()
+        model.watch_replication()
+        self.assertEqual(model.get_led_partitions('broker1'),
+                         [('topic0', '1'), ('topic1', '1')])
+        self.assertEqual(model.get_led_partitions('broker2'), [])
+        set_partition_state(self.zk_client, 'topic0', 1, 2, [1, 2])
+        self.assertEqual(model.get_led_partitions('broker1'),
+                         [('topic1', '1')])
+        self.assertEqual(model.get_led_partitions('broker2'),
+                         [('topic0', '1')])
+        self.zk_client.delete('/brokers/topics/topic1')
+        self.assertEqual(model.get_led_partitions('broker1'), [])
+        self.assertEqual(model.get_led_partitions('missing'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
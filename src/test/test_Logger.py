@@ -0,0 +1,85 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import os
+import time
+import unittest
+import tempfile
+
+from simoorg.Logger import Logger, LogWriter
+
+
+class TestLogger(unittest.TestCase):
+    """
+        Test level filtering, lazy formatting and the async writer of the
+        logger
+    """
+    def setUp(self):
+        log_fd, self.log_path = tempfile.mkstemp(prefix='simoorg_logger_')
+        os.close(log_fd)
+        self.log_config = {'path': self.log_path, 'console': False,
+                           'log_level': 'INFO', 'verbose': False}
+
+    def tearDown(self):
+        os.remove(self.log_path)
+
+    def read_log(self):
+        with open(self.log_path) as log_fd:
+            return log_fd.read()
+
+    def test_levels(self):
+        """
+            Messages above the configured level are dropped without
+            formatting them
+        """
+        logger = Logger(self.log_config)
+        self.assert_(logger.is_enabled_for('INFO'))
+        self.assert_(not logger.is_enabled_for('DEBUG'))
+        # the format string is broken, formatting it would raise
+        logger.logit('INFO', 'dropped {0} {1}', log_level='DEBUG',
+                     args=(1,))
+        logger.logit('INFO', 'kept {0}', args=('line',))
+        self.assertEqual(self.read_log().count('\n'), 1)
+        self.assert_('[INFO]: kept line' in self.read_log())
+
+    def test_async_writer(self):
+        """
+            Lines stay buffered until flush is called
+        """
+        self.log_config['async_writer'] = True
+        self.log_config['flush_interval'] = 60
+        logger = Logger(self.log_config)
+        for index in range(10):
+            logger.logit('INFO', 'line {0}', args=(index,))
+        self.assertEqual(self.read_log(), '')
+        logger.flush()
+        lines = self.read_log().splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assert_(lines[-1].endswith('line 9'))
+
+    def test_flush_interval(self):
+        """
+            The writer flushes on its own once the flush interval passed
+        """
+        writer = LogWriter(flush_interval=0.2, flush_size=1 << 20)
+        file_handle = writer.open_file(self.log_path)
+        writer.write(file_handle, False, 'now', 'INFO', 'first line')
+        deadline = time.time() + 2
+        while not self.read_log() and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.read_log(), '[now] [INFO]: first line\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
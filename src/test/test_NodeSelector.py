@@ -0,0 +1,84 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import random
+import unittest
+
+import mock_modules.Logger as Logger
+from simoorg.plugins.common.KafkaClusterModel import KafkaClusterModel
+from simoorg.plugins.topology.KafkaTopology.NodeSelector import NodeSelector
+from mock_modules.MockKazooClient import MockKazooClient, build_cluster
+
+ZK_PATHS = {'broker_ids': '/brokers/ids',
+            'broker_topics': '/brokers/topics',
+            'controller': '/controller'}
+
+
+class TestNodeSelector(unittest.TestCase):
+    """
+        Test the compiled selector table of the kafka topology
+    """
+    def setUp(self):
+        random.seed(7)
+        self.zk_client = MockKazooClient()
+        build_cluster(self.zk_client, brokers=5, partitions=5)
+        self.cluster_model = KafkaClusterModel(self.zk_client, ZK_PATHS)
+        self.cluster_model.start()
+        self.logger = Logger.Logger()
+
+    def test_compile(self):
+        """
+            Unknown node types and bad weights are left out of the plan
+        """
+        selector = NodeSelector(self.cluster_model, {
+            'node_type_1': {'CONTROLLER': {}},
+            'node_type_2': {'LEADER': {'Topic': 'topic1', 'Partition': 3,
+                                       'Weight': 2}},
+            'node_type_3': {'UNKNOWN_BROKER': {}},
+            'node_type_4': {'RANDOM_BROKER': {'Weight': 0}}},
+            self.logger)
+        self.assertEqual([str(metadata) for metadata in selector.plan],
+                         ['CONTROLLER', 'LEADER for topic1/3'])
+        self.assertEqual(selector.cumulative_weights, [1, 3])
+        self.assert_(self.logger.log_contains(
+            'Ignoring node_type_3, unknown node type UNKNOWN_BROKER'))
+        self.assert_(self.logger.log_contains(
+            'Ignoring node_type_4, weight 0 is not a positive number'))
+        picks = [selector.get_random_node() for _ in range(300)]
+        self.assertEqual(set(picks), set(['broker0', 'broker3']))
+        self.assert_(picks.count('broker3') > picks.count('broker0'))
+        self.assertEqual(NodeSelector(self.cluster_model, None,
+                                      self.logger).get_random_node(), None)
+
+    def test_random_nodes(self):
+        """
+            get_random_nodes returns distinct hosts unless asked not to
+        """
+        selector = NodeSelector(self.cluster_model, {
+            'node_type_1': {'RANDOM_BROKER': {}},
+            'node_type_2': {'CONTROLLER': {}}}, self.logger)
+        nodes = selector.get_random_nodes(4)
+        self.assertEqual(len(nodes), 4)
+        self.assertEqual(len(set(nodes)), 4)
+        self.assertEqual(sorted(selector.get_random_nodes(10)),
+                         ['broker{0}'.format(index) for index in range(5)])
+        selector = NodeSelector(self.cluster_model, {
+            'node_type_1': {'CONTROLLER': {}}}, self.logger)
+        self.assertEqual(selector.get_random_nodes(3, distinct=False),
+                         ['broker0'] * 3)
+        self.assertEqual(selector.get_random_nodes(3), ['broker0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,13 +15,45 @@
 import os
 import yaml
 import time
+import random
 import unittest
 
+import pytest
+
 import simoorg.plugins.scheduler.NonDeterministicScheduler. \
     NonDeterministicScheduler as NonDeterministicScheduler
 
 FATEBOOK_DIR = (os.path.dirname(os.path.realpath(__file__)) +
                 "/unittest_configs/scheduler_configs/fate_books/")
+LONG_RUN_DESTINY = {'constraints': {'min_gap_between_failures': 1,
+                                    'max_gap_between_failures': 4,
+                                    'total_run_duration': 30 * 24 * 60},
+                    'failures': {'failure1': {}, 'failure2': {},
+                                 'failure3': {}}}
+
+
+def draw_reference_trigger_times(start_time, end_time, min_gap, max_gap):
+    """
+        The trigger times the scheduler drew before the plan went into
+        arrays, one randint per failure
+    """
+    trigger_times = []
+    trigger_time = start_time
+    while True:
+        trigger_time += random.randint(min_gap, max_gap) * 60
+        if trigger_time > end_time:
+            return trigger_times
+        trigger_times.append(trigger_time)
+
+
+def get_gap_frequencies(trigger_times, start_time):
+    """
+        Share of each gap, in minutes, between consecutive trigger times
+    """
+    gaps = [(trigger_time - last_time) // 60 for last_time, trigger_time
+            in zip([start_time] + list(trigger_times), trigger_times)]
+    return dict((gap, gaps.count(gap) / float(len(gaps)))
+                for gap in set(gaps))
 
 
 class TestNonDeterministicScheduler(unittest.TestCase):
@@ -85,6 +117,110 @@ class TestNonDeterministicScheduler(unittest.TestCase):
                 current_step_time = step
                 plan_index += 1
 
+    def test_plan_arrays(self):
+        """
+            A long plan is kept as parallel arrays which agree with the
+            list of dicts view
+        """
+        destiny_object = {'constraints': {'min_gap_between_failures': 1,
+                                          'max_gap_between_failures': 2,
+                                          'total_run_duration': 30 * 24 * 60},
+                          'failures': {'failure1': {}, 'failure2': {},
+                                       'failure3': {}}}
+        start_timestamp = int(time.time())
+        non_det_sched_obj = (NonDeterministicScheduler
+                             .NonDeterministicScheduler(destiny_object))
+        failure_names, failure_indexes, trigger_times = \
+            non_det_sched_obj.get_plan_arrays()
+        failure_indexes = failure_indexes.tolist()
+        trigger_times = trigger_times.tolist()
+        self.assertEqual(sorted(failure_names), ['failure1', 'failure2',
+                                                 'failure3'])
+        self.assertEqual(len(failure_indexes), len(trigger_times))
+        # 30 days at one or two minutes between failures
+        self.assert_(21600 <= len(trigger_times) <= 43200)
+        self.assertEqual(failure_indexes[:6], [0, 1, 2, 0, 1, 2])
+        # the scheduler may have started a second after start_timestamp
+        self.assert_(60 <= trigger_times[0] - start_timestamp <= 121)
+        for last_time, trigger_time in zip(trigger_times, trigger_times[1:]):
+            self.assert_(60 <= trigger_time - last_time <= 120)
+        self.assert_(trigger_times[-1] <= start_timestamp + 30 * 24 * 3600 + 1)
+        plan = non_det_sched_obj.get_plan()
+        self.assert_(non_det_sched_obj.plan is plan)
+        self.assertEqual(plan[:3], [{failure_names[index]:
+                                     trigger_times[index]}
+                                    for index in range(3)])
+        self.assertEqual(plan[-1], {failure_names[failure_indexes[-1]]:
+                                    trigger_times[-1]})
+        self.assertEqual(non_det_sched_obj.get_compact_plan().to_events(),
+                         plan)
+        destiny_object['failures'] = {}
+        self.assertEqual(NonDeterministicScheduler.NonDeterministicScheduler(
+            destiny_object).get_plan(), [])
+        destiny_object['constraints']['max_gap_between_failures'] = 0
+        self.assertRaises(ValueError,
+                          NonDeterministicScheduler.NonDeterministicScheduler,
+                          destiny_object)
+
+    def test_fallback_distribution(self):
+        """
+            Without numpy the gaps follow the distribution of the
+            generator the arrays replaced
+        """
+        non_det_sched_obj = (NonDeterministicScheduler
+                             .NonDeterministicScheduler(LONG_RUN_DESTINY))
+        start_time = int(time.time())
+        end_time = start_time + 30 * 24 * 3600
+        random.seed(1)
+        trigger_times = non_det_sched_obj.draw_trigger_times(
+            start_time, end_time, 1, 4)
+        reference_times = draw_reference_trigger_times(start_time, end_time,
+                                                       1, 4)
+        # 30 days at 2.5 minutes between failures on average
+        self.assert_(abs(len(trigger_times) - len(reference_times)) <
+                     0.02 * len(reference_times))
+        frequencies = get_gap_frequencies(trigger_times, start_time)
+        reference_frequencies = get_gap_frequencies(reference_times,
+                                                    start_time)
+        self.assertEqual(sorted(frequencies), [1, 2, 3, 4])
+        self.assertEqual(sorted(reference_frequencies), [1, 2, 3, 4])
+        for gap in frequencies:
+            self.assert_(abs(frequencies[gap] -
+                             reference_frequencies[gap]) < 0.02)
+        self.assert_(trigger_times[-1] <= end_time)
+
+    def test_numpy_plan(self):
+        """
+            With numpy the gaps are drawn in batches which join up into
+            one increasing plan
+        """
+        numpy = pytest.importorskip('numpy')
+        self.assert_(NonDeterministicScheduler.numpy is numpy)
+        non_det_sched_obj = (NonDeterministicScheduler
+                             .NonDeterministicScheduler(LONG_RUN_DESTINY))
+        start_time = int(time.time())
+        end_time = start_time + 30 * 24 * 3600
+        batch_margin = NonDeterministicScheduler.BATCH_MARGIN
+        # batches a tenth of the plan, so several of them are drawn
+        NonDeterministicScheduler.BATCH_MARGIN = 0.1
+        try:
+            trigger_times = non_det_sched_obj.draw_trigger_times_numpy(
+                start_time, end_time, 1, 4).tolist()
+        finally:
+            NonDeterministicScheduler.BATCH_MARGIN = batch_margin
+        self.assert_(trigger_times[-1] <= end_time)
+        self.assert_(end_time - trigger_times[-1] < 4 * 60)
+        gaps = [trigger_time - last_time for last_time, trigger_time
+                in zip([start_time] + trigger_times, trigger_times)]
+        self.assertEqual(sorted(set(gaps)), [60, 120, 180, 240])
+        failure_names, failure_indexes, plan_times = \
+            non_det_sched_obj.get_plan_arrays()
+        self.assert_(isinstance(plan_times, numpy.ndarray))
+        compact_plan = non_det_sched_obj.get_compact_plan()
+        self.assertEqual(len(compact_plan), len(plan_times))
+        self.assertEqual(compact_plan.to_events(),
+                         non_det_sched_obj.get_plan())
+
 
 if __name__ == '__main__':
     unittest.main()
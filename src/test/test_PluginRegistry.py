@@ -0,0 +1,138 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import os
+import copy
+import yaml
+import unittest
+
+import simoorg.PluginRegistry as PluginRegistry
+from simoorg.plugins.handler.TestHandler.TestHandler import TestHandler
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+FATE_BOOK = (TEST_DIR + "/unittest_configs/atropos_configs/sample_base/" +
+             "fate_books/test.yaml")
+
+
+class PerUseHandler(TestHandler):
+    """
+        A handler which does not allow its instances to be reused
+    """
+    REUSABLE = False
+
+
+class TestPluginRegistry(unittest.TestCase):
+    """
+        Test the class cache, the reuse of instances and the fate book
+        validation of the plugin registry
+    """
+    def setUp(self):
+        PluginRegistry.PLUGIN_CLASSES[
+            (PluginRegistry.HANDLER_PLUGIN, 'PerUseHandler')] = PerUseHandler
+
+    def tearDown(self):
+        del PluginRegistry.PLUGIN_CLASSES[
+            (PluginRegistry.HANDLER_PLUGIN, 'PerUseHandler')]
+
+    def test_classes(self):
+        """
+            Classes are imported once and unknown plugins raise
+            ImportError
+        """
+        handler_class = PluginRegistry.get_plugin_class(
+            PluginRegistry.HANDLER_PLUGIN, 'TestHandler')
+        self.assert_(handler_class is TestHandler)
+        self.assert_((PluginRegistry.HANDLER_PLUGIN, 'TestHandler') in
+                     PluginRegistry.PLUGIN_CLASSES)
+        self.assertRaises(ImportError, PluginRegistry.get_plugin_class,
+                          PluginRegistry.HANDLER_PLUGIN, 'MissingHandler')
+
+    def test_instances(self):
+        """
+            Reusable plugins get one instance per key, the others a new
+            instance on every call
+        """
+        registry = PluginRegistry.PluginRegistry()
+        first = registry.get_instance(PluginRegistry.HANDLER_PLUGIN,
+                                      'TestHandler', 'node1', TEST_DIR,
+                                      'node1')
+        self.assert_(first is registry.get_instance(
+            PluginRegistry.HANDLER_PLUGIN, 'TestHandler', 'node1', TEST_DIR,
+            'node1'))
+        other = registry.get_instance(PluginRegistry.HANDLER_PLUGIN,
+                                      'TestHandler', 'node2', TEST_DIR,
+                                      'node2')
+        self.assert_(other is not first)
+        self.assertEqual(other.target, 'node2')
+        self.assert_(registry.get_instance(
+            PluginRegistry.HANDLER_PLUGIN, 'PerUseHandler', 'node1',
+            TEST_DIR, 'node1') is not registry.get_instance(
+            PluginRegistry.HANDLER_PLUGIN, 'PerUseHandler', 'node1',
+            TEST_DIR, 'node1'))
+        self.assert_(not registry.is_cached(PluginRegistry.HANDLER_PLUGIN,
+                                            'PerUseHandler', 'node1'))
+        # instances are not shared between registries
+        self.assert_(PluginRegistry.PluginRegistry().get_instance(
+            PluginRegistry.HANDLER_PLUGIN, 'TestHandler', 'node1', TEST_DIR,
+            'node1') is not first)
+        # kept instances are handed back to be closed
+        self.assertEqual(registry.pop_instances(
+            PluginRegistry.HEALTHCHECK_PLUGIN), [])
+        self.assertEqual(sorted(registry.pop_instances(
+            PluginRegistry.HANDLER_PLUGIN)), sorted([first, other]))
+        self.assert_(not registry.is_cached(PluginRegistry.HANDLER_PLUGIN,
+                                            'TestHandler', 'node1'))
+
+    def test_config_key(self):
+        """
+            The config key of a plugin config does not depend on the
+            order of its keys, but on every value
+        """
+        self.assertEqual(PluginRegistry.get_config_key(None), None)
+        config_key = PluginRegistry.get_config_key({'a': 1, 'b': [1, 2]})
+        self.assertEqual(config_key, PluginRegistry.get_config_key(
+            dict([('b', [1, 2]), ('a', 1)])))
+        self.assertNotEqual(config_key, PluginRegistry.get_config_key(
+            {'a': 1, 'b': [1, 3]}))
+        self.assertNotEqual(config_key, PluginRegistry.get_config_key({}))
+
+    def test_validate_fate_book(self):
+        """
+            Every plugin named in a fate book is checked
+        """
+        with open(FATE_BOOK) as fate_book_fd:
+            fate_book = yaml.load(fate_book_fd)
+        self.assertEqual(PluginRegistry.validate_fate_book(fate_book), [])
+        broken_book = copy.deepcopy(fate_book)
+        broken_book['topology']['topology_plugin'] = 'StaticTopolgy'
+        broken_book['healthcheck']['plugin'] = 'DefaultHealtCheck'
+        broken_book['failures'][0]['restore_handler']['type'] = 'TestHandlr'
+        errors = PluginRegistry.validate_fate_book(broken_book)
+        self.assertEqual(len(errors), 3)
+        self.assert_('StaticTopolgy' in errors[0])
+        self.assert_('DefaultHealtCheck' in errors[1])
+        self.assert_('restore_handler of failure test_failure' in errors[2])
+        # the children of a composite health check are checked too
+        composite_book = copy.deepcopy(fate_book)
+        composite_book['healthcheck'] = {
+            'plugin': 'CompositeHealthCheck',
+            'plugin_configs': {'checks': [{'plugin': 'DefaultHealthCheck'},
+                                          {'plugin': 'HttpHealthCheck'}]}}
+        errors = PluginRegistry.validate_fate_book(composite_book)
+        self.assertEqual(len(errors), 1)
+        self.assert_('HttpHealthCheck in healthcheck check 1' in errors[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
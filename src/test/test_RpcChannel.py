@@ -0,0 +1,127 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import os
+import time
+import unittest
+import threading
+import simoorg.Api.ApiConstants as ApiConstants
+
+from simoorg.Api.RpcChannel import RpcServer, RpcClient, RpcError, \
+    RpcTimeout
+
+TEST_SOCKET = '/tmp/moirai_rpc_unittest.sock'
+
+
+def dispatch(command, args, method):
+    """
+        Echo the arguments back after sleeping for args['delay'] seconds
+    """
+    time.sleep(args.get('delay', 0))
+    return ([command, args.get('value'), method],
+            {ApiConstants.DATA_VERSION_KEY: args.get('version')})
+
+
+class TestRpcChannel(unittest.TestCase):
+    """
+        Test multiplexing, timeouts and reconnects of the RPC channel
+    """
+    def setUp(self):
+        self.server = RpcServer(TEST_SOCKET, dispatch)
+        self.server.start()
+        self.client = RpcClient(TEST_SOCKET, timeout=2)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_call(self):
+        """
+            A simple request gets its own output back
+        """
+        self.assertEqual(self.client.call('list', {'value': 1}, 'GET'),
+                         ['list', 1, 'GET'])
+
+    def test_concurrent_calls(self):
+        """
+            Requests in flight at the same time share one connection and
+            each caller gets its own response, even out of order
+        """
+        results = {}
+
+        def caller(index):
+            results[index] = self.client.call(
+                'plan', {'value': index, 'delay': (5 - index) * 0.1}, 'GET')
+        threads = [threading.Thread(target=caller, args=(index,))
+                   for index in range(5)]
+        for thrd in threads:
+            thrd.start()
+        for thrd in threads:
+            thrd.join()
+        for index in range(5):
+            self.assertEqual(results[index], ['plan', index, 'GET'])
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_timeout(self):
+        """
+            A slow response raises RpcTimeout and is dropped when it
+            arrives later
+        """
+        self.assertRaises(RpcTimeout, self.client.call, 'events',
+                          {'delay': 0.5}, 'GET', timeout=0.1)
+        time.sleep(0.6)
+        self.assertEqual(self.client.call('list', {'value': 2}, 'GET'),
+                         ['list', 2, 'GET'])
+
+    def test_reconnect(self):
+        """
+            The client reconnects after moirai restarted
+        """
+        self.client.call('list', {}, 'GET')
+        self.server.stop()
+        self.assertRaises(RpcError, self.client.call, 'list', {}, 'GET')
+        self.server = RpcServer(TEST_SOCKET, dispatch)
+        self.server.start()
+        self.assertEqual(self.client.call('list', {'value': 3}, 'GET'),
+                         ['list', 3, 'GET'])
+        self.assert_(os.path.exists(TEST_SOCKET))
+
+    def test_data_version(self):
+        """
+            The client follows the data version from responses and from
+            messages pushed by the server, and forgets it on disconnect
+        """
+        response_map = self.client.request('list', {'version': 'a.0-1'},
+                                           'GET')
+        self.assertEqual(response_map[ApiConstants.DATA_VERSION_KEY],
+                         'a.0-1')
+        self.assertEqual(self.client.data_version, 'a.0-1')
+        self.server.broadcast({ApiConstants.DATA_VERSION_KEY: 'a.0-2'})
+        deadline = time.time() + 1
+        while self.client.data_version != 'a.0-2' and \
+                time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.client.data_version, 'a.0-2')
+        # a response which was overtaken by a broadcast does not move the
+        # version back
+        self.client.request('list', {'version': 'a.0-1'}, 'GET')
+        self.assertEqual(self.client.data_version, 'a.0-2')
+        self.client.request('list', {'version': 'a.1-3'}, 'GET')
+        self.assertEqual(self.client.data_version, 'a.1-3')
+        self.client.close()
+        self.assertEqual(self.client.data_version, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import os
+import socket
+import unittest
+
+import simoorg.plugins.handler.ShellScriptHandler.ShellScriptHandler as \
+    ShellScriptHandler
+from simoorg.plugins.common.ConnectionPool import ConnectionPool
+import mock_modules.Logger as Logger
+from mock_modules.MockSshClient import MockSSHClient, MockChannel
+
+CONFIG_DIR = (os.path.dirname(os.path.realpath(__file__)) +
+              "/unittest_configs/handler_configs")
+TEST_HOST = 'test-node'
+TEST_USER = 'test'
+
+
+class TestShellScriptHandler(unittest.TestCase):
+    """
+        Test the shell script handler against a mock ssh client
+    """
+    def setUp(self):
+        MockSSHClient.reset()
+        self.ssh_client_class = ShellScriptHandler.paramiko.SSHClient
+        ShellScriptHandler.paramiko.SSHClient = MockSSHClient
+        self.logger = Logger.Logger()
+        self.channels = []
+
+    def tearDown(self):
+        ShellScriptHandler.paramiko.SSHClient = self.ssh_client_class
+        for channel in self.channels:
+            channel.close()
+
+    def get_handler(self, connection_pool=None, **kwargs):
+        """
+            Create a handler for the test node
+        """
+        handler = ShellScriptHandler.ShellScriptHandler(
+            CONFIG_DIR, TEST_HOST, logger_instance=self.logger,
+            username=TEST_USER, **kwargs)
+        if connection_pool is not None:
+            handler.set_connection_pool(connection_pool)
+        return handler
+
+    def queue_channel(self, **kwargs):
+        """
+            Queue the channel the next command runs on
+        """
+        channel = MockChannel(**kwargs)
+        self.channels.append(channel)
+        MockSSHClient.channels.append(channel)
+        return channel
+
+    def run_cycle(self, connection_pool):
+        """
+            Induce and revert a failure the way atropos does, with a new
+            handler for every command
+        """
+        statuses = []
+        for script in ('induce.sh', 'revert.sh'):
+            handler = self.get_handler(connection_pool)
+            handler.authenticate()
+            try:
+                statuses.append(handler.execute_command(script, [])[0])
+            finally:
+                handler.close()
+        return statuses
+
+    def test_pooled_connection(self):
+        """
+            Handlers of the same node reuse one ssh connection through the
+            pool, a dead connection is replaced
+        """
+        pool = ConnectionPool()
+        self.assertEqual(self.run_cycle(pool), [0, 0])
+        self.assertEqual(self.run_cycle(pool), [0, 0])
+        self.assertEqual(len(MockSSHClient.clients), 1)
+        first_client = MockSSHClient.clients[0]
+        self.assertEqual(len(first_client.commands), 4)
+        self.assertEqual(pool.get_stats()['reused'], 3)
+        self.assertEqual(first_client.get_transport().keepalive, 30)
+        # the remote end went away while the connection was idle
+        first_client.get_transport().active = False
+        self.assertEqual(self.run_cycle(pool), [0, 0])
+        self.assertEqual(len(MockSSHClient.clients), 2)
+        self.assert_(first_client.closed)
+        self.assertEqual(len(MockSSHClient.clients[1].commands), 2)
+        self.assertEqual(pool.get_stats()['open'], 1)
+
+    def test_broken_connection(self):
+        """
+            A connection which broke during a command is not given back
+            to the pool
+        """
+        pool = ConnectionPool()
+        handler = self.get_handler(pool)
+        handler.authenticate()
+        handler.ssh_client.get_transport().active = False
+        self.assertRaises(ShellScriptHandler.paramiko.SSHException,
+                          handler.execute_command, 'induce.sh', [])
+        handler.close()
+        self.assertEqual(pool.get_stats()['open'], 0)
+        self.assertEqual(self.run_cycle(pool), [0, 0])
+        self.assertEqual(len(MockSSHClient.clients), 2)
+
+    def test_broken_wait(self):
+        """
+            A connection which breaks while the handler waits for the
+            command output is not given back to the pool
+        """
+        pool = ConnectionPool()
+        for recv_error in (socket.error("Connection reset"), EOFError()):
+            handler = self.get_handler(pool)
+            handler.authenticate()
+            self.queue_channel(stdout_chunks=['started\n'], exit_ready=False,
+                               recv_error=recv_error)
+            self.assertRaises(type(recv_error), handler.execute_command,
+                              'induce.sh', [])
+            self.assert_(handler.connection_broken)
+            handler.close()
+            self.assertEqual(pool.get_stats()['open'], 0)
+        self.assertEqual(self.run_cycle(pool), [0, 0])
+        self.assertEqual(len(MockSSHClient.clients), 3)
+
+    def test_bounded_output(self):
+        """
+            The output buffer keeps only the last max_bytes and says how
+            much it dropped
+        """
+        output_buffer = ShellScriptHandler.BoundedOutputBuffer(10)
+        output_buffer.append('')
+        self.assertEqual(output_buffer.get_lines(), [])
+        output_buffer.append('line1\n')
+        output_buffer.append('line2\n')
+        self.assertEqual(output_buffer.size, 10)
+        self.assertEqual(output_buffer.get_lines(),
+                         ['[2 bytes of output truncated]\n', 'ne1\n',
+                          'line2\n'])
+        output_buffer.append('a much longer line\n')
+        self.assertEqual(output_buffer.size, 10)
+        self.assertEqual(output_buffer.dropped_bytes, 21)
+        self.assertEqual(output_buffer.get_lines(),
+                         ['[21 bytes of output truncated]\n', 'nger line\n'])
+        handler = self.get_handler()
+        handler.max_output_bytes = 13
+        handler.authenticate()
+        self.queue_channel(stdout_chunks=['first\n', 'second\n', 'third\n'])
+        status, output, errors = handler.execute_command('induce.sh', [])
+        self.assertEqual(status, 0)
+        self.assertEqual(output, ['[6 bytes of output truncated]\n',
+                                  'second\n', 'third\n'])
+        self.assertEqual(errors, [])
+
+    def test_command_timeout(self):
+        """
+            A command which does not exit within command_timeout gets the
+            timeout status and its channel is closed
+        """
+        handler = self.get_handler(command_timeout=0.2)
+        handler.authenticate()
+        channel = self.queue_channel(stdout_chunks=['started\n'],
+                                     exit_ready=False)
+        status, output, errors = handler.execute_command('induce.sh', [])
+        self.assertEqual(status, ShellScriptHandler.COMMAND_TIMEOUT_STATUS)
+        self.assertEqual(output, ['started\n'])
+        self.assert_(channel.closed)
+        self.assert_(self.logger.log_contains(
+            "Command did not finish within 0.2 seconds, giving up"))
+
+    def test_drain_on_exit(self):
+        """
+            Output still queued on the channel when the command exits is
+            read before the exit status is returned
+        """
+        handler = self.get_handler()
+        handler.authenticate()
+        self.queue_channel(stdout_chunks=['out1\n', 'out2\n'],
+                           stderr_chunks=['err1\n', 'err2\n'],
+                           exit_status=3)
+        status, output, errors = handler.execute_command('revert.sh',
+                                                         ['arg1', 'arg2'])
+        self.assertEqual(status, 3)
+        self.assertEqual(output, ['out1\n', 'out2\n'])
+        self.assertEqual(errors, ['err1\n', 'err2\n'])
+        self.assertEqual(MockSSHClient.clients[0].commands,
+                         ['revert.sh arg1 arg2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
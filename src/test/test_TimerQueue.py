@@ -0,0 +1,90 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import time
+import unittest
+import threading
+
+from simoorg.TimerQueue import TimerQueue
+
+
+class TestTimerQueue(unittest.TestCase):
+    """
+        Test ordering, due time handling and task tracking of the
+        timer queue
+    """
+    def test_ordering(self):
+        """
+            Items come out in due time order, ties in scheduling order
+        """
+        timer_queue = TimerQueue()
+        now = time.time()
+        timer_queue.schedule(now + 0.2, 'late')
+        timer_queue.schedule(now, 'first')
+        timer_queue.schedule(now, 'second')
+        items = []
+        for _ in range(3):
+            items.append(timer_queue.get()[1])
+            timer_queue.task_done()
+        self.assertEqual(items, ['first', 'second', 'late'])
+        self.assert_(time.time() >= now + 0.2)
+        self.assertEqual(timer_queue.get(), None)
+
+    def test_active_task(self):
+        """
+            get waits for active tasks, which may schedule new items
+        """
+        timer_queue = TimerQueue()
+        timer_queue.schedule(time.time(), 'induce')
+        self.assertEqual(timer_queue.get()[1], 'induce')
+
+        def finish_induce():
+            time.sleep(0.1)
+            timer_queue.schedule(time.time() + 0.1, 'revert')
+            timer_queue.task_done()
+        thrd = threading.Thread(target=finish_induce)
+        thrd.start()
+        self.assertEqual(timer_queue.get()[1], 'revert')
+        timer_queue.task_done()
+        thrd.join()
+        self.assertEqual(timer_queue.get(), None)
+
+    def test_stop(self):
+        """
+            stop makes get return even with items pending
+        """
+        timer_queue = TimerQueue()
+        timer_queue.schedule(time.time() + 60, 'never')
+        threading.Timer(0.1, timer_queue.stop).start()
+        self.assertEqual(timer_queue.get(), None)
+        self.assertEqual(len(timer_queue), 1)
+
+    def test_discard(self):
+        """
+            discard drops matching pending items, get returns once the
+            rest are handed out
+        """
+        timer_queue = TimerQueue()
+        now = time.time()
+        for index in range(4):
+            timer_queue.schedule(now + (3 - index) * 60, index)
+        self.assertEqual(timer_queue.discard(lambda item: item != 3), 3)
+        self.assertEqual(len(timer_queue), 1)
+        self.assertEqual(timer_queue.get()[1], 3)
+        timer_queue.task_done()
+        self.assertEqual(timer_queue.get(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#
+# Copyright 2015 LinkedIn Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+import unittest
+
+from simoorg.plugins.common.ZKUtil import KafkaZkHelper
+from mock_modules.MockKazooClient import MockKazooClient, build_cluster
+
+ZK_PATHS = {'broker_ids': '/brokers/ids',
+            'broker_topics': '/brokers/topics',
+            'controller': '/controller'}
+
+
+class TestKafkaZkHelper(unittest.TestCase):
+    """
+        Test the lookups of the kafka zookeeper helper and the number of
+        round trips they take
+    """
+    def setUp(self):
+        self.zk_client = MockKazooClient()
+        build_cluster(self.zk_client, brokers=300)
+        self.helper = KafkaZkHelper(self.zk_client, ZK_PATHS)
+
+    def test_lookups(self):
+        """
+            Lookups return the same values as before and None for
+            missing znodes
+        """
+        helper = self.helper
+        self.assertEqual(helper.get_controller(), 'broker0')
+        self.assertEqual(helper.get_leader('topic1', 1), 'broker1')
+        self.assertEqual(helper.get_isr('topic0', 0)[:2],
+                         ['broker0', 'broker1'])
+        self.assertEqual(sorted(helper.get_topics()), ['topic0', 'topic1'])
+        self.assertEqual(helper.get_number_of_partitions('topic0'), 2)
+        self.assert_(helper.get_partition('topic0') in ['0', '1'])
+        self.assertEqual(helper.get_host(7), 'broker7')
+        self.assertEqual(helper.get_hosts([2, 1000, 3]),
+                         ['broker2', None, 'broker3'])
+        self.assertEqual(helper.get_host(1000), None)
+        self.assertEqual(helper.get_leader('missing', 0), None)
+        self.assertEqual(helper.get_isr('missing', 0), None)
+        self.assertEqual(helper.get_partition('missing'), None)
+        self.zk_client.delete('/controller')
+        self.assertEqual(helper.get_controller(), None)
+
+    def test_round_trips(self):
+        """
+            Host reads of a call are pipelined into one round trip
+        """
+        hosts = self.helper.get_all_hosts()
+        self.assertEqual(len(hosts), 300)
+        self.assert_('broker299' in hosts)
+        self.assertEqual(self.zk_client.round_trips, 2)
+        self.assertEqual(self.zk_client.requests, 301)
+        self.zk_client.round_trips = 0
+        self.assertEqual(len(self.helper.get_isr('topic1', 0)), 300)
+        self.assertEqual(self.zk_client.round_trips, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
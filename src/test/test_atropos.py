@@ -17,11 +17,17 @@ import yaml
 import time
 import shutil
 import signal
+import tempfile
 import unittest
 import threading
 import multiprocessing
 
 import simoorg.atropos as atropos
+import simoorg.JournalLog as JournalLog
+import simoorg.PluginRegistry as PluginRegistry
+from simoorg.plugins.scheduler.BaseScheduler import plan_from_events
+from simoorg.plugins.healthcheck.HealthCheck import HealthCheck
+from simoorg.plugins.common.ConnectionPool import ConnectionPool
 import mock_modules.Logger as Logger
 
 TEST_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -53,6 +59,17 @@ INCORRECT_HC_FATEBOOK = (TEST_DIR + "/unittest_configs/atropos_configs/" +
                          "sample_incorrect_hc/fate_books/test.yaml")
 MISSING_DESTINY_FATEBOOK = (TEST_DIR + "/unittest_configs/atropos_configs/" +
                             "sample_missing_destiny/fate_books/test.yaml")
+FANOUT_CONFIG_DIR = (TEST_DIR + "/unittest_configs/atropos_configs/" +
+                     "sample_fanout/")
+FANOUT_FATEBOOK = FANOUT_CONFIG_DIR + "fate_books/test.yaml"
+# Positions of the status and timings in an event tuple
+EVENT_STATUS = 4
+EVENT_TIMINGS = 5
+FANOUT_NODES = ['fanout-node1', 'fanout-node2', 'fanout-node3']
+OVERLAP_CONFIG_DIR = (TEST_DIR + "/unittest_configs/atropos_configs/" +
+                      "sample_overlap/")
+OVERLAP_FATEBOOK = OVERLAP_CONFIG_DIR + "fate_books/test.yaml"
+OVERLAP_NODES = ['overlap-node1', 'overlap-node2']
 HASH_LENGTH = 8
 
 EVENT_SCHEDULE_BUFFER = 10
@@ -61,6 +78,50 @@ ATROPOS_START_BUFFER = 2
 TEST_FAILURE_NAME = 'test_failure'
 
 
+class RecoveringHealthCheck(HealthCheck):
+    """
+        Health check which fails its first revert checks, the coordinate
+        gives how many
+    """
+    REUSABLE = True
+
+    def __init__(self, script, plugin_config=None):
+        HealthCheck.__init__(self, script, plugin_config)
+        self.revert_checks = 0
+
+    def check(self):
+        return True
+
+    def check_revert(self):
+        self.revert_checks += 1
+        return self.revert_checks > self.script
+
+
+class PooledHandler(object):
+    """
+        Handler which holds a connection of the atropos pool from
+        authenticate until close, like the ShellScriptHandler
+    """
+    def __init__(self, config_dir, hostname, logger_instance=None,
+                 verbose=True):
+        self.hostname = hostname
+        self.connection_pool = None
+        self.connection = None
+
+    def set_connection_pool(self, connection_pool):
+        self.connection_pool = connection_pool
+
+    def authenticate(self):
+        self.connection = self.connection_pool.acquire(
+            self.hostname, lambda: object())
+
+    def execute_command(self, script, arguments):
+        return 0, [], []
+
+    def close(self):
+        self.connection_pool.release(self.hostname, self.connection)
+
+
 def KillerThread(pid, sleep_time):
     time.sleep(sleep_time)
     os.kill(pid, signal.SIGTERM)
@@ -116,7 +177,8 @@ class TestAtropos(unittest.TestCase):
         event_q = multiprocessing.Queue()
         random_start_time = ATROPOS_START_BUFFER
         my_pid = os.getpid()
-        event_time = time.time() + EVENT_SCHEDULE_BUFFER
+        # plans hold whole second trigger times and atropos keeps to them
+        event_time = int(time.time()) + EVENT_SCHEDULE_BUFFER
 
         # Create an event file to be consumed by a scheduler
         with open(self.test_config['event_file'], 'w') as ev_fd:
@@ -175,7 +237,8 @@ class TestAtropos(unittest.TestCase):
                                            logger_instance=self.logger)
         failure_event = list(event_q.get())
         revert_event = list(event_q.get())
-        self.assert_(failure_event[-1] and not (revert_event[-1]))
+        self.assert_(failure_event[EVENT_STATUS] and
+                     not (revert_event[EVENT_STATUS]))
 
     def test_failure_skip(self):
         """
@@ -196,7 +259,8 @@ class TestAtropos(unittest.TestCase):
                                            logger_instance=self.logger)
         failure_event = list(event_q.get())
         revert_event = list(event_q.get())
-        self.assert_(not (failure_event[-1]) and not (revert_event[-1]))
+        self.assert_(not (failure_event[EVENT_STATUS]) and
+                     not (revert_event[EVENT_STATUS]))
 
     def test_atropos_failure_effect(self):
         """
@@ -225,6 +289,197 @@ class TestAtropos(unittest.TestCase):
         else:
             self.assert_(False)
 
+    def test_fanout(self):
+        """
+            Check a fan-out failure is induced on every node of the
+            topology with one event per node
+        """
+        with open(FANOUT_FATEBOOK) as c_fd:
+            self.config_ = yaml.load(c_fd)
+        input_q = multiprocessing.Queue()
+        event_q = multiprocessing.Queue()
+        event_time = time.time() + EVENT_SCHEDULE_BUFFER
+        with open(self.test_config['event_file'], 'w') as ev_fd:
+            ev_fd.write(str(event_time))
+        my_pid = os.getpid()
+        # revert skip is enabled so the per node test files stay behind
+        self.atropos_obj = atropos.Atropos(self.config_,
+                                           FANOUT_CONFIG_DIR, input_q,
+                                           event_q,
+                                           logger_instance=self.logger)
+        induced_nodes = []
+        for _ in range(2 * len(FANOUT_NODES)):
+            event = list(event_q.get())
+            if event[1] == TEST_FAILURE_NAME:
+                self.assert_(event[EVENT_STATUS])
+                induced_nodes.append(event[3])
+            else:
+                self.assert_(not event[EVENT_STATUS])
+        self.assertEqual(sorted(induced_nodes), FANOUT_NODES)
+        for node in FANOUT_NODES:
+            result_file = "/tmp/atropos_unittest_" + node
+            with open(result_file) as atr_fd:
+                result_pid = atr_fd.readline().strip()
+            os.remove(result_file)
+            self.assertEqual(int(result_pid), my_pid)
+
+    def test_fanout_pool_limit(self):
+        """
+            A fan-out to more nodes than the connection pool holds runs in
+            batches of the pool size instead of waiting at the start gate
+        """
+        PluginRegistry.PLUGIN_CLASSES[
+            (PluginRegistry.HANDLER_PLUGIN, 'PooledHandler')] = PooledHandler
+        try:
+            atropos_obj = atropos.Atropos(self.config_, TEST_CONFIG_DIR,
+                                          multiprocessing.Queue(),
+                                          multiprocessing.Queue(),
+                                          logger_instance=self.logger,
+                                          install_signal_handler=False,
+                                          start=False)
+            atropos_obj.handler_connection_pool = ConnectionPool(
+                max_connections=2, acquire_timeout=5)
+            nodes = ['pool-node{0}'.format(index) for index in range(5)]
+            handler_data = {'type': 'PooledHandler', 'coordinate': 'test',
+                            'arguments': None}
+            start_time = time.time()
+            results = atropos_obj.run_parallel(atropos_obj.run_inducer,
+                                               nodes, handler_data, None,
+                                               len(nodes))
+            self.assertEqual(results, [True] * len(nodes))
+            self.assert_(time.time() - start_time < 5)
+            self.assertEqual(
+                atropos_obj.handler_connection_pool.get_stats()['open'], 2)
+        finally:
+            del PluginRegistry.PLUGIN_CLASSES[
+                (PluginRegistry.HANDLER_PLUGIN, 'PooledHandler')]
+
+    def test_overlapping_failures(self):
+        """
+            Check a second failure is induced while the first one is
+            still waiting for its revert, when the impact limit allows it
+        """
+        with open(OVERLAP_FATEBOOK) as c_fd:
+            self.config_ = yaml.load(c_fd)
+        input_q = multiprocessing.Queue()
+        event_q = multiprocessing.Queue()
+        event_time = int(time.time()) + EVENT_SCHEDULE_BUFFER
+        with open(self.test_config['event_file'], 'w') as ev_fd:
+            ev_fd.write(str(event_time) + "\n" + str(event_time + 1))
+        self.atropos_obj = atropos.Atropos(self.config_,
+                                           OVERLAP_CONFIG_DIR, input_q,
+                                           event_q,
+                                           logger_instance=self.logger)
+        events = [list(event_q.get()) for _ in range(4)]
+        # both inductions come before the first revert
+        self.assertEqual([event[1] for event in events],
+                         [TEST_FAILURE_NAME] * 2 +
+                         [TEST_FAILURE_NAME + '-revert'] * 2)
+        self.assert_(events[0][EVENT_STATUS] and events[1][EVENT_STATUS])
+        self.assert_(events[0][EVENT_TIMINGS]['induce_latency'] >= 0)
+        self.assert_(events[2][EVENT_TIMINGS]['revert_latency'] >= 0)
+        for node in OVERLAP_NODES:
+            result_file = "/tmp/atropos_unittest_" + node
+            if os.path.isfile(result_file):
+                os.remove(result_file)
+
+    def test_event_error(self):
+        """
+            An event which raises stops the inductions still to come, but
+            the failures already induced are reverted before the error
+            reaches the caller
+        """
+        with open(OVERLAP_FATEBOOK) as c_fd:
+            self.config_ = yaml.load(c_fd)
+        atropos_obj = atropos.Atropos(self.config_, OVERLAP_CONFIG_DIR,
+                                      multiprocessing.Queue(),
+                                      multiprocessing.Queue(),
+                                      logger_instance=self.logger,
+                                      install_signal_handler=False,
+                                      start=False)
+        atropos_obj.open_journal()
+        induced = []
+        reverted = []
+
+        def induce_fate(failure_name, trigger_time):
+            induced.append(failure_name)
+            if failure_name == 'broken_failure':
+                raise RuntimeError('induce handler failed')
+            atropos_obj.timer_queue.schedule(
+                time.time() + 0.5, (atropos.REVERT_EVENT, failure_name,
+                                    trigger_time, OVERLAP_NODES))
+
+        def revert_fate(nodes, failure_name, trigger_time, due_time):
+            reverted.append(failure_name)
+        atropos_obj.induce_fate = induce_fate
+        atropos_obj.revert_fate = revert_fate
+        now = time.time()
+        plan = plan_from_events([{'failure1': now},
+                                 {'failure2': now + 0.1},
+                                 {'broken_failure': now + 0.2},
+                                 {'failure4': now + 0.3}])
+        self.assertRaises(RuntimeError, atropos_obj.follow_plan, plan)
+        atropos_obj.close_journal()
+        self.assertEqual(induced, ['failure1', 'failure2', 'broken_failure'])
+        self.assertEqual(sorted(reverted), ['failure1', 'failure2'])
+        self.assertEqual(len(atropos_obj.timer_queue), 0)
+
+    def test_stop_during_induce(self):
+        """
+            An induction counts as a failure in flight as soon as it is
+            dispatched. A stop drops the inductions still to come, but the
+            running one finishes and its revert runs
+        """
+        with open(OVERLAP_FATEBOOK) as c_fd:
+            self.config_ = yaml.load(c_fd)
+        atropos_obj = atropos.Atropos(self.config_, OVERLAP_CONFIG_DIR,
+                                      multiprocessing.Queue(),
+                                      multiprocessing.Queue(),
+                                      logger_instance=self.logger,
+                                      install_signal_handler=False,
+                                      start=False)
+        atropos_obj.open_journal()
+        induce_started = threading.Event()
+        stop_requested = threading.Event()
+        induced = []
+        reverted = []
+
+        def induce_fate(failure_name, trigger_time):
+            induce_started.set()
+            # a slow health check, nothing is charged to the journal yet
+            stop_requested.wait(5)
+            induced.append(failure_name)
+            atropos_obj.timer_queue.schedule(
+                time.time() + 0.2, (atropos.REVERT_EVENT, failure_name,
+                                    trigger_time, OVERLAP_NODES))
+
+        def revert_fate(nodes, failure_name, trigger_time, due_time):
+            reverted.append(failure_name)
+        atropos_obj.induce_fate = induce_fate
+        atropos_obj.revert_fate = revert_fate
+
+        stop_checks = []
+
+        def stop_atropos():
+            induce_started.wait(5)
+            stop_checks.append((atropos_obj.failure_in_flight,
+                                atropos_obj.handle_sigterm()))
+            atropos_obj.request_stop()
+            stop_requested.set()
+        stop_thread = threading.Thread(target=stop_atropos)
+        stop_thread.start()
+        now = time.time()
+        plan = plan_from_events([{'failure1': now},
+                                 {'failure2': now + 0.5}])
+        self.assertRaises(SystemExit, atropos_obj.follow_plan, plan)
+        stop_thread.join()
+        atropos_obj.close_journal()
+        self.assertEqual(stop_checks, [(True, False)])
+        self.assertEqual(induced, ['failure1'])
+        self.assertEqual(reverted, ['failure1'])
+        self.assert_(not atropos_obj.failure_in_flight)
+        self.assertEqual(len(atropos_obj.timer_queue), 0)
+
     def test_missing_sched(self):
         """
             Check the system exits when we skip scheduler name in the fatebook
@@ -307,7 +562,8 @@ class TestAtropos(unittest.TestCase):
                                            logger_instance=self.logger)
         failure_event = list(event_q.get())
         revert_event = list(event_q.get())
-        self.assert_(not (failure_event[-1] or revert_event[-1]))
+        self.assert_(not (failure_event[EVENT_STATUS] or
+                          revert_event[EVENT_STATUS]))
 
     def test_missing_random_node(self):
         """
@@ -330,7 +586,8 @@ class TestAtropos(unittest.TestCase):
                                            logger_instance=self.logger)
         failure_event = list(event_q.get())
         revert_event = list(event_q.get())
-        self.assert_(not (failure_event[-1] or revert_event[-1]))
+        self.assert_(not (failure_event[EVENT_STATUS] or
+                          revert_event[EVENT_STATUS]))
 
     def test_incorrect_healthcheck(self):
         """
@@ -355,6 +612,111 @@ class TestAtropos(unittest.TestCase):
         if not exit_exception_flag:
             self.assert_(False)
 
+    def test_revert_gate(self):
+        """
+            A gated revert waits until the revert health check passes,
+            backing off between the checks, or gives up at the gate timeout
+        """
+        PluginRegistry.PLUGIN_CLASSES[
+            (PluginRegistry.HEALTHCHECK_PLUGIN, 'RecoveringHealthCheck')] = \
+            RecoveringHealthCheck
+        try:
+            self.config_['healthcheck'] = {'plugin': 'RecoveringHealthCheck',
+                                           'coordinate': 3,
+                                           'gate_revert': True,
+                                           'gate_interval': 0.05,
+                                           'gate_timeout': 5}
+            atropos_obj = atropos.Atropos(self.config_, TEST_CONFIG_DIR,
+                                          multiprocessing.Queue(),
+                                          multiprocessing.Queue(),
+                                          logger_instance=self.logger,
+                                          install_signal_handler=False,
+                                          start=False)
+            self.assert_(atropos_obj.is_revert_gated())
+            self.assert_(atropos_obj.is_recovery_probed())
+            # three failed checks, 0.05, 0.1 and 0.2 seconds apart
+            time_to_healthy = atropos_obj.wait_for_recovery(
+                TEST_FAILURE_NAME)
+            self.assert_(0.35 <= time_to_healthy < 2)
+            self.assertEqual(atropos_obj.import_health_check(
+                'RecoveringHealthCheck', 3).revert_checks, 4)
+            atropos_obj.healthcheck['coordinate'] = 1000
+            atropos_obj.healthcheck['gate_timeout'] = 0.2
+            start_time = time.time()
+            self.assertEqual(atropos_obj.wait_for_recovery(
+                TEST_FAILURE_NAME), None)
+            self.assert_(time.time() - start_time < 2)
+            del atropos_obj.healthcheck['gate_revert']
+            self.assert_(not atropos_obj.is_revert_gated())
+            self.assert_(not atropos_obj.is_recovery_probed())
+            atropos_obj.healthcheck['probe_recovery'] = True
+            self.assert_(atropos_obj.is_recovery_probed())
+            # a new plugin config gets a new instance
+            self.assert_(atropos_obj.import_health_check(
+                'RecoveringHealthCheck', 3) is not
+                atropos_obj.import_health_check(
+                    'RecoveringHealthCheck', 3, {'cache_ttl': 1}))
+            health_check = atropos_obj.import_health_check(
+                'RecoveringHealthCheck', 3)
+            atropos_obj.close_health_checks()
+            self.assert_(atropos_obj.import_health_check(
+                'RecoveringHealthCheck', 3) is not health_check)
+        finally:
+            del PluginRegistry.PLUGIN_CLASSES[
+                (PluginRegistry.HEALTHCHECK_PLUGIN, 'RecoveringHealthCheck')]
+
+    def test_journal_recovery(self):
+        """
+            Failures a dead atropos left outstanding in the journal log
+            start charged and are reverted by revert_outstanding, a failed
+            revert stays in the log
+        """
+        with open(FANOUT_FATEBOOK) as c_fd:
+            self.config_['failures'] = yaml.load(c_fd)['failures']
+        temp_dir = tempfile.mkdtemp(prefix='simoorg_journal_')
+        log_path = os.path.join(temp_dir, 'test.journal')
+        self.config_['journal_log'] = log_path
+        trigger_time = time.time()
+        journal_log = JournalLog.JournalLog(log_path)
+        for target in FANOUT_NODES:
+            journal_log.append([(JournalLog.INDUCE_INTENT, TEST_FAILURE_NAME,
+                                 target, trigger_time, True)], durable=True)
+        journal_log.close()
+        # the induce never ran on the last node, so its revert fails
+        for target in FANOUT_NODES[:2]:
+            with open("/tmp/atropos_unittest_" + target, 'w') as atr_fd:
+                atr_fd.write(str(os.getpid()))
+        event_q = multiprocessing.Queue()
+        try:
+            atropos_obj = atropos.Atropos(self.config_, TEST_CONFIG_DIR,
+                                          multiprocessing.Queue(), event_q,
+                                          logger_instance=self.logger,
+                                          install_signal_handler=False,
+                                          start=False)
+            atropos_obj.open_journal()
+            self.assertEqual(atropos_obj.journal.get_total_impacted(), 3)
+            self.assert_(atropos_obj.failure_in_flight)
+            self.assertEqual(atropos_obj.revert_outstanding(), 1)
+            atropos_obj.close_journal()
+            statuses = {}
+            for _ in FANOUT_NODES:
+                event = event_q.get(timeout=5)
+                self.assertEqual(event[1], TEST_FAILURE_NAME + '-revert')
+                statuses[event[3]] = event[EVENT_STATUS]
+            self.assertEqual(statuses, {'fanout-node1': True,
+                                        'fanout-node2': True,
+                                        'fanout-node3': False})
+            self.assertEqual(atropos_obj.journal.get_total_impacted(), 1)
+            self.assert_(atropos_obj.failure_in_flight)
+            for target in FANOUT_NODES[:2]:
+                self.assert_(not os.path.exists("/tmp/atropos_unittest_" +
+                                                target))
+            self.assertEqual(JournalLog.replay(log_path),
+                             [(TEST_FAILURE_NAME, 'fanout-node3',
+                               trigger_time)])
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
     def test_missing_destiny(self):
         """
             Check that the atropos object generates an exception
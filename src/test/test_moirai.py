@@ -14,13 +14,21 @@
 
 import unittest
 import os
+import Queue
 import subprocess
 import shutil
+import tempfile
 import simoorg.moirai as Moirai
+import simoorg.JournalLog as JournalLog
+import simoorg.ImpactLedger as ImpactLedger
 import simoorg.Api.ApiConstants as ApiConstants
+import simoorg.Api.MoiraiApiServer as MoiraiApiServer
+from simoorg.plugins.topology.StaticTopology.StaticTopology import \
+    StaticTopology
 import json
 import time
 import yaml
+import threading
 
 # Assuming a flat collection of tests
 MOIRAI_CONFIG_DIR = (os.path.dirname(os.path.realpath(__file__)) +
@@ -34,14 +42,32 @@ INCORRECT_FATEBOOK = "sample_incorrect/"
 MISSING_FATEBOOK = "sample_missing/"
 MISSING_API_CONFIGS = "sample_missing_api/"
 IMPOSSIBLE_API_CONFIGS = "sample_impossible_api/"
+API_WORKERS_CONFIGS = "sample_api_workers/"
+API_RPC_CONFIGS = "sample_api_rpc/"
+UNKNOWN_PLUGIN_CONFIGS = "sample_unknown_plugin/"
 COUNT_FATE = ['ps', 'aux']
 TMP_FIFO = "/tmp/test.fifo"
+DEAD_FIFO = "/tmp/test_dead_endpoint.fifo"
+API_LISTENER_WARMUP_TIME = 0.5
+EVENT_QUEUE_FLUSH_TIME = 0.2
 TEST_DIR = os.path.dirname(os.path.realpath(__file__))
 DUMMY_HEALTHCHECK_SRC = (TEST_DIR + "/unittest_configs/dummy_healthcheck/" +
                          "dummy.sh")
 DUMMY_HEALTHCHECK_DST = "/tmp/dummy.sh"
 
 
+class FakeAtroposProcess(object):
+    """
+        Stands in for the process of a pooled atropos worker
+    """
+    def __init__(self, pid):
+        self.pid = pid
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+
 class TestMoirai(unittest.TestCase):
     """
         In this test set we want to test three different behavior of Moirai
@@ -108,6 +134,177 @@ class TestMoirai(unittest.TestCase):
             moirai_obj.finish()
             self.assert_(caught_exception_flag)
 
+    def test_unknown_plugin(self):
+        """
+            A fate book naming a plugin which does not exist is refused
+            before any atropos is started
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + UNKNOWN_PLUGIN_CONFIGS)
+        try:
+            moirai_obj.spawn_atropos()
+        except ValueError as exc:
+            self.assert_('TestHandlr' in str(exc))
+            self.assertEqual(moirai_obj.atropos_army, {})
+        else:
+            moirai_obj.finish()
+            self.fail('fate book with an unknown handler was accepted')
+
+    def test_recover_journals(self):
+        """
+            Deploying the atropos of a fate book with a journal log first
+            reverts the failures its last atropos left outstanding, the
+            topology of the recovering atropos is closed afterwards
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + CORRECT_FATEBOOK)
+        moirai_obj.api_config['fate_book_cache'] = None
+        temp_dir = tempfile.mkdtemp(prefix='simoorg_recover_')
+        log_path = os.path.join(temp_dir, 'test.journal')
+        test_file = os.path.join(temp_dir, 'induced')
+        deployed = []
+        moirai_obj.deploy_forked_atropos = deployed.append
+        closed_topologies = []
+        StaticTopology.close = lambda topology: \
+            closed_topologies.append(topology)
+        try:
+            moirai_obj.read_configs()
+            moirai_obj.load_config()
+            config = moirai_obj.atropos_fate_book_configs['test_service']
+            config['journal_log'] = log_path
+            for handler in ('induce_handler', 'restore_handler'):
+                config['failures'][0][handler]['coordinate'] = test_file
+            with open(test_file, 'w') as test_fd:
+                test_fd.write(str(os.getpid()))
+            journal_log = JournalLog.JournalLog(log_path)
+            journal_log.append([(JournalLog.INDUCE_INTENT, 'test_failure',
+                                 'localhost', 1.0, True)], durable=True)
+            journal_log.close()
+            moirai_obj.deploy_atropos(moirai_obj.atropos_fate_book_configs)
+            self.assertEqual(deployed,
+                             [moirai_obj.atropos_fate_book_configs])
+            self.assert_(not os.path.exists(test_file))
+            self.assertEqual(JournalLog.replay(log_path), [])
+            event = moirai_obj.atropos_event_queue.get(timeout=5)
+            self.assertEqual(event[:5], ('test_service',
+                                         'test_failure-revert', 1.0,
+                                         'localhost', True))
+            self.assertEqual(len(closed_topologies), 1)
+        finally:
+            del StaticTopology.close
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_recover_journals_ledger(self):
+        """
+            Failures the journal recovery could not revert are not charged
+            to the impact ledger by the recovering atropos, redeploying
+            leaves the ledger empty for the new atropos to charge
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + CORRECT_FATEBOOK)
+        moirai_obj.api_config['fate_book_cache'] = None
+        moirai_obj.impact_ledger = ImpactLedger.ImpactLedger(
+            service_maximum=10, host_maximum=10)
+        temp_dir = tempfile.mkdtemp(prefix='simoorg_recover_')
+        log_path = os.path.join(temp_dir, 'test.journal')
+        moirai_obj.deploy_forked_atropos = lambda fate_book_configs: None
+        try:
+            moirai_obj.read_configs()
+            moirai_obj.load_config()
+            config = moirai_obj.atropos_fate_book_configs['test_service']
+            config['journal_log'] = log_path
+            # the revert fails as the induced file is missing
+            for handler in ('induce_handler', 'restore_handler'):
+                config['failures'][0][handler]['coordinate'] = \
+                    os.path.join(temp_dir, 'induced')
+            journal_log = JournalLog.JournalLog(log_path)
+            journal_log.append([(JournalLog.INDUCE_INTENT, 'test_failure',
+                                 'localhost', 1.0, True)], durable=True)
+            journal_log.close()
+            # the dead atropos still holds its impact
+            moirai_obj.impact_ledger.admit('test_service', 'localhost')
+            for _ in range(2):
+                moirai_obj.deploy_atropos(
+                    moirai_obj.atropos_fate_book_configs)
+                self.assertEqual(moirai_obj.impact_ledger.get_count(
+                    ImpactLedger.SERVICE_COUNTER, 'test_service'), 0)
+                self.assertEqual(moirai_obj.impact_ledger.get_count(
+                    ImpactLedger.HOST_COUNTER, 'localhost'), 0)
+            self.assertEqual(JournalLog.replay(log_path),
+                             [('test_failure', 'localhost', 1.0)])
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_reload_fate_books(self):
+        """
+            A reload starts the atropos of new fate books, replaces the
+            atropos of changed ones once they stopped and stops the
+            atropos of removed ones, the others keep running
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + CORRECT_FATEBOOK)
+        moirai_obj.api_config['fate_book_cache'] = None
+        moirai_obj.fate_books_dir = tempfile.mkdtemp(prefix='simoorg_reload_')
+        fate_book_path = os.path.join(moirai_obj.fate_books_dir, 'test.yaml')
+        other_path = os.path.join(moirai_obj.fate_books_dir, 'other.yaml')
+        shutil.copyfile(MOIRAI_CONFIG_DIR + CORRECT_FATEBOOK +
+                        'fate_books/test.yaml', fate_book_path)
+        with open(fate_book_path) as c_fd:
+            fate_book = c_fd.read()
+        deployed = []
+
+        def deploy_atropos(fate_book_configs):
+            for service_name in fate_book_configs:
+                proc = FakeAtroposProcess(len(deployed))
+                moirai_obj.atropos_army[service_name] = proc
+                moirai_obj.atropos_host_queues[proc.pid] = (Queue.Queue(),
+                                                            Queue.Queue())
+                deployed.append(service_name)
+        moirai_obj.deploy_atropos = deploy_atropos
+        try:
+            moirai_obj.read_configs()
+            moirai_obj.load_config()
+            deploy_atropos(moirai_obj.atropos_fate_book_configs)
+            moirai_obj.add_service_entry('test_service', ['localhost'], [])
+            self.assertEqual(moirai_obj.reload_fate_books(), ([], [], []))
+            with open(other_path, 'w') as c_fd:
+                c_fd.write(fate_book.replace('service: test_service',
+                                             'service: other_service'))
+            self.assertEqual(moirai_obj.reload_fate_books(),
+                             (['other_service'], [], []))
+            self.assertEqual(deployed, ['test_service', 'other_service'])
+            with open(fate_book_path, 'w') as c_fd:
+                c_fd.write(fate_book.replace('wait_seconds: 5',
+                                             'wait_seconds: 6'))
+            self.assertEqual(moirai_obj.reload_fate_books(),
+                             ([], [], ['test_service']))
+            control_q, stopped_q = moirai_obj.atropos_host_queues[0]
+            self.assertEqual(control_q.get_nowait(), 'test_service')
+            # a failure is still in flight, nothing is replaced yet
+            moirai_obj.restart_stopped_atropos()
+            self.assertEqual(len(deployed), 2)
+            data_version = moirai_obj.get_data_version()
+            stopped_q.put('test_service')
+            moirai_obj.restart_stopped_atropos()
+            self.assertEqual(deployed[2:], ['test_service'])
+            self.assertEqual(moirai_obj.pending_restarts, {})
+            self.assert_('test_service' not in moirai_obj.service_map)
+            self.assertNotEqual(
+                moirai_obj.get_data_version().rsplit('-', 1)[0],
+                data_version.rsplit('-', 1)[0])
+            os.remove(other_path)
+            self.assertEqual(moirai_obj.reload_fate_books(),
+                             ([], ['other_service'], []))
+            moirai_obj.atropos_army['other_service'].alive = False
+            moirai_obj.restart_stopped_atropos()
+            self.assertEqual(sorted(moirai_obj.atropos_army),
+                             ['test_service'])
+            self.assertEqual(len(deployed), 3)
+            # a broken fate book leaves the running atropos alone
+            with open(fate_book_path, 'w') as c_fd:
+                c_fd.write(fate_book.replace('service: test_service', ''))
+            self.assertEqual(moirai_obj.reload_fate_books(), ([], [], []))
+            self.assertEqual(moirai_obj.atropos_fate_book_configs.keys(),
+                             ['test_service'])
+        finally:
+            shutil.rmtree(moirai_obj.fate_books_dir, ignore_errors=True)
+
     def test_moirai(self):
         """
             Test the correct behavior of Moirai
@@ -253,6 +450,190 @@ class TestMoirai(unittest.TestCase):
         self.assert_(not moirai_obj.api_read_procs[0].is_alive())
         moirai_obj.finish()
 
+    def test_api_workers(self):
+        """
+            A client which stopped reading its FIFO does not stall the
+            api workers and shows up in the metrics
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + API_WORKERS_CONFIGS)
+        moirai_obj.add_service_entry('test_service', ['localhost'], [])
+        moirai_obj.start_api_listeners()
+        time.sleep(API_LISTENER_WARMUP_TIME)
+        self.command_id = 0
+        for fifo_path in (TMP_FIFO, DEAD_FIFO):
+            try:
+                os.mkfifo(fifo_path)
+            except (IOError, OSError):
+                print ("the temp fifo file already exists, moving along")
+        with open(MOIRAI_CONFIG_DIR + API_WORKERS_CONFIGS + '/api.yaml') \
+                as conf_fd:
+            self.api_config = yaml.load(conf_fd)
+        api_fifo_fd = os.open(TMP_FIFO, os.O_NONBLOCK)
+        self.api_fifo_file = os.fdopen(api_fifo_fd)
+        # nobody ever reads the reply of this command
+        self.api_fifo_path = DEAD_FIFO
+        self.command_id = 100
+        status, output = self.execute_command('list', {})
+        self.assertEqual(status, -1)
+        self.api_fifo_path = TMP_FIFO
+        status, output = self.execute_command('list', {})
+        self.assertEqual(json.loads(output), ['test_service'])
+        status, output = self.execute_command('metrics', {})
+        metrics = json.loads(output)
+        self.assertEqual(metrics['dropped_replies'], 1)
+        self.assertEqual(metrics['commands']['list']['count'], 2)
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['workers'], 2)
+        self.api_fifo_file.close()
+        os.remove(DEAD_FIFO)
+
+    def test_api_get_events_pages(self):
+        """
+            The events command keeps its plain list output and pages
+            through the events when given a cursor, since or limit
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + API_WORKERS_CONFIGS)
+        events = []
+        for trigger_time in range(5):
+            event = ['failure1', trigger_time, 'node1', True]
+            events.append(event)
+            moirai_obj.atropos_event_queue.put(
+                tuple(['test_service'] + event))
+        time.sleep(EVENT_QUEUE_FLUSH_TIME)
+        args = {'service_name': 'test_service'}
+        self.assertEqual(json.loads(moirai_obj.api_get_events(args)),
+                         events)
+        args['limit'] = '2'
+        page = json.loads(moirai_obj.api_get_events(args))
+        self.assertEqual(page['events'], events[:2])
+        args['cursor'] = str(page['next_cursor'])
+        page = json.loads(moirai_obj.api_get_events(args))
+        self.assertEqual(page['events'], events[2:4])
+        del args['cursor']
+        args['since'] = '3'
+        page = json.loads(moirai_obj.api_get_events(args))
+        self.assertEqual(page['events'], events[4:])
+        self.assertEqual(page['next_cursor'], 5)
+        args['limit'] = 'many'
+        self.assertEqual(moirai_obj.api_get_events(args),
+                         'Invalid value for limit')
+        self.assertEqual(json.loads(moirai_obj.api_get_events(
+            {'service_name': 'other_service'})), [[]])
+
+    def test_api_get_stats(self):
+        """
+            The stats command reports the timing percentiles of each
+            failure from the timings attached to the events
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + API_WORKERS_CONFIGS)
+        for trigger_time in range(4):
+            moirai_obj.atropos_event_queue.put(
+                ('test_service', 'failure1', trigger_time, 'node1', True,
+                 {'induce_latency': 1.5}))
+            moirai_obj.atropos_event_queue.put(
+                ('test_service', 'failure1-revert', trigger_time, 'node1',
+                 True, {'revert_latency': 0.5, 'time_to_healthy': 10}))
+        time.sleep(EVENT_QUEUE_FLUSH_TIME)
+        stats = json.loads(moirai_obj.api_get_stats(
+            {'service_name': 'test_service'}))
+        self.assertEqual(stats['failure1']['induce_latency'],
+                         {'count': 4, 'p50': 1.5, 'p95': 1.5, 'p99': 1.5})
+        self.assertEqual(stats['failure1']['time_to_healthy']['p99'], 10)
+        self.assertEqual(stats['failure1']['unrecovered'], 0)
+        self.assertEqual(json.loads(moirai_obj.api_get_stats(
+            {'service_name': 'other_service'})), {})
+
+    def test_dispatch_concurrency(self):
+        """
+            A slow command does not hold the api lock, other commands and
+            new services go through while it runs
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + API_WORKERS_CONFIGS)
+        moirai_obj.add_service_entry('test_service', ['localhost'], [])
+        stats_started = threading.Event()
+        stats_release = threading.Event()
+
+        def api_get_stats(args):
+            stats_started.set()
+            stats_release.wait(ApiConstants.READ_TIMEOUT_SECS)
+            return json.dumps({})
+        moirai_obj.api_get_stats = api_get_stats
+        stats_thread = threading.Thread(
+            target=moirai_obj.dispatch_command,
+            args=('stats', {'service_name': 'test_service'}, 'GET'))
+        stats_thread.start()
+        try:
+            self.assert_(stats_started.wait(ApiConstants.READ_TIMEOUT_SECS))
+            moirai_obj.add_service_entry('other_service', ['localhost'], [])
+            output, response_keys = moirai_obj.dispatch_command(
+                'list', {}, 'GET')
+            self.assertEqual(sorted(json.loads(output)),
+                             ['other_service', 'test_service'])
+            self.assertEqual(response_keys[ApiConstants.DATA_VERSION_KEY],
+                             moirai_obj.get_data_version())
+            self.assert_(stats_thread.is_alive())
+        finally:
+            stats_release.set()
+            stats_thread.join()
+
+    def wait_for_data_version(self, moirai_obj, data_version):
+        """
+            Wait until moirai moved on to the given data version
+        """
+        deadline = time.time() + ApiConstants.READ_TIMEOUT_SECS
+        while moirai_obj.data_version < data_version and \
+                time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(moirai_obj.data_version, data_version)
+
+    def test_conditional_get(self):
+        """
+            Versioned outputs carry an ETag, the api server answers a
+            conditional GET for the current version with a 304 without
+            asking moirai and notices new versions pushed by moirai
+        """
+        moirai_obj = Moirai.Moirai(MOIRAI_CONFIG_DIR + API_RPC_CONFIGS)
+        moirai_obj.start_api_listeners()
+        moirai_obj.atropos_data_queue.put(('test_service', ['a'],
+                                           [{'failure1': 10}]))
+        self.wait_for_data_version(moirai_obj, 1)
+        api_server = MoiraiApiServer.MoiraiApiServer(
+            MOIRAI_CONFIG_DIR + API_RPC_CONFIGS + 'api.yaml')
+        client = api_server.fetch_app().test_client()
+        try:
+            response = client.get('/test_service/plan')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data), [{'failure1': 10}])
+            plan_etag = response.headers['ETag']
+            response = client.get('/test_service/plan',
+                                  headers={'If-None-Match': plan_etag})
+            self.assertEqual(response.status_code, 304)
+            response = client.get('/list')
+            list_etag = response.headers['ETag']
+            metrics = moirai_obj.api_metrics.get_snapshot()
+            self.assertEqual(metrics['commands']['plan']['count'], 1)
+            moirai_obj.atropos_data_queue.put(('other_service', ['b'], []))
+            self.wait_for_data_version(moirai_obj, 2)
+            deadline = time.time() + ApiConstants.READ_TIMEOUT_SECS
+            while api_server.rpc_client.data_version != \
+                    moirai_obj.get_data_version() and time.time() < deadline:
+                time.sleep(0.01)
+            response = client.get('/list',
+                                  headers={'If-None-Match': list_etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sorted(json.loads(response.data)),
+                             ['other_service', 'test_service'])
+            # the plan of a registered service does not change
+            response = client.get('/test_service/plan',
+                                  headers={'If-None-Match': plan_etag})
+            self.assertEqual(response.status_code, 304)
+            metrics = moirai_obj.api_metrics.get_snapshot()
+            self.assertEqual(metrics['commands']['plan']['count'], 1)
+        finally:
+            api_server.rpc_client.close()
+            os.remove(api_server.api_fifo_path)
+            moirai_obj.finish()
+
     def test_moirai_api_commands(self):
         """
             Test the api hooks for moirai
@@ -263,7 +644,8 @@ class TestMoirai(unittest.TestCase):
         failure_list = ['test_failure']
         server_list = ['localhost']
         self.command_id = 0
-        event_list_cnt = 4
+        # failure name, trigger time, node, status and timings
+        event_list_cnt = 5
         try:
             os.mkfifo(TMP_FIFO)
         except (IOError, OSError):